@@ -3,6 +3,7 @@ import logging
 from flask_login import current_user
 
 from pcapi.admin.base_configuration import BaseAdminView
+from pcapi.models.feature import invalidate_features_cache
 import pcapi.notifications.internal.transactional.change_feature_flip as change_feature_flip_internal_message
 
 
@@ -25,3 +26,7 @@ class FeatureView(BaseAdminView):
         logger.info("Activated or deactivated feature flag", extra={"feature": model.name, "active": model.isActive})
         change_feature_flip_internal_message.send(feature=model, current_user=current_user)
         return super().on_model_change(form=form, model=model, is_created=is_created)
+
+    def after_model_change(self, form, model, is_created):  # type: ignore [no-untyped-def]
+        invalidate_features_cache()
+        return super().after_model_change(form=form, model=model, is_created=is_created)
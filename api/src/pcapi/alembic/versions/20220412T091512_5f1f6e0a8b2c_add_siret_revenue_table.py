@@ -0,0 +1,26 @@
+"""Add siret_revenue table."""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "5f1f6e0a8b2c"
+down_revision = "bc19bb0b294f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "siret_revenue",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("siret", sa.String(length=14), nullable=False),
+        sa.Column("year", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("siret", "year", name="unique_siret_year"),
+    )
+
+
+def downgrade():
+    op.drop_table("siret_revenue")
@@ -0,0 +1,110 @@
+"""Add bookedAmount and usedAmount columns to deposit, maintained by a booking trigger.
+
+Existing deposits are not backfilled here: that would lock the deposit
+and booking tables while all bookings are scanned. Run the
+`recompute_deposit_balances` command after this migration, then enable
+the USE_DEPOSIT_BALANCE_COLUMNS feature flag once
+`check_deposit_balance_consistency` reports no inconsistent deposit.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8a1f3c2d9e47"
+down_revision = "5f1f6e0a8b2c"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("deposit", sa.Column("bookedAmount", sa.Numeric(10, 2), nullable=False, server_default=sa.text("0")))
+    op.add_column("deposit", sa.Column("usedAmount", sa.Numeric(10, 2), nullable=False, server_default=sa.text("0")))
+    # This is a frozen copy of `Booking.trig_deposit_balance_ddl`, on
+    # purpose: the migration must not change if the model does.
+    op.execute(
+        """
+    CREATE OR REPLACE FUNCTION update_deposit_balance()
+    RETURNS TRIGGER AS $$
+    DECLARE
+        old_deposit_id bigint;
+        new_deposit_id bigint;
+        old_booked_amount numeric := 0;
+        old_used_amount numeric := 0;
+        new_booked_amount numeric := 0;
+        new_used_amount numeric := 0;
+    BEGIN
+        IF TG_OP != 'INSERT' THEN
+            IF OLD."individualBookingId" IS NOT NULL THEN
+                SELECT "depositId" INTO old_deposit_id FROM individual_booking WHERE id = OLD."individualBookingId";
+            END IF;
+            IF OLD.status != 'CANCELLED' THEN
+                old_booked_amount := OLD.amount * OLD.quantity;
+            END IF;
+            IF OLD.status IN ('USED', 'REIMBURSED') THEN
+                old_used_amount := OLD.amount * OLD.quantity;
+            END IF;
+        END IF;
+
+        IF TG_OP != 'DELETE' THEN
+            IF NEW."individualBookingId" IS NOT NULL THEN
+                SELECT "depositId" INTO new_deposit_id FROM individual_booking WHERE id = NEW."individualBookingId";
+            END IF;
+            IF NEW.status != 'CANCELLED' THEN
+                new_booked_amount := NEW.amount * NEW.quantity;
+            END IF;
+            IF NEW.status IN ('USED', 'REIMBURSED') THEN
+                new_used_amount := NEW.amount * NEW.quantity;
+            END IF;
+        END IF;
+
+        IF old_deposit_id IS NOT DISTINCT FROM new_deposit_id THEN
+            -- Avoid locking the deposit row when nothing has changed.
+            IF new_deposit_id IS NOT NULL
+                AND (new_booked_amount != old_booked_amount OR new_used_amount != old_used_amount)
+            THEN
+                UPDATE deposit
+                SET
+                    "bookedAmount" = "bookedAmount" + new_booked_amount - old_booked_amount,
+                    "usedAmount" = "usedAmount" + new_used_amount - old_used_amount
+                WHERE id = new_deposit_id;
+            END IF;
+        ELSE
+            IF old_deposit_id IS NOT NULL THEN
+                UPDATE deposit
+                SET
+                    "bookedAmount" = "bookedAmount" - old_booked_amount,
+                    "usedAmount" = "usedAmount" - old_used_amount
+                WHERE id = old_deposit_id;
+            END IF;
+            IF new_deposit_id IS NOT NULL THEN
+                UPDATE deposit
+                SET
+                    "bookedAmount" = "bookedAmount" + new_booked_amount,
+                    "usedAmount" = "usedAmount" + new_used_amount
+                WHERE id = new_deposit_id;
+            END IF;
+        END IF;
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS booking_update_deposit_balance ON booking;
+
+    CREATE TRIGGER booking_update_deposit_balance
+    AFTER INSERT
+    OR UPDATE OF status, amount, quantity, "individualBookingId"
+    OR DELETE
+    ON booking
+    FOR EACH ROW
+    EXECUTE PROCEDURE update_deposit_balance()
+    """
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS booking_update_deposit_balance ON booking")
+    op.execute("DROP FUNCTION IF EXISTS update_deposit_balance")
+    op.drop_column("deposit", "usedAmount")
+    op.drop_column("deposit", "bookedAmount")
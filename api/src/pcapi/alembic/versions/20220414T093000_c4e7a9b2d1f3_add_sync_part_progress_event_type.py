@@ -0,0 +1,28 @@
+"""Add SyncPartProgress to localprovidereventtype, to resume TiteLive
+synchronizations in the middle of a file.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "c4e7a9b2d1f3"
+down_revision = "8a1f3c2d9e47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("ALTER TYPE localprovidereventtype ADD VALUE IF NOT EXISTS 'SyncPartProgress'")
+
+
+def downgrade():
+    op.execute("DELETE FROM local_provider_event WHERE type = 'SyncPartProgress'")
+    op.execute("ALTER TYPE localprovidereventtype RENAME TO localprovidereventtype_old")
+    op.execute(
+        "CREATE TYPE localprovidereventtype AS ENUM ('SyncError', 'SyncPartStart', 'SyncPartEnd', 'SyncStart', 'SyncEnd')"
+    )
+    op.execute(
+        "ALTER TABLE local_provider_event ALTER COLUMN type TYPE localprovidereventtype "
+        "USING type::text::localprovidereventtype"
+    )
+    op.execute("DROP TYPE localprovidereventtype_old")
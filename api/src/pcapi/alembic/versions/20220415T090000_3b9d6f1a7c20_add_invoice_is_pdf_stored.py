@@ -0,0 +1,23 @@
+"""Add isPdfStored column to invoice, so that the PDF file of an
+invoice can be generated again if it could not be stored.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3b9d6f1a7c20"
+down_revision = "c4e7a9b2d1f3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "invoice",
+        sa.Column("isPdfStored", sa.Boolean(), nullable=False, server_default=sa.sql.expression.true()),
+    )
+
+
+def downgrade():
+    op.drop_column("invoice", "isPdfStored")
@@ -1,6 +1,7 @@
 import ftplib
-from io import BytesIO
 import logging
+import tempfile
+from typing import IO
 from typing import Pattern
 from zipfile import ZipFile
 
@@ -25,14 +26,25 @@ def connect_to_titelive_ftp():  # type: ignore [no-untyped-def]
     return ftp_titelive
 
 
-def get_zip_file_from_ftp(zip_file_name: str, folder_name: str) -> ZipFile:
-    data_file = BytesIO()
-    data_file.name = zip_file_name
-    file_path = "RETR " + folder_name + "/" + zip_file_name
+def download_file_from_ftp(file_path: str) -> IO[bytes]:
+    """Download the file to a temporary file (that is deleted when it
+    is closed), so that it is never entirely loaded in memory.
+    """
+    data_file = tempfile.TemporaryFile()
     logger.info("Downloading file %s", file_path)
-    connect_to_titelive_ftp().retrbinary(file_path, data_file.write)
+    with connect_to_titelive_ftp() as ftp_titelive:
+        ftp_titelive.retrbinary("RETR " + file_path, data_file.write)
+    data_file.seek(0)
+    return data_file
+
+
+def get_zip_file_from_ftp(zip_file_name: str, folder_name: str) -> ZipFile:
+    data_file = download_file_from_ftp(folder_name + "/" + zip_file_name)
     # FIXME: this should be a with statement. Requires titelive sync to be rewritten
-    return ZipFile(data_file, "r")
+    zip_file = ZipFile(data_file, "r")
+    # The name of the archive is used to get its date.
+    zip_file.filename = zip_file_name
+    return zip_file
 
 
 def get_files_to_process_from_titelive_ftp(titelive_folder_name: str, date_regexp: Pattern[str]) -> list[str]:
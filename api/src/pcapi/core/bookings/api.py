@@ -1,17 +1,24 @@
 import datetime
 import logging
 from operator import or_
+import secrets
+import tempfile
 import typing
 
+from google.cloud.storage.blob import Blob
+import jwt
 import pytz
 from sqlalchemy import and_
 
+from pcapi import settings
 from pcapi.core import search
 from pcapi.core.bookings import constants
 from pcapi.core.bookings.models import Booking
 from pcapi.core.bookings.models import BookingCancellationReasons
 from pcapi.core.bookings.models import BookingStatus
+from pcapi.core.bookings.models import BookingStatusFilter
 from pcapi.core.bookings.models import IndividualBooking
+import pcapi.core.bookings.repository as bookings_repository
 from pcapi.core.bookings.repository import generate_booking_token
 from pcapi.core.educational.models import CollectiveBooking
 from pcapi.core.educational.models import CollectiveBookingCancellationReasons
@@ -33,8 +40,11 @@ from pcapi.core.mails.transactional.bookings.booking_confirmation_to_beneficiary
     send_individual_booking_confirmation_email_to_beneficiary,
 )
 from pcapi.core.mails.transactional.bookings.new_booking_to_pro import send_user_new_booking_to_pro_email
+from pcapi.core.mails.transactional.pro.bookings_csv_export_to_pro import send_bookings_csv_export_to_pro_email
+from pcapi.core.offers import exceptions as offers_exceptions
 from pcapi.core.offers import repository as offers_repository
 import pcapi.core.offers.models as offers_models
+from pcapi.core.users import utils as users_utils
 from pcapi.core.users.external import update_external_pro
 from pcapi.core.users.external import update_external_user
 from pcapi.core.users.models import User
@@ -42,6 +52,7 @@ from pcapi.models import db
 from pcapi.models.feature import FeatureToggle
 from pcapi.repository import repository
 from pcapi.repository import transaction
+from pcapi.routes.serialization.bookings_recap_serialize import OfferType
 from pcapi.workers.push_notification_job import send_cancel_booking_notification
 from pcapi.workers.user_emails_job import send_booking_cancellation_emails_to_user_and_offerer_job
 
@@ -54,6 +65,10 @@ from .exceptions import BookingIsAlreadyUsed
 logger = logging.getLogger(__name__)
 
 QR_CODE_PASS_CULTURE_VERSION = "v3"
+# Exported CSV reports are stored in the (private) encrypted bucket.
+BOOKINGS_EXPORTS_BUCKET = "bookings_exports"
+BOOKINGS_EXPORT_LINK_VALIDITY = datetime.timedelta(days=7)
+BOOKINGS_EXPORT_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
 
 
 def book_offer(
@@ -65,67 +80,12 @@ def book_offer(
     Return a booking or raise an exception if it's not possible.
     Update a user's credit information on Batch.
     """
-    # The call to transaction here ensures we free the FOR UPDATE lock
-    # on the stock if validation issues an exception
-    with transaction():
-        stock = offers_repository.get_and_lock_stock(stock_id=stock_id)
-        validation.check_offer_is_not_educational(stock)
-        validation.check_offer_category_is_bookable_by_user(beneficiary, stock)
-        validation.check_can_book_free_offer(beneficiary, stock)
-        validation.check_offer_already_booked(beneficiary, stock.offer)
-        validation.check_quantity(stock.offer, quantity)
-        validation.check_stock_is_bookable(stock, quantity)
-        total_amount = quantity * stock.price
-        validation.check_expenses_limits(beneficiary, total_amount, stock.offer)
-
-        is_activation_code_applicable = (
-            stock.canHaveActivationCodes
-            and db.session.query(offers_models.ActivationCode.query.filter_by(stock=stock).exists()).scalar()
-        )
-        if is_activation_code_applicable:
-            validation.check_activation_code_available(stock)
-
-        first_venue_booking = not db.session.query(
-            Booking.query.filter(Booking.venueId == stock.offer.venueId).exists()
-        ).scalar()
-
-        # FIXME (dbaty, 2020-10-20): if we directly set relations (for
-        # example with `booking.user = beneficiary`) instead of foreign keys,
-        # the session tries to add the object when `get_user_expenses()`
-        # is called because autoflush is enabled. As such, the PostgreSQL
-        # exceptions (tooManyBookings and insufficientFunds) may raise at
-        # this point and will bubble up. If we want them to be caught, we
-        # have to set foreign keys, so that the session is NOT autoflushed
-        # in `get_user_expenses` and is only committed in `repository.save()`
-        # where exceptions are caught. Since we are using flask-sqlalchemy,
-        # I don't think that we should use autoflush, nor should we use
-        # the `pcapi.repository.repository` module.
-        booking = Booking(
-            userId=beneficiary.id,
-            stockId=stock.id,
-            amount=stock.price,
-            quantity=quantity,
-            token=generate_booking_token(),
-            venueId=stock.offer.venueId,
-            offererId=stock.offer.venue.managingOffererId,
-            status=BookingStatus.CONFIRMED,
-        )
-
-        booking.dateCreated = datetime.datetime.utcnow()
-        booking.cancellationLimitDate = compute_cancellation_limit_date(stock.beginningDatetime, booking.dateCreated)
-
-        if is_activation_code_applicable:
-            booking.activationCode = offers_repository.get_available_activation_code(stock)
-            booking.mark_as_used()
-
-        individual_booking = IndividualBooking(
-            booking=booking,
-            depositId=beneficiary.deposit.id if beneficiary.has_active_deposit else None,  # type: ignore [union-attr]
-            userId=beneficiary.id,
-        )
-        stock.dnBookedQuantity += booking.quantity
-
-        repository.save(individual_booking, stock)
+    if FeatureToggle.ENABLE_LOW_CONTENTION_BOOKING.is_active():
+        individual_booking, first_venue_booking = _book_offer_with_short_stock_lock(beneficiary, stock_id, quantity)
+    else:
+        individual_booking, first_venue_booking = _book_offer_with_stock_lock(beneficiary, stock_id, quantity)
+    booking = individual_booking.booking
+    stock = booking.stock
 
     logger.info(
         "Beneficiary booked an offer",
@@ -154,6 +114,125 @@ def book_offer(
     return individual_booking.booking
 
 
+def _book_offer_with_stock_lock(beneficiary: User, stock_id: int, quantity: int) -> tuple[IndividualBooking, bool]:
+    # The call to transaction here ensures we free the FOR UPDATE lock
+    # on the stock if validation issues an exception
+    with transaction():
+        stock = offers_repository.get_and_lock_stock(stock_id=stock_id)
+        _check_stock_can_be_booked(beneficiary, stock, quantity)
+
+        is_activation_code_applicable = _is_activation_code_applicable(stock)
+        if is_activation_code_applicable:
+            validation.check_activation_code_available(stock)
+
+        first_venue_booking = _is_first_venue_booking(stock)
+
+        individual_booking = _create_individual_booking(beneficiary, stock, quantity)
+        if is_activation_code_applicable:
+            individual_booking.booking.activationCode = offers_repository.get_available_activation_code(stock)
+            individual_booking.booking.mark_as_used()
+        stock.dnBookedQuantity += quantity
+
+        repository.save(individual_booking, stock)
+
+    return individual_booking, first_venue_booking
+
+
+def _book_offer_with_short_stock_lock(
+    beneficiary: User, stock_id: int, quantity: int
+) -> tuple[IndividualBooking, bool]:
+    """Book the offer like `_book_offer_with_stock_lock()`, except that
+    all checks are done before locking the stock. The stock is only
+    locked by the update of its booked quantity, until the booking is
+    inserted. Concurrent bookings of a popular stock hence do not wait
+    for the checks of each other.
+    """
+    stock = offers_models.Stock.query.filter_by(id=stock_id).populate_existing().one_or_none()
+    if not stock:
+        raise offers_exceptions.StockDoesNotExist()
+    _check_stock_can_be_booked(beneficiary, stock, quantity)
+
+    is_activation_code_applicable = _is_activation_code_applicable(stock)
+    if is_activation_code_applicable:
+        validation.check_activation_code_available(stock)
+
+    first_venue_booking = _is_first_venue_booking(stock)
+
+    with transaction():
+        # The remaining quantity may have changed since the checks above.
+        if not offers_repository.book_stock_quantity(stock.id, quantity):
+            raise exceptions.StockIsNotBookable()
+        # The stock is now locked. Check again what a concurrent
+        # booking could have changed.
+        validation.check_offer_already_booked(beneficiary, stock.offer)
+        individual_booking = _create_individual_booking(beneficiary, stock, quantity)
+        if is_activation_code_applicable:
+            activation_code = offers_repository.get_available_activation_code(stock)
+            if not activation_code:
+                raise exceptions.NoActivationCodeAvailable()
+            individual_booking.booking.activationCode = activation_code
+            individual_booking.booking.mark_as_used()
+
+        repository.save(individual_booking)
+
+    return individual_booking, first_venue_booking
+
+
+def _check_stock_can_be_booked(beneficiary: User, stock: offers_models.Stock, quantity: int) -> None:
+    validation.check_offer_is_not_educational(stock)
+    validation.check_offer_category_is_bookable_by_user(beneficiary, stock)
+    validation.check_can_book_free_offer(beneficiary, stock)
+    validation.check_offer_already_booked(beneficiary, stock.offer)
+    validation.check_quantity(stock.offer, quantity)
+    validation.check_stock_is_bookable(stock, quantity)
+    total_amount = quantity * stock.price
+    validation.check_expenses_limits(beneficiary, total_amount, stock.offer)
+
+
+def _is_activation_code_applicable(stock: offers_models.Stock) -> bool:
+    return (
+        stock.canHaveActivationCodes
+        and db.session.query(offers_models.ActivationCode.query.filter_by(stock=stock).exists()).scalar()
+    )
+
+
+def _is_first_venue_booking(stock: offers_models.Stock) -> bool:
+    return not db.session.query(Booking.query.filter(Booking.venueId == stock.offer.venueId).exists()).scalar()
+
+
+def _create_individual_booking(beneficiary: User, stock: offers_models.Stock, quantity: int) -> IndividualBooking:
+    # FIXME (dbaty, 2020-10-20): if we directly set relations (for
+    # example with `booking.user = beneficiary`) instead of foreign keys,
+    # the session tries to add the object when `get_user_expenses()`
+    # is called because autoflush is enabled. As such, the PostgreSQL
+    # exceptions (tooManyBookings and insufficientFunds) may raise at
+    # this point and will bubble up. If we want them to be caught, we
+    # have to set foreign keys, so that the session is NOT autoflushed
+    # in `get_user_expenses` and is only committed in `repository.save()`
+    # where exceptions are caught. Since we are using flask-sqlalchemy,
+    # I don't think that we should use autoflush, nor should we use
+    # the `pcapi.repository.repository` module.
+    booking = Booking(
+        userId=beneficiary.id,
+        stockId=stock.id,
+        amount=stock.price,
+        quantity=quantity,
+        token=generate_booking_token(),
+        venueId=stock.offer.venueId,
+        offererId=stock.offer.venue.managingOffererId,
+        status=BookingStatus.CONFIRMED,
+    )
+
+    booking.dateCreated = datetime.datetime.utcnow()
+    booking.cancellationLimitDate = compute_cancellation_limit_date(stock.beginningDatetime, booking.dateCreated)
+
+    return IndividualBooking(
+        booking=booking,
+        depositId=beneficiary.deposit.id if beneficiary.has_active_deposit else None,  # type: ignore [union-attr]
+        userId=beneficiary.id,
+    )
+
+
 def _cancel_booking(
     booking: Booking,
     reason: BookingCancellationReasons,
@@ -542,3 +621,67 @@ def auto_mark_as_used_after_event() -> None:
             "collectiveBookingsUpdatedCount": n_collective_bookings_updated,
         },
     )
+
+
+def export_csv_report(
+    user: User,
+    booking_period: typing.Optional[tuple[datetime.date, datetime.date]] = None,
+    status_filter: typing.Optional[BookingStatusFilter] = BookingStatusFilter.BOOKED,
+    event_date: typing.Optional[datetime.datetime] = None,
+    venue_id: typing.Optional[int] = None,
+    offer_type: typing.Optional[OfferType] = None,
+) -> str:
+    """Generate the CSV report of bookings, store it in the (private)
+    encrypted bucket and send a download link to the requesting pro
+    user. Return the link.
+
+    The link expires after ``BOOKINGS_EXPORT_LINK_VALIDITY`` and can
+    only be used by the requesting user, see `get_exported_csv_report()`.
+
+    This is meant to be called from a background task, for reports
+    that are too large to be generated within an HTTP request.
+    """
+    chunks = bookings_repository.stream_csv_report(
+        user,
+        booking_period=booking_period,
+        status_filter=status_filter,
+        event_date=event_date,
+        venue_id=venue_id,
+        offer_type=offer_type,
+    )
+    object_id = f"{user.id}/{secrets.token_urlsafe()}.csv"
+    with tempfile.TemporaryFile() as fp:
+        for chunk in chunks:
+            fp.write(chunk)
+        fp.seek(0)
+        users_utils.store_object_from_file(BOOKINGS_EXPORTS_BUCKET, object_id, fp, content_type="text/csv")
+    expiration_date = datetime.datetime.utcnow() + BOOKINGS_EXPORT_LINK_VALIDITY
+    token = users_utils.encode_jwt_payload({"user_id": user.id, "object_id": object_id}, expiration_date)
+    url = f"{settings.API_URL}/bookings/csv/exports/{token}"
+    send_bookings_csv_export_to_pro_email(user, url, expiration_date)
+    logger.info("Exported bookings CSV report", extra={"user": user.id, "object_id": object_id})
+    return url
+
+
+def get_exported_csv_report(user: User, token: str) -> typing.Iterator[bytes]:
+    """Return the content of a report stored by `export_csv_report()`,
+    by chunks.
+
+    Raise ``InvalidBookingsExportLink`` if the token is invalid, has
+    expired or has been generated for another user.
+    """
+    try:
+        payload = users_utils.decode_jwt_token(token)
+    except jwt.InvalidTokenError:
+        raise exceptions.InvalidBookingsExportLink()
+    if payload.get("user_id") != user.id:
+        raise exceptions.InvalidBookingsExportLink()
+    blob = users_utils.get_object(f"{BOOKINGS_EXPORTS_BUCKET}/{payload['object_id']}")
+    if blob is None:
+        raise exceptions.InvalidBookingsExportLink()
+    return _iter_blob(blob)
+
+
+def _iter_blob(blob: Blob) -> typing.Iterator[bytes]:
+    for start in range(0, blob.size, BOOKINGS_EXPORT_DOWNLOAD_CHUNK_SIZE):
+        yield blob.download_as_bytes(start=start, end=start + BOOKINGS_EXPORT_DOWNLOAD_CHUNK_SIZE - 1)
@@ -8,6 +8,7 @@ BOOKS_BOOKINGS_AUTO_EXPIRY_DELAY = datetime.timedelta(days=10)
 BOOKINGS_EXPIRY_NOTIFICATION_DELAY = datetime.timedelta(days=7)
 BOOKS_BOOKINGS_EXPIRY_NOTIFICATION_DELAY = datetime.timedelta(days=5)
 AUTO_USE_AFTER_EVENT_TIME_DELAY = datetime.timedelta(hours=48)
+PRO_BOOKINGS_COUNT_CACHE_TTL = datetime.timedelta(minutes=1)
 
 
 def _get_hours_from_timedelta(td: datetime.timedelta) -> float:
@@ -133,3 +133,7 @@ class BookingIsExpired(Exception):
 
 class BookingNotConfirmed(Exception):
     pass
+
+
+class InvalidBookingsExportLink(Exception):
+    pass
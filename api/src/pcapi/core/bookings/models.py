@@ -418,3 +418,90 @@ Booking.trig_update_cancellationDate_on_isCancelled_ddl = f"""
     """
 
 event.listen(Booking.__table__, "after_create", DDL(Booking.trig_update_cancellationDate_on_isCancelled_ddl))
+
+# Keep `deposit."bookedAmount"` and `deposit."usedAmount"` up to date
+# so that reading the balance of a deposit does not require to sum
+# all its bookings. Deltas are applied to the deposit(s) of the old
+# and the new version of the row, which handles creation, cancellation
+# (and uncancellation), use, reimbursement and deletion of bookings.
+# Migration 8a1f3c2d9e47 installs a frozen copy of this DDL: changing it
+# here requires a new migration.
+Booking.trig_deposit_balance_ddl = f"""
+    CREATE OR REPLACE FUNCTION update_deposit_balance()
+    RETURNS TRIGGER AS $$
+    DECLARE
+        old_deposit_id bigint;
+        new_deposit_id bigint;
+        old_booked_amount numeric := 0;
+        old_used_amount numeric := 0;
+        new_booked_amount numeric := 0;
+        new_used_amount numeric := 0;
+    BEGIN
+        IF TG_OP != 'INSERT' THEN
+            IF OLD."individualBookingId" IS NOT NULL THEN
+                SELECT "depositId" INTO old_deposit_id FROM individual_booking WHERE id = OLD."individualBookingId";
+            END IF;
+            IF OLD.status != '{BookingStatus.CANCELLED.value}' THEN
+                old_booked_amount := OLD.amount * OLD.quantity;
+            END IF;
+            IF OLD.status IN ('{BookingStatus.USED.value}', '{BookingStatus.REIMBURSED.value}') THEN
+                old_used_amount := OLD.amount * OLD.quantity;
+            END IF;
+        END IF;
+
+        IF TG_OP != 'DELETE' THEN
+            IF NEW."individualBookingId" IS NOT NULL THEN
+                SELECT "depositId" INTO new_deposit_id FROM individual_booking WHERE id = NEW."individualBookingId";
+            END IF;
+            IF NEW.status != '{BookingStatus.CANCELLED.value}' THEN
+                new_booked_amount := NEW.amount * NEW.quantity;
+            END IF;
+            IF NEW.status IN ('{BookingStatus.USED.value}', '{BookingStatus.REIMBURSED.value}') THEN
+                new_used_amount := NEW.amount * NEW.quantity;
+            END IF;
+        END IF;
+
+        IF old_deposit_id IS NOT DISTINCT FROM new_deposit_id THEN
+            -- Avoid locking the deposit row when nothing has changed.
+            IF new_deposit_id IS NOT NULL
+                AND (new_booked_amount != old_booked_amount OR new_used_amount != old_used_amount)
+            THEN
+                UPDATE deposit
+                SET
+                    "bookedAmount" = "bookedAmount" + new_booked_amount - old_booked_amount,
+                    "usedAmount" = "usedAmount" + new_used_amount - old_used_amount
+                WHERE id = new_deposit_id;
+            END IF;
+        ELSE
+            IF old_deposit_id IS NOT NULL THEN
+                UPDATE deposit
+                SET
+                    "bookedAmount" = "bookedAmount" - old_booked_amount,
+                    "usedAmount" = "usedAmount" - old_used_amount
+                WHERE id = old_deposit_id;
+            END IF;
+            IF new_deposit_id IS NOT NULL THEN
+                UPDATE deposit
+                SET
+                    "bookedAmount" = "bookedAmount" + new_booked_amount,
+                    "usedAmount" = "usedAmount" + new_used_amount
+                WHERE id = new_deposit_id;
+            END IF;
+        END IF;
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS booking_update_deposit_balance ON booking;
+
+    CREATE TRIGGER booking_update_deposit_balance
+    AFTER INSERT
+    OR UPDATE OF status, amount, quantity, "individualBookingId"
+    OR DELETE
+    ON booking
+    FOR EACH ROW
+    EXECUTE PROCEDURE update_deposit_balance()
+    """
+
+event.listen(Booking.__table__, "after_create", DDL(Booking.trig_deposit_balance_ddl))
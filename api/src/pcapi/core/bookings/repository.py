@@ -3,21 +3,32 @@ from datetime import date
 from datetime import datetime
 from datetime import time
 from datetime import timedelta
+from datetime import timezone
+from decimal import Decimal
+import hashlib
 from io import StringIO
+import json
+import logging
 import math
 import typing
 from typing import Iterable
+from typing import Iterator
 from typing import List
 from typing import Optional
 
+from flask import current_app
 from flask_sqlalchemy import BaseQuery
+import redis
 from sqlalchemy import Column
 from sqlalchemy import Date
+from sqlalchemy import and_
 from sqlalchemy import case
 from sqlalchemy import cast
 from sqlalchemy import func
+from sqlalchemy import literal
 from sqlalchemy import or_
 from sqlalchemy import text
+from sqlalchemy import tuple_
 from sqlalchemy.orm import contains_eager
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.attributes import InstrumentedAttribute
@@ -48,13 +59,20 @@ from pcapi.core.users.utils import sanitize_email
 from pcapi.domain.booking_recap import utils as booking_recap_utils
 from pcapi.domain.booking_recap.booking_recap import BookingRecap
 from pcapi.domain.booking_recap.bookings_recap_paginated import BookingsRecapPaginated
+from pcapi.domain.booking_recap.bookings_recap_paginated import decode_cursor
+from pcapi.domain.booking_recap.bookings_recap_paginated import encode_cursor
 from pcapi.models import db
 from pcapi.models.api_errors import ResourceNotFoundError
 from pcapi.routes.serialization.bookings_recap_serialize import OfferType
+from pcapi.utils.date import CUSTOM_TIMEZONES
+from pcapi.utils.date import METROPOLE_TIMEZONE
 from pcapi.utils.token import random_token
 
 
+logger = logging.getLogger(__name__)
+
 DUO_QUANTITY = 2
+PRO_BOOKINGS_COUNT_CACHE_KEY_PREFIX = "cache:pro-bookings-count"
 
 
 BOOKING_STATUS_LABELS = {
@@ -66,6 +84,24 @@ BOOKING_STATUS_LABELS = {
     "confirmed": "confirmé",
 }
 
+CSV_REPORT_HEADER = (
+    "Lieu",
+    "Nom de l’offre",
+    "Date de l'évènement",
+    "ISBN",
+    "Nom et prénom du bénéficiaire",
+    "Email du bénéficiaire",
+    "Téléphone du bénéficiaire",
+    "Date et heure de réservation",
+    "Date et heure de validation",
+    "Contremarque",
+    "Prix de la réservation",
+    "Statut de la contremarque",
+    "Date et heure de remboursement",
+    "Type d'offre",
+)
+CSV_REPORT_CHUNK_SIZE = 1000
+
 BOOKING_DATE_STATUS_MAPPING = {
     BookingStatusFilter.BOOKED: Booking.dateCreated,
     BookingStatusFilter.VALIDATED: Booking.dateUsed,
@@ -115,8 +151,17 @@ def find_by_pro_user(
     offer_type: Optional[OfferType] = None,
     page: int = 1,
     per_page_limit: int = 1000,
+    cursor: Optional[str] = None,
 ) -> BookingsRecapPaginated:
-    total_bookings_recap = _get_filtered_bookings_count(
+    """Return a page of bookings, ordered by descending booking date.
+
+    If ``cursor`` is given (see ``BookingsRecapPaginated.next_cursor``),
+    rows that come after this cursor are returned and ``page`` is
+    ignored (except in the returned object), which is much cheaper
+    than an offset on deep pages. Otherwise, the requested ``page`` is
+    returned.
+    """
+    total_bookings_recap = _get_filtered_bookings_count_with_cache(
         user,
         booking_period,
         status_filter=status_filter,
@@ -133,16 +178,28 @@ def find_by_pro_user(
         venue_id=venue_id,
         offer_type=offer_type,
     )
-    bookings_query = _duplicate_booking_when_quantity_is_two(bookings_query)
-    bookings_page = (
-        bookings_query.order_by(text('"bookedAt" DESC')).offset((page - 1) * per_page_limit).limit(per_page_limit).all()
+    bookings_query = _duplicate_booking_when_quantity_is_two_with_index(
+        bookings_query,
+        after=decode_cursor(cursor) if cursor else None,
     )
+    bookings_query = bookings_query.order_by(text('"bookedAt" DESC, "bookingId" DESC, "duplicateIndex" DESC'))
+    if not cursor:
+        bookings_query = bookings_query.offset((page - 1) * per_page_limit)
+    # Fetch one more row to know whether there is a next page.
+    bookings_page = bookings_query.limit(per_page_limit + 1).all()
+
+    next_cursor = None
+    if len(bookings_page) > per_page_limit:
+        bookings_page = bookings_page[:per_page_limit]
+        last = bookings_page[-1]
+        next_cursor = encode_cursor(last.bookedAt, last.bookingId, last.duplicateIndex)
 
     return _paginated_bookings_sql_entities_to_bookings_recap(
         paginated_bookings=bookings_page,
         page=page,
         per_page_limit=per_page_limit,
         total_bookings_recap=total_bookings_recap,
+        next_cursor=next_cursor,
     )
 
 
@@ -390,6 +447,77 @@ def get_bookings_from_deposit(deposit_id: int) -> list[Booking]:
     )
 
 
+class DepositSpentAmounts(typing.NamedTuple):
+    total: Decimal
+    digital: Decimal
+    physical: Decimal
+
+
+def get_spent_amounts_by_deposit(deposit_ids: Iterable[int]) -> dict[int, DepositSpentAmounts]:
+    """Return the amounts spent on each requested deposit: in total,
+    on offers that count towards the digital cap, and on offers that
+    count towards the physical cap (see
+    `pcapi.core.payments.conf.BaseSpecificCaps`).
+
+    Deposits without any (non-cancelled) booking are not included.
+    """
+    booking_amount = Booking.amount * Booking.quantity
+    offer_is_digital = and_(Offer.url.isnot(None), Offer.url != "")
+    rows = (
+        db.session.query(
+            IndividualBooking.depositId,
+            func.sum(booking_amount),
+            func.coalesce(
+                func.sum(
+                    case(
+                        [
+                            (
+                                and_(
+                                    offer_is_digital,
+                                    Offer.subcategoryId.in_(subcategories.DIGITAL_DEPOSIT_SUBCATEGORIES),
+                                ),
+                                booking_amount,
+                            )
+                        ],
+                        else_=0,
+                    )
+                ),
+                0,
+            ),
+            func.coalesce(
+                func.sum(
+                    case(
+                        [
+                            (
+                                and_(
+                                    not_(offer_is_digital),
+                                    Offer.subcategoryId.in_(subcategories.PHYSICAL_DEPOSIT_SUBCATEGORIES),
+                                ),
+                                booking_amount,
+                            )
+                        ],
+                        else_=0,
+                    )
+                ),
+                0,
+            ),
+        )
+        .select_from(Booking)
+        .join(Booking.individualBooking)
+        .join(Booking.stock)
+        .join(Stock.offer)
+        .filter(
+            IndividualBooking.depositId.in_(list(deposit_ids)),
+            or_(Booking.status != BookingStatus.CANCELLED, Booking.status == None),
+        )
+        .group_by(IndividualBooking.depositId)
+    )
+    return {
+        deposit_id: DepositSpentAmounts(Decimal(total), Decimal(digital), Decimal(physical))
+        for deposit_id, total, digital, physical in rows
+    }
+
+
 def get_csv_report(
     user: User,
     booking_period: Optional[tuple[date, date]] = None,
@@ -410,11 +538,51 @@ def get_csv_report(
     return _serialize_csv_report(bookings_query)
 
 
+def stream_csv_report(
+    user: User,
+    booking_period: Optional[tuple[date, date]] = None,
+    status_filter: Optional[BookingStatusFilter] = BookingStatusFilter.BOOKED,
+    event_date: Optional[datetime] = None,
+    venue_id: Optional[int] = None,
+    offer_type: Optional[OfferType] = None,
+) -> Iterator[bytes]:
+    """Return the same report as `get_csv_report()`, as UTF-8 encoded
+    chunks (the first one starting with a BOM), so that large reports
+    do not have to be held in memory.
+    """
+    bookings_query = _get_filtered_booking_report(
+        pro_user=user,
+        period=booking_period,  # type: ignore [arg-type]
+        status_filter=status_filter,  # type: ignore [arg-type]
+        event_date=event_date,
+        venue_id=venue_id,
+        offer_type=offer_type,
+    )
+    bookings_query = _duplicate_booking_when_quantity_is_two(bookings_query)
+    yield "\ufeff".encode("utf-8")
+    for chunk in _iter_csv_report(bookings_query):
+        yield chunk.encode("utf-8")
+
+
 # FIXME (Gautier, 03-25-2022): also used in collective_booking. SHould we move it to core or some other place?
 def field_to_venue_timezone(field: InstrumentedAttribute) -> cast:
     return cast(func.timezone(Venue.timezone, func.timezone("UTC", field)), Date)
 
 
+def _venue_timezone() -> case:
+    # Same as `Venue.timezone`, but without a subquery since the
+    # offerer is already joined in `_get_filtered_bookings_query()`.
+    return case(
+        CUSTOM_TIMEZONES,
+        value=func.coalesce(Venue.departementCode, Offerer.departementCode),
+        else_=METROPOLE_TIMEZONE,
+    )
+
+
+def _field_to_venue_local_datetime(field: InstrumentedAttribute) -> func.timezone:
+    return func.timezone(_venue_timezone(), func.timezone("UTC", field))
+
+
 def _get_filtered_bookings_query(
     pro_user: User,
     period: Optional[tuple[date, date]] = None,
@@ -485,6 +653,42 @@ def _get_filtered_bookings_count(
     return bookings_count.scalar()
 
 
+def _get_filtered_bookings_count_with_cache(
+    pro_user: User,
+    period: Optional[tuple[date, date]] = None,
+    status_filter: Optional[BookingStatusFilter] = None,
+    event_date: Optional[date] = None,
+    venue_id: Optional[int] = None,
+    offer_type: Optional[OfferType] = None,
+) -> int:
+    """Same as `_get_filtered_bookings_count()`, but cache the result
+    for a short time, since it is requested for each page.
+    """
+    filters = (
+        pro_user.id,
+        [d.isoformat() for d in period] if period else None,
+        status_filter.value if status_filter else None,
+        event_date.isoformat() if event_date else None,
+        venue_id,
+        offer_type.value if offer_type else None,
+    )
+    digest = hashlib.sha256(json.dumps(filters).encode()).hexdigest()
+    key = f"{PRO_BOOKINGS_COUNT_CACHE_KEY_PREFIX}:{digest}"
+    try:
+        cached = current_app.redis_client.get(key)  # type: ignore [attr-defined]
+    except redis.exceptions.RedisError as exc:
+        logger.warning("Could not get cached count of pro bookings", extra={"exc": str(exc)})
+        cached = None
+    if cached is not None:
+        return int(cached)
+    count = _get_filtered_bookings_count(pro_user, period, status_filter, event_date, venue_id, offer_type)
+    try:
+        current_app.redis_client.set(key, count, ex=constants.PRO_BOOKINGS_COUNT_CACHE_TTL)  # type: ignore [attr-defined]
+    except redis.exceptions.RedisError as exc:
+        logger.warning("Could not cache count of pro bookings", extra={"exc": str(exc)})
+    return count
+
+
 def _get_filtered_booking_report(
     pro_user: User,
     period: tuple[date, date],
@@ -526,6 +730,11 @@ def _get_filtered_booking_report(
             Booking.reimbursementDate.label("reimbursedAt"),
             Booking.cancellationDate.label("cancelledAt"),
             Booking.isConfirmed,
+            # Local (naive) datetimes, converted in SQL. See `_to_aware_datetime()`.
+            _field_to_venue_local_datetime(Stock.beginningDatetime).label("stockBeginningDatetimeLocal"),
+            _field_to_venue_local_datetime(Booking.dateCreated).label("bookedAtLocal"),
+            _field_to_venue_local_datetime(Booking.dateUsed).label("usedAtLocal"),
+            _field_to_venue_local_datetime(Booking.reimbursementDate).label("reimbursedAtLocal"),
             # `get_batch` function needs a field called exactly `id` to work,
             # the label prevents SA from using a bad (prefixed) label for this field
             Booking.id.label("id"),
@@ -562,6 +771,7 @@ def _get_filtered_booking_pro(
             ),
         )
         .with_entities(
+            Booking.id.label("bookingId"),
             Booking.token.label("bookingToken"),
             Booking.dateCreated.label("bookedAt"),
             Booking.quantity,
@@ -598,6 +808,33 @@ def _duplicate_booking_when_quantity_is_two(bookings_recap_query: BaseQuery) ->
     return bookings_recap_query.union_all(bookings_recap_query.filter(Booking.quantity == 2))
 
 
+def _duplicate_booking_when_quantity_is_two_with_index(
+    bookings_recap_query: BaseQuery,
+    after: Optional[tuple[datetime, int, int]] = None,
+) -> BaseQuery:
+    """Like `_duplicate_booking_when_quantity_is_two()`, but add a
+    ``duplicateIndex`` column (1 for the second row of duo bookings) so
+    that each row can be pointed to by a cursor.
+
+    If ``after`` is given, only return rows that come after this
+    cursor when ordered by descending ``(bookedAt, bookingId,
+    duplicateIndex)``. The condition is applied to each side of the
+    union so that it can use indexes.
+    """
+    first = bookings_recap_query.add_columns(literal(0).label("duplicateIndex"))
+    second = bookings_recap_query.filter(Booking.quantity == 2).add_columns(literal(1).label("duplicateIndex"))
+    if after:
+        booked_at, booking_id, duplicate_index = after
+        before_cursor = tuple_(Booking.dateCreated, Booking.id) < tuple_(booked_at, booking_id)
+        second = second.filter(before_cursor)
+        if duplicate_index == 1:
+            # The first row of the cursor's booking comes right after it.
+            first = first.filter(or_(before_cursor, Booking.id == booking_id))
+        else:
+            first = first.filter(before_cursor)
+    return first.union_all(second)
+
+
 def _serialize_booking_recap(booking: AbstractKeyedTuple) -> BookingRecap:
     return BookingRecap(
         offer_identifier=booking.offerId,  # type: ignore [attr-defined]
@@ -638,12 +875,14 @@ def _paginated_bookings_sql_entities_to_bookings_recap(
     page: int,
     per_page_limit: int,
     total_bookings_recap: int,
+    next_cursor: Optional[str] = None,
 ) -> BookingsRecapPaginated:
     return BookingsRecapPaginated(
         bookings_recap=[_serialize_booking_recap(booking) for booking in paginated_bookings],  # type: ignore [arg-type]
         page=page,
         pages=int(math.ceil(total_bookings_recap / per_page_limit)),
         total=total_bookings_recap,
+        next_cursor=next_cursor,
     )
 
 
@@ -654,50 +893,54 @@ def _get_booking_status(status: BookingStatus, is_confirmed: bool) -> str:
     return BOOKING_STATUS_LABELS[status]
 
 
-def _serialize_csv_report(query: BaseQuery) -> str:
+def _to_aware_datetime(utc_datetime: Optional[datetime], local_datetime: Optional[datetime]) -> Optional[datetime]:
+    """Return an aware datetime from the UTC and local (naive)
+    datetimes, without having to look up the timezone database for
+    each row.
+    """
+    if utc_datetime is None:
+        return None
+    return local_datetime.replace(tzinfo=timezone(local_datetime - utc_datetime))  # type: ignore [union-attr]
+
+
+def _serialize_csv_report_row(booking: AbstractKeyedTuple) -> tuple:
+    return (
+        booking.venueName,  # type: ignore [attr-defined]
+        booking.offerName,  # type: ignore [attr-defined]
+        _to_aware_datetime(booking.stockBeginningDatetime, booking.stockBeginningDatetimeLocal),  # type: ignore [attr-defined]
+        booking.isbn,  # type: ignore [attr-defined]
+        f"{booking.beneficiaryLastName} {booking.beneficiaryFirstName}",  # type: ignore [attr-defined]
+        booking.beneficiaryEmail,  # type: ignore [attr-defined]
+        booking.beneficiaryPhoneNumber,  # type: ignore [attr-defined]
+        _to_aware_datetime(booking.bookedAt, booking.bookedAtLocal),  # type: ignore [attr-defined]
+        _to_aware_datetime(booking.usedAt, booking.usedAtLocal),  # type: ignore [attr-defined]
+        booking_recap_utils.get_booking_token(
+            booking.token, booking.status, booking.offerIsEducational, booking.stockBeginningDatetime  # type: ignore [attr-defined]
+        ),
+        booking.amount,  # type: ignore [attr-defined]
+        _get_booking_status(booking.status, booking.isConfirmed),  # type: ignore [attr-defined]
+        _to_aware_datetime(booking.reimbursedAt, booking.reimbursedAtLocal),  # type: ignore [attr-defined]
+        serialize_offer_type_educational_or_individual(booking.offerIsEducational),  # type: ignore [attr-defined]
+    )
+
+
+def _iter_csv_report(query: BaseQuery) -> Iterator[str]:
+    """Yield the CSV report by chunks of (at most) ``CSV_REPORT_CHUNK_SIZE`` rows."""
+    chunk_size = CSV_REPORT_CHUNK_SIZE
     output = StringIO()
     writer = csv.writer(output, dialect=csv.excel, delimiter=";", quoting=csv.QUOTE_NONNUMERIC)
-    writer.writerow(
-        (
-            "Lieu",
-            "Nom de l’offre",
-            "Date de l'évènement",
-            "ISBN",
-            "Nom et prénom du bénéficiaire",
-            "Email du bénéficiaire",
-            "Téléphone du bénéficiaire",
-            "Date et heure de réservation",
-            "Date et heure de validation",
-            "Contremarque",
-            "Prix de la réservation",
-            "Statut de la contremarque",
-            "Date et heure de remboursement",
-            "Type d'offre",
-        )
-    )
-    for booking in query.yield_per(1000):
-        writer.writerow(
-            (
-                booking.venueName,
-                booking.offerName,
-                convert_booking_dates_utc_to_venue_timezone(booking.stockBeginningDatetime, booking),
-                booking.isbn,
-                f"{booking.beneficiaryLastName} {booking.beneficiaryFirstName}",
-                booking.beneficiaryEmail,
-                booking.beneficiaryPhoneNumber,
-                convert_booking_dates_utc_to_venue_timezone(booking.bookedAt, booking),
-                convert_booking_dates_utc_to_venue_timezone(booking.usedAt, booking),
-                booking_recap_utils.get_booking_token(
-                    booking.token, booking.status, booking.offerIsEducational, booking.stockBeginningDatetime
-                ),
-                booking.amount,
-                _get_booking_status(booking.status, booking.isConfirmed),
-                convert_booking_dates_utc_to_venue_timezone(booking.reimbursedAt, booking),
-                serialize_offer_type_educational_or_individual(booking.offerIsEducational),
-            )
-        )
+    writer.writerow(CSV_REPORT_HEADER)
+    for index, booking in enumerate(query.yield_per(chunk_size), 1):
+        writer.writerow(_serialize_csv_report_row(booking))
+        if index % chunk_size == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue()
 
-    return output.getvalue()
+
+def _serialize_csv_report(query: BaseQuery) -> str:
+    return "".join(_iter_csv_report(query))
 
 
 def get_soon_expiring_bookings(expiration_days_delta: int) -> typing.Generator[Booking, None, None]:
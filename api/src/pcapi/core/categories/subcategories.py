@@ -1475,6 +1475,12 @@ PERMANENT_SUBCATEGORIES = {
 }
 EXPIRABLE_SUBCATEGORIES = {subcategory.id: subcategory for subcategory in ALL_SUBCATEGORIES if subcategory.can_expire}
 EVENT_SUBCATEGORIES = {subcategory.id: subcategory for subcategory in ALL_SUBCATEGORIES if subcategory.is_event}
+DIGITAL_DEPOSIT_SUBCATEGORIES = {
+    subcategory.id: subcategory for subcategory in ALL_SUBCATEGORIES if subcategory.is_digital_deposit
+}
+PHYSICAL_DEPOSIT_SUBCATEGORIES = {
+    subcategory.id: subcategory for subcategory in ALL_SUBCATEGORIES if subcategory.is_physical_deposit
+}
 ACTIVATION_SUBCATEGORIES = (ACTIVATION_EVENT.id, ACTIVATION_THING.id)
 BOOK_WITH_ISBN = (LIVRE_PAPIER.id, LIVRE_AUDIO_PHYSIQUE.id, LIVRE_NUMERIQUE.id)
 
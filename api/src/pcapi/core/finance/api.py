@@ -27,24 +27,32 @@ few more criteria, see `price_bookings()` and
 """
 
 from collections import defaultdict
+import concurrent.futures
+import contextlib
 import csv
+import dataclasses
 import datetime
 import decimal
+import io
 import itertools
 import logging
+import multiprocessing
 from operator import attrgetter
 import pathlib
 import secrets
 import tempfile
+import time
 import typing
 import zipfile
 
+from flask import current_app
 from flask import render_template
 import pytz
 import sqlalchemy as sqla
 from sqlalchemy import Date
 from sqlalchemy import and_
 from sqlalchemy import cast
+import sqlalchemy.dialects.postgresql as sqla_psql
 import sqlalchemy.orm as sqla_orm
 import sqlalchemy.sql.functions as sqla_func
 
@@ -65,9 +73,11 @@ from pcapi.domain import reimbursement
 from pcapi.models import db
 from pcapi.models.bank_information import BankInformation
 from pcapi.models.bank_information import BankInformationStatus
+from pcapi.models.feature import FeatureToggle
 from pcapi.repository import transaction
 from pcapi.utils import human_ids
 from pcapi.utils import pdf as pdf_utils
+from pcapi.utils.chunks import get_chunks
 
 from . import conf
 from . import exceptions
@@ -115,18 +125,14 @@ _PRICE_BOOKINGS_ORDER_CLAUSE = (
 )
 
 
-def price_bookings(min_date: datetime.datetime = MIN_DATE_TO_PRICE):  # type: ignore [no-untyped-def]
-    """Price bookings that have been recently marked as used.
-
-    This function is normally called by a cron job.
-    """
+def _get_bookings_to_price(min_date: datetime.datetime) -> sqla_orm.Query:
     # The upper bound on `dateUsed` avoids selecting a very recent
     # booking that may have been COMMITed to the database just before
     # another booking with a slightly older `dateUsed` (see note in
     # module docstring).
     threshold = datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
     window = (min_date, threshold)
-    bookings = (
+    return (
         bookings_models.Booking.query.filter(bookings_models.Booking.dateUsed.between(*window))
         .join(bookings_models.Booking.stock)
         .outerjoin(
@@ -152,6 +158,14 @@ def price_bookings(min_date: datetime.datetime = MIN_DATE_TO_PRICE):  # type: ig
             ),
         )
     )
+
+
+def price_bookings(min_date: datetime.datetime = MIN_DATE_TO_PRICE):  # type: ignore [no-untyped-def]
+    """Price bookings that have been recently marked as used.
+
+    This function is normally called by a cron job.
+    """
+    bookings = _get_bookings_to_price(min_date)
     errorred_business_unit_ids = set()
     for booking in bookings:
         try:
@@ -175,6 +189,158 @@ def price_bookings(min_date: datetime.datetime = MIN_DATE_TO_PRICE):  # type: ig
             )
 
 
+def price_bookings_by_business_unit(
+    min_date: datetime.datetime = MIN_DATE_TO_PRICE,
+    chunk_size: int = 1_000,
+) -> None:
+    """Price bookings that have been recently marked as used, business
+    unit by business unit.
+
+    The result is the same as ``price_bookings()``, but it is much
+    faster when there are many bookings to price: the business unit is
+    locked once for each chunk of ``chunk_size`` bookings, the revenue
+    is computed once for each SIRET (and then accrued in memory),
+    custom reimbursement rules are cached (and only reloaded when they
+    change), and pricings are inserted in bulk.
+
+    If a chunk cannot be priced, its bookings are priced one by one
+    with ``price_booking()``, so that bookings that precede the
+    problematic one are priced, as with ``price_bookings()``.
+    """
+    booking_ids_by_business_unit = defaultdict(list)
+    for booking in _get_bookings_to_price(min_date):
+        # Bookings are ordered (see `_PRICE_BOOKINGS_ORDER_CLAUSE`),
+        # and so is each list.
+        booking_ids_by_business_unit[booking.venue.businessUnitId].append(booking.id)
+
+    for business_unit_id, booking_ids in booking_ids_by_business_unit.items():
+        extra = {"business_unit": business_unit_id, "bookings": len(booking_ids)}
+        try:
+            with log_elapsed(logger, "Priced bookings of business unit", extra):
+                for chunk in get_chunks(booking_ids, chunk_size):
+                    # Get the finder for each chunk, so that rules that
+                    # have been changed since the previous chunk was
+                    # committed are taken into account. It is cached
+                    # and only reloaded when rules have changed.
+                    rule_finder = reimbursement.get_custom_rule_finder()
+                    try:
+                        _price_bookings_of_business_unit(business_unit_id, chunk, rule_finder)
+                    except Exception as exc:  # pylint: disable=broad-except
+                        logger.info(
+                            "Could not price chunk of bookings, pricing them one by one",
+                            extra={"business_unit": business_unit_id, "exc": str(exc)},
+                        )
+                        bookings = (
+                            bookings_models.Booking.query.filter(bookings_models.Booking.id.in_(chunk))
+                            .join(bookings_models.Booking.stock)
+                            .order_by(*_PRICE_BOOKINGS_ORDER_CLAUSE)
+                            .options(sqla_orm.joinedload(bookings_models.Booking.venue))
+                        )
+                        for booking in bookings:
+                            price_booking(booking)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.exception(
+                "Could not price bookings of business unit",
+                extra={"business_unit": business_unit_id, "exc": str(exc)},
+            )
+
+
+def _price_bookings_of_business_unit(
+    business_unit_id: int,
+    booking_ids: list[int],
+    rule_finder: reimbursement.CustomRuleFinder,
+) -> None:
+    with transaction():
+        lock_business_unit(business_unit_id)
+
+        # Now that we have acquired a lock, fetch bookings from the
+        # database again, with the same checks as in `price_booking()`.
+        bookings = (
+            bookings_models.Booking.query.filter(
+                bookings_models.Booking.id.in_(booking_ids),
+                bookings_models.Booking.status == bookings_models.BookingStatus.USED,
+            )
+            .outerjoin(
+                models.Pricing,
+                sqla.and_(
+                    models.Pricing.bookingId == bookings_models.Booking.id,
+                    models.Pricing.status != models.PricingStatus.CANCELLED,
+                ),
+            )
+            .filter(models.Pricing.id.is_(None))
+            .join(bookings_models.Booking.stock)
+            .join(offers_models.Stock.offer)
+            .join(bookings_models.Booking.venue)
+            .join(offerers_models.Venue.businessUnit)
+            .filter(
+                models.BusinessUnit.id == business_unit_id,
+                models.BusinessUnit.siret.isnot(None),
+                models.BusinessUnit.status == models.BusinessUnitStatus.ACTIVE,
+            )
+            .order_by(*_PRICE_BOOKINGS_ORDER_CLAUSE)
+            .options(
+                sqla_orm.contains_eager(bookings_models.Booking.stock).contains_eager(offers_models.Stock.offer),
+                sqla_orm.contains_eager(bookings_models.Booking.venue).contains_eager(
+                    offerers_models.Venue.businessUnit
+                ),
+            )
+            .all()
+        )
+
+        # Revenue of each SIRET for each year, in eurocents.
+        initial_revenues: dict[tuple, int] = {}
+        revenues: dict[tuple, int] = {}
+        pricings = []
+        for booking in bookings:
+            siret = booking.venue.siret or booking.venue.businessUnit.siret
+            key = (siret, _get_revenue_year(booking.dateUsed))  # type: ignore [arg-type]
+            if key not in revenues:
+                # Pricings that depend on the following bookings of
+                # this chunk have already been deleted here, since
+                # they also depend on this one.
+                _delete_dependent_pricings(booking, "Deleted pricings priced too early")
+                _siret, initial_revenues[key] = _get_siret_and_current_revenue(booking)  # type: ignore [misc]
+                revenues[key] = initial_revenues[key]
+            pricing = _make_pricing(booking, siret, revenues[key], rule_finder)
+            revenues[key] = pricing.revenue
+            pricings.append(pricing)
+
+        _insert_pricings(pricings)
+        for (siret, year), revenue in revenues.items():
+            _add_to_siret_revenue(siret, year, revenue - initial_revenues[(siret, year)])
+
+
+def _insert_pricings(pricings: list[models.Pricing]) -> None:
+    """Insert pricings and their lines with one INSERT each, instead of
+    one INSERT per object.
+    """
+    if not pricings:
+        return
+    pricing_columns = (
+        "status",
+        "bookingId",
+        "businessUnitId",
+        "siret",
+        "valueDate",
+        "amount",
+        "standardRule",
+        "customRuleId",
+        "revenue",
+    )
+    rows = db.session.execute(
+        models.Pricing.__table__.insert()
+        .values([{column: getattr(pricing, column) for column in pricing_columns} for pricing in pricings])
+        .returning(models.Pricing.id, models.Pricing.bookingId)
+    )
+    pricing_ids = {row.bookingId: row.id for row in rows}
+    lines = [
+        {"pricingId": pricing_ids[pricing.bookingId], "amount": line.amount, "category": line.category}
+        for pricing in pricings
+        for line in pricing.lines
+    ]
+    db.session.execute(models.PricingLine.__table__.insert().values(lines))
+
+
 def _booking_comparison_tuple(booking: bookings_models.Booking) -> list:
     """Return a list of values, for a particular booking, that can be
     compared to `_PRICE_BOOKINGS_ORDER_CLAUSE`.
@@ -255,16 +421,25 @@ def price_booking(booking: bookings_models.Booking) -> models.Pricing:
 
         pricing = _price_booking(booking)
         db.session.add(pricing)
+        _add_to_siret_revenue(pricing.siret, _get_revenue_year(pricing.valueDate), _get_booking_revenue(booking))
 
         db.session.commit()
     return pricing
 
 
+def _get_revenue_year(value_date: datetime.datetime) -> int:
+    """Return the accounting year of the given value date."""
+    return value_date.replace(tzinfo=pytz.utc).astimezone(utils.ACCOUNTING_TIMEZONE).year
+
+
 def _get_revenue_period(value_date: datetime.datetime) -> [datetime.datetime, datetime.datetime]:  # type: ignore [misc]
     """Return a datetime (year) period for the given value date, i.e. the
     first and last seconds of the year of the ``value_date``.
     """
-    year = value_date.replace(tzinfo=pytz.utc).astimezone(utils.ACCOUNTING_TIMEZONE).year
+    return _get_revenue_period_of_year(_get_revenue_year(value_date))
+
+
+def _get_revenue_period_of_year(year: int) -> tuple[datetime.datetime, datetime.datetime]:
     first_second = utils.ACCOUNTING_TIMEZONE.localize(
         datetime.datetime.combine(
             datetime.date(year, 1, 1),
@@ -283,54 +458,116 @@ def _get_revenue_period(value_date: datetime.datetime) -> [datetime.datetime, da
 def _get_siret_and_current_revenue(booking: bookings_models.Booking) -> typing.Union[str, int]:
     """Return the SIRET to use for the requested booking, and the current
     year revenue for this SIRET, NOT including the requested booking.
+
+    The revenue is read from the `SiretRevenue` ledger. If there is no
+    ledger entry yet for this SIRET and year, it is computed from
+    existing pricings and stored.
     """
     siret = booking.venue.siret or booking.venue.businessUnit.siret
-    revenue_period = _get_revenue_period(booking.dateUsed)  # type: ignore [arg-type]
-    # I tried to be clever and store the accruing revenue on `Pricing`
-    # for quick access. But my first attempt had a bug. I *think* that
-    # the right way is to do this (but it has NOT been field-tested):
-    #
-    #     latest_pricing = (
-    #         models.Pricing.query.filter_by(siret=siret)
-    #         .filter(models.Pricing.valueDate.between(*revenue_period))
-    #         # See `order_by` used in `price_bookings()`
-    #         .order_by(models.Pricing.valueDate.desc(), models.Pricing.bookingId.desc())
-    #         .first()
-    #     )
-    #
-    # ... but a less error-prone and actually fast enough way is to
-    # just calculate the sum on-the-fly.
+    year = _get_revenue_year(booking.dateUsed)  # type: ignore [arg-type]
     current_revenue = (
-        bookings_models.Booking.query.join(models.Pricing)
-        # Collective bookings must not be included in revenue.
-        .filter(bookings_models.Booking.individualBookingId.isnot(None))
-        .filter(
-            models.Pricing.siret == siret,
-            # The following filter is not strictly necessary, because
-            # this function is called when the booking is being priced
-            # (so there is no Pricing yet).
-            models.Pricing.bookingId != booking.id,
-            models.Pricing.valueDate.between(*revenue_period),
-            models.Pricing.status.notin_(
-                (
-                    models.PricingStatus.CANCELLED,
-                    models.PricingStatus.REJECTED,
-                )
-            ),
+        models.SiretRevenue.query.filter_by(siret=siret, year=year).with_entities(models.SiretRevenue.revenue).scalar()
+    )
+    if current_revenue is None:
+        current_revenue = _compute_siret_revenue(siret, year, excluded_booking_id=booking.id)
+        db.session.execute(
+            sqla_psql.insert(models.SiretRevenue)
+            .values(siret=siret, year=year, revenue=current_revenue)
+            .on_conflict_do_nothing(constraint="unique_siret_year")
         )
-        .with_entities(sqla.func.sum(bookings_models.Booking.amount * bookings_models.Booking.quantity))
-        .scalar()
+    return siret, current_revenue  # type: ignore [return-value]
+
+
+def _compute_siret_revenue(siret: str, year: int, excluded_booking_id: typing.Optional[int] = None) -> int:
+    """Return the revenue of a SIRET for the requested year (in euro
+    cents), computed from all its pricings.
+    """
+    revenue_period = _get_revenue_period_of_year(year)
+    query = bookings_models.Booking.query.join(models.Pricing).filter(
+        # Collective bookings must not be included in revenue.
+        bookings_models.Booking.individualBookingId.isnot(None),
+        models.Pricing.siret == siret,
+        models.Pricing.valueDate.between(*revenue_period),
+        models.Pricing.status.notin_(
+            (
+                models.PricingStatus.CANCELLED,
+                models.PricingStatus.REJECTED,
+            )
+        ),
+    )
+    if excluded_booking_id:
+        query = query.filter(models.Pricing.bookingId != excluded_booking_id)
+    revenue = query.with_entities(
+        sqla.func.sum(bookings_models.Booking.amount * bookings_models.Booking.quantity)
+    ).scalar()
+    return utils.to_eurocents(revenue or 0)
+
+
+def _add_to_siret_revenue(siret: str, year: int, delta: int) -> None:
+    """Add ``delta`` (in euro cents, possibly negative) to the revenue
+    ledger of a SIRET.
+
+    Nothing is done if there is no ledger entry yet: it will be
+    computed from pricings when it's first needed.
+    """
+    if not delta:
+        return
+    models.SiretRevenue.query.filter_by(siret=siret, year=year).update(
+        {"revenue": models.SiretRevenue.revenue + delta}, synchronize_session=False
     )
-    return siret, utils.to_eurocents(current_revenue or 0)  # type: ignore [return-value]
+
+
+def _get_booking_revenue(booking: bookings_models.Booking) -> int:
+    """Return the part of the revenue that comes from the requested
+    booking (in euro cents).
+    """
+    # Collective bookings must not be included in revenue.
+    if not booking.individualBookingId:
+        return 0
+    return utils.to_eurocents(booking.total_amount)
+
+
+def check_siret_revenues(year: typing.Optional[int] = None) -> list[dict]:
+    """Compare the revenue ledger with the sum of the amounts of
+    pricings, and return discrepancies.
+
+    This does not fix anything. Ledger entries that are wrong can be
+    deleted: they are computed again when they are needed.
+    """
+    query = models.SiretRevenue.query.order_by(models.SiretRevenue.siret, models.SiretRevenue.year)
+    if year:
+        query = query.filter_by(year=year)
+    discrepancies = []
+    for entry in query:
+        expected = _compute_siret_revenue(entry.siret, entry.year)
+        if entry.revenue != expected:
+            discrepancies.append(
+                {"siret": entry.siret, "year": entry.year, "ledger": entry.revenue, "expected": expected},
+            )
+            logger.error(
+                "Found discrepancy in revenue ledger",
+                extra={"siret": entry.siret, "year": entry.year, "ledger": entry.revenue, "expected": expected},
+            )
+    return discrepancies
 
 
 def _price_booking(booking: bookings_models.Booking) -> models.Pricing:
     siret, current_revenue = _get_siret_and_current_revenue(booking)  # type: ignore [misc]
-    new_revenue = current_revenue
-    # Collective bookings must not be included in revenue.
-    if booking.individualBookingId:
-        new_revenue += utils.to_eurocents(booking.total_amount)
-    rule_finder = reimbursement.CustomRuleFinder()
+    rule_finder = reimbursement.get_custom_rule_finder()
+    return _make_pricing(booking, siret, current_revenue, rule_finder)
+
+
+def _make_pricing(
+    booking: bookings_models.Booking,
+    siret: str,
+    current_revenue: int,
+    rule_finder: reimbursement.CustomRuleFinder,
+) -> models.Pricing:
+    """Return a new (not yet saved) pricing for the requested booking,
+    given the current year revenue of the SIRET, NOT including the
+    requested booking.
+    """
+    new_revenue = current_revenue + _get_booking_revenue(booking)
     # FIXME (dbaty, 2021-11-10): `revenue` here is in eurocents but
     # `get_reimbursement_rule` expects euros. Clean that once the
     # old payment code has been removed and the function accepts
@@ -390,7 +627,14 @@ def _delete_dependent_pricings(booking: bookings_models.Booking, log_message: st
             sqla.func.ROW(*_PRICE_BOOKINGS_ORDER_CLAUSE) > sqla.func.ROW(*_booking_comparison_tuple(booking)),
         )
         .with_entities(
-            models.Pricing.id, models.Pricing.bookingId, models.Pricing.status, bookings_models.Booking.stockId
+            models.Pricing.id,
+            models.Pricing.bookingId,
+            models.Pricing.status,
+            models.Pricing.valueDate,
+            bookings_models.Booking.stockId,
+            bookings_models.Booking.individualBookingId,
+            bookings_models.Booking.amount,
+            bookings_models.Booking.quantity,
         )
         .all()
     )
@@ -471,8 +715,22 @@ def _delete_dependent_pricings(booking: bookings_models.Booking, log_message: st
     lines.delete(synchronize_session=False)
     logs = models.PricingLog.query.filter(models.PricingLog.pricingId.in_(pricing_ids))
     logs.delete(synchronize_session=False)
-    pricings = models.Pricing.query.filter(models.Pricing.id.in_(pricing_ids))
-    pricings.delete(synchronize_session=False)
+    models.Pricing.query.filter(models.Pricing.id.in_(pricing_ids)).delete(synchronize_session=False)
+
+    revenue_deltas: dict[int, int] = defaultdict(int)
+    for pricing in pricings:
+        if pricing.id not in pricing_ids:
+            continue
+        if pricing.status in (models.PricingStatus.CANCELLED, models.PricingStatus.REJECTED):
+            continue
+        # Collective bookings must not be included in revenue.
+        if not pricing.individualBookingId:
+            continue
+        year = _get_revenue_year(pricing.valueDate)
+        revenue_deltas[year] -= utils.to_eurocents(pricing.amount * pricing.quantity)
+    for year, delta in revenue_deltas.items():
+        _add_to_siret_revenue(siret, year, delta)
+
     logger.info(
         log_message,
         extra={
@@ -522,6 +780,8 @@ def cancel_pricing(
                 reason=reason,
             )
         )
+        if pricing.status != models.PricingStatus.REJECTED:
+            _add_to_siret_revenue(pricing.siret, _get_revenue_year(pricing.valueDate), -_get_booking_revenue(booking))
         pricing.status = models.PricingStatus.CANCELLED
         db.session.add(pricing)
         db.session.commit()
@@ -533,9 +793,15 @@ def generate_cashflows_and_payment_files(cutoff: datetime.datetime):  # type: ig
     generate_payment_files(batch_id)
 
 
-def generate_cashflows(cutoff: datetime.datetime) -> int:
+def generate_cashflows(cutoff: datetime.datetime, chunk_size: int = 1_000) -> int:
     """Generate a new CashflowBatch and a new cashflow for each business
     unit for which there is money to transfer.
+
+    Business units are processed by chunks of ``chunk_size``, with a
+    few set-based queries for each chunk (see
+    `_generate_cashflows_of_business_units()`). If a chunk fails,
+    each of its business units is processed in its own savepoint, so
+    that a faulty business unit does not block the others.
     """
     logger.info("Started to generate cashflows")
     batch = models.CashflowBatch(cutoff=cutoff)
@@ -544,93 +810,145 @@ def generate_cashflows(cutoff: datetime.datetime) -> int:
     batch_id = batch.id  # access _before_ COMMIT to avoid extra SELECT
     db.session.commit()
 
-    filters = (
-        models.Pricing.status == models.PricingStatus.VALIDATED,
-        models.Pricing.valueDate < cutoff,
-        # Even if a booking is marked as used prematurely, we should
-        # wait for the event to happen.
-        sqla.or_(
-            offers_models.Stock.beginningDatetime.is_(None),
-            offers_models.Stock.beginningDatetime < cutoff,
-        ),
-        # We should not have any validated pricing with a cashflow,
-        # this is a safety belt.
-        models.CashflowPricing.pricingId.is_(None),
-        # Bookings can now be priced even if BankInformation is not ACCEPTED,
-        # but to generate cashflows we definitely need it.
-        BankInformation.status == BankInformationStatus.ACCEPTED,
-    )
-
-    def _mark_as_processed(pricings):  # type: ignore [no-untyped-def]
-        pricings_to_update = models.Pricing.query.filter(
-            models.Pricing.id.in_(pricings.with_entities(models.Pricing.id))
-        )
-        pricings_to_update.update(
-            {"status": models.PricingStatus.PROCESSED},
-            synchronize_session=False,
-        )
-
-    business_unit_ids_and_bank_account_ids = (
-        models.Pricing.query.filter(
-            models.BusinessUnit.bankAccountId.isnot(None),
-            *filters,
+    business_unit_ids = [
+        business_unit_id
+        for business_unit_id, in db.session.execute(
+            f"""
+            SELECT DISTINCT pricing."businessUnitId"
+            {_CASHFLOW_ELIGIBLE_PRICINGS_CLAUSE}
+            """,
+            params=_get_cashflow_eligible_pricings_params(cutoff),
         )
-        .join(models.Pricing.booking)
-        .join(bookings_models.Booking.stock)
-        .join(models.Pricing.businessUnit)
-        .join(models.BusinessUnit.bankAccount)
-        .outerjoin(models.CashflowPricing)
-        .with_entities(models.Pricing.businessUnitId, models.BusinessUnit.bankAccountId)
-        .distinct()
-    )
-    for business_unit_id, bank_account_id in business_unit_ids_and_bank_account_ids:
-        logger.info("Generating cashflow", extra={"business_unit": business_unit_id})
+    ]
+    for business_unit_ids_chunk in get_chunks(business_unit_ids, chunk_size):
+        extra = {"batch": batch_id, "business_units": len(business_unit_ids_chunk)}
         try:
-            with transaction():
-                pricings = (
-                    models.Pricing.query.join(models.BusinessUnit)
-                    .join(models.BusinessUnit.bankAccount)
-                    .join(models.Pricing.booking)
-                    .join(bookings_models.Booking.stock)
-                    .outerjoin(models.CashflowPricing)
-                    .filter(
-                        models.Pricing.businessUnitId == business_unit_id,
-                        *filters,
-                    )
-                )
-                total = pricings.with_entities(sqla.func.sum(models.Pricing.amount)).scalar()
-                if not total:
-                    # Mark as `PROCESSED` even if there is no cashflow, so
-                    # that we will not process these pricings again.
-                    _mark_as_processed(pricings)
-                    continue
-                cashflow = models.Cashflow(
-                    batchId=batch_id,
-                    businessUnitId=business_unit_id,
-                    bankAccountId=bank_account_id,
-                    status=models.CashflowStatus.PENDING,
-                    amount=total,
-                )
-                db.session.add(cashflow)
-                links = [models.CashflowPricing(cashflowId=cashflow.id, pricingId=pricing.id) for pricing in pricings]
-                # Mark as `PROCESSED` now (and not before), otherwise the
-                # `pricings` query above will be empty since it
-                # filters on `VALIDATED` pricings.
-                _mark_as_processed(pricings)
-                db.session.bulk_save_objects(links)
-                db.session.commit()
-                logger.info("Generated cashflow", extra={"business_unit": business_unit_id})
+            with log_elapsed(logger, "Generated cashflows for a chunk of business units", extra):
+                with transaction():
+                    _generate_cashflows_of_business_units(batch_id, cutoff, business_unit_ids_chunk)
         except Exception:  # pylint: disable=broad-except
             if settings.IS_RUNNING_TESTS:
                 raise
             logger.exception(
-                "Could not generate cashflows for a business unit",
-                extra={"business_unit": business_unit_id, "batch": batch_id},
+                "Could not generate cashflows for a chunk of business units, processing them one by one",
+                extra={"batch": batch_id},
             )
+            _generate_cashflows_of_business_units_one_by_one(batch_id, cutoff, business_unit_ids_chunk)
 
     return batch_id
 
 
+# The `FROM` and `WHERE` clauses that select pricings for which a
+# cashflow should be generated.
+_CASHFLOW_ELIGIBLE_PRICINGS_CLAUSE = """
+    FROM pricing
+    JOIN business_unit ON business_unit.id = pricing."businessUnitId"
+    -- Bookings can now be priced even if BankInformation is not
+    -- ACCEPTED, but to generate cashflows we definitely need it.
+    JOIN bank_information ON bank_information.id = business_unit."bankAccountId"
+    JOIN booking ON booking.id = pricing."bookingId"
+    JOIN stock ON stock.id = booking."stockId"
+    -- We should not have any validated pricing with a cashflow, this
+    -- is a safety belt.
+    LEFT OUTER JOIN cashflow_pricing ON cashflow_pricing."pricingId" = pricing.id
+    WHERE
+      pricing.status = :validated
+      AND pricing."valueDate" < :cutoff
+      -- Even if a booking is marked as used prematurely, we should
+      -- wait for the event to happen.
+      AND (stock."beginningDatetime" IS NULL OR stock."beginningDatetime" < :cutoff)
+      AND cashflow_pricing."pricingId" IS NULL
+      AND bank_information.status = :accepted
+"""
+
+
+def _get_cashflow_eligible_pricings_params(cutoff: datetime.datetime) -> dict:
+    return {
+        "validated": models.PricingStatus.VALIDATED.value,
+        "cutoff": cutoff,
+        "accepted": BankInformationStatus.ACCEPTED.name,
+    }
+
+
+def _generate_cashflows_of_business_units(batch_id: int, cutoff: datetime.datetime, business_unit_ids: list[int]):  # type: ignore [no-untyped-def]
+    """Generate cashflows for the requested business units, in a single
+    statement: compute the total of each business unit, insert
+    cashflows and links to pricings, and mark pricings as processed.
+
+    Pricings are marked as processed even if the total is zero and no
+    cashflow is created, so that we will not process them again.
+    """
+    params = _get_cashflow_eligible_pricings_params(cutoff)
+    params.update(
+        {
+            "business_unit_ids": business_unit_ids,
+            "batch_id": batch_id,
+            "pending": models.CashflowStatus.PENDING.value,
+            "processed": models.PricingStatus.PROCESSED.value,
+        }
+    )
+    n_cashflows, n_pricings = db.session.execute(
+        f"""
+        WITH eligible AS (
+          SELECT pricing.id, pricing."businessUnitId", business_unit."bankAccountId", pricing.amount
+          {_CASHFLOW_ELIGIBLE_PRICINGS_CLAUSE}
+          AND pricing."businessUnitId" = ANY(:business_unit_ids)
+        ),
+        totals AS (
+          SELECT "businessUnitId", "bankAccountId", sum(amount) AS amount
+          FROM eligible
+          GROUP BY "businessUnitId", "bankAccountId"
+        ),
+        inserted_cashflows AS (
+          INSERT INTO cashflow ("batchId", "businessUnitId", "bankAccountId", status, amount)
+          SELECT :batch_id, "businessUnitId", "bankAccountId", :pending, amount
+          FROM totals
+          WHERE amount != 0
+          RETURNING id, "businessUnitId"
+        ),
+        inserted_links AS (
+          INSERT INTO cashflow_pricing ("cashflowId", "pricingId")
+          SELECT inserted_cashflows.id, eligible.id
+          FROM eligible
+          JOIN inserted_cashflows ON inserted_cashflows."businessUnitId" = eligible."businessUnitId"
+        ),
+        updated_pricings AS (
+          UPDATE pricing
+          SET status = :processed
+          FROM eligible
+          WHERE pricing.id = eligible.id
+          RETURNING pricing.id
+        )
+        SELECT
+          (SELECT count(*) FROM inserted_cashflows),
+          (SELECT count(*) FROM updated_pricings)
+        """,
+        params=params,
+    ).fetchone()
+    logger.info(
+        "Generated cashflows",
+        extra={
+            "batch": batch_id,
+            "business_units": business_unit_ids,
+            "cashflows": n_cashflows,
+            "pricings": n_pricings,
+        },
+    )
+
+
+def _generate_cashflows_of_business_units_one_by_one(batch_id: int, cutoff: datetime.datetime, business_unit_ids: list[int]):  # type: ignore [no-untyped-def]
+    with transaction():
+        for business_unit_id in business_unit_ids:
+            try:
+                with db.session.begin_nested():
+                    _generate_cashflows_of_business_units(batch_id, cutoff, [business_unit_id])
+            except Exception:  # pylint: disable=broad-except
+                logger.exception(
+                    "Could not generate cashflows for a business unit",
+                    extra={"business_unit": business_unit_id, "batch": batch_id},
+                )
+
+
 def generate_payment_files(batch_id: int):  # type: ignore [no-untyped-def]
     """Generate all payment files that are related to the requested
     CashflowBatch and mark all related Cashflow as ``UNDER_REVIEW``.
@@ -646,13 +964,14 @@ def generate_payment_files(batch_id: int):  # type: ignore [no-untyped-def]
             f"because {not_pending_cashflows} cashflows are not pending",
         )
 
-    file_paths = {}
-    logger.info("Generating business units file")
-    file_paths["business_units"] = _generate_business_units_file()
-    logger.info("Generating payments file")
-    file_paths["payments"] = _generate_payments_file(batch_id)
-    logger.info("Generating wallets file")
-    file_paths["wallets"] = _generate_wallets_file()
+    file_paths = _generate_files(
+        {
+            "business_units": _generate_business_units_file,
+            "payments": lambda: _generate_payments_file(batch_id),
+            "wallets": _generate_wallets_file,
+        },
+        workers=settings.FINANCE_FILES_GENERATION_WORKERS,
+    )
     logger.info(
         "Finance files have been generated",
         extra={"paths": [str(path) for path in file_paths.values()]},
@@ -681,6 +1000,28 @@ def generate_payment_files(batch_id: int):  # type: ignore [no-untyped-def]
     logger.info("Updated cashflow status")
 
 
+def _generate_files(generators: dict[str, typing.Callable[[], pathlib.Path]], workers: int) -> dict[str, pathlib.Path]:
+    """Call the requested file generators and return the paths of the
+    generated files.
+
+    Files are independent from each other. If ``workers`` is greater
+    than 1, they are generated concurrently, each in its own thread
+    (and thus with its own database session).
+    """
+    if workers <= 1:
+        return {name: generator() for name, generator in generators.items()}
+
+    app = current_app._get_current_object()  # pylint: disable=protected-access
+
+    def _generate(generator: typing.Callable[[], pathlib.Path]) -> pathlib.Path:
+        with app.app_context():
+            return generator()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {name: executor.submit(_generate, generator) for name, generator in generators.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
 def _write_csv(
     filename: str,
     header: typing.Iterable,
@@ -689,29 +1030,50 @@ def _write_csv(
     row_formatter: typing.Callable[typing.Any, typing.Iterable] = lambda row: row,  # type: ignore [misc]
     compress: bool = False,
 ) -> pathlib.Path:
+    """Write rows to a CSV file and return its path.
+
+    Rows are written as they come, and compressed on the fly if
+    ``compress`` is set, so that memory usage does not depend on the
+    number of rows. Queries should hence use ``yield_per()`` so that
+    rows are fetched from a server-side cursor.
+    """
     assert (rows is not None) ^ (batched_rows is not None)
+    if rows is not None:
+        batched_rows = (rows,)
 
     # Store file in a dedicated directory within "/tmp". It's easier
     # to clean files in tests that way.
-    path = pathlib.Path(tempfile.mkdtemp()) / f"{filename}.csv"
-    with open(path, "w+", encoding="utf-8") as fp:
+    directory = pathlib.Path(tempfile.mkdtemp())
+    csv_filename = f"{filename}.csv"
+    n_rows = 0
+    with contextlib.ExitStack() as stack:
+        if compress:
+            path = directory / f"{csv_filename}.zip"
+            zfile = stack.enter_context(
+                zipfile.ZipFile(
+                    path,
+                    "w",
+                    compression=zipfile.ZIP_DEFLATED,
+                    compresslevel=settings.FINANCE_FILES_COMPRESSION_LEVEL,
+                )
+            )
+            fp = stack.enter_context(
+                io.TextIOWrapper(zfile.open(csv_filename, "w", force_zip64=True), encoding="utf-8")
+            )
+        else:
+            path = directory / csv_filename
+            fp = stack.enter_context(open(path, "w+", encoding="utf-8"))
         writer = csv.writer(fp, quoting=csv.QUOTE_NONNUMERIC)
         writer.writerow(header)
-        if rows is not None:
-            writer.writerows(row_formatter(row) for row in rows)
-        if batched_rows is not None:
-            for rows_ in batched_rows:
-                writer.writerows(row_formatter(row) for row in rows_)
-    if compress:
-        compressed_path = pathlib.Path(str(path) + ".zip")
-        with zipfile.ZipFile(
-            compressed_path,
-            "w",
-            compression=zipfile.ZIP_DEFLATED,
-            compresslevel=9,
-        ) as zfile:
-            zfile.write(path, arcname=path.name)
-        path = compressed_path
+        for rows_ in batched_rows:  # type: ignore [union-attr]
+            for row in rows_:
+                writer.writerow(row_formatter(row))
+                n_rows += 1
+
+    logger.info(
+        "Generated finance file",
+        extra={"path": str(path), "rows": n_rows, "bytes": path.stat().st_size},
+    )
     return path
 
 
@@ -744,6 +1106,7 @@ def _generate_business_units_file() -> pathlib.Path:
             BankInformation.iban.label("iban"),
             BankInformation.bic.label("bic"),
         )
+        .yield_per(1000)
     )
     row_formatter = lambda row: (
         human_ids.humanize(row.venue_id),
@@ -844,10 +1207,7 @@ def _generate_payments_file(batch_id: int) -> pathlib.Path:
             models.Pricing.amount.label("pricing_amount"),
             educational_models.EducationalDeposit.ministry.label("ministry"),
         )
-        # FIXME (dbaty, 2021-11-30): other functions use `yield_per()`
-        # but I am not sure it helps here. We have used
-        # `pcapi.utils.db.get_batches` in the old-style payment code
-        # and that may be what's best here.
+        # Fetch rows from a server-side cursor, see `_write_csv()`.
         .yield_per(1000)
     )
     return _write_csv(
@@ -895,16 +1255,39 @@ def _payment_details_row_formatter(sql_row):  # type: ignore [no-untyped-def]
 
 def _generate_wallets_file() -> pathlib.Path:
     header = ["ID de l'utilisateur", "Solde théorique", "Solde réel"]
-    # Warning: this query ignores the expiration date of deposits.
-    query = (
-        db.session.query(
-            users_models.User.id.label("user_id"),
-            sqla.func.get_wallet_balance(users_models.User.id, False).label("current_balance"),
-            sqla.func.get_wallet_balance(users_models.User.id, True).label("real_balance"),
+    if FeatureToggle.USE_DEPOSIT_BALANCE_COLUMNS.is_active():
+        # Only the current deposit (if any) is taken into account: users
+        # whose deposits have all expired have a balance of zero.
+        deposit = payments_models.Deposit
+        query = (
+            db.session.query(
+                users_models.User.id.label("user_id"),
+                sqla.func.coalesce(deposit.amount - deposit.bookedAmount, 0).label("current_balance"),
+                sqla.func.coalesce(deposit.amount - deposit.usedAmount, 0).label("real_balance"),
+            )
+            .outerjoin(
+                deposit,
+                sqla.and_(
+                    deposit.userId == users_models.User.id,
+                    deposit.expirationDate > sqla.func.now(),
+                ),
+            )
+            .filter(users_models.User.deposits != None)
+            .order_by(users_models.User.id)
+            .yield_per(1000)
+        )
+    else:
+        # Warning: this query ignores the expiration date of deposits.
+        query = (
+            db.session.query(
+                users_models.User.id.label("user_id"),
+                sqla.func.get_wallet_balance(users_models.User.id, False).label("current_balance"),
+                sqla.func.get_wallet_balance(users_models.User.id, True).label("real_balance"),
+            )
+            .filter(users_models.User.deposits != None)
+            .order_by(users_models.User.id)
+            .yield_per(1000)
         )
-        .filter(users_models.User.deposits != None)
-        .order_by(users_models.User.id)
-    )
     row_formatter = lambda row: (row.user_id, row.current_balance, row.real_balance)
     return _write_csv(
         "soldes_des_utilisateurs",
@@ -968,7 +1351,18 @@ def _make_invoice_line(group: conf.RuleGroups, pricings: list, line_rate: decima
 
 
 def generate_invoices():  # type: ignore [no-untyped-def]
-    """Generate (and store) all invoices."""
+    """Generate (and store) all invoices.
+
+    The PDF file of invoices that have been generated during a previous
+    run but whose PDF could not be stored is generated again first.
+
+    If ``INVOICE_PDF_GENERATION_WORKERS`` is greater than 1, PDF files
+    are rendered and uploaded by a pool of worker processes, see
+    `_generate_invoices_with_pdf_pool()`.
+    """
+    invoices_without_pdf = models.Invoice.query.filter(models.Invoice.isPdfStored.is_(False)).order_by(
+        models.Invoice.id
+    )
     rows = (
         db.session.query(
             models.Cashflow.businessUnitId.label("business_unit_id"),
@@ -983,24 +1377,181 @@ def generate_invoices():  # type: ignore [no-untyped-def]
         # UNDER_REVIEW, but having a safety belt here is almost free.
         .filter(models.InvoiceCashflow.invoiceId.is_(None))
         .group_by(models.Cashflow.businessUnitId)
+        .all()
+    )
+
+    workers = settings.INVOICE_PDF_GENERATION_WORKERS
+    if workers > 1:
+        _generate_invoices_with_pdf_pool(invoices_without_pdf.all(), rows, workers)
+    else:
+        for invoice in invoices_without_pdf:
+            try:
+                with transaction():
+                    extra = {"business_unit_id": invoice.businessUnitId, "invoice": invoice.id}
+                    with log_elapsed(logger, "Stored and sent invoice", extra):
+                        _store_invoice_and_send_email(invoice)
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.exception(
+                    "Could not store invoice",
+                    extra={"business_unit": invoice.businessUnitId, "invoice": invoice.id, "exc": str(exc)},
+                )
+        for row in rows:
+            try:
+                with transaction():
+                    extra = {"business_unit_id": row.business_unit_id}
+                    with log_elapsed(logger, "Generated and sent invoice", extra):
+                        generate_and_store_invoice(row.business_unit_id, row.cashflow_ids)
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.exception(
+                    "Could not generate invoice",
+                    extra={
+                        "business_unit": row.business_unit_id,
+                        "cashflow_ids": row.cashflow_ids,
+                        "exc": str(exc),
+                    },
+                )
+    generate_invoice_file(datetime.date.today())
+
+
+@dataclasses.dataclass
+class _InvoicePdfJob:
+    invoice_id: int
+    business_unit_id: int
+    storage_object_id: str
+    html: str
+    attempt: int = 1
+
+    @classmethod
+    def from_invoice(cls, invoice: models.Invoice) -> "_InvoicePdfJob":
+        return cls(
+            invoice_id=invoice.id,
+            business_unit_id=invoice.businessUnitId,
+            storage_object_id=invoice.storage_object_id,
+            html=_generate_invoice_html(invoice=invoice),
+        )
+
+
+def _get_invoice_pdf_executor(workers: int) -> concurrent.futures.Executor:
+    # Worker processes are spawned, not forked: forked processes would
+    # inherit (and share) the database connections of the engine. They
+    # do not need the database anyway.
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
     )
 
-    for row in rows:
+
+def _generate_invoices_with_pdf_pool(invoices_without_pdf: list[models.Invoice], rows: list, workers: int) -> None:
+    """Generate invoices and render their PDF in worker processes.
+
+    Database work (generating the invoice and its HTML) is done in the
+    current process, one business unit at a time. Rendering the PDF
+    (which is CPU-bound) and uploading it are done in ``workers``
+    processes. At most ``2 * workers`` PDF files are waiting to be
+    rendered at any time, so that HTML documents do not pile up in
+    memory. A failed rendering or upload is retried up to
+    ``INVOICE_PDF_GENERATION_MAX_ATTEMPTS`` times. The invoice is
+    marked as stored and the email is sent once the PDF has been
+    stored.
+
+    The invoice is committed before its PDF is rendered (it holds the
+    lock on the reference scheme until then). If all attempts fail,
+    the invoice is left with ``isPdfStored = False`` and its PDF is
+    generated again by the next run.
+    """
+    max_pending = 2 * workers
+    pending: dict[concurrent.futures.Future, _InvoicePdfJob] = {}
+    with _get_invoice_pdf_executor(workers) as executor:
+        for invoice in invoices_without_pdf:
+            while len(pending) >= max_pending:
+                _process_invoice_pdf_jobs(executor, pending)
+            try:
+                job = _InvoicePdfJob.from_invoice(invoice)
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.exception(
+                    "Could not store invoice",
+                    extra={"business_unit": invoice.businessUnitId, "invoice": invoice.id, "exc": str(exc)},
+                )
+                continue
+            _submit_invoice_pdf_job(executor, pending, job)
+        for row in rows:
+            while len(pending) >= max_pending:
+                _process_invoice_pdf_jobs(executor, pending)
+            try:
+                with transaction():
+                    extra = {"business_unit_id": row.business_unit_id}
+                    with log_elapsed(logger, "Generated invoice model instance and HTML", extra):
+                        invoice = _generate_invoice(
+                            business_unit_id=row.business_unit_id,
+                            cashflow_ids=row.cashflow_ids,
+                        )
+                        job = _InvoicePdfJob.from_invoice(invoice)
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.exception(
+                    "Could not generate invoice",
+                    extra={
+                        "business_unit": row.business_unit_id,
+                        "cashflow_ids": row.cashflow_ids,
+                        "exc": str(exc),
+                    },
+                )
+                continue
+            _submit_invoice_pdf_job(executor, pending, job)
+        while pending:
+            _process_invoice_pdf_jobs(executor, pending)
+
+
+def _submit_invoice_pdf_job(
+    executor: concurrent.futures.Executor,
+    pending: dict[concurrent.futures.Future, _InvoicePdfJob],
+    job: _InvoicePdfJob,
+) -> None:
+    try:
+        future = executor.submit(_store_invoice_pdf, job.storage_object_id, job.html)
+    except Exception as exc:  # pylint: disable=broad-except
+        # The pool may be broken if a worker process died abruptly.
+        logger.exception(
+            "Could not generate invoice PDF",
+            extra={"invoice": job.invoice_id, "business_unit": job.business_unit_id, "exc": str(exc)},
+        )
+        return
+    pending[future] = job
+
+
+def _process_invoice_pdf_jobs(
+    executor: concurrent.futures.Executor,
+    pending: dict[concurrent.futures.Future, _InvoicePdfJob],
+) -> None:
+    """Wait for at least one PDF job to finish and process finished
+    jobs: retry failed ones, mark the invoice as stored and send the
+    email for successful ones.
+    """
+    done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+    for future in done:
+        job = pending.pop(future)
+        log_extra = {
+            "invoice": job.invoice_id,
+            "business_unit": job.business_unit_id,
+            "attempt": job.attempt,
+        }
+        try:
+            timings = future.result()
+        except Exception as exc:  # pylint: disable=broad-except
+            if job.attempt < settings.INVOICE_PDF_GENERATION_MAX_ATTEMPTS:
+                logger.warning("Could not generate invoice PDF, will retry", extra=log_extra | {"exc": str(exc)})
+                _submit_invoice_pdf_job(executor, pending, dataclasses.replace(job, attempt=job.attempt + 1))
+            else:
+                logger.exception("Could not generate invoice PDF", extra=log_extra | {"exc": str(exc)})
+            continue
+        logger.info("Generated invoice PDF", extra=log_extra | timings)
         try:
             with transaction():
-                extra = {"business_unit_id": row.business_unit_id}
-                with log_elapsed(logger, "Generated and sent invoice", extra):
-                    generate_and_store_invoice(row.business_unit_id, row.cashflow_ids)
+                invoice = models.Invoice.query.get(job.invoice_id)
+                invoice.isPdfStored = True
+            with log_elapsed(logger, "Sent invoice", log_extra):
+                send_invoice_available_to_pro_email(invoice)
         except Exception as exc:  # pylint: disable=broad-except
-            logger.exception(
-                "Could not generate invoice",
-                extra={
-                    "business_unit": row.business_unit_id,
-                    "cashflow_ids": row.cashflow_ids,
-                    "exc": str(exc),
-                },
-            )
-    generate_invoice_file(datetime.date.today())
+            logger.exception("Could not send invoice", extra=log_extra | {"exc": str(exc)})
 
 
 def generate_invoice_file(invoice_date: datetime.date) -> pathlib.Path:
@@ -1035,6 +1586,7 @@ def generate_invoice_file(invoice_date: datetime.date) -> pathlib.Path:
         )
         .filter(cast(models.Invoice.date, Date) == invoice_date)
         .order_by(models.Invoice.id, models.Pricing.id, models.PricingLine.id)
+        .yield_per(1000)
     )
 
     row_formatter = lambda row: (
@@ -1059,16 +1611,26 @@ def generate_and_store_invoice(business_unit_id: int, cashflow_ids: list[int]):
     log_extra = {"business_unit": business_unit_id}
     with log_elapsed(logger, "Generated invoice model instance", log_extra):
         invoice = _generate_invoice(business_unit_id=business_unit_id, cashflow_ids=cashflow_ids)
+    _store_invoice_and_send_email(invoice)
+
+
+def _store_invoice_and_send_email(invoice: models.Invoice) -> None:
+    log_extra = {"business_unit": invoice.businessUnitId}
     with log_elapsed(logger, "Generated invoice HTML", log_extra):
         invoice_html = _generate_invoice_html(invoice=invoice)
     with log_elapsed(logger, "Generated invoice PDF", log_extra):
         _store_invoice_pdf(invoice_storage_id=invoice.storage_object_id, invoice_html=invoice_html)
+    invoice.isPdfStored = True
+    db.session.commit()
     with log_elapsed(logger, "Sent invoice", log_extra):
         send_invoice_available_to_pro_email(invoice)
 
 
 def _generate_invoice(business_unit_id: int, cashflow_ids: list[int]):  # type: ignore [no-untyped-def]
-    invoice = models.Invoice(businessUnitId=business_unit_id)
+    # The invoice is committed at the end of this function, before its
+    # PDF is stored. It is marked as stored afterwards, so that the PDF
+    # of an invoice can be generated again if it could not be stored.
+    invoice = models.Invoice(businessUnitId=business_unit_id, isPdfStored=False)
     total_reimbursed_amount = 0
     cashflows = models.Cashflow.query.filter(models.Cashflow.id.in_(cashflow_ids)).options(
         sqla_orm.joinedload(models.Cashflow.pricings)
@@ -1210,11 +1772,23 @@ def _generate_invoice_html(invoice: models.Invoice) -> str:
     return render_template("invoices/invoice.html", **context)
 
 
-def _store_invoice_pdf(invoice_storage_id: str, invoice_html: str):  # type: ignore [no-untyped-def]
+def _store_invoice_pdf(invoice_storage_id: str, invoice_html: str) -> dict[str, float]:
+    """Render the invoice PDF and upload it. Return the duration of
+    each step (in seconds).
+
+    This function may be called in a worker process: it must not use
+    the database.
+    """
+    start = time.perf_counter()
     invoice_pdf = pdf_utils.generate_pdf_from_html(html_content=invoice_html)
+    rendered = time.perf_counter()
     store_public_object(
         folder="invoices", object_id=invoice_storage_id, blob=invoice_pdf, content_type="application/pdf"
     )
+    return {
+        "render_duration": rendered - start,
+        "upload_duration": time.perf_counter() - rendered,
+    }
 
 
 def merge_cashflow_batches(  # type: ignore [no-untyped-def]
@@ -67,6 +67,15 @@ class EducationalPricingFactory(BaseFactory):
     standardRule = "Remboursement total"
 
 
+class SiretRevenueFactory(BaseFactory):
+    class Meta:
+        model = models.SiretRevenue
+
+    siret = factory.Sequence(lambda n: f"{n:014}")
+    year = factory.LazyFunction(lambda: datetime.date.today().year)
+    revenue = 0
+
+
 class PricingLineFactory(BaseFactory):
     class Meta:
         model = models.PricingLine
@@ -175,6 +175,25 @@ class Pricing(Model):  # type: ignore [valid-type, misc]
     )
 
 
+class SiretRevenue(Model):  # type: ignore [valid-type, misc]
+    """The revenue of a SIRET for an accounting year, in euro cents.
+
+    It is the sum of the amount of individual bookings for which
+    there is a pricing that is neither cancelled nor rejected (i.e.
+    ``Pricing.revenue`` of the latest pricing). It is updated along
+    with pricings, so that we do not have to compute the sum whenever
+    we price a booking. See ``check_siret_revenues()`` to detect
+    discrepancies.
+    """
+
+    id = sqla.Column(sqla.BigInteger, primary_key=True, autoincrement=True)
+    siret = sqla.Column(sqla.String(14), nullable=False)
+    year = sqla.Column(sqla.Integer, nullable=False)
+    revenue = sqla.Column(sqla.Integer, nullable=False)
+
+    __table_args__ = (sqla.UniqueConstraint("siret", "year", name="unique_siret_year"),)
+
+
 class PricingLine(Model):  # type: ignore [valid-type, misc]
     id = sqla.Column(sqla.BigInteger, primary_key=True, autoincrement=True)
 
@@ -345,6 +364,8 @@ class Invoice(Model):  # type: ignore [valid-type, misc]
     # See the note about `amount` at the beginning of this module.
     amount = sqla.Column(sqla.Integer, nullable=False)
     token = sqla.Column(sqla.Text, unique=True, nullable=False)
+    # False until the PDF file has been stored, see `api.generate_invoices()`.
+    isPdfStored = sqla.Column(sqla.Boolean, nullable=False, server_default=sqla.sql.expression.true(), default=True)
     lines = sqla_orm.relationship("InvoiceLine", back_populates="invoice")
     cashflows = sqla_orm.relationship("Cashflow", secondary="invoice_cashflow", back_populates="invoices")
 
@@ -0,0 +1,23 @@
+import datetime
+
+from pcapi.core import mails
+from pcapi.core.mails.models.sendinblue_models import SendinblueTransactionalEmailData
+from pcapi.core.mails.transactional.sendinblue_template_ids import TransactionalEmail
+from pcapi.core.users.models import User
+
+
+def get_bookings_csv_export_to_pro_email_data(
+    url: str, expiration_date: datetime.datetime
+) -> SendinblueTransactionalEmailData:
+    return SendinblueTransactionalEmailData(
+        template=TransactionalEmail.BOOKINGS_CSV_EXPORT_TO_PRO.value,
+        params={
+            "EXPORT_LINK": url,
+            "EXPIRATION_DATE": expiration_date.strftime("%d/%m/%Y"),
+        },
+    )
+
+
+def send_bookings_csv_export_to_pro_email(user: User, url: str, expiration_date: datetime.datetime) -> bool:
+    data = get_bookings_csv_export_to_pro_email_data(url, expiration_date)
+    return mails.send(recipients=[user.email], data=data)
@@ -80,6 +80,7 @@ class TransactionalEmail(Enum):
     BOOKING_CANCELLATION_CONFIRMATION_BY_PRO = TemplatePro(
         id_prod=377, id_not_prod=60, tags=["pro_annulation_rerservation"]
     )
+    BOOKINGS_CSV_EXPORT_TO_PRO = TemplatePro(id_prod=642, id_not_prod=80, tags=["pro_export_reservations"])
     BOOKING_EXPIRATION_TO_PRO = TemplatePro(id_prod=380, id_not_prod=50, tags=["pro_reservation_expiree_30j"])
     EAC_NEW_BOOKING_TO_PRO = TemplatePro(id_prod=383, id_not_prod=67, tags=["pro_nouvelle_reservation_eac"])
     EAC_NEW_PREBOOKING_TO_PRO = TemplatePro(id_prod=429, id_not_prod=68, tags=["pro_nouvelle_prereservation_eac"])
@@ -0,0 +1,86 @@
+"""A Redis cache of offers, as serialized by the native API.
+
+Cached offers are invalidated when the offer is reindexed (see
+``search.async_index_offer_ids()``) and when offers of its venue are
+reindexed (through a version of the venue that is stored along the
+cached offer). The cache has a short TTL because a concurrent read
+may cache an offer just before it is modified.
+"""
+import json
+import logging
+import secrets
+from typing import Iterable
+from typing import Optional
+
+import flask
+
+from pcapi import settings
+
+
+logger = logging.getLogger(__name__)
+
+NATIVE_OFFER_REDIS_KEY = "cache:native-offer:{offer_id}"
+NATIVE_OFFER_VENUE_VERSION_REDIS_KEY = "cache:native-offer:venue-version:{venue_id}"
+
+
+def get_native_offer(offer_id: int) -> Optional[dict]:
+    """Return the serialized offer, or None if it is not cached or if
+    its venue has changed since it was cached.
+    """
+    redis = flask.current_app.redis_client  # type: ignore [attr-defined]
+    try:
+        cached = redis.get(NATIVE_OFFER_REDIS_KEY.format(offer_id=offer_id))
+        if cached is None:
+            return None
+        entry = json.loads(cached)
+        venue_version = redis.get(NATIVE_OFFER_VENUE_VERSION_REDIS_KEY.format(venue_id=entry["venueId"]))
+    except Exception:  # pylint: disable=broad-except
+        if settings.IS_RUNNING_TESTS:
+            raise
+        logger.exception("Could not get cached offer", extra={"offer": offer_id})
+        return None
+    if venue_version != entry["venueVersion"]:
+        return None
+    return entry["offer"]
+
+
+def set_native_offer(offer_id: int, venue_id: int, serialized_offer: dict, ttl: int) -> None:
+    redis = flask.current_app.redis_client  # type: ignore [attr-defined]
+    try:
+        venue_version = redis.get(NATIVE_OFFER_VENUE_VERSION_REDIS_KEY.format(venue_id=venue_id))
+        entry = {"venueId": venue_id, "venueVersion": venue_version, "offer": serialized_offer}
+        redis.set(NATIVE_OFFER_REDIS_KEY.format(offer_id=offer_id), json.dumps(entry), ex=ttl)
+    except Exception:  # pylint: disable=broad-except
+        if settings.IS_RUNNING_TESTS:
+            raise
+        logger.exception("Could not cache offer", extra={"offer": offer_id})
+
+
+def invalidate_native_offers(offer_ids: Iterable[int]) -> None:
+    keys = [NATIVE_OFFER_REDIS_KEY.format(offer_id=offer_id) for offer_id in offer_ids]
+    if not keys:
+        return
+    try:
+        flask.current_app.redis_client.delete(*keys)  # type: ignore [attr-defined]
+    except Exception:  # pylint: disable=broad-except
+        if settings.IS_RUNNING_TESTS:
+            raise
+        logger.exception("Could not invalidate cached offers", extra={"offers": offer_ids})
+
+
+def invalidate_native_offers_of_venues(venue_ids: Iterable[int]) -> None:
+    try:
+        with flask.current_app.redis_client.pipeline(transaction=False) as pipeline:  # type: ignore [attr-defined]
+            for venue_id in venue_ids:
+                # The version must outlive cached offers that refer to
+                # the previous version.
+                pipeline.set(
+                    NATIVE_OFFER_VENUE_VERSION_REDIS_KEY.format(venue_id=venue_id),
+                    secrets.token_hex(8),
+                    ex=max(settings.NATIVE_OFFER_CACHE_TTL, 1),
+                )
+            pipeline.execute()
+    except Exception:  # pylint: disable=broad-except
+        if settings.IS_RUNNING_TESTS:
+            raise
+        logger.exception("Could not invalidate cached offers of venues", extra={"venues": venue_ids})
@@ -9,8 +9,10 @@ from typing import Optional
 from flask_sqlalchemy import BaseQuery
 from sqlalchemy import and_
 from sqlalchemy import func
+from sqlalchemy import literal_column
 from sqlalchemy import not_
 from sqlalchemy import or_
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import contains_eager
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.exc import NoResultFound
@@ -406,6 +408,7 @@ def get_offers_map_by_venue_reference(id_at_provider_list: list[str], venue_id:
 def get_stocks_by_id_at_providers(id_at_providers: list[str]) -> dict:
     stocks = Stock.query.filter(Stock.idAtProviders.in_(id_at_providers)).with_entities(
         Stock.id,
+        Stock.offerId,
         Stock.idAtProviders,
         Stock.dnBookedQuantity,
         Stock.quantity,
@@ -414,6 +417,7 @@ def get_stocks_by_id_at_providers(id_at_providers: list[str]) -> dict:
     return {
         stock.idAtProviders: {
             "id": stock.id,
+            "offer_id": stock.offerId,
             "booking_quantity": stock.dnBookedQuantity,
             "quantity": stock.quantity,
             "price": stock.price,
@@ -422,6 +426,66 @@ def get_stocks_by_id_at_providers(id_at_providers: list[str]) -> dict:
     }
 
 
+# `xmax` is 0 for rows that have just been inserted, and the id of the
+# current transaction for rows that have been updated by `ON CONFLICT`.
+_ROW_WAS_INSERTED = literal_column("xmax = 0").label("inserted")
+
+
+def upsert_provider_offers(rows: list[dict]) -> list[tuple[int, str, bool]]:
+    """Insert offers, or set the provider of offers that already exist
+    with the same ``(venueId, idAtProvider)``, in a single statement.
+
+    Rows are keyed by column names. Return ``(id, idAtProvider,
+    inserted)`` for each offer.
+    """
+    if not rows:
+        return []
+    statement = postgresql.insert(Offer.__table__).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=["venueId", "idAtProvider"],
+        set_={"lastProviderId": statement.excluded.lastProviderId},
+    ).returning(Offer.id, Offer.idAtProvider, _ROW_WAS_INSERTED)
+    return [tuple(row) for row in db.session.execute(statement)]  # type: ignore [misc]
+
+
+def update_provider_offers(venue_id: int, id_at_provider_list: list[str], provider_id: Optional[int]) -> dict[str, int]:
+    """Set the provider of existing offers. Return their ids, by
+    ``idAtProvider``.
+    """
+    if not id_at_provider_list:
+        return {}
+    statement = (
+        Offer.__table__.update()
+        .where(and_(Offer.venueId == venue_id, Offer.idAtProvider.in_(id_at_provider_list)))
+        .values(lastProviderId=provider_id)
+        .returning(Offer.id, Offer.idAtProvider)
+    )
+    return {id_at_provider: offer_id for offer_id, id_at_provider in db.session.execute(statement)}
+
+
+def upsert_provider_stocks(rows: list[dict]) -> list[tuple[int, int, bool]]:
+    """Insert stocks, or update the quantity and price of stocks that
+    already exist with the same ``idAtProviders``, in a single statement.
+
+    The quantity of each row is the quantity that is available: the
+    booked quantity of existing stocks is added to it. Return
+    ``(id, offerId, inserted)`` for each stock.
+    """
+    if not rows:
+        return []
+    statement = postgresql.insert(Stock.__table__).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=["idAtProviders"],
+        set_={
+            "quantity": statement.excluded.quantity + Stock.dnBookedQuantity,
+            "rawProviderQuantity": statement.excluded.rawProviderQuantity,
+            "price": statement.excluded.price,
+            "lastProviderId": statement.excluded.lastProviderId,
+        },
+    ).returning(Stock.id, Stock.offerId, _ROW_WAS_INSERTED)
+    return [tuple(row) for row in db.session.execute(statement)]  # type: ignore [misc]
+
+
 def get_active_offers_count_for_venue(venue_id) -> int:  # type: ignore [no-untyped-def]
     query = Offer.query.filter(Offer.venueId == venue_id)
     query = _filter_by_status(query, OfferStatus.ACTIVE.name)
@@ -451,6 +515,22 @@ def get_and_lock_stock(stock_id: int) -> Stock:
     return stock
 
 
+def book_stock_quantity(stock_id: int, quantity: int) -> bool:
+    """Increment the booked quantity of the stock if enough quantity
+    remains, in a single statement. Return whether the stock has been
+    updated.
+
+    The stock row is locked until the end of the current transaction,
+    as with `get_and_lock_stock()`, so the same warning applies.
+    """
+    updated = Stock.query.filter(
+        Stock.id == stock_id,
+        Stock.isSoftDeleted.is_(False),
+        or_(Stock.quantity.is_(None), Stock.quantity - Stock.dnBookedQuantity >= quantity),
+    ).update({"dnBookedQuantity": Stock.dnBookedQuantity + quantity}, synchronize_session=False)
+    return updated == 1
+
+
 def check_stock_consistency() -> list[int]:
     return [
         item[0]
@@ -550,6 +630,26 @@ def get_available_activation_code(stock: Stock) -> Optional[ActivationCode]:
     ).first()
 
 
+def get_available_activation_code_expiration_dates(stock_ids: list[int]) -> dict[int, Optional[datetime]]:
+    """Return the earliest expiration date of available activation codes,
+    for each requested stock that has at least one available code.
+
+    The expiration date is None if none of the available codes expires.
+    """
+    if not stock_ids:
+        return {}
+    return dict(
+        db.session.query(ActivationCode.stockId, func.min(ActivationCode.expirationDate))
+        .filter(
+            ActivationCode.stockId.in_(stock_ids),
+            ActivationCode.bookingId.is_(None),
+            or_(ActivationCode.expirationDate.is_(None), ActivationCode.expirationDate > func.now()),
+        )
+        .group_by(ActivationCode.stockId)
+        .all()
+    )
+
+
 def get_educational_offer_by_id(offer_id: str) -> Offer:
     return get_educational_offer_by_id_base_query(offer_id).one()
 
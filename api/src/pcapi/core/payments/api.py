@@ -5,6 +5,7 @@ from dateutil.relativedelta import relativedelta
 import pytz
 
 from pcapi import settings
+from pcapi.core.bookings.models import BookingStatus
 import pcapi.core.payments.conf as deposit_conf
 from pcapi.core.payments.models import CustomReimbursementRule
 from pcapi.core.payments.models import Deposit
@@ -167,3 +168,48 @@ def edit_reimbursement_rule(rule, end_date):  # type: ignore [no-untyped-def]
         raise
     repository.save(rule)
     return rule
+
+
+def recompute_deposit_balances(deposit_ids: list[int]) -> None:
+    """Recompute `bookedAmount` and `usedAmount` of the requested
+    deposits from their bookings.
+
+    Deposits are locked first. The booking trigger updates the deposit
+    of each changed booking, so a transaction that has changed a
+    booking of these deposits has either committed before the lock is
+    acquired (and its booking is included in the sums below), or waits
+    for the current transaction to commit before applying its own
+    change on top of the recomputed amounts. The caller must commit.
+    """
+    db.session.execute(
+        "SELECT id FROM deposit WHERE id IN :deposit_ids ORDER BY id FOR UPDATE",
+        {"deposit_ids": tuple(deposit_ids)},
+    )
+    query = f"""
+      WITH amounts_per_deposit AS (
+        SELECT
+          deposit.id AS deposit_id,
+          COALESCE(
+            SUM(booking.amount * booking.quantity)
+            FILTER (WHERE booking.status != '{BookingStatus.CANCELLED.value}'),
+            0
+          ) AS booked_amount,
+          COALESCE(
+            SUM(booking.amount * booking.quantity)
+            FILTER (WHERE booking.status IN ('{BookingStatus.USED.value}', '{BookingStatus.REIMBURSED.value}')),
+            0
+          ) AS used_amount
+        FROM deposit
+        LEFT OUTER JOIN individual_booking ON individual_booking."depositId" = deposit.id
+        LEFT OUTER JOIN booking ON booking."individualBookingId" = individual_booking.id
+        WHERE deposit.id IN :deposit_ids
+        GROUP BY deposit.id
+      )
+      UPDATE deposit
+      SET
+        "bookedAmount" = amounts_per_deposit.booked_amount,
+        "usedAmount" = amounts_per_deposit.used_amount
+      FROM amounts_per_deposit
+      WHERE deposit.id = amounts_per_deposit.deposit_id
+    """
+    db.session.execute(query, {"deposit_ids": tuple(deposit_ids)})
@@ -174,6 +174,17 @@ class Deposit(PcObject, Model):  # type: ignore [valid-type, misc]
 
     recredits = relationship("Recredit", order_by="Recredit.dateCreated.desc()")
 
+    # These amounts are maintained by the `booking_update_deposit_balance`
+    # trigger on the booking table (see `Booking.trig_deposit_balance_ddl`).
+    # They are not refreshed on objects already loaded in the session.
+    # Use `payments.repository.check_deposit_balance_consistency()` and
+    # `payments.api.recompute_deposit_balances()` to check and fix them.
+    # They are only read when USE_DEPOSIT_BALANCE_COLUMNS is active;
+    # otherwise the `get_wallet_balance` SQL function is used.
+    bookedAmount = sa.Column(sa.Numeric(10, 2), nullable=False, server_default=sa.text("0"))
+
+    usedAmount = sa.Column(sa.Numeric(10, 2), nullable=False, server_default=sa.text("0"))
+
     __table_args__ = (
         sa.UniqueConstraint(
             "userId",
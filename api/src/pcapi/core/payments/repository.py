@@ -1,3 +1,8 @@
+from sqlalchemy import func
+
+from pcapi.core.bookings.models import Booking
+from pcapi.core.bookings.models import BookingStatus
+from pcapi.core.bookings.models import IndividualBooking
 from pcapi.core.payments.models import Deposit
 from pcapi.core.payments.models import DepositType
 from pcapi.core.users.models import User
@@ -6,3 +11,23 @@ from pcapi.models import db
 
 def does_deposit_exists_for_beneficiary_and_type(beneficiary: User, deposit_type: DepositType):  # type: ignore [no-untyped-def]
     return db.session.query(Deposit.query.filter_by(userId=beneficiary.id, type=deposit_type.value).exists()).scalar()
+
+
+def check_deposit_balance_consistency() -> list[int]:
+    """Return the ids of deposits whose `bookedAmount` or `usedAmount`
+    do not match the sum of their bookings.
+    """
+    booking_amount = Booking.amount * Booking.quantity
+    booked_amount = func.coalesce(func.sum(booking_amount).filter(Booking.status != BookingStatus.CANCELLED), 0)
+    used_amount = func.coalesce(
+        func.sum(booking_amount).filter(Booking.status.in_((BookingStatus.USED, BookingStatus.REIMBURSED))), 0
+    )
+    return [
+        item[0]
+        for item in db.session.query(Deposit.id)
+        .outerjoin(Deposit.individual_bookings)
+        .outerjoin(IndividualBooking.booking)
+        .group_by(Deposit.id)
+        .having((Deposit.bookedAmount != booked_amount) | (Deposit.usedAmount != used_amount))
+        .all()
+    ]
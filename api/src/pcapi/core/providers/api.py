@@ -1,6 +1,12 @@
+import contextlib
 from dataclasses import asdict
 from datetime import datetime
 import logging
+import time
+from typing import Any
+from typing import Callable
+from typing import Counter
+from typing import Generator
 from typing import Iterable
 from typing import Optional
 from typing import Union
@@ -15,6 +21,9 @@ from pcapi.core.offers.repository import get_offers_map_by_id_at_provider
 from pcapi.core.offers.repository import get_offers_map_by_venue_reference
 from pcapi.core.offers.repository import get_products_map_by_provider_reference
 from pcapi.core.offers.repository import get_stocks_by_id_at_providers
+from pcapi.core.offers.repository import update_provider_offers
+from pcapi.core.offers.repository import upsert_provider_offers
+from pcapi.core.offers.repository import upsert_provider_stocks
 from pcapi.core.providers.exceptions import NoSiretSpecified
 from pcapi.core.providers.exceptions import ProviderNotFound
 from pcapi.core.providers.exceptions import ProviderWithoutApiImplementation
@@ -28,6 +37,7 @@ from pcapi.core.providers.models import VenueProviderCreationPayload
 from pcapi.core.providers.repository import get_provider_enabled_for_pro_by_id
 from pcapi.domain.price_rule import PriceRule
 from pcapi.models import db
+from pcapi.models.feature import FeatureToggle
 from pcapi.models.product import Product
 from pcapi.repository import repository
 from pcapi.routes.serialization.venue_provider_serialize import PostVenueProviderBody
@@ -160,11 +170,25 @@ def _siret_can_be_synchronized(
 
 
 def synchronize_stocks(
-    stock_details: Iterable[StockDetail], venue: Venue, provider_id: Optional[int] = None
+    stock_details: Iterable[StockDetail],
+    venue: Venue,
+    provider_id: Optional[int] = None,
+    timings: Optional[Counter] = None,
 ) -> dict[str, int]:
+    """Create or update offers and stocks of the venue.
+
+    If ``timings`` is given, the time spent in database lookups and
+    writes is added to its ``lookup_duration`` and ``write_duration``
+    keys.
+    """
+    timings = Counter() if timings is None else timings
+    if FeatureToggle.ENABLE_PROVIDER_STOCK_UPSERT.is_active():
+        return _synchronize_stocks_with_upsert(stock_details, venue, provider_id, timings)
+
     products_provider_references = [stock_detail.products_provider_reference for stock_detail in stock_details]
-    # here product.id_at_providers is the "ref" field that provider api gives use.
-    products_by_provider_reference = get_products_map_by_provider_reference(products_provider_references)
+    with _measure(timings, "lookup_duration"):
+        # here product.id_at_providers is the "ref" field that provider api gives use.
+        products_by_provider_reference = get_products_map_by_provider_reference(products_provider_references)
 
     stock_details = [
         stock for stock in stock_details if stock.products_provider_reference in products_by_provider_reference
@@ -172,7 +196,7 @@ def synchronize_stocks(
 
     offers_provider_references = [stock_detail.offers_provider_reference for stock_detail in stock_details]
     # here offers.id_at_providers is the "ref" field that provider api gives use.
-    with log_elapsed(
+    with _measure(timings, "lookup_duration"), log_elapsed(
         logger,
         "get_offers_map_by_id_at_provider",
         extra={
@@ -183,7 +207,7 @@ def synchronize_stocks(
         offers_by_provider_reference = get_offers_map_by_id_at_provider(offers_provider_references, venue)
 
     products_references = [stock_detail.products_provider_reference for stock_detail in stock_details]
-    with log_elapsed(
+    with _measure(timings, "lookup_duration"), log_elapsed(
         logger,
         "get_offers_map_by_venue_reference",
         extra={
@@ -196,7 +220,8 @@ def synchronize_stocks(
     offers_update_mapping = [
         {"id": offer_id, "lastProviderId": provider_id} for offer_id in offers_by_provider_reference.values()
     ]
-    db.session.bulk_update_mappings(Offer, offers_update_mapping)
+    with _measure(timings, "write_duration"):
+        db.session.bulk_update_mappings(Offer, offers_update_mapping)
 
     new_offers = _build_new_offers_from_stock_details(
         stock_details,
@@ -208,13 +233,16 @@ def synchronize_stocks(
     )
     new_offers_references = [new_offer.idAtProvider for new_offer in new_offers]
 
-    db.session.bulk_save_objects(new_offers)
+    with _measure(timings, "write_duration"):
+        db.session.bulk_save_objects(new_offers)
 
-    new_offers_by_provider_reference = get_offers_map_by_id_at_provider(new_offers_references, venue)  # type: ignore [arg-type]
+    with _measure(timings, "lookup_duration"):
+        new_offers_by_provider_reference = get_offers_map_by_id_at_provider(new_offers_references, venue)  # type: ignore [arg-type]
     offers_by_provider_reference = {**offers_by_provider_reference, **new_offers_by_provider_reference}
 
     stocks_provider_references = [stock.stocks_provider_reference for stock in stock_details]
-    stocks_by_provider_reference = get_stocks_by_id_at_providers(stocks_provider_references)
+    with _measure(timings, "lookup_duration"):
+        stocks_by_provider_reference = get_stocks_by_id_at_providers(stocks_provider_references)
     update_stock_mapping, new_stocks, offer_ids = _get_stocks_to_upsert(
         stock_details,
         stocks_by_provider_reference,
@@ -223,16 +251,175 @@ def synchronize_stocks(
         provider_id,
     )
 
-    db.session.bulk_save_objects(new_stocks)
-    db.session.bulk_update_mappings(Stock, update_stock_mapping)
+    with _measure(timings, "write_duration"):
+        db.session.bulk_save_objects(new_stocks)
+        db.session.bulk_update_mappings(Stock, update_stock_mapping)
 
-    db.session.commit()
+        db.session.commit()
 
     search.async_index_offer_ids(offer_ids)
 
     return {"new_offers": len(new_offers), "new_stocks": len(new_stocks), "updated_stocks": len(update_stock_mapping)}
 
 
+def _synchronize_stocks_with_upsert(
+    stock_details: Iterable[StockDetail], venue: Venue, provider_id: Optional[int], timings: Counter
+) -> dict[str, int]:
+    products_provider_references = [stock_detail.products_provider_reference for stock_detail in stock_details]
+    with _measure(timings, "lookup_duration"):
+        products_by_provider_reference = get_products_map_by_provider_reference(products_provider_references)
+    stock_details = [
+        stock for stock in stock_details if stock.products_provider_reference in products_by_provider_reference
+    ]
+    with _measure(timings, "lookup_duration"):
+        stocks_by_provider_reference = get_stocks_by_id_at_providers(
+            [stock_detail.stocks_provider_reference for stock_detail in stock_details]
+        )
+
+    # Offers are only created for stocks that have a quantity, the
+    # others are only updated if they exist.
+    offer_rows = {
+        stock_detail.products_provider_reference: _build_offer_row(
+            venue, products_by_provider_reference[stock_detail.products_provider_reference], stock_detail, provider_id
+        )
+        for stock_detail in stock_details
+        if stock_detail.available_quantity
+    }
+    references_without_quantity = [
+        stock_detail.offers_provider_reference for stock_detail in stock_details if not stock_detail.available_quantity
+    ]
+    with _measure(timings, "write_duration"):
+        upserted_offers = upsert_provider_offers(_get_valid_offer_rows(list(offer_rows.values()), venue))
+        offers_by_provider_reference = update_provider_offers(venue.id, references_without_quantity, provider_id)
+    offers_by_provider_reference.update({reference: offer_id for offer_id, reference, _inserted in upserted_offers})
+
+    stock_rows = []
+    offer_ids = set()
+    for stock_detail in stock_details:
+        product = products_by_provider_reference[stock_detail.products_provider_reference]
+        book_price = stock_detail.price or float(product.extraData["prix_livre"])  # type: ignore [call-overload, index]
+        stock = stocks_by_provider_reference.get(stock_detail.stocks_provider_reference)
+        if stock:
+            if not stock_detail.price and float(stock["price"]) != book_price:
+                logger.warning(
+                    "Stock specific price has been overriden by product price because provider price is missing",
+                    extra={
+                        "stock": stock["id"],
+                        "previous_stock_price": float(stock["price"]),
+                        "new_price": book_price,
+                    },
+                )
+            offer_id = stock["offer_id"]
+            if _should_reindex_offer(stock_detail.available_quantity, book_price, stock):
+                offer_ids.add(offer_id)
+        else:
+            offer_id = offers_by_provider_reference.get(stock_detail.offers_provider_reference)
+            if not stock_detail.available_quantity or not offer_id:
+                continue
+        stock_rows.append(_build_stock_row(stock_detail, offer_id, book_price, provider_id))
+
+    with _measure(timings, "write_duration"):
+        upserted_stocks = upsert_provider_stocks(_get_valid_stock_rows(stock_rows))
+        db.session.commit()
+    # New stocks make their offer bookable: reindex it.
+    offer_ids.update(offer_id for _stock_id, offer_id, inserted in upserted_stocks if inserted)
+
+    search.async_index_offer_ids(offer_ids)
+
+    new_stock_count = sum(1 for _stock_id, _offer_id, inserted in upserted_stocks if inserted)
+    return {
+        "new_offers": sum(1 for _offer_id, _reference, inserted in upserted_offers if inserted),
+        "new_stocks": new_stock_count,
+        "updated_stocks": len(upserted_stocks) - new_stock_count,
+    }
+
+
+def _build_offer_row(venue: Venue, product: Product, stock_detail: StockDetail, provider_id: Optional[int]) -> dict:
+    # Keys are column names, not attribute names (see `extraData`).
+    return {
+        "bookingEmail": venue.bookingEmail,
+        "description": product.description,
+        "jsonData": product.extraData,
+        "idAtProvider": stock_detail.products_provider_reference,
+        "lastProviderId": provider_id,
+        "name": product.name,
+        "productId": product.id,
+        "venueId": venue.id,
+        "subcategoryId": product.subcategoryId,
+        "withdrawalDetails": venue.withdrawalDetails,
+    }
+
+
+def _build_stock_row(stock_detail: StockDetail, offer_id: int, price: float, provider_id: Optional[int]) -> dict:
+    return {
+        "quantity": stock_detail.available_quantity,
+        "rawProviderQuantity": stock_detail.available_quantity,
+        "bookingLimitDatetime": None,
+        "offerId": offer_id,
+        "price": price,
+        "dateModified": datetime.utcnow(),
+        "idAtProviders": stock_detail.stocks_provider_reference,
+        "lastProviderId": provider_id,
+    }
+
+
+def _get_valid_offer_rows(rows: list[dict], venue: Venue) -> list[dict]:
+    """Return the rows that would pass `validate()` for offers. Offers
+    of a batch are all physical and of the same venue, so the venue
+    is checked once.
+    """
+    if venue.isVirtual:
+        logger.error("[SYNC] cannot add physical offers to a virtual venue", extra={"venue": venue.id})
+        return []
+    max_name_length = Offer.__table__.c.name.type.length
+    return _get_valid_rows(
+        rows,
+        "idAtProvider",
+        {
+            "name": lambda name: bool(name) and len(name) <= max_name_length,
+            "subcategoryId": bool,
+        },
+    )
+
+
+def _get_valid_stock_rows(rows: list[dict]) -> list[dict]:
+    """Return the rows that would pass `validate()` for stocks."""
+    max_reference_length = Stock.__table__.c.idAtProviders.type.length
+    return _get_valid_rows(
+        rows,
+        "idAtProviders",
+        {
+            "quantity": lambda quantity: quantity is None or quantity >= 0,
+            "price": lambda price: price is not None and price >= 0,
+            "idAtProviders": lambda reference: len(reference) <= max_reference_length,
+        },
+    )
+
+
+def _get_valid_rows(rows: list[dict], reference_key: str, checks: dict[str, Callable[[Any], bool]]) -> list[dict]:
+    valid_rows = []
+    for row in rows:
+        errors = [key for key, check in checks.items() if not check(row[key])]
+        if errors:
+            logger.error(
+                "[SYNC] errors while trying to add stock or offer with ref %s: %s",
+                row[reference_key],
+                errors,
+            )
+            continue
+        valid_rows.append(row)
+    return valid_rows
+
+
+@contextlib.contextmanager
+def _measure(timings: Counter, key: str) -> Generator:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[key] += time.perf_counter() - start
+
+
 def _build_new_offers_from_stock_details(
     stock_details: list[StockDetail],
     existing_offers_by_provider_reference: dict[str, int],
@@ -35,3 +35,7 @@ class VenueSiretNotRegistered(VenueProviderException):
 
 class ConnexionToProviderApiFailed(VenueProviderException):
     pass
+
+
+class SynchronizationTimeout(Exception):
+    pass
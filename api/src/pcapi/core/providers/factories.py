@@ -77,3 +77,11 @@ class AllocineVenueProviderPriceRuleFactory(BaseFactory):
     allocineVenueProvider = factory.SubFactory(AllocineVenueProviderFactory)
     priceRule = "default"
     price = 5.5
+
+
+class LocalProviderEventFactory(BaseFactory):
+    class Meta:
+        model = models.LocalProviderEvent
+
+    provider = factory.SubFactory(ProviderFactory)
+    type = models.LocalProviderEventType.SyncStart
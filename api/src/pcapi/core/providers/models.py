@@ -206,6 +206,7 @@ class LocalProviderEventType(enum.Enum):
     SyncError = "SyncError"
 
     SyncPartStart = "SyncPartStart"
+    SyncPartProgress = "SyncPartProgress"
     SyncPartEnd = "SyncPartEnd"
 
     SyncStart = "SyncStart"
@@ -18,7 +18,11 @@ def get_venue_provider_list(venue_id: int) -> list[VenueProvider]:
 
 
 def get_active_venue_providers_by_provider(provider_id: int) -> list[VenueProvider]:
-    return VenueProvider.query.filter_by(providerId=provider_id, isActive=True).all()
+    return (
+        VenueProvider.query.filter_by(providerId=provider_id, isActive=True)
+        .order_by(VenueProvider.lastSyncDate.asc().nullsfirst())
+        .all()
+    )
 
 
 def get_venue_provider_by_venue_and_provider_ids(venue_id: int, provider_id: int) -> VenueProvider:
@@ -1,14 +1,21 @@
+from concurrent import futures
 import logging
+import threading
+import time
 from typing import Iterable
 
+import flask
 from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import selectinload
 
 from pcapi import settings
 from pcapi.core.educational import models as educational_models
 from pcapi.core.offerers.models import Venue
+from pcapi.core.offers import cache as offers_cache
 from pcapi.core.offers.models import Offer
 from pcapi.core.search.backends import base
 from pcapi.repository import offer_queries
+from pcapi.utils import db as db_utils
 from pcapi.utils.module_loading import import_string
 
 
@@ -25,8 +32,10 @@ def async_index_offer_ids(offer_ids: Iterable[int]) -> None:
     ``Offer.id``.
 
     This function returns quickly. The "real" reindexation will be
-    done later through a cron job.
+    done later through a cron job. The cache of these offers is
+    invalidated right away.
     """
+    offers_cache.invalidate_native_offers(offer_ids)
     backend = _get_backend()
     try:
         backend.enqueue_offer_ids(offer_ids)
@@ -99,8 +108,10 @@ def async_index_offers_of_venue_ids(venue_ids: Iterable[int]) -> None:
     from the list of ``Venue.id``.
 
     This function returns quickly. The "real" reindexation will be
-    done later through a cron job.
+    done later through a cron job. The cache of these offers is
+    invalidated right away.
     """
+    offers_cache.invalidate_native_offers_of_venues(venue_ids)
     backend = _get_backend()
     try:
         backend.enqueue_venue_ids_for_offers(venue_ids)
@@ -113,7 +124,7 @@ def async_index_offers_of_venue_ids(venue_ids: Iterable[int]) -> None:
         )
 
 
-def index_offers_in_queue(stop_only_when_empty: bool = False, from_error_queue: bool = False) -> None:
+def index_offers_in_queue(stop_only_when_empty: bool = False, from_error_queue: bool = False, workers: int = 1) -> None:
     """Pop offers from indexation queue and reindex them.
 
     If ``from_error_queue`` is True, pop offers from the error queue
@@ -130,43 +141,113 @@ def index_offers_in_queue(stop_only_when_empty: bool = False, from_error_queue:
     If ``stop_only_when_empty`` is True (i.e. if called from the
     ``process_offers`` Flask command), we pop from the queue and stop
     only when the queue is empty.
+
+    If ``workers`` is greater than 1, batches are processed by as many
+    threads, so that loading offers from the database, serializing
+    them and calling the external indexation service overlap across
+    batches. See ``_index_offers_in_queue_with_workers()``.
     """
     backend = _get_backend()
-    while True:
-        # We must pop and not get-and-delete. Otherwise two concurrent
-        # cron jobs could delete the wrong offers from the queue:
-        # 1. Cron job 1 gets the first 1.000 offers from the queue.
-        # 2. Cron job 2 gets the same 1.000 offers from the queue.
-        # 3. Cron job 1 finishes processing the batch and deletes the
-        #    first 1.000 offers from the queue. OK.
-        # 4. Cron job 2 finishes processing the batch and also deletes
-        #    the first 1.000 offers from the queue. Not OK, these are
-        #    not the same offers it just processed!
-        offer_ids = backend.pop_offer_ids_from_queue(
-            count=settings.REDIS_OFFER_IDS_CHUNK_SIZE, from_error_queue=from_error_queue
-        )
-        if not offer_ids:
-            break
+    if workers > 1:
+        _index_offers_in_queue_with_workers(backend, workers, stop_only_when_empty, from_error_queue)
+    else:
+        while True:
+            # We must pop and not get-and-delete. Otherwise two concurrent
+            # cron jobs could delete the wrong offers from the queue:
+            # 1. Cron job 1 gets the first 1.000 offers from the queue.
+            # 2. Cron job 2 gets the same 1.000 offers from the queue.
+            # 3. Cron job 1 finishes processing the batch and deletes the
+            #    first 1.000 offers from the queue. OK.
+            # 4. Cron job 2 finishes processing the batch and also deletes
+            #    the first 1.000 offers from the queue. Not OK, these are
+            #    not the same offers it just processed!
+            offer_ids = backend.pop_offer_ids_from_queue(
+                count=settings.REDIS_OFFER_IDS_CHUNK_SIZE, from_error_queue=from_error_queue
+            )
+            if not offer_ids:
+                break
+
+            _reindex_offer_ids_from_queue(offer_ids, from_error_queue)
+
+            left_to_process = backend.count_offers_to_index_from_queue(from_error_queue=from_error_queue)
+            if not stop_only_when_empty and left_to_process < settings.REDIS_OFFER_IDS_CHUNK_SIZE:
+                break
+
+    logger.info(
+        "Offer indexation queue stats",
+        extra=backend.get_offer_queue_stats(from_error_queue=from_error_queue),
+    )
+
+
+def _index_offers_in_queue_with_workers(
+    backend: base.SearchBackend,
+    workers: int,
+    stop_only_when_empty: bool,
+    from_error_queue: bool,
+) -> None:
+    """Pop batches of offers from the queue in the current thread and
+    hand them over to a pool of ``workers`` threads.
+
+    At most ``2 * workers`` batches are popped but not yet processed:
+    one being processed by each worker, and one waiting for each
+    worker. We don't pop more: the queue is emptied at the pace at
+    which we can process it, and we do not lose too many offers if
+    the process is killed. Offers that could not be indexed are
+    enqueued in the error queue, as in the serial mode.
+    """
+    app = flask.current_app._get_current_object()  # pylint: disable=protected-access
+    pending_batches = threading.BoundedSemaphore(2 * workers)
+    running: set[futures.Future] = set()
 
-        logger.info("Fetched offers from indexation queue", extra={"count": len(offer_ids)})
+    def process(offer_ids: set[int]) -> None:
         try:
-            reindex_offer_ids(offer_ids)
-        except Exception as exc:  # pylint: disable=broad-except
-            if settings.IS_RUNNING_TESTS:
-                raise
-            logger.exception(
-                "Exception while reindexing offers, must fix manually",
-                extra={"exc": str(exc), "offers": offer_ids},
-            )
-        else:
-            logger.info(
-                "Reindexed offers from queue",
-                extra={"count": len(offer_ids), "from_error_queue": from_error_queue},
+            # Each thread has its own app context, and thus its own
+            # SQLAlchemy session (that is removed on teardown).
+            with app.app_context():
+                _reindex_offer_ids_from_queue(offer_ids, from_error_queue)
+        finally:
+            pending_batches.release()
+
+    with futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="index-offers") as executor:
+        while True:
+            pending_batches.acquire()  # pylint: disable=consider-using-with
+            offer_ids = backend.pop_offer_ids_from_queue(
+                count=settings.REDIS_OFFER_IDS_CHUNK_SIZE, from_error_queue=from_error_queue
             )
+            if not offer_ids:
+                pending_batches.release()
+                break
+            running.add(executor.submit(process, offer_ids))
+
+            done = {future for future in running if future.done()}
+            running -= done
+            for future in done:
+                future.result()  # re-raise exceptions (only raised in tests)
 
-        left_to_process = backend.count_offers_to_index_from_queue(from_error_queue=from_error_queue)
-        if not stop_only_when_empty and left_to_process < settings.REDIS_OFFER_IDS_CHUNK_SIZE:
-            break
+            left_to_process = backend.count_offers_to_index_from_queue(from_error_queue=from_error_queue)
+            if not stop_only_when_empty and left_to_process < settings.REDIS_OFFER_IDS_CHUNK_SIZE:
+                break
+
+    for future in running:
+        future.result()
+
+
+def _reindex_offer_ids_from_queue(offer_ids: set[int], from_error_queue: bool) -> None:
+    logger.info("Fetched offers from indexation queue", extra={"count": len(offer_ids)})
+    try:
+        reindex_offer_ids(offer_ids)
+    except Exception as exc:  # pylint: disable=broad-except
+        if settings.IS_RUNNING_TESTS:
+            raise
+        logger.exception(
+            "Exception while reindexing offers, must fix manually",
+            extra={"exc": str(exc), "offers": offer_ids},
+        )
+    else:
+        logger.info(
+            "Reindexed offers from queue",
+            extra={"count": len(offer_ids), "from_error_queue": from_error_queue},
+        )
 
 
 def index_collective_offers_in_queue(from_error_queue: bool = False) -> None:
@@ -336,16 +417,16 @@ def index_offers_of_venues_in_queue() -> None:
     try:
         venue_ids = backend.pop_venue_ids_for_offers_from_queue(count=settings.REDIS_VENUE_IDS_FOR_OFFERS_CHUNK_SIZE)
         for venue_id in venue_ids:
-            page = 0
+            last_id = 0
             logger.info("Starting to index offers of venue", extra={"venue": venue_id})
             while True:
-                offer_ids = offer_queries.get_paginated_offer_ids_by_venue_id(
-                    limit=settings.ALGOLIA_OFFERS_BY_VENUE_CHUNK_SIZE, page=page, venue_id=venue_id
+                offer_ids = offer_queries.get_offer_ids_by_venue_id_after(
+                    venue_id=venue_id, last_id=last_id, limit=settings.ALGOLIA_OFFERS_BY_VENUE_CHUNK_SIZE
                 )
                 if not offer_ids:
                     break
                 reindex_offer_ids(offer_ids)
-                page += 1
+                last_id = offer_ids[-1]
             logger.info("Finished indexing offers of venue", extra={"venue": venue_id})
     except Exception:  # pylint: disable=broad-except
         if settings.IS_RUNNING_TESTS:
@@ -362,14 +443,25 @@ def reindex_offer_ids(offer_ids: Iterable[int]) -> None:
     be slow. It should not be called by usual code. You should rather
     call `async_index_offer_ids()` instead to return quickly.
     """
+    offer_ids = list(offer_ids)
     backend = _get_backend()
+    start = time.perf_counter()
+    with db_utils.count_queries() as query_counter:
+        _reindex_offer_ids(backend, offer_ids)
+    logger.info(
+        "Reindexed batch of offers",
+        extra={
+            "count": len(offer_ids),
+            "queries": query_counter.count,
+            "elapsed": time.perf_counter() - start,
+        },
+    )
 
+
+def _reindex_offer_ids(backend: base.SearchBackend, offer_ids: Iterable[int]) -> None:
     to_add = []
     to_delete = []
-    # FIXME (dbaty, 2021-07-05): join-load Stock, Venue, Offerer,
-    # etc. to avoid N+1 queries on each offer.
-    offers = Offer.query.filter(Offer.id.in_(offer_ids))
-    for offer in offers:
+    for offer in get_offers_for_indexation(offer_ids):
         if offer and offer.is_eligible_for_search:
             to_add.append(offer)
         elif backend.check_offer_is_indexed(offer):
@@ -410,6 +502,28 @@ def reindex_offer_ids(offer_ids: Iterable[int]) -> None:
         backend.enqueue_offer_ids_in_error([offer.id for offer in to_delete])
 
 
+def get_offers_for_indexation(offer_ids: Iterable[int]) -> list[Offer]:
+    """Return offers with everything that is needed by
+    ``Offer.is_eligible_for_search`` and the backend serialization
+    (stocks, venue, offerer, criteria, mediations and product).
+
+    This issues a fixed number of queries, whatever the number of
+    offers: one for offers, venues, offerers and products (joined
+    load of many-to-one relationships) and one per one-to-many
+    relationship (stocks, criteria and mediations), to avoid a
+    cartesian product.
+    """
+    return (
+        Offer.query.filter(Offer.id.in_(offer_ids))
+        .options(joinedload(Offer.venue, innerjoin=True).joinedload(Venue.managingOfferer, innerjoin=True))
+        .options(joinedload(Offer.product, innerjoin=True))
+        .options(selectinload(Offer.stocks))
+        .options(selectinload(Offer.criteria))
+        .options(selectinload(Offer.mediations))
+        .all()
+    )
+
+
 def unindex_offer_ids(offer_ids: Iterable[int]) -> None:
     backend = _get_backend()
     try:
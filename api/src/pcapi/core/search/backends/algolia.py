@@ -1,6 +1,10 @@
+import hashlib
+import json
 import logging
 import re
+import time
 from typing import Iterable
+from typing import Optional
 import urllib.parse
 
 import algoliasearch.search_client
@@ -18,20 +22,74 @@ from pcapi.utils.stopwords import STOPWORDS
 
 logger = logging.getLogger(__name__)
 
-# FIXME (dbaty, 2021-10-15): these are all lists, which are less
-# usable for us than sets. See also `redis_lpop()` below, which we
-# would not have to implement if we were using sets (because `SPOP`
-# does allow to pop multiple items at once with our Redis version).
+# Offers (and venues whose offers must be reindexed) are queued in
+# sorted sets, scored by the time they were first enqueued. Adding an
+# id that is already in the queue does not change its position, so
+# that a popular offer that is booked many times is indexed only once
+# per batch.
+REDIS_OFFER_IDS_TO_INDEX = "search:algolia:offer-ids-to-index"
+REDIS_OFFER_IDS_IN_ERROR_TO_INDEX = "search:algolia:offer-ids-in-error-to-index"
+REDIS_VENUE_IDS_FOR_OFFERS_TO_INDEX = "search:algolia:venue-ids-for-offers-to-index"
+# Counters of enqueued and duplicate ids, for each queue.
+REDIS_QUEUE_STATS = "search:algolia:queue-stats"
+# FIXME (2022-06-01): these legacy lists are drained when popping
+# from the corresponding sorted sets above (see `_POP_SCRIPT`). Remove
+# them once they are empty on all environments.
 REDIS_LIST_OFFER_IDS_NAME = "offer_ids"
 REDIS_LIST_OFFER_IDS_IN_ERROR_NAME = "offer_ids_in_error"
 REDIS_LIST_VENUE_IDS_FOR_OFFERS_NAME = "venue_ids_for_offers"
+LEGACY_LISTS = {
+    REDIS_OFFER_IDS_TO_INDEX: REDIS_LIST_OFFER_IDS_NAME,
+    REDIS_OFFER_IDS_IN_ERROR_TO_INDEX: REDIS_LIST_OFFER_IDS_IN_ERROR_NAME,
+    REDIS_VENUE_IDS_FOR_OFFERS_TO_INDEX: REDIS_LIST_VENUE_IDS_FOR_OFFERS_NAME,
+}
+
+# KEYS[1]: queue (sorted set), KEYS[2]: stats (hash)
+# ARGV[1]: score (enqueue timestamp), ARGV[2:]: ids
+_ENQUEUE_SCRIPT = """
+local added = 0
+for i = 2, #ARGV do
+    added = added + redis.call("ZADD", KEYS[1], "NX", ARGV[1], ARGV[i])
+end
+redis.call("HINCRBY", KEYS[2], KEYS[1] .. ":enqueued", added)
+redis.call("HINCRBY", KEYS[2], KEYS[1] .. ":duplicates", #ARGV - 1 - added)
+return added
+"""
+
+# `LPOP` and `SPOP` cannot pop multiple items at once with our Redis
+# version (5.0), and a pipeline of `ZRANGE` and `ZREM` is not atomic.
+# A script is.
+#
+# KEYS[1]: queue (sorted set), KEYS[2]: legacy queue (list)
+# ARGV[1]: count
+_POP_SCRIPT = """
+local count = tonumber(ARGV[1])
+local ids = redis.call("LRANGE", KEYS[2], 0, count - 1)
+if #ids > 0 then
+    redis.call("LTRIM", KEYS[2], #ids, -1)
+end
+if #ids < count then
+    local popped = redis.call("ZPOPMIN", KEYS[1], count - #ids)
+    for i = 1, #popped, 2 do
+        table.insert(ids, popped[i])
+    end
+end
+return ids
+"""
+
 REDIS_VENUE_IDS_TO_INDEX = "search:algolia:venue-ids-to-index"
 REDIS_COLLECTIVE_OFFER_IDS_TO_INDEX = "search:algolia:collective-offer-ids-to-index"
 REDIS_COLLECTIVE_OFFER_TEMPLATE_IDS_TO_INDEX = "search:algolia:collective-offer-template-ids-to-index"
 REDIS_COLLECTIVE_OFFER_IDS_IN_ERROR_TO_INDEX = "search:algolia:collective-offer-ids-in-error-to-index"
 REDIS_COLLECTIVE_OFFER_TEMPLATE_IDS_IN_ERROR_TO_INDEX = "search:algolia:collective-offer-template-ids-in-error-to-index"
 REDIS_VENUE_IDS_IN_ERROR_TO_INDEX = "search:algolia:venue-ids-in-error-to-index"
+# These hashmaps store a fingerprint of each indexed object (see
+# `get_fingerprint()`), so that we do not push to Algolia an object
+# that has not changed since it was last indexed.
 REDIS_HASHMAP_INDEXED_OFFERS_NAME = "indexed_offers"
+REDIS_HASHMAP_INDEXED_VENUES_NAME = "search:algolia:indexed-venues"
+REDIS_HASHMAP_INDEXED_COLLECTIVE_OFFERS_NAME = "search:algolia:indexed-collective-offers"
+REDIS_HASHMAP_INDEXED_COLLECTIVE_OFFER_TEMPLATES_NAME = "search:algolia:indexed-collective-offer-templates"
 
 DEFAULT_LONGITUDE = 2.409289
 DEFAULT_LATITUDE = 47.158459
@@ -72,6 +130,12 @@ def remove_stopwords(s: str) -> str:
     return " ".join(words)
 
 
+def get_fingerprint(obj: dict) -> str:
+    """Return a short hash of a serialized object."""
+    serialized = json.dumps(obj, sort_keys=True, default=str)
+    return hashlib.blake2b(serialized.encode(), digest_size=8).hexdigest()
+
+
 class AlgoliaBackend(base.SearchBackend):
     def __init__(self):  # type: ignore [no-untyped-def]
         super().__init__()
@@ -87,24 +151,21 @@ class AlgoliaBackend(base.SearchBackend):
         self.redis_client = current_app.redis_client
 
     def enqueue_offer_ids(self, offer_ids: Iterable[int]) -> None:
-        if not offer_ids:
-            return
-        try:
-            self.redis_client.rpush(REDIS_LIST_OFFER_IDS_NAME, *offer_ids)
-        except redis.exceptions.RedisError:
-            if settings.IS_RUNNING_TESTS:
-                raise
-            logger.exception("Could not add offers to indexation queue", extra={"offers": offer_ids})
+        self._enqueue_in_sorted_set(offer_ids, REDIS_OFFER_IDS_TO_INDEX)
 
     def enqueue_offer_ids_in_error(self, offer_ids: Iterable[int]) -> None:
-        if not offer_ids:
+        self._enqueue_in_sorted_set(offer_ids, REDIS_OFFER_IDS_IN_ERROR_TO_INDEX)
+
+    def _enqueue_in_sorted_set(self, ids: Iterable[int], queue_name: str) -> None:
+        if not ids:
             return
         try:
-            self.redis_client.rpush(REDIS_LIST_OFFER_IDS_IN_ERROR_NAME, *offer_ids)
+            script = self.redis_client.register_script(_ENQUEUE_SCRIPT)
+            script(keys=[queue_name, REDIS_QUEUE_STATS], args=[time.time(), *ids])
         except redis.exceptions.RedisError:
             if settings.IS_RUNNING_TESTS:
                 raise
-            logger.exception("Could not add offers to error queue", extra={"offers": offer_ids})
+            logger.exception("Could not add ids to indexation queue", extra={"ids": ids, "queue": queue_name})
 
     def enqueue_collective_offer_ids(self, collective_offer_ids: Iterable[int]) -> None:
         self._enqueue_collective_offer_ids(
@@ -173,7 +234,7 @@ class AlgoliaBackend(base.SearchBackend):
         return self._enqueue_venue_ids(venue_ids, REDIS_VENUE_IDS_IN_ERROR_TO_INDEX)
 
     def enqueue_venue_ids_for_offers(self, venue_ids: Iterable[int]) -> None:
-        return self._enqueue_venue_ids_legacy_for_list(venue_ids, REDIS_LIST_VENUE_IDS_FOR_OFFERS_NAME)
+        return self._enqueue_in_sorted_set(venue_ids, REDIS_VENUE_IDS_FOR_OFFERS_TO_INDEX)
 
     def _enqueue_venue_ids(self, venue_ids: Iterable[int], queue_name: str) -> None:
         if not venue_ids:
@@ -185,25 +246,13 @@ class AlgoliaBackend(base.SearchBackend):
                 "Could not add venues to indexation queue", extra={"venues": venue_ids, "queue": queue_name}
             )
 
-    def _enqueue_venue_ids_legacy_for_list(self, venue_ids: Iterable[int], queue_name: str) -> None:
-        if not venue_ids:
-            return
-        try:
-            self.redis_client.rpush(queue_name, *venue_ids)
-        except redis.exceptions.RedisError:
-            if settings.IS_RUNNING_TESTS:
-                raise
-            logger.exception(
-                "Could not add venues to indexation queue", extra={"venues": venue_ids, "queue": queue_name}
-            )
-
     def pop_offer_ids_from_queue(self, count: int, from_error_queue: bool = False) -> set[int]:
         if from_error_queue:
-            redis_list_name = REDIS_LIST_OFFER_IDS_IN_ERROR_NAME
+            queue_name = REDIS_OFFER_IDS_IN_ERROR_TO_INDEX
         else:
-            redis_list_name = REDIS_LIST_OFFER_IDS_NAME
+            queue_name = REDIS_OFFER_IDS_TO_INDEX
 
-        return self.redis_lpop(redis_list_name, count)
+        return self._pop_from_sorted_set(queue_name, count)
 
     def pop_venue_ids_from_queue(self, count: int, from_error_queue: bool = False) -> set[int]:
         if from_error_queue:
@@ -248,21 +297,67 @@ class AlgoliaBackend(base.SearchBackend):
             return set()
 
     def pop_venue_ids_for_offers_from_queue(self, count: int) -> set[int]:
-        return self.redis_lpop(REDIS_LIST_VENUE_IDS_FOR_OFFERS_NAME, count)
+        return self._pop_from_sorted_set(REDIS_VENUE_IDS_FOR_OFFERS_TO_INDEX, count)
+
+    def _pop_from_sorted_set(self, queue_name: str, count: int) -> set[int]:
+        """Pop (at most) ``count`` ids from the queue, oldest first.
+
+        Ids that are still in the legacy list are popped first.
+
+        The error handling is minimal: if the script fails, the
+        function returns an empty set. It's fine, the next run may
+        have more chance and may work.
+        """
+        try:
+            script = self.redis_client.register_script(_POP_SCRIPT)
+            ids = script(keys=[queue_name, LEGACY_LISTS[queue_name]], args=[count])
+        except redis.exceptions.RedisError:
+            if settings.IS_RUNNING_TESTS:
+                raise
+            logger.exception("Could not pop ids to index from queue", extra={"queue": queue_name})
+            return set()
+        return {int(id_) for id_ in ids}  # str -> int
 
     def count_offers_to_index_from_queue(self, from_error_queue: bool = False) -> int:
         if from_error_queue:
-            redis_list_name = REDIS_LIST_OFFER_IDS_IN_ERROR_NAME
+            queue_name = REDIS_OFFER_IDS_IN_ERROR_TO_INDEX
         else:
-            redis_list_name = REDIS_LIST_OFFER_IDS_NAME
+            queue_name = REDIS_OFFER_IDS_TO_INDEX
         try:
-            return self.redis_client.llen(redis_list_name)
+            with self.redis_client.pipeline(transaction=False) as pipeline:
+                pipeline.zcard(queue_name)
+                pipeline.llen(LEGACY_LISTS[queue_name])
+                return sum(pipeline.execute())
         except redis.exceptions.RedisError:
             if settings.IS_RUNNING_TESTS:
                 raise
             logger.exception("Could not count offers left to index from queue")
             return 0
 
+    def get_offer_queue_stats(self, from_error_queue: bool = False) -> dict:
+        """Return the depth of the queue, and how many ids have been
+        enqueued and ignored as duplicates since the queue was created.
+        """
+        if from_error_queue:
+            queue_name = REDIS_OFFER_IDS_IN_ERROR_TO_INDEX
+        else:
+            queue_name = REDIS_OFFER_IDS_TO_INDEX
+        try:
+            enqueued, duplicates = self.redis_client.hmget(
+                REDIS_QUEUE_STATS, f"{queue_name}:enqueued", f"{queue_name}:duplicates"
+            )
+        except redis.exceptions.RedisError:
+            if settings.IS_RUNNING_TESTS:
+                raise
+            logger.exception("Could not get stats of indexation queue", extra={"queue": queue_name})
+            return {}
+        return {
+            "queue": queue_name,
+            "depth": self.count_offers_to_index_from_queue(from_error_queue=from_error_queue),
+            "enqueued": int(enqueued or 0),
+            "duplicates": int(duplicates or 0),
+        }
+
     def check_offer_is_indexed(self, offer: offers_models.Offer) -> bool:
         try:
             return self.redis_client.hexists(REDIS_HASHMAP_INDEXED_OFFERS_NAME, offer.id)
@@ -280,23 +375,7 @@ class AlgoliaBackend(base.SearchBackend):
         if not offers:
             return
         objects = [self.serialize_offer(offer) for offer in offers]
-        self.algolia_offers_client.save_objects(objects)
-        try:
-            # We used to store a summary of each offer, which is why
-            # we used hashmap and not a set. But since we don't need
-            # the value anymore, we can store the lightest object
-            # possible to make Redis use less memory. In the future,
-            # we may even remove the hashmap if it's not proven useful
-            # (see log in reindex_offer_ids)
-            offer_ids = [offer.id for offer in offers]
-            pipeline = self.redis_client.pipeline(transaction=True)
-            for offer_id in offer_ids:
-                pipeline.hset(REDIS_HASHMAP_INDEXED_OFFERS_NAME, offer_id, "")
-            pipeline.execute()
-        except Exception:  # pylint: disable=broad-except
-            logger.exception("Could not add to list of indexed offers", extra={"offers": offer_ids})
-        finally:
-            pipeline.reset()
+        self._save_objects(self.algolia_offers_client, REDIS_HASHMAP_INDEXED_OFFERS_NAME, objects)
 
     def index_collective_offers(
         self,
@@ -305,7 +384,7 @@ class AlgoliaBackend(base.SearchBackend):
         if not collective_offers:
             return
         objects = [self.serialize_collective_offer(collective_offer) for collective_offer in collective_offers]
-        self.algolia_collective_offers_client.save_objects(objects)
+        self._save_objects(self.algolia_collective_offers_client, REDIS_HASHMAP_INDEXED_COLLECTIVE_OFFERS_NAME, objects)
 
     def index_collective_offer_templates(
         self,
@@ -317,13 +396,53 @@ class AlgoliaBackend(base.SearchBackend):
             self.serialize_collective_offer_template(collective_offer_template)
             for collective_offer_template in collective_offer_templates
         ]
-        self.algolia_collective_offers_templates_client.save_objects(objects)
+        self._save_objects(
+            self.algolia_collective_offers_templates_client,
+            REDIS_HASHMAP_INDEXED_COLLECTIVE_OFFER_TEMPLATES_NAME,
+            objects,
+        )
 
     def index_venues(self, venues: Iterable[offerers_models.Venue]) -> None:
         if not venues:
             return
         objects = [self.serialize_venue(venue) for venue in venues]
-        self.algolia_venues_client.save_objects(objects)
+        self._save_objects(self.algolia_venues_client, REDIS_HASHMAP_INDEXED_VENUES_NAME, objects)
+
+    def _save_objects(self, algolia_client, hashmap_name: str, objects: list[dict]) -> None:  # type: ignore [no-untyped-def]
+        """Push objects to Algolia, except those that have not changed
+        since they were last pushed.
+        """
+        fingerprints = {str(obj["objectID"]): get_fingerprint(obj) for obj in objects}
+        try:
+            previous_fingerprints = self.redis_client.hmget(hashmap_name, list(fingerprints))
+        except redis.exceptions.RedisError:
+            if settings.IS_RUNNING_TESTS:
+                raise
+            logger.exception("Could not get fingerprints of indexed objects", extra={"hashmap": hashmap_name})
+            # We don't know which objects have changed, push them all.
+            previous_fingerprints = [None] * len(fingerprints)
+        changed = {
+            object_id
+            for object_id, previous in zip(fingerprints, previous_fingerprints)
+            if previous != fingerprints[object_id]
+        }
+        to_push = [obj for obj in objects if str(obj["objectID"]) in changed]
+
+        if to_push:
+            algolia_client.save_objects(to_push)
+            try:
+                self.redis_client.hset(
+                    hashmap_name, mapping={object_id: fingerprints[object_id] for object_id in changed}
+                )
+            except redis.exceptions.RedisError:
+                if settings.IS_RUNNING_TESTS:
+                    raise
+                logger.exception("Could not store fingerprints of indexed objects", extra={"hashmap": hashmap_name})
+
+        logger.info(
+            "Pushed changed objects to indexation service",
+            extra={"hashmap": hashmap_name, "pushed": len(to_push), "skipped": len(objects) - len(to_push)},
+        )
 
     def unindex_offer_ids(self, offer_ids: Iterable[int]) -> None:
         if not offer_ids:
@@ -351,25 +470,47 @@ class AlgoliaBackend(base.SearchBackend):
         if not venue_ids:
             return
         self.algolia_venues_client.delete_objects(venue_ids)
+        self._forget_indexed_objects(REDIS_HASHMAP_INDEXED_VENUES_NAME, venue_ids)
 
     def unindex_collective_offer_ids(self, collective_offer_ids: Iterable[int]) -> None:
         if not collective_offer_ids:
             return
         self.algolia_collective_offers_client.delete_objects(collective_offer_ids)
+        self._forget_indexed_objects(REDIS_HASHMAP_INDEXED_COLLECTIVE_OFFERS_NAME, collective_offer_ids)
 
     def unindex_collective_offer_template_ids(self, collective_offer_template_ids: Iterable[int]) -> None:
         if not collective_offer_template_ids:
             return
         self.algolia_collective_offers_templates_client.delete_objects(collective_offer_template_ids)
+        self._forget_indexed_objects(
+            REDIS_HASHMAP_INDEXED_COLLECTIVE_OFFER_TEMPLATES_NAME, collective_offer_template_ids
+        )
 
     def unindex_all_venues(self) -> None:
         self.algolia_venues_client.clear_objects()
+        self._forget_indexed_objects(REDIS_HASHMAP_INDEXED_VENUES_NAME)
 
     def unindex_all_collective_offers(self) -> None:
         self.algolia_collective_offers_client.clear_objects()
+        self._forget_indexed_objects(REDIS_HASHMAP_INDEXED_COLLECTIVE_OFFERS_NAME)
 
     def unindex_all_collective_offers_templates(self) -> None:
         self.algolia_collective_offers_templates_client.clear_objects()
+        self._forget_indexed_objects(REDIS_HASHMAP_INDEXED_COLLECTIVE_OFFER_TEMPLATES_NAME)
+
+    def _forget_indexed_objects(self, hashmap_name: str, object_ids: Optional[Iterable[int]] = None) -> None:
+        """Remove the given objects (or all objects if ``object_ids`` is
+        None) from the fingerprints hashmap.
+        """
+        try:
+            if object_ids is None:
+                self.redis_client.delete(hashmap_name)
+            else:
+                self.redis_client.hdel(hashmap_name, *object_ids)
+        except redis.exceptions.RedisError:
+            if settings.IS_RUNNING_TESTS:
+                raise
+            logger.exception("Could not remove objects from fingerprints hashmap", extra={"hashmap": hashmap_name})
 
     @classmethod
     def serialize_offer(cls, offer: offers_models.Offer) -> dict:
@@ -512,39 +653,6 @@ class AlgoliaBackend(base.SearchBackend):
             },
         }
 
-    def redis_lpop(self, queue_name: str, count: int) -> set[int]:
-        """
-        Here we can't use `LPOP` because its `count` argument has been
-        added in Redis 6.2. GCP currently has an earlier version of
-        Redis (5.0), where we can pop only one item at once. As a
-        work around, we get and delete items within a pipeline,
-        which should be atomic.
-
-        The error handling is minimal:
-        - if the get fails, the function returns an empty list. It's
-          fine, the next run may have more chance and may work;
-        - if the delete fails, we'll process the same batch
-          twice. It's not optimal, but it's ok.
-        """
-        obj_ids = set()
-
-        try:
-            pipeline = self.redis_client.pipeline(transaction=True)
-
-            pipeline.lrange(queue_name, 0, count - 1)
-            pipeline.ltrim(queue_name, count, -1)
-
-            results = pipeline.execute()
-            obj_ids = {int(obj_id) for obj_id in results[0]}
-        except redis.exceptions.RedisError:
-            if settings.IS_RUNNING_TESTS:
-                raise
-            logger.exception("Could not pop obj ids to index from queue")
-        finally:
-            pipeline.reset()
-
-        return obj_ids
-
 
 def position(venue):  # type: ignore [no-untyped-def]
     latitude = venue.latitude or DEFAULT_LATITUDE
@@ -48,6 +48,9 @@ class SearchBackend:
     def count_offers_to_index_from_queue(self, from_error_queue: bool = False) -> int:
         raise NotImplementedError()
 
+    def get_offer_queue_stats(self, from_error_queue: bool = False) -> dict:
+        raise NotImplementedError()
+
     def check_offer_is_indexed(self, offer: "offers_models.Offer") -> bool:
         raise NotImplementedError()
 
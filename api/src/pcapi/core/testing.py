@@ -15,6 +15,7 @@ import sqlalchemy.orm
 
 from pcapi import settings
 from pcapi.models.feature import Feature
+from pcapi.models.feature import invalidate_features_cache
 
 
 # 1. SELECT the user session.
@@ -264,6 +265,7 @@ class override_features(TestContextDecorator):
         if flask.has_request_context():
             if hasattr(flask.request, "_cached_features"):
                 flask.request._cached_features = {}
+        invalidate_features_cache()
 
     def disable(self):  # type: ignore [no-untyped-def]
         for name, status in self.apply_to_revert.items():
@@ -272,6 +274,7 @@ class override_features(TestContextDecorator):
         if flask.has_request_context():
             if hasattr(flask.request, "_cached_features"):
                 flask.request._cached_features = {}
+        invalidate_features_cache()
 
 
 def clean_temporary_files(test_function):  # type: ignore [no-untyped-def]
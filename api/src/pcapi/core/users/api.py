@@ -29,6 +29,7 @@ from pcapi.core.mails.transactional.users.email_address_change_confirmation impo
 import pcapi.core.offerers.api as offerers_api
 import pcapi.core.offerers.models as offerers_models
 import pcapi.core.payments.api as payment_api
+import pcapi.core.payments.models as payments_models
 from pcapi.core.subscription import api as subscription_api
 from pcapi.core.users import utils as users_utils
 from pcapi.core.users.external import update_external_pro
@@ -497,61 +498,108 @@ def update_user_info(  # type: ignore [no-untyped-def]
 
 
 def get_domains_credit(user: User, user_bookings: list[bookings_models.Booking] = None) -> Optional[DomainsCredit]:
-    if not user.deposit:
+    """Return the credit of the user.
+
+    If ``user_bookings`` is given (and already loaded with their stock
+    and offer), spent amounts are computed from it. Otherwise, they are
+    computed in a single aggregate query.
+    """
+    deposit = user.deposit
+    if not deposit:
         return None
 
     if user_bookings is None:
-        deposit_bookings = bookings_repository.get_bookings_from_deposit(user.deposit.id)
+        spent = bookings_repository.get_spent_amounts_by_deposit([deposit.id]).get(deposit.id, _NOTHING_SPENT)
     else:
-        deposit_bookings = [
-            booking
-            for booking in user_bookings
-            if booking.individualBooking is not None
-            and booking.individualBooking.depositId == user.deposit.id
-            and booking.status != bookings_models.BookingStatus.CANCELLED
-        ]
+        spent = _get_spent_amounts_from_bookings(deposit, user_bookings)
+    return _build_domains_credit(deposit, spent)
 
-    domains_credit = DomainsCredit(
-        all=Credit(
-            initial=user.deposit.amount,
-            remaining=max(user.deposit.amount - sum(booking.total_amount for booking in deposit_bookings), Decimal("0"))
-            if user.has_active_deposit
-            else Decimal("0"),
-        )
+
+def get_domains_credits(users: typing.Iterable[User]) -> dict[int, Optional[DomainsCredit]]:
+    """Return the credit of each requested user, indexed by user id.
+    This is meant for batch jobs (such as marketing automations) that
+    need the credit of many users.
+
+    Spent amounts of all deposits are computed in a single query.
+    Deposits of users should have been loaded beforehand (for example
+    with ``joinedload(User.deposits)``).
+    """
+    deposits = {user.id: user.deposit for user in users}
+    spent_amounts = bookings_repository.get_spent_amounts_by_deposit(
+        [deposit.id for deposit in deposits.values() if deposit]
     )
-    specific_caps = user.deposit.specific_caps
+    return {
+        user_id: _build_domains_credit(deposit, spent_amounts.get(deposit.id, _NOTHING_SPENT)) if deposit else None
+        for user_id, deposit in deposits.items()
+    }
 
-    if specific_caps.DIGITAL_CAP:
-        digital_bookings_total = sum(
-            [
+
+_NOTHING_SPENT = bookings_repository.DepositSpentAmounts(Decimal("0"), Decimal("0"), Decimal("0"))
+
+
+def _get_spent_amounts_from_bookings(
+    deposit: payments_models.Deposit,
+    user_bookings: list[bookings_models.Booking],
+) -> bookings_repository.DepositSpentAmounts:
+    deposit_bookings = [
+        booking
+        for booking in user_bookings
+        if booking.individualBooking is not None
+        and booking.individualBooking.depositId == deposit.id
+        and booking.status != bookings_models.BookingStatus.CANCELLED
+    ]
+    specific_caps = deposit.specific_caps
+    return bookings_repository.DepositSpentAmounts(
+        total=sum((booking.total_amount for booking in deposit_bookings), Decimal("0")),
+        digital=sum(
+            (
                 booking.total_amount
                 for booking in deposit_bookings
                 if specific_caps.digital_cap_applies(booking.stock.offer)
-            ]
+            ),
+            Decimal("0"),
+        ),
+        physical=sum(
+            (
+                booking.total_amount
+                for booking in deposit_bookings
+                if specific_caps.physical_cap_applies(booking.stock.offer)
+            ),
+            Decimal("0"),
+        ),
+    )
+
+
+def _build_domains_credit(
+    deposit: payments_models.Deposit,
+    spent: bookings_repository.DepositSpentAmounts,
+) -> DomainsCredit:
+    is_active = deposit.expirationDate > datetime.utcnow()  # same as `User.has_active_deposit`
+    domains_credit = DomainsCredit(
+        all=Credit(
+            initial=deposit.amount,
+            remaining=max(deposit.amount - spent.total, Decimal("0")) if is_active else Decimal("0"),
         )
+    )
+    specific_caps = deposit.specific_caps
+
+    if specific_caps.DIGITAL_CAP:
         domains_credit.digital = Credit(
             initial=specific_caps.DIGITAL_CAP,
             remaining=(
                 min(
-                    max(specific_caps.DIGITAL_CAP - digital_bookings_total, Decimal("0")),
+                    max(specific_caps.DIGITAL_CAP - spent.digital, Decimal("0")),
                     domains_credit.all.remaining,
                 )
             ),
         )
 
     if specific_caps.PHYSICAL_CAP:
-        physical_bookings_total = sum(
-            [
-                booking.total_amount
-                for booking in deposit_bookings
-                if specific_caps.physical_cap_applies(booking.stock.offer)
-            ]
-        )
         domains_credit.physical = Credit(
             initial=specific_caps.PHYSICAL_CAP,
             remaining=(
                 min(
-                    max(specific_caps.PHYSICAL_CAP - physical_bookings_total, Decimal("0")),
+                    max(specific_caps.PHYSICAL_CAP - spent.physical, Decimal("0")),
                     domains_credit.all.remaining,
                 )
             ),
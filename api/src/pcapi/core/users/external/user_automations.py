@@ -14,6 +14,7 @@ from pcapi.core.payments.models import Deposit
 from pcapi.core.users.external.sendinblue import add_contacts_to_list
 from pcapi.core.users.models import User
 from pcapi.models import db
+from pcapi.models.feature import FeatureToggle
 
 
 YIELD_COUNT_PER_DB_QUERY = 1000
@@ -87,6 +88,10 @@ def users_beneficiary_credit_expiration_within_next_3_months_automation() -> boo
 
 
 def get_users_ex_beneficiary() -> List[User]:
+    if FeatureToggle.USE_DEPOSIT_BALANCE_COLUMNS.is_active():
+        has_no_balance = Deposit.amount - Deposit.bookedAmount <= 0
+    else:
+        has_no_balance = func.get_wallet_balance(User.id, False) <= 0
     return (
         db.session.query(User.email)
         .join(User.deposits)
@@ -96,7 +101,7 @@ def get_users_ex_beneficiary() -> List[User]:
                 Deposit.expirationDate <= datetime.combine(date.today(), datetime.min.time()),
                 and_(
                     Deposit.expirationDate > datetime.combine(date.today(), datetime.min.time()),
-                    func.get_wallet_balance(User.id, False) <= 0,
+                    has_no_balance,
                 ),
             )
         )
@@ -374,8 +374,26 @@ class User(PcObject, Model, NeedsValidationMixin):  # type: ignore [valid-type,
     def needsToSeeTutorials(self):  # type: ignore [no-untyped-def]
         return self.is_beneficiary and not self.hasSeenTutorials
 
+    def _get_current_deposit_balance(self, spent_amount_field: str) -> Decimal:
+        from pcapi.core.payments import models as payments_models
+
+        deposit = payments_models.Deposit
+        balance = (
+            db.session.query(deposit.amount - getattr(deposit, spent_amount_field))
+            .filter(deposit.userId == self.id, deposit.expirationDate > sa.func.now())
+            .scalar()
+        )
+        # There is no balance if the user has no current deposit. The
+        # balance could also be negative if the amount of the deposit
+        # has been lowered. We don't want to expose a negative number.
+        return max(Decimal(0), balance or Decimal(0))
+
     @property
     def real_wallet_balance(self):  # type: ignore [no-untyped-def]
+        from pcapi.models.feature import FeatureToggle
+
+        if FeatureToggle.USE_DEPOSIT_BALANCE_COLUMNS.is_active():
+            return self._get_current_deposit_balance("usedAmount")
         balance = db.session.query(sa.func.get_wallet_balance(self.id, True)).scalar()
         # Balance can be negative if the user has booked in the past
         # but their deposit has expired. We don't want to expose a
@@ -384,6 +402,10 @@ class User(PcObject, Model, NeedsValidationMixin):  # type: ignore [valid-type,
 
     @property
     def wallet_balance(self):  # type: ignore [no-untyped-def]
+        from pcapi.models.feature import FeatureToggle
+
+        if FeatureToggle.USE_DEPOSIT_BALANCE_COLUMNS.is_active():
+            return self._get_current_deposit_balance("bookedAmount")
         balance = db.session.query(sa.func.get_wallet_balance(self.id, False)).scalar()
         return max(0, balance)
 
@@ -1,6 +1,7 @@
 from datetime import date
 from datetime import datetime
 import logging
+from typing import BinaryIO
 from typing import Optional
 from typing import Union
 
@@ -14,6 +15,8 @@ from pcapi import settings
 
 
 logger = logging.getLogger(__name__)
+# Must be a multiple of 256 KB, see `google.cloud.storage.blob.Blob`.
+OBJECT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
 JWT_ADAGE_PUBLIC_KEY_PATH = f"src/pcapi/routes/adage_iframe/public_key/{settings.JWT_ADAGE_PUBLIC_KEY_FILENAME}"
 
 
@@ -68,6 +71,20 @@ def store_object(
         raise exception
 
 
+def store_object_from_file(bucket: str, object_id: str, fp: BinaryIO, content_type: Optional[str] = None) -> None:
+    """Same as `store_object()`, but the file is read and uploaded by
+    chunks, so that it does not have to be held in memory.
+    """
+    storage_path = bucket + "/" + object_id
+    try:
+        storage_client_bucket = get_encrypted_gcp_storage_client_bucket()
+        gcp_cloud_blob = storage_client_bucket.blob(storage_path, chunk_size=OBJECT_UPLOAD_CHUNK_SIZE)
+        gcp_cloud_blob.upload_from_file(fp, content_type=content_type)
+    except Exception as exception:
+        logger.exception("An error has occured while trying to upload file on encrypted GCP bucket: %s", str(exception))
+        raise exception
+
+
 def delete_object(storage_path: str) -> None:
     try:
         storage_client_bucket = get_encrypted_gcp_storage_client_bucket()
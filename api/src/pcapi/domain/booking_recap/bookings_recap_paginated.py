@@ -1,3 +1,7 @@
+import base64
+from datetime import datetime
+from typing import Optional
+
 from pcapi.domain.booking_recap.booking_recap import BookingRecap
 
 
@@ -8,8 +12,31 @@ class BookingsRecapPaginated:
         page: int,
         pages: int,
         total: int,
+        next_cursor: Optional[str] = None,
     ):
         self.bookings_recap = bookings_recap
         self.page = page
         self.pages = pages
         self.total = total
+        self.next_cursor = next_cursor
+
+
+def encode_cursor(booked_at: datetime, booking_id: int, duplicate_index: int) -> str:
+    """Return an opaque cursor that points to a row of the list of
+    bookings. ``duplicate_index`` is 1 for the second row of duo
+    bookings, 0 otherwise.
+    """
+    raw = f"{booked_at.isoformat()}|{booking_id}|{duplicate_index}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int, int]:
+    """Decode a cursor returned by `encode_cursor()`. Raise
+    ``ValueError`` if the cursor is not valid.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        booked_at, booking_id, duplicate_index = raw.split("|")
+        return datetime.fromisoformat(booked_at), int(booking_id), int(duplicate_index)
+    except (TypeError, ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
@@ -1,14 +1,27 @@
+import bisect
 from dataclasses import dataclass
 import datetime
 from decimal import Decimal
+import logging
+import secrets
+import threading
+import types
 from typing import Optional
 
+from flask import current_app as app
+import redis
+import sqlalchemy as sa
+import sqlalchemy.orm as sa_orm
+
 from pcapi.core.bookings.models import Booking
 from pcapi.core.categories import subcategories
 from pcapi.core.finance import conf as finance_conf
 from pcapi.core.offers.models import Offer
 import pcapi.core.payments.models as payments_models
+from pcapi.models import db
+
 
+logger = logging.getLogger(__name__)
 
 # A new set rules are in effect as of 1 September 2021 (i.e. 31 August 22:00 UTC)
 SEPTEMBER_2021 = datetime.datetime(2021, 9, 1) - datetime.timedelta(hours=2)
@@ -204,6 +217,63 @@ assert [r.description for r in REGULAR_RULES] == [
 ]
 
 
+# Revenue thresholds (in euros) used by regular rules: a regular rule
+# must give the same result for all revenues between two consecutive
+# thresholds (lower threshold excluded, upper threshold included).
+REVENUE_THRESHOLDS = (20000, 40000, 150000)
+
+
+class RegularRuleIndex:
+    """A precompiled index of regular rules.
+
+    Regular rules only depend on the reimbursement rule of the
+    subcategory of the offer, whether the offer is educational, the
+    date on which the booking has been used and the revenue. The
+    index holds matching rules for each combination of these (dates
+    and revenues being reduced to periods and revenue bands), so that
+    we do not have to evaluate all rules for each booking.
+    """
+
+    def __init__(self, rules: list[payments_models.ReimbursementRule]):
+        boundaries = {rule.valid_from for rule in rules} | {rule.valid_until for rule in rules}  # type: ignore [attr-defined]
+        self.period_boundaries = sorted(boundary for boundary in boundaries if boundary)
+        period_starts = [payments_models.MIN_DATETIME] + self.period_boundaries
+        revenues = list(REVENUE_THRESHOLDS) + [REVENUE_THRESHOLDS[-1] + 1]
+        self.index: dict[tuple, list[payments_models.ReimbursementRule]] = {}
+        for choice in subcategories.ReimbursementRuleChoices:
+            for is_educational in (False, True):
+                for period, date_used in enumerate(period_starts):
+                    probe = self._make_probe(choice.value, is_educational, date_used)
+                    for band, revenue in enumerate(revenues):
+                        key = (choice.value, is_educational, period, band)
+                        self.index[key] = [rule for rule in rules if rule.matches(probe, Decimal(revenue))]
+
+    @classmethod
+    def _make_probe(cls, reimbursement_rule: str, is_educational: bool, date_used: datetime.datetime):  # type: ignore [no-untyped-def]
+        """Return an object that looks like a booking, as far as regular
+        rules are concerned.
+        """
+        subcategory = types.SimpleNamespace(reimbursement_rule=reimbursement_rule)
+        offer = types.SimpleNamespace(subcategory=subcategory, isEducational=is_educational)
+        return types.SimpleNamespace(stock=types.SimpleNamespace(offer=offer), dateUsed=date_used)
+
+    def get_rules(self, booking: Booking, cumulative_revenue: Decimal) -> list[payments_models.ReimbursementRule]:
+        """Return regular rules that match the requested booking, in the
+        same order as in the list of rules given to the constructor.
+        """
+        offer = booking.stock.offer
+        key = (
+            offer.subcategory.reimbursement_rule,
+            bool(offer.isEducational),
+            bisect.bisect_right(self.period_boundaries, booking.dateUsed),
+            bisect.bisect_left(REVENUE_THRESHOLDS, cumulative_revenue),
+        )
+        return self.index[key]
+
+
+REGULAR_RULES_INDEX = RegularRuleIndex(REGULAR_RULES)
+
+
 @dataclass
 class BookingReimbursement:
     booking: Booking
@@ -212,26 +282,116 @@ class BookingReimbursement:
 
 
 class CustomRuleFinder:
-    def __init__(self):  # type: ignore [no-untyped-def]
-        self.rules = payments_models.CustomReimbursementRule.query.all()
+    def __init__(self, rules: Optional[list[payments_models.CustomReimbursementRule]] = None):
+        if rules is None:
+            rules = payments_models.CustomReimbursementRule.query.all()
+        self.rules = rules
         self.rules_by_offer = self._partition_by_field("offerId")
         self.rules_by_offerer = self._partition_by_field("offererId")
 
     def _partition_by_field(self, field: str):  # type: ignore [no-untyped-def]
-        cache = {}  # type: ignore [var-annotated]
+        """Return a dictionary of rules, indexed by the value of the
+        requested field. Each item is a tuple of the list of the start
+        dates of rules and the list of rules, both sorted by start date.
+        """
+        partitions = {}  # type: ignore [var-annotated]
         for rule in self.rules:
-            cache.setdefault(getattr(rule, field), []).append(rule)
+            partitions.setdefault(getattr(rule, field), []).append(rule)
+        cache = {}
+        for key, rules in partitions.items():
+            rules.sort(key=lambda rule: rule.timespan.lower)
+            cache[key] = ([rule.timespan.lower for rule in rules], rules)
         return cache
 
-    def get_rule(self, booking: Booking) -> Optional[payments_models.CustomReimbursementRule]:
-        for rule in self.rules_by_offer.get(booking.stock.offerId, ()):
-            if rule.matches(booking):
-                return rule
-        for rule in self.rules_by_offerer.get(booking.offererId, ()):
+    def _find(self, partition, key, booking: Booking):  # type: ignore [no-untyped-def]
+        starts, rules = partition.get(key, ((), ()))
+        # Only look at rules that have started before the booking has
+        # been used.
+        for rule in rules[: bisect.bisect_right(starts, booking.dateUsed)]:
             if rule.matches(booking):
                 return rule
         return None
 
+    def get_rule(self, booking: Booking) -> Optional[payments_models.CustomReimbursementRule]:
+        return self._find(self.rules_by_offer, booking.stock.offerId, booking) or self._find(
+            self.rules_by_offerer, booking.offererId, booking
+        )
+
+
+CUSTOM_RULES_VERSION_REDIS_KEY = "finance:custom-reimbursement-rules:version"
+_custom_rule_finder_lock = threading.Lock()
+_custom_rule_finder_cache = {"version": None, "finder": None}
+
+
+def _get_custom_rules_version() -> str:
+    version = app.redis_client.get(CUSTOM_RULES_VERSION_REDIS_KEY)  # type: ignore [attr-defined]
+    if version is None:
+        app.redis_client.set(CUSTOM_RULES_VERSION_REDIS_KEY, secrets.token_hex(8), nx=True)  # type: ignore [attr-defined]
+        version = app.redis_client.get(CUSTOM_RULES_VERSION_REDIS_KEY)  # type: ignore [attr-defined]
+    return version
+
+
+def get_custom_rule_finder() -> CustomRuleFinder:
+    """Return a ``CustomRuleFinder`` that is cached in this process
+    until custom rules are modified (see ``invalidate_custom_rule_finder()``).
+
+    If Redis is not available, return a new finder that is not cached.
+    """
+    try:
+        version = _get_custom_rules_version()
+    except redis.exceptions.RedisError:
+        logger.exception("Could not get version of custom reimbursement rules, loading them from the database")
+        return CustomRuleFinder()
+    with _custom_rule_finder_lock:
+        if _custom_rule_finder_cache["version"] != version:
+            finder = CustomRuleFinder(_load_detached_custom_rules())
+            _custom_rule_finder_cache.update(version=version, finder=finder)
+        return _custom_rule_finder_cache["finder"]  # type: ignore [return-value]
+
+
+def _load_detached_custom_rules() -> list[payments_models.CustomReimbursementRule]:
+    """Load rules in a separate session (on the connection of the
+    current session, so that it sees the same data), so that they are
+    neither expired when the current session is committed nor shared
+    with the identity map of the current session.
+    """
+    session = sa_orm.Session(bind=db.session.connection())
+    try:
+        return session.query(payments_models.CustomReimbursementRule).all()
+    finally:
+        session.close()
+
+
+def invalidate_custom_rule_finder() -> None:
+    """Invalidate the cache of ``get_custom_rule_finder()`` in all
+    processes.
+    """
+    app.redis_client.set(CUSTOM_RULES_VERSION_REDIS_KEY, secrets.token_hex(8))  # type: ignore [attr-defined]
+
+
+@sa.event.listens_for(payments_models.CustomReimbursementRule, "after_insert")
+@sa.event.listens_for(payments_models.CustomReimbursementRule, "after_update")
+@sa.event.listens_for(payments_models.CustomReimbursementRule, "after_delete")
+def _track_custom_rule_changes(mapper, connection, target):  # type: ignore [no-untyped-def]
+    session = sa_orm.object_session(target)
+    if session is not None:
+        session.info["custom_reimbursement_rules_changed"] = True
+
+
+@sa.event.listens_for(sa_orm.Session, "after_commit")
+def _invalidate_custom_rule_finder_after_commit(session):  # type: ignore [no-untyped-def]
+    if not session.info.pop("custom_reimbursement_rules_changed", False):
+        return
+    try:
+        invalidate_custom_rule_finder()
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Could not invalidate cache of custom reimbursement rules")
+
+
+@sa.event.listens_for(sa_orm.Session, "after_rollback")
+def _forget_custom_rule_changes(session):  # type: ignore [no-untyped-def]
+    session.info.pop("custom_reimbursement_rules_changed", None)
+
 
 def get_reimbursement_rule(
     booking: Booking, custom_rule_finder: CustomRuleFinder, cumulative_revenue: Decimal
@@ -241,9 +401,7 @@ def get_reimbursement_rule(
         return custom_rule
 
     candidates = []
-    for rule in REGULAR_RULES:
-        if not rule.matches(booking, cumulative_revenue):
-            continue
+    for rule in REGULAR_RULES_INDEX.get_rules(booking, cumulative_revenue):
         if isinstance(rule, ReimbursementRateForBookAbove20000):
             return rule
         candidates.append(rule)
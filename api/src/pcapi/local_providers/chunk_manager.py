@@ -8,10 +8,21 @@ from pcapi.repository.providable_queries import update_chunk
 
 
 def get_existing_pc_obj(
-    providable_info: ProvidableInfo, chunk_to_insert: dict, chunk_to_update: dict
+    providable_info: ProvidableInfo,
+    chunk_to_insert: dict,
+    chunk_to_update: dict,
+    existing_objects: Optional[dict] = None,
 ) -> Optional[Model]:  # type: ignore [valid-type]
+    """Return the object from the current chunks or from the database.
+
+    If given, ``existing_objects`` holds all existing objects that may
+    be requested (indexed by chunk key), and the database is not queried.
+    """
     object_in_current_chunk = get_object_from_current_chunks(providable_info, chunk_to_insert, chunk_to_update)
     if object_in_current_chunk is None:
+        if existing_objects is not None:
+            chunk_key = f"{providable_info.id_at_providers}|{providable_info.type.__name__}"  # type: ignore [attr-defined]
+            return existing_objects.get(chunk_key)
         return get_existing_object(providable_info.type, providable_info.id_at_providers)
 
     return object_in_current_chunk
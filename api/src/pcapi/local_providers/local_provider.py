@@ -1,7 +1,10 @@
 from abc import abstractmethod
+from collections import defaultdict
 from collections.abc import Iterator
 from datetime import datetime
+import itertools
 import logging
+from typing import Optional
 
 from pcapi.connectors.thumb_storage import create_thumb
 from pcapi.core import search
@@ -17,7 +20,9 @@ from pcapi.models import db
 from pcapi.models.api_errors import ApiErrors
 from pcapi.models.has_thumb_mixin import HasThumbMixin
 from pcapi.repository import repository
+from pcapi.repository.providable_queries import get_existing_objects
 from pcapi.repository.providable_queries import get_last_update_for_provider
+from pcapi.utils.db import count_queries
 from pcapi.validation.models import entity_validator
 
 
@@ -28,6 +33,16 @@ CHUNK_MAX_SIZE = 1000
 
 
 class LocalProvider(Iterator):
+    # When set, `updateObjects()` reads that many items in advance and
+    # fetches their existing objects with one query per model, instead
+    # of one query per object. Since `fill_object_attributes()` (and
+    # thumb getters) usually rely on attributes that `__next__()` sets
+    # for the current item, these attributes must then be listed in
+    # `item_state_attributes`, so that they are restored before each
+    # item is processed.
+    look_ahead_size = 0
+    item_state_attributes: tuple[str, ...] = ()
+
     def __init__(self, venue_provider=None, **options):  # type: ignore [no-untyped-def]
         self.venue_provider = venue_provider
         self.updatedObjects = 0
@@ -120,6 +135,11 @@ class LocalProvider(Iterator):
 
         self.updatedObjects += 1
 
+    def checkpoint(self) -> None:
+        """Called when all items that have been read so far have been
+        saved, so that the provider may record its progress.
+        """
+
     def log_provider_event(self, event_type, event_payload=None):  # type: ignore [no-untyped-def]
         local_provider_event = providers_models.LocalProviderEvent()
         local_provider_event.type = event_type
@@ -128,18 +148,19 @@ class LocalProvider(Iterator):
         db.session.add(local_provider_event)
         db.session.commit()
 
-    def _print_objects_summary(self):  # type: ignore [no-untyped-def]
+    def _print_objects_summary(self, query_count: int):  # type: ignore [no-untyped-def]
         # FIXME (dbaty, 2020-02-05): I don't know how we could end up
         # here with no venue_provider, but there are checks elsewhere
         # so I do the same here.
         venue_id = self.venue_provider.venueId if self.venue_provider else "none"
         logger.info(
-            "Synchronization of objects of venue=%s, checked=%d, created=%d, updated=%d, errors=%s",
+            "Synchronization of objects of venue=%s, checked=%d, created=%d, updated=%d, errors=%s, queries=%d",
             venue_id,
             self.checkedObjects,
             self.createdObjects,
             self.updatedObjects,
             self.erroredObjects,
+            query_count,
         )
         logger.info(
             "Synchronization of thumbs of venue=%s, checked=%d, created=%d, updated=%d, errors=%s",
@@ -150,8 +171,92 @@ class LocalProvider(Iterator):
             self.erroredThumbs,
         )
 
+    def _read_items(self) -> Iterator[list[tuple[list[ProvidableInfo], dict]]]:
+        """Yield batches of items (one item, unless look-ahead is
+        enabled), along with their state (see `item_state_attributes`).
+        """
+        batch_size = self.look_ahead_size or 1
+        while True:
+            items = []
+            for providable_infos in itertools.islice(self, batch_size):
+                item_state = {name: getattr(self, name, None) for name in self.item_state_attributes}
+                items.append((providable_infos, item_state))
+            if items:
+                yield items
+            if len(items) < batch_size:
+                return
+
+    def _restore_item_state(self, item_state: dict) -> None:
+        for name, value in item_state.items():
+            setattr(self, name, value)
+
+    def _get_existing_objects(self, items: list[tuple[list[ProvidableInfo], dict]]) -> dict[str, Model]:  # type: ignore [valid-type]
+        ids_at_providers_by_type = defaultdict(set)
+        for providable_infos, _item_state in items:
+            for providable_info in providable_infos:
+                ids_at_providers_by_type[providable_info.type].add(providable_info.id_at_providers)
+        existing_objects = {}
+        for model_type, ids_at_providers in ids_at_providers_by_type.items():
+            for id_at_providers, pc_object in get_existing_objects(model_type, ids_at_providers).items():
+                existing_objects[f"{id_at_providers}|{model_type.__name__}"] = pc_object
+        return existing_objects
+
+    def _handle_providable_info(  # type: ignore [no-untyped-def]
+        self,
+        providable_info: ProvidableInfo,
+        chunk_to_insert: dict,
+        chunk_to_update: dict,
+        existing_objects: Optional[dict] = None,
+    ):
+        chunk_key = providable_info.id_at_providers + "|" + str(providable_info.type.__name__)
+        pc_object = get_existing_pc_obj(providable_info, chunk_to_insert, chunk_to_update, existing_objects)
+
+        if pc_object is None:
+            if not self.can_create:
+                return
+
+            try:
+                pc_object = self._create_object(providable_info)
+                chunk_to_insert[chunk_key] = pc_object
+            except ApiErrors:
+                return
+        else:
+            last_update_for_current_provider = get_last_update_for_provider(self.provider.id, pc_object)
+            object_need_update = (
+                last_update_for_current_provider is None
+                or last_update_for_current_provider < providable_info.date_modified_at_provider
+            )
+
+            if object_need_update:
+                try:
+                    self._handle_update(pc_object, providable_info)
+                    if chunk_key in chunk_to_insert:
+                        chunk_to_insert[chunk_key] = pc_object
+                    else:
+                        chunk_to_update[chunk_key] = pc_object
+                except ApiErrors:
+                    return
+
+        if isinstance(pc_object, HasThumbMixin):
+            initial_thumb_count = pc_object.thumbCount
+            try:
+                self._handle_thumb(pc_object)
+            except Exception as e:  # pylint: disable=broad-except
+                self.log_provider_event(providers_models.LocalProviderEventType.SyncError, e.__class__.__name__)
+                self.erroredThumbs += 1
+                logger.info("ERROR during handle thumb: %s", e, exc_info=True)
+            pc_object_has_new_thumbs = pc_object.thumbCount != initial_thumb_count
+            if pc_object_has_new_thumbs:
+                errors = entity_validator.validate(pc_object)
+                if errors and len(errors.errors) > 0:
+                    self.log_provider_event(providers_models.LocalProviderEventType.SyncError, "ApiErrors")
+                    return
+
+                chunk_to_update[chunk_key] = pc_object
+
+        self.checkedObjects += 1
+
     def updateObjects(self, limit=None):  # type: ignore [no-untyped-def]
-        # pylint: disable=too-many-nested-blocks
         if self.venue_provider and not self.venue_provider.isActive:
             logger.info("Venue provider %s is inactive", self.venue_provider)
             return
@@ -167,76 +272,45 @@ class LocalProvider(Iterator):
         chunk_to_insert = {}
         chunk_to_update = {}
 
-        for providable_infos in self:
-            objects_limit_reached = limit and self.checkedObjects >= limit
-            if objects_limit_reached:
-                break
-
-            has_no_providables_info = len(providable_infos) == 0
-            if has_no_providables_info:
-                self.checkedObjects += 1
-                continue
-
-            for providable_info in providable_infos:
-                chunk_key = providable_info.id_at_providers + "|" + str(providable_info.type.__name__)
-                pc_object = get_existing_pc_obj(providable_info, chunk_to_insert, chunk_to_update)
-
-                if pc_object is None:
-                    if not self.can_create:
+        with count_queries() as query_counter:
+            for items in self._read_items():
+                existing_objects = self._get_existing_objects(items) if self.look_ahead_size else None
+                for providable_infos, item_state in items:
+                    objects_limit_reached = limit and self.checkedObjects >= limit
+                    if objects_limit_reached:
+                        break
+                    self._restore_item_state(item_state)
+
+                    has_no_providables_info = len(providable_infos) == 0
+                    if has_no_providables_info:
+                        self.checkedObjects += 1
                         continue
 
-                    try:
-                        pc_object = self._create_object(providable_info)
-                        chunk_to_insert[chunk_key] = pc_object
-                    except ApiErrors:
-                        continue
-                else:
-                    last_update_for_current_provider = get_last_update_for_provider(self.provider.id, pc_object)
-                    object_need_update = (
-                        last_update_for_current_provider is None
-                        or last_update_for_current_provider < providable_info.date_modified_at_provider
-                    )
-
-                    if object_need_update:
-                        try:
-                            self._handle_update(pc_object, providable_info)
-                            if chunk_key in chunk_to_insert:
-                                chunk_to_insert[chunk_key] = pc_object
-                            else:
-                                chunk_to_update[chunk_key] = pc_object
-                        except ApiErrors:
-                            continue
-
-                if isinstance(pc_object, HasThumbMixin):
-                    initial_thumb_count = pc_object.thumbCount
-                    try:
-                        self._handle_thumb(pc_object)
-                    except Exception as e:  # pylint: disable=broad-except
-                        self.log_provider_event(providers_models.LocalProviderEventType.SyncError, e.__class__.__name__)
-                        self.erroredThumbs += 1
-                        logger.info("ERROR during handle thumb: %s", e, exc_info=True)
-                    pc_object_has_new_thumbs = pc_object.thumbCount != initial_thumb_count
-                    if pc_object_has_new_thumbs:
-                        errors = entity_validator.validate(pc_object)
-                        if errors and len(errors.errors) > 0:
-                            self.log_provider_event(providers_models.LocalProviderEventType.SyncError, "ApiErrors")
-                            continue
-
-                        chunk_to_update[chunk_key] = pc_object
-
-                self.checkedObjects += 1
-
+                    for providable_info in providable_infos:
+                        self._handle_providable_info(
+                            providable_info, chunk_to_insert, chunk_to_update, existing_objects
+                        )
+                        # With look-ahead, chunks are only saved between
+                        # batches: committing would expire the objects that
+                        # have been fetched in advance.
+                        if not self.look_ahead_size and len(chunk_to_insert) + len(chunk_to_update) >= CHUNK_MAX_SIZE:
+                            _save_chunks(chunk_to_insert, chunk_to_update)
+
+                if limit and self.checkedObjects >= limit:
+                    break
                 if len(chunk_to_insert) + len(chunk_to_update) >= CHUNK_MAX_SIZE:
-                    save_chunks(chunk_to_insert, chunk_to_update)
-                    _reindex_offers(list(chunk_to_insert.values()) + list(chunk_to_update.values()))
-                    chunk_to_insert = {}
-                    chunk_to_update = {}
-
-        if len(chunk_to_insert) + len(chunk_to_update) > 0:
-            save_chunks(chunk_to_insert, chunk_to_update)
-            _reindex_offers(list(chunk_to_insert.values()) + list(chunk_to_update.values()))
-
-        self._print_objects_summary()
+                    _save_chunks(chunk_to_insert, chunk_to_update)
+                    self.checkpoint()
+            else:
+                # All items have been read and handled.
+                if len(chunk_to_insert) + len(chunk_to_update) > 0:
+                    _save_chunks(chunk_to_insert, chunk_to_update)
+                self.checkpoint()
+
+            if len(chunk_to_insert) + len(chunk_to_update) > 0:
+                _save_chunks(chunk_to_insert, chunk_to_update)
+
+        self._print_objects_summary(query_counter.count)
         self.log_provider_event(providers_models.LocalProviderEventType.SyncEnd)
 
         if self.venue_provider is not None:
@@ -257,6 +331,13 @@ def _save_same_thumb_from_thumb_count_to_index(pc_object: Model, thumb_index: in
             pc_object.thumbCount += 1  # type: ignore [attr-defined]
 
 
+def _save_chunks(chunk_to_insert: dict, chunk_to_update: dict) -> None:
+    save_chunks(chunk_to_insert, chunk_to_update)
+    _reindex_offers(list(chunk_to_insert.values()) + list(chunk_to_update.values()))
+    chunk_to_insert.clear()
+    chunk_to_update.clear()
+
+
 def _reindex_offers(created_or_updated_objects):  # type: ignore [no-untyped-def]
     offer_ids = set()
     for obj in created_or_updated_objects:
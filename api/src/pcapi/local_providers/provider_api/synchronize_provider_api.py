@@ -1,12 +1,19 @@
+import contextlib
 from datetime import datetime
 from decimal import Decimal
 import logging
+import queue
+import threading
 import time
+from typing import Any
 from typing import Counter
 from typing import Generator
+from typing import Iterator
+from typing import Optional
 
 from sqlalchemy.sql.sqltypes import DateTime
 
+from pcapi.core.providers import exceptions
 from pcapi.core.providers.api import synchronize_stocks
 from pcapi.core.providers.models import Provider
 from pcapi.core.providers.models import StockDetail
@@ -18,8 +25,12 @@ from pcapi.utils.custom_keys import compute_venue_reference
 
 logger = logging.getLogger(__name__)
 
+# Number of batches that are fetched from the provider API while the
+# current batch is being saved.
+PREFETCHED_BATCH_COUNT = 1
 
-def synchronize_venue_provider(venue_provider: VenueProvider) -> None:
+
+def synchronize_venue_provider(venue_provider: VenueProvider, deadline: Optional[float] = None) -> None:
     venue = venue_provider.venue
     provider = venue_provider.provider
     start_sync_date = datetime.utcnow()
@@ -29,14 +40,26 @@ def synchronize_venue_provider(venue_provider: VenueProvider) -> None:
     provider_api = provider.getProviderAPI()
 
     stats = Counter()  # type: ignore [var-annotated]
-    for raw_stocks in _get_stocks_by_batch(
-        venue_provider.venueIdAtOfferProvider, provider_api, venue_provider.lastSyncDate  # type: ignore [arg-type]
-    ):
-        stock_details = _build_stock_details_from_raw_stocks(
-            raw_stocks, venue_provider.venueIdAtOfferProvider, provider, venue.id
+    # Durations are written by the prefetching thread (`http_duration`)
+    # and by this thread, they are only read once both are done.
+    timings = Counter()  # type: ignore [var-annotated]
+    batches = _prefetch(
+        _get_stocks_by_batch(
+            venue_provider.venueIdAtOfferProvider, provider_api, venue_provider.lastSyncDate, timings  # type: ignore [arg-type]
         )
-        operations = synchronize_stocks(stock_details, venue, provider_id=provider.id)
-        stats += Counter(operations)
+    )
+    with contextlib.closing(batches):
+        for raw_stocks in batches:
+            stock_details = _build_stock_details_from_raw_stocks(
+                raw_stocks, venue_provider.venueIdAtOfferProvider, provider, venue.id
+            )
+            operations = synchronize_stocks(stock_details, venue, provider_id=provider.id, timings=timings)
+            stats.update(operations)
+            # Stocks are committed batch by batch, but `lastSyncDate` is
+            # only updated at the end, so the next synchronization will
+            # fetch again the stocks of an interrupted one.
+            if deadline is not None and time.monotonic() > deadline:
+                raise exceptions.SynchronizationTimeout(f"Synchronization of venue {venue.id} has timed out")
 
     venue_provider.lastSyncDate = start_sync_date
     repository.save(venue_provider)
@@ -49,19 +72,25 @@ def synchronize_venue_provider(venue_provider: VenueProvider) -> None:
             "provider": provider.name,
             "duration": time.perf_counter() - start,
             **stats,
+            **timings,
         },
     )
 
 
-def _get_stocks_by_batch(siret: str, provider_api: ProviderAPI, modified_since: DateTime) -> Generator:
+def _get_stocks_by_batch(
+    siret: str, provider_api: ProviderAPI, modified_since: DateTime, timings: Optional[Counter] = None
+) -> Generator:
     last_processed_provider_reference = ""
 
     while True:
+        request_start = time.perf_counter()
         response = provider_api.validated_stocks(
             siret=siret,
             last_processed_reference=last_processed_provider_reference,
             modified_since=modified_since.strftime("%Y-%m-%dT%H:%M:%SZ") if modified_since else "",  # type: ignore [attr-defined]
         )
+        if timings is not None:
+            timings["http_duration"] += time.perf_counter() - request_start
         raw_stocks = response.get("stocks", [])
 
         if not raw_stocks:
@@ -72,6 +101,51 @@ def _get_stocks_by_batch(siret: str, provider_api: ProviderAPI, modified_since:
         last_processed_provider_reference = raw_stocks[-1]["ref"]
 
 
+def _prefetch(batches: Iterator, size: int = PREFETCHED_BATCH_COUNT) -> Generator:
+    """Iterate over ``batches`` in a background thread, so that the next
+    batches are fetched while the current one is processed.
+
+    At most ``size`` batches are waiting to be processed. Errors of the
+    background thread are raised in the caller. When the generator is
+    closed, the background thread stops after its current batch.
+    """
+    buffer: queue.Queue = queue.Queue(maxsize=size)
+    stopped = threading.Event()
+
+    def put(item: tuple[str, Any]) -> bool:
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce() -> None:
+        try:
+            for batch in batches:
+                if not put(("batch", batch)):
+                    return
+        except Exception as exc:  # pylint: disable=broad-except
+            put(("error", exc))
+        else:
+            put(("end", None))
+
+    thread = threading.Thread(target=produce, name="provider-api-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, value = buffer.get()
+            if kind == "end":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        stopped.set()
+        thread.join()
+
+
 def _build_stock_details_from_raw_stocks(
     raw_stocks: list[dict], venue_siret: str, provider: Provider, venue_id: int
 ) -> list[StockDetail]:
@@ -5,6 +5,7 @@ from typing import Optional
 from pcapi.core.providers.models import VenueProvider
 import pcapi.core.providers.repository as providers_repository
 import pcapi.local_providers
+from pcapi.local_providers import sync_scheduler
 from pcapi.local_providers.provider_api import synchronize_provider_api
 from pcapi.repository import transaction
 from pcapi.scheduled_tasks.logger import CronStatus
@@ -25,29 +26,23 @@ def synchronize_data_for_provider(provider_name: str, limit: Optional[int] = Non
 
 def synchronize_venue_providers_for_provider(provider_id: int, limit: Optional[int] = None) -> None:
     venue_providers = providers_repository.get_active_venue_providers_by_provider(provider_id)
-    for venue_provider in venue_providers:
-        try:
-            with transaction():
-                synchronize_venue_provider(venue_provider, limit)
-        except Exception as exc:  # pylint: disable=broad-except
-            logger.exception(
-                "Could not synchronize venue provider",
-                extra={
-                    "venue_provider": venue_provider.id,
-                    "venue": venue_provider.venueId,
-                    "provider": venue_provider.providerId,
-                    "exc": exc,
-                },
-            )
+
+    def sync_function(venue_provider: VenueProvider, deadline: Optional[float]) -> None:
+        with transaction():
+            synchronize_venue_provider(venue_provider, limit, deadline=deadline)
+
+    sync_scheduler.synchronize_venue_providers(venue_providers, sync_function)
 
 
 def get_local_provider_class_by_name(class_name: str) -> Callable:
     return getattr(pcapi.local_providers, class_name)
 
 
-def synchronize_venue_provider(venue_provider: VenueProvider, limit: Optional[int] = None):  # type: ignore [no-untyped-def]
+def synchronize_venue_provider(  # type: ignore [no-untyped-def]
+    venue_provider: VenueProvider, limit: Optional[int] = None, deadline: Optional[float] = None
+):
     if venue_provider.provider.implements_provider_api:
-        synchronize_provider_api.synchronize_venue_provider(venue_provider)
+        synchronize_provider_api.synchronize_venue_provider(venue_provider, deadline=deadline)
 
     else:
         assert venue_provider.provider.localClass == "AllocineStocks", "Only AllocineStocks should reach this code"
@@ -0,0 +1,190 @@
+"""Synchronize venue providers concurrently.
+
+Venue providers are synchronized in the order in which they are given
+(usually by last synchronization date, so that venues that could not be
+synchronized during a run are synchronized first during the next one).
+Each synchronization runs in a thread with its own database session, and
+no more than ``max_workers_per_provider`` venues of the same provider
+are synchronized at the same time.
+"""
+from collections import Counter
+from collections import deque
+from concurrent import futures
+import dataclasses
+import logging
+import time
+from typing import Callable
+from typing import Optional
+
+import flask
+
+from pcapi import settings
+from pcapi.core.providers import exceptions
+from pcapi.core.providers.models import VenueProvider
+from pcapi.models import db
+
+
+logger = logging.getLogger(__name__)
+
+SYNCHRONIZED = "synchronized"
+FAILED = "failed"
+TIMED_OUT = "timed_out"
+
+
+@dataclasses.dataclass(frozen=True)
+class VenueProviderInfo:
+    """Attributes of a venue provider that are still available when
+    its session has been rolled back or removed.
+    """
+
+    id: int
+    venue_id: int
+    provider_id: int
+    provider_name: str
+    venue_id_at_offer_provider: str
+
+    @classmethod
+    def from_venue_provider(cls, venue_provider: VenueProvider) -> "VenueProviderInfo":
+        return cls(
+            id=venue_provider.id,
+            venue_id=venue_provider.venueId,
+            provider_id=venue_provider.providerId,
+            provider_name=venue_provider.provider.name,
+            venue_id_at_offer_provider=venue_provider.venueIdAtOfferProvider,
+        )
+
+
+@dataclasses.dataclass
+class SyncStats:
+    synchronized: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    elapsed: float = 0.0
+
+
+# The synchronization function is called with the venue provider and
+# the `time.monotonic()` deadline after which it should raise
+# `SynchronizationTimeout` (or None if there is no timeout).
+SyncFunction = Callable[[VenueProvider, Optional[float]], None]
+ErrorHandler = Callable[[VenueProviderInfo, Exception], None]
+
+
+def synchronize_venue_providers(
+    venue_providers: list[VenueProvider],
+    sync_function: SyncFunction,
+    on_error: Optional[ErrorHandler] = None,
+    max_workers: Optional[int] = None,
+    max_workers_per_provider: Optional[int] = None,
+    timeout: Optional[int] = None,
+) -> SyncStats:
+    max_workers = settings.PROVIDER_SYNC_MAX_WORKERS if max_workers is None else max_workers
+    if max_workers_per_provider is None:
+        max_workers_per_provider = settings.PROVIDER_SYNC_MAX_WORKERS_PER_PROVIDER
+    timeout = settings.PROVIDER_SYNC_VENUE_TIMEOUT if timeout is None else timeout
+
+    start = time.perf_counter()
+    outcomes: Counter = Counter()
+    if max_workers <= 1:
+        for venue_provider in venue_providers:
+            info = VenueProviderInfo.from_venue_provider(venue_provider)
+            outcomes[_synchronize(info, lambda vp=venue_provider: vp, sync_function, on_error, timeout)] += 1
+    else:
+        infos = [VenueProviderInfo.from_venue_provider(venue_provider) for venue_provider in venue_providers]
+        # Release the connection of the caller while threads use theirs.
+        db.session.commit()
+        outcomes = _synchronize_concurrently(
+            infos, sync_function, on_error, max_workers, max_workers_per_provider, timeout
+        )
+
+    stats = SyncStats(
+        synchronized=outcomes[SYNCHRONIZED],
+        failed=outcomes[FAILED],
+        timed_out=outcomes[TIMED_OUT],
+        elapsed=time.perf_counter() - start,
+    )
+    logger.info("Synchronized venue providers", extra=dataclasses.asdict(stats))
+    return stats
+
+
+def _synchronize_concurrently(
+    infos: list[VenueProviderInfo],
+    sync_function: SyncFunction,
+    on_error: Optional[ErrorHandler],
+    max_workers: int,
+    max_workers_per_provider: int,
+    timeout: int,
+) -> Counter:
+    app = flask.current_app._get_current_object()  # pylint: disable=protected-access
+    # Keep the position of each venue provider, so that the next venue
+    # provider to synchronize is the first one (in the given order)
+    # whose provider is below its concurrency limit.
+    pending_by_provider: dict[int, deque[tuple[int, VenueProviderInfo]]] = {}
+    for position, info in enumerate(infos):
+        pending_by_provider.setdefault(info.provider_id, deque()).append((position, info))
+    running: dict[futures.Future, VenueProviderInfo] = {}
+    running_by_provider: Counter = Counter()
+    outcomes: Counter = Counter()
+
+    with futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="provider-sync") as executor:
+        while pending_by_provider or running:
+            while len(running) < max_workers:
+                available = [
+                    provider_id
+                    for provider_id in pending_by_provider
+                    if running_by_provider[provider_id] < max_workers_per_provider
+                ]
+                if not available:
+                    break
+                provider_id = min(available, key=lambda provider_id: pending_by_provider[provider_id][0][0])
+                _position, info = pending_by_provider[provider_id].popleft()
+                if not pending_by_provider[provider_id]:
+                    del pending_by_provider[provider_id]
+                future = executor.submit(_synchronize_in_thread, app, info, sync_function, on_error, timeout)
+                running[future] = info
+                running_by_provider[info.provider_id] += 1
+
+            done, _not_done = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                info = running.pop(future)
+                running_by_provider[info.provider_id] -= 1
+                outcomes[future.result()] += 1
+
+    return outcomes
+
+
+def _synchronize_in_thread(
+    app: flask.Flask,
+    info: VenueProviderInfo,
+    sync_function: SyncFunction,
+    on_error: Optional[ErrorHandler],
+    timeout: int,
+) -> str:
+    with app.app_context():
+        try:
+            return _synchronize(info, lambda: VenueProvider.query.get(info.id), sync_function, on_error, timeout)
+        finally:
+            db.session.remove()
+
+
+def _synchronize(
+    info: VenueProviderInfo,
+    get_venue_provider: Callable[[], VenueProvider],
+    sync_function: SyncFunction,
+    on_error: Optional[ErrorHandler],
+    timeout: int,
+) -> str:
+    deadline = time.monotonic() + timeout if timeout else None
+    extra = {"venue_provider": info.id, "venue": info.venue_id, "provider": info.provider_id}
+    try:
+        sync_function(get_venue_provider(), deadline)
+    except exceptions.SynchronizationTimeout:
+        db.session.rollback()
+        logger.warning("Synchronization of venue provider has timed out", extra={**extra, "timeout": timeout})
+        return TIMED_OUT
+    except Exception as exc:  # pylint: disable=broad-except
+        db.session.rollback()
+        logger.exception("Could not synchronize venue provider", extra={**extra, "exc": exc})
+        if on_error:
+            on_error(info, exc)
+        return FAILED
+    return SYNCHRONIZED
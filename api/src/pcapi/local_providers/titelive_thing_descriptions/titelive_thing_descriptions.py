@@ -20,6 +20,8 @@ END_FILE_IDENTIFIER = "_p.txt"
 class TiteLiveThingDescriptions(LocalProvider):
     name = "TiteLive (Epagine / Place des libraires.com) Descriptions"
     can_create = False
+    look_ahead_size = 1000
+    item_state_attributes = ("zip_file", "description_zip_info")
 
     def __init__(self):  # type: ignore [no-untyped-def]
         super().__init__()
@@ -30,6 +32,7 @@ class TiteLiveThingDescriptions(LocalProvider):
         self.description_zip_infos = None
         self.zip_file = None
         self.date_modified = None
+        self.ended_file_dates: list[int] = []
 
     def __next__(self) -> list[ProvidableInfo]:
         if self.description_zip_infos is None:
@@ -55,8 +58,9 @@ class TiteLiveThingDescriptions(LocalProvider):
 
     def open_next_file(self):  # type: ignore [no-untyped-def]
         if self.zip_file:
-            current_file_date = get_date_from_filename(self.zip_file, DATE_REGEXP)
-            self.log_provider_event(providers_models.LocalProviderEventType.SyncPartEnd, current_file_date)
+            # The end of the file is logged by `checkpoint()`, once all
+            # its descriptions have been saved.
+            self.ended_file_dates.append(get_date_from_filename(self.zip_file, DATE_REGEXP))
         next_zip_file_name = str(next(self.zips))
         self.zip_file = get_zip_file_from_ftp(next_zip_file_name, DESCRIPTION_FOLDER_NAME_TITELIVE)
         new_file_date = get_date_from_filename(self.zip_file, DATE_REGEXP)
@@ -67,6 +71,11 @@ class TiteLiveThingDescriptions(LocalProvider):
 
         self.date_modified = read_description_date(str(new_file_date))
 
+    def checkpoint(self) -> None:
+        for file_date in self.ended_file_dates:
+            self.log_provider_event(providers_models.LocalProviderEventType.SyncPartEnd, file_date)
+        self.ended_file_dates = []
+
     def get_remaining_files_to_check(self, all_zips) -> iter:  # type: ignore [no-untyped-def, valid-type]
         latest_sync_part_end_event = local_provider_event_queries.find_latest_sync_part_end_event(self.provider)
 
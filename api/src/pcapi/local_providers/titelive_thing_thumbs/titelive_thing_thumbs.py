@@ -20,6 +20,8 @@ SYNCHONISABLE_FILE_EXTENSION = "_75.jpg"
 class TiteLiveThingThumbs(LocalProvider):
     name = "TiteLive (Epagine / Place des libraires.com) Thumbs"
     can_create = False
+    look_ahead_size = 1000
+    item_state_attributes = ("zip", "thumb_zipinfo")
 
     def __init__(self):  # type: ignore [no-untyped-def]
         super().__init__()
@@ -29,6 +31,7 @@ class TiteLiveThingThumbs(LocalProvider):
         self.zips = self.get_remaining_files_to_check(all_zips)
         self.thumb_zipinfos = None
         self.zip = None
+        self.ended_file_dates: list[int] = []
 
     def __next__(self) -> list[ProvidableInfo]:
         if self.thumb_zipinfos is None:
@@ -50,8 +53,9 @@ class TiteLiveThingThumbs(LocalProvider):
 
     def open_next_file(self):  # type: ignore [no-untyped-def]
         if self.zip:
-            file_date = get_date_from_filename(self.zip, DATE_REGEXP)
-            self.log_provider_event(providers_models.LocalProviderEventType.SyncPartEnd, file_date)
+            # The end of the file is logged by `checkpoint()`, once all
+            # its thumbs have been saved.
+            self.ended_file_dates.append(get_date_from_filename(self.zip, DATE_REGEXP))
 
         next_zip_file_name = str(next(self.zips))
         file_date = get_date_from_filename(next_zip_file_name, DATE_REGEXP)
@@ -66,6 +70,11 @@ class TiteLiveThingThumbs(LocalProvider):
             )
         )
 
+    def checkpoint(self) -> None:
+        for file_date in self.ended_file_dates:
+            self.log_provider_event(providers_models.LocalProviderEventType.SyncPartEnd, file_date)
+        self.ended_file_dates = []
+
     def get_object_thumb_index(self) -> int:
         return extract_thumb_index(self.thumb_zipinfo.filename)
 
@@ -1,10 +1,11 @@
-from io import BytesIO
+from collections.abc import Iterator
 from io import TextIOWrapper
+import itertools
 import logging
 import re
 from typing import Optional
 
-from pcapi.connectors.ftp_titelive import connect_to_titelive_ftp
+from pcapi.connectors.ftp_titelive import download_file_from_ftp
 from pcapi.connectors.ftp_titelive import get_files_to_process_from_titelive_ftp
 from pcapi.core.categories import subcategories
 from pcapi.core.offers.api import deactivate_permanently_unavailable_products
@@ -84,15 +85,20 @@ SCHOOL_RELATED_CSR_CODE = [
 class TiteLiveThings(LocalProvider):
     name = "TiteLive (Epagine / Place des libraires.com)"
     can_create = True
+    look_ahead_size = 1000
+    item_state_attributes = ("product_infos", "product_subcategory_id", "product_extra_data")
 
     def __init__(self):  # type: ignore [no-untyped-def]
         super().__init__()
 
         ordered_thing_files = get_files_to_process_from_titelive_ftp(THINGS_FOLDER_NAME_TITELIVE, DATE_REGEXP)
         self.thing_files = self.get_remaining_files_to_check(ordered_thing_files)
+        self.resume_point = self.get_resume_point()
 
         self.data_lines = None
         self.products_file = None
+        self.line_number = 0
+        self.ended_file_dates: list[int] = []
         self.product_extra_data = {}
 
     def __next__(self) -> Optional[list[ProvidableInfo]]:
@@ -105,6 +111,7 @@ class TiteLiveThings(LocalProvider):
         except StopIteration:
             self.open_next_file()
             elements = next(self.data_lines).split("~")  # type: ignore [arg-type]
+        self.line_number += 1
 
         if len(elements) != NUMBER_OF_ELEMENTS_PER_LINE:
             self.log_provider_event(providers_models.LocalProviderEventType.SyncError, "number of elements mismatch")
@@ -112,10 +119,12 @@ class TiteLiveThings(LocalProvider):
 
         self.product_infos = get_infos_from_data_line(elements)
 
-        (
-            self.product_subcategory_id,
-            self.product_extra_data["bookFormat"],
-        ) = get_subcategory_and_extra_data_from_titelive_type(self.product_infos["code_support"])
+        # Use a new dict for each line, since it is restored with
+        # `item_state_attributes` when looking ahead.
+        self.product_subcategory_id, book_format = get_subcategory_and_extra_data_from_titelive_type(
+            self.product_infos["code_support"]
+        )
+        self.product_extra_data = {"bookFormat": book_format}
         book_unique_identifier = self.product_infos["ean13"]
 
         ineligibility_reason = self.get_ineligibility_reason()
@@ -182,13 +191,38 @@ class TiteLiveThings(LocalProvider):
 
     def open_next_file(self):  # type: ignore [no-untyped-def]
         if self.products_file:
-            file_date = get_date_from_filename(self.products_file, DATE_REGEXP)
-            self.log_provider_event(providers_models.LocalProviderEventType.SyncPartEnd, file_date)
+            # The end of the file is logged by `checkpoint()`, once all
+            # its lines have been saved.
+            self.ended_file_dates.append(get_date_from_filename(self.products_file, DATE_REGEXP))
         self.products_file = next(self.thing_files)
         file_date = get_date_from_filename(self.products_file, DATE_REGEXP)
         self.log_provider_event(providers_models.LocalProviderEventType.SyncPartStart, file_date)
 
-        self.data_lines = get_lines_from_thing_file(str(self.products_file))
+        self.line_number = 0
+        if self.resume_point and self.resume_point[0] == file_date:
+            self.line_number = self.resume_point[1]
+            logger.info("Resuming synchronization of file %s at line %d", self.products_file, self.line_number)
+        self.data_lines = get_lines_from_thing_file(str(self.products_file), start_line=self.line_number)
+
+    def checkpoint(self) -> None:
+        for file_date in self.ended_file_dates:
+            self.log_provider_event(providers_models.LocalProviderEventType.SyncPartEnd, file_date)
+        self.ended_file_dates = []
+        if self.products_file:
+            file_date = get_date_from_filename(self.products_file, DATE_REGEXP)
+            self.log_provider_event(
+                providers_models.LocalProviderEventType.SyncPartProgress, f"{file_date}:{self.line_number}"
+            )
+
+    def get_resume_point(self) -> Optional[tuple[int, int]]:
+        """Return the date of the file and the line at which a previous,
+        interrupted synchronization stopped.
+        """
+        event = local_provider_event_queries.find_interrupted_sync_progress_event(self.provider)
+        if event is None:
+            return None
+        file_date, line_number = event.payload.split(":")
+        return int(file_date), int(line_number)
 
     def get_remaining_files_to_check(self, ordered_thing_files: list) -> iter:  # type: ignore [valid-type]
         latest_sync_part_end_event = local_provider_event_queries.find_latest_sync_part_end_event(self.provider)
@@ -200,17 +234,15 @@ class TiteLiveThings(LocalProvider):
         return iter([])
 
 
-def get_lines_from_thing_file(thing_file: str):  # type: ignore [no-untyped-def]
-    data_file = BytesIO()
-    data_wrapper = TextIOWrapper(
-        data_file,
-        encoding="iso-8859-1",
-        line_buffering=True,
-    )
-    file_path = "RETR " + THINGS_FOLDER_NAME_TITELIVE + "/" + thing_file
-    connect_to_titelive_ftp().retrbinary(file_path, data_file.write)
-    data_wrapper.seek(0, 0)
-    return iter(data_wrapper.readlines())
+def get_lines_from_thing_file(thing_file: str, start_line: int = 0) -> Iterator[str]:
+    """Yield the lines of the file, starting at ``start_line``.
+
+    The file is downloaded to a temporary file and lines are decoded
+    one at a time, so that the file is never entirely loaded in memory.
+    """
+    data_file = download_file_from_ftp(THINGS_FOLDER_NAME_TITELIVE + "/" + thing_file)
+    with TextIOWrapper(data_file, encoding="iso-8859-1") as data_lines:
+        yield from itertools.islice(data_lines, start_line, None)
 
 
 def get_subcategory_and_extra_data_from_titelive_type(titelive_type):  # type: ignore [no-untyped-def]
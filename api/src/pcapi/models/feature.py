@@ -1,5 +1,9 @@
 import enum
 import logging
+import secrets
+import threading
+import time
+from typing import Optional
 
 from alembic import op
 import flask
@@ -8,6 +12,7 @@ from sqlalchemy import String
 from sqlalchemy import Text
 from sqlalchemy.sql import text
 
+from pcapi import settings
 from pcapi.models import Model
 from pcapi.models import db
 from pcapi.models.deactivable_mixin import DeactivableMixin
@@ -46,6 +51,9 @@ class FeatureToggle(enum.Enum):
     ENABLE_ISBN_REQUIRED_IN_LIVRE_EDITION_OFFER_CREATION = (
         "Active le champ isbn obligatoire lors de la création d'offre de type LIVRE_EDITION"
     )
+    ENABLE_LOW_CONTENTION_BOOKING = (
+        "Vérifie les réservations avant de verrouiller le stock, pour les offres très demandées"
+    )
     ENABLE_NATIVE_APP_RECAPTCHA = "Active le reCaptacha sur l'API native"
     ENABLE_NATIVE_CULTURAL_SURVEY = (
         "Active le Questionnaire des pratiques initiales natif (non TypeForm) sur l'app native et décli web"
@@ -60,6 +68,9 @@ class FeatureToggle(enum.Enum):
     ENABLE_PHONE_VALIDATION = "Active la validation du numéro de téléphone"  # TODO (viconnex) remove when FORCE_PHONE_VALIDATION is released in production
     ENABLE_PRO_ACCOUNT_CREATION = "Permettre l'inscription des comptes professionels"
     ENABLE_PRO_BOOKINGS_V2 = "Activer l'affichage de la page booking avec la nouvelle architecture."
+    ENABLE_PROVIDER_STOCK_UPSERT = (
+        "Synchronise les offres et stocks des fournisseurs avec des requêtes INSERT ... ON CONFLICT"
+    )
     ENABLE_UBBLE = "Active la vérification d'identité par Ubble"
     ENABLE_UBBLE_SUBSCRIPTION_LIMITATION = "Active la limitation en fonction de l'âge lors de pic d'inscription"
     ENFORCE_BANK_INFORMATION_WITH_SIRET = "Forcer les informations banquaires à être liées à un SIRET."
@@ -72,6 +83,9 @@ class FeatureToggle(enum.Enum):
         "Inclure les anciens modèles de données pour le téléchargement des remboursements "
     )
     PRICE_BOOKINGS = "Active la valorisation des réservations"
+    PRICE_BOOKINGS_BY_BUSINESS_UNIT = (
+        "Valorise les réservations par lots, point de remboursement par point de remboursement"
+    )
     PRO_DISABLE_EVENTS_QRCODE = "Active la possibilité de différencier le type d’envoi des billets sur une offre et le retrait du QR code sur la réservation"
     SHOW_INVOICES_ON_PRO_PORTAL = "Activer l'affichage des remboursements sur le portail pro"
     SYNCHRONIZE_ALLOCINE = "Permettre la synchronisation journalière avec Allociné"
@@ -79,6 +93,9 @@ class FeatureToggle(enum.Enum):
     SYNCHRONIZE_TITELIVE_PRODUCTS_DESCRIPTION = "Permettre limport journalier des résumés des livres"
     SYNCHRONIZE_TITELIVE_PRODUCTS_THUMBS = "Permettre limport journalier des couvertures de livres"
     UPDATE_BOOKING_USED = "Permettre la validation automatique des contremarques 48h après la fin de lévènement"
+    USE_DEPOSIT_BALANCE_COLUMNS = (
+        "Lire le solde des crédits dans les colonnes bookedAmount et usedAmount au lieu de get_wallet_balance"
+    )
     USER_PROFILING_FRAUD_CHECK = "Détection de la fraude basée sur le profil de l'utilisateur"
     # FIXME (dbaty, 2022-02-21): remove WEBAPP_V2_ENABLED when no user
     # accessed the old webapp (through its old URL) anymore. Until
@@ -98,7 +115,10 @@ class FeatureToggle(enum.Enum):
             if cached_value is not None:
                 return cached_value
 
-        value = Feature.query.filter_by(name=self.name).one().isActive
+        value = _get_features_snapshot().get(self.name)
+        if value is None:
+            # Not installed (yet?): let it fail loudly, as before.
+            value = Feature.query.filter_by(name=self.name).one().isActive
 
         if flask.has_request_context():
             flask.request._cached_features[self.name] = value  # type: ignore [attr-defined]
@@ -115,6 +135,74 @@ class Feature(PcObject, Model, DeactivableMixin):  # type: ignore [valid-type, m
         return str(self.name).replace("FeatureToggle.", "")
 
 
+FEATURES_VERSION_REDIS_KEY = "cache:feature-flags:version"
+_features_snapshot_lock = threading.Lock()
+_features_snapshot: dict = {"version": None, "checked_at": None, "loaded_at": None, "features": {}}
+
+
+def _get_features_version() -> Optional[str]:
+    try:
+        version = flask.current_app.redis_client.get(FEATURES_VERSION_REDIS_KEY)  # type: ignore [attr-defined]
+        if version is None:
+            flask.current_app.redis_client.set(FEATURES_VERSION_REDIS_KEY, secrets.token_hex(8), nx=True)  # type: ignore [attr-defined]
+            version = flask.current_app.redis_client.get(FEATURES_VERSION_REDIS_KEY)  # type: ignore [attr-defined]
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Could not get version of feature flags from Redis, falling back to database")
+        return None
+    return version
+
+
+def _get_features_snapshot() -> dict[str, bool]:
+    """Return the state of all feature flags, from a snapshot that is
+    shared by all threads of this process.
+
+    The snapshot is trusted for ``FEATURES_CACHE_TTL`` seconds. After
+    that, it is reloaded from the database if feature flags have
+    changed (see ``invalidate_features_cache()``), if the version could
+    not be fetched from Redis, or if it is older than
+    ``FEATURES_CACHE_MAX_AGE`` seconds.
+
+    The lock only protects the snapshot itself: Redis and the database
+    are queried without holding it, so a slow reload does not block
+    other threads. Two threads may then reload the snapshot at the
+    same time, which is harmless.
+    """
+    if settings.FEATURES_CACHE_TTL <= 0:
+        return dict(Feature.query.with_entities(Feature.name, Feature.isActive))
+
+    now = time.time()
+    with _features_snapshot_lock:
+        snapshot = _features_snapshot.copy()
+    if snapshot["checked_at"] is not None and now - snapshot["checked_at"] < settings.FEATURES_CACHE_TTL:
+        return snapshot["features"]
+
+    version = _get_features_version()
+    features, loaded_at = snapshot["features"], snapshot["loaded_at"]
+    if (
+        version is None
+        or version != snapshot["version"]
+        or loaded_at is None
+        or now - loaded_at >= settings.FEATURES_CACHE_MAX_AGE
+    ):
+        features = dict(Feature.query.with_entities(Feature.name, Feature.isActive))
+        loaded_at = now
+    with _features_snapshot_lock:
+        _features_snapshot.update(version=version, checked_at=now, loaded_at=loaded_at, features=features)
+    return features
+
+
+def invalidate_features_cache() -> None:
+    """Invalidate the snapshot of feature flags in this process and
+    make other processes reload it once their own snapshot expires.
+    """
+    with _features_snapshot_lock:
+        _features_snapshot.update(version=None, checked_at=None, loaded_at=None, features={})
+    try:
+        flask.current_app.redis_client.set(FEATURES_VERSION_REDIS_KEY, secrets.token_hex(8))  # type: ignore [attr-defined]
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Could not invalidate the cache of feature flags")
+
+
 FEATURES_DISABLED_BY_DEFAULT = (
     FeatureToggle.ALLOW_EMPTY_USER_PROFILING,
     FeatureToggle.ALLOW_IDCHECK_REGISTRATION_FOR_EDUCONNECT_ELIGIBLE,
@@ -127,18 +215,22 @@ FEATURES_DISABLED_BY_DEFAULT = (
     FeatureToggle.ENABLE_ID_CHECK_RETENTION,
     FeatureToggle.ENABLE_IOS_OFFERS_LINK_WITH_REDIRECTION,
     FeatureToggle.ENABLE_ISBN_REQUIRED_IN_LIVRE_EDITION_OFFER_CREATION,
+    FeatureToggle.ENABLE_LOW_CONTENTION_BOOKING,
     FeatureToggle.ENABLE_NATIVE_CULTURAL_SURVEY,
     FeatureToggle.ENABLE_NATIVE_ID_CHECK_VERBOSE_DEBUGGING,
     FeatureToggle.ENABLE_NEW_COLLECTIVE_MODEL,
     FeatureToggle.ENABLE_NEW_VENUE_PAGES,
     FeatureToggle.ENABLE_PRO_BOOKINGS_V2,
+    FeatureToggle.ENABLE_PROVIDER_STOCK_UPSERT,
     FeatureToggle.ENABLE_UBBLE_SUBSCRIPTION_LIMITATION,
     FeatureToggle.ENFORCE_BANK_INFORMATION_WITH_SIRET,
     FeatureToggle.FORCE_PHONE_VALIDATION,
     FeatureToggle.GENERATE_CASHFLOWS_BY_CRON,
     FeatureToggle.ID_CHECK_ADDRESS_AUTOCOMPLETION,
+    FeatureToggle.PRICE_BOOKINGS_BY_BUSINESS_UNIT,
     FeatureToggle.PRO_DISABLE_EVENTS_QRCODE,
     FeatureToggle.SHOW_INVOICES_ON_PRO_PORTAL,
+    FeatureToggle.USE_DEPOSIT_BALANCE_COLUMNS,
     FeatureToggle.USER_PROFILING_FRAUD_CHECK,
     FeatureToggle.ENABLE_INDIVIDUAL_AND_COLLECTIVE_OFFER_SEPARATION,
 )
@@ -212,6 +304,7 @@ def install_feature_flags() -> None:
         )
 
     db.session.commit()
+    invalidate_features_cache()
 
     if to_remove_flags:
         logger.error("The following feature flags are present in database but not present in code: %s", to_remove_flags)
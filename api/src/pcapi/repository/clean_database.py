@@ -42,6 +42,7 @@ def clean_all_database(*args, **kwargs):  # type: ignore [no-untyped-def]
     finance_models.PricingLine.query.delete()
     finance_models.PricingLog.query.delete()
     finance_models.Pricing.query.delete()
+    finance_models.SiretRevenue.query.delete()
     finance_models.InvoiceLine.query.delete()
     finance_models.Invoice.query.delete()
     finance_models.BusinessUnitVenueLink.query.delete()
@@ -1,5 +1,6 @@
 from datetime import datetime
 from datetime import timedelta
+from typing import Optional
 
 import pcapi.core.providers.models as providers_models
 
@@ -14,3 +15,30 @@ def find_latest_sync_part_end_event(provider: providers_models.Provider) -> prov
         .order_by(providers_models.LocalProviderEvent.date.desc())
         .first()
     )
+
+
+def find_interrupted_sync_progress_event(
+    provider: providers_models.Provider,
+) -> Optional[providers_models.LocalProviderEvent]:
+    """Return the last progress event of the provider, if no file or
+    synchronization has ended since then (i.e. if the synchronization
+    has been interrupted in the middle of a file).
+    """
+    event = (
+        providers_models.LocalProviderEvent.query.filter(
+            (providers_models.LocalProviderEvent.provider == provider)
+            & providers_models.LocalProviderEvent.type.in_(
+                (
+                    providers_models.LocalProviderEventType.SyncPartProgress,
+                    providers_models.LocalProviderEventType.SyncPartEnd,
+                    providers_models.LocalProviderEventType.SyncEnd,
+                )
+            )
+            & (providers_models.LocalProviderEvent.date > datetime.utcnow() - timedelta(days=25))
+        )
+        .order_by(providers_models.LocalProviderEvent.date.desc(), providers_models.LocalProviderEvent.id.desc())
+        .first()
+    )
+    if event and event.type == providers_models.LocalProviderEventType.SyncPartProgress:
+        return event
+    return None
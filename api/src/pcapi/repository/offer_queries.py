@@ -1,3 +1,5 @@
+import typing
+
 from sqlalchemy.orm import joinedload
 
 from pcapi.core.offers.models import Offer
@@ -15,23 +17,26 @@ def get_offers_by_ids(offer_ids: list[int]) -> list[Offer]:
     return Offer.query.filter(Offer.id.in_(offer_ids)).options(joinedload("stocks")).all()
 
 
-def get_paginated_active_offer_ids(limit: int, page: int) -> list[int]:
-    query = (
-        Offer.query.with_entities(Offer.id)
-        .filter(Offer.isActive.is_(True))
-        .order_by(Offer.id)
-        .offset(page * limit)
-        .limit(limit)
-    )
+def get_active_offer_ids_after(last_id: int, limit: int, max_id: typing.Optional[int] = None) -> list[int]:
+    """Return the ids of (at most ``limit``) active offers whose id is
+    greater than ``last_id`` (and lower or equal to ``max_id``, if
+    given), ordered by id.
+
+    Callers should pass the last id of the previous batch: the cost of
+    each call does not depend on how far we are in the table.
+    """
+    query = Offer.query.with_entities(Offer.id).filter(Offer.isActive.is_(True), Offer.id > last_id)
+    if max_id is not None:
+        query = query.filter(Offer.id <= max_id)
+    query = query.order_by(Offer.id).limit(limit)
     return [offer_id for offer_id, in query]
 
 
-def get_paginated_offer_ids_by_venue_id(venue_id: int, limit: int, page: int) -> list[int]:
+def get_offer_ids_by_venue_id_after(venue_id: int, last_id: int, limit: int) -> list[int]:
     query = (
         Offer.query.with_entities(Offer.id)
-        .filter(Offer.venueId == venue_id)
+        .filter(Offer.venueId == venue_id, Offer.id > last_id)
         .order_by(Offer.id)
-        .offset(page * limit)
         .limit(limit)
     )
     return [offer_id for offer_id, in query]
@@ -1,4 +1,5 @@
 import datetime
+from typing import Iterable
 from typing import Optional
 
 from pcapi.core.offers.models import Offer
@@ -49,6 +50,14 @@ def get_existing_object(model_type: Model, id_at_providers: str) -> Optional[dic
     return model_type.query.filter_by(idAtProviders=id_at_providers).one_or_none()  # type: ignore [attr-defined]
 
 
+def get_existing_objects(model_type: Model, ids_at_providers: Iterable[str]) -> dict[str, Model]:  # type: ignore [valid-type]
+    """Return existing objects, indexed by their id at providers."""
+    # Same exception for Offer as in `get_existing_object()`
+    column = model_type.idAtProvider if model_type == Offer else model_type.idAtProviders  # type: ignore [attr-defined]
+    objects = model_type.query.filter(column.in_(ids_at_providers)).all()  # type: ignore [attr-defined]
+    return {getattr(pc_object, column.key): pc_object for pc_object in objects}
+
+
 def get_last_update_for_provider(provider_id: int, pc_obj: Model) -> datetime:  # type: ignore [valid-type]
     if pc_obj.lastProviderId == provider_id:  # type: ignore [attr-defined]
         return pc_obj.dateModifiedAtLastProvider if pc_obj.dateModifiedAtLastProvider else None  # type: ignore [attr-defined]
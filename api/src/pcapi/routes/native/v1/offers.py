@@ -1,10 +1,18 @@
+from datetime import datetime
+import json
+from typing import Union
+
+from flask import Response
+from flask import make_response
 from sqlalchemy.orm import joinedload
 
+from pcapi import settings
 from pcapi.core.categories import subcategories
 from pcapi.core.mails.transactional.users.offer_link_to_ios_user import send_offer_link_to_ios_user_email
 from pcapi.core.offerers.models import Offerer
 from pcapi.core.offerers.models import Venue
 from pcapi.core.offers import api
+from pcapi.core.offers import cache as offers_cache
 from pcapi.core.offers.exceptions import OfferReportError
 from pcapi.core.offers.models import Offer
 from pcapi.core.offers.models import Reason
@@ -19,13 +27,54 @@ from . import blueprint
 from .serialization import offers as serializers
 
 
+# Subcategories and report reasons only change when the code is
+# deployed. Clients revalidate them with their ETag.
+STATIC_RESPONSES_MAX_AGE = 10 * 60
+
+
 # It will break the WebApp v2 proxy in case of endpoint modification. Read https://github.com/pass-culture/pass-culture-app-native/pull/2808/files#r844891000
 @blueprint.native_v1.route("/offer/<int:offer_id>", methods=["GET"])
 @spectree_serialize(
     response_model=serializers.OfferResponse, api=blueprint.api, on_error_statuses=[404]
 )  # type: ignore
-def get_offer(offer_id: str) -> serializers.OfferResponse:
-    offer = (
+def get_offer(offer_id: int) -> Union[serializers.OfferResponse, Response]:
+    if settings.NATIVE_OFFER_CACHE_TTL <= 0:
+        return serializers.OfferResponse.from_orm(_get_offer(offer_id))
+
+    serialized_offer = offers_cache.get_native_offer(offer_id)
+    if serialized_offer is None:
+        offer = _get_offer(offer_id)
+        serialized_offer = json.loads(serializers.OfferResponse.from_orm(offer).json(by_alias=True))
+        ttl = _get_offer_cache_ttl(offer)
+        if ttl > 0:
+            offers_cache.set_native_offer(offer.id, offer.venueId, serialized_offer, ttl)
+    else:
+        serializers.refresh_cancellation_limit_datetimes(serialized_offer)
+
+    response = make_response(json.dumps(serialized_offer), 200)
+    response.mimetype = "application/json"
+    return response
+
+
+def _get_offer_cache_ttl(offer: Offer) -> int:
+    """Return for how long the serialized offer may be cached: until
+    one of its stocks expires or one of its activation codes expires,
+    and no longer than ``NATIVE_OFFER_CACHE_TTL``.
+    """
+    now = datetime.utcnow()
+    dates = []
+    for stock in offer.stocks:
+        dates.extend((stock.beginningDatetime, stock.bookingLimitDatetime))
+        if stock.activationCode:
+            dates.append(stock.activationCode["expirationDate"])
+    next_change = min((date for date in dates if date and date > now), default=None)
+    if next_change is None:
+        return settings.NATIVE_OFFER_CACHE_TTL
+    return min(settings.NATIVE_OFFER_CACHE_TTL, int((next_change - now).total_seconds()))
+
+
+def _get_offer(offer_id: int) -> Offer:
+    return (
         Offer.query.options(joinedload(Offer.stocks))
         .options(
             joinedload(Offer.venue)
@@ -38,8 +87,6 @@ def get_offer(offer_id: str) -> serializers.OfferResponse:
         .first_or_404()
     )
 
-    return serializers.OfferResponse.from_orm(offer)
-
 
 @blueprint.native_v1.route("/offer/<int:offer_id>/report", methods=["POST"])
 @spectree_serialize(on_success_status=204, api=blueprint.api)  # type: ignore
@@ -54,7 +101,9 @@ def report_offer(user: User, offer_id: int, body: serializers.OfferReportRequest
 
 
 @blueprint.native_v1.route("/offer/report/reasons", methods=["GET"])
-@spectree_serialize(api=blueprint.api, response_model=serializers.OfferReportReasons)  # type: ignore
+@spectree_serialize(
+    api=blueprint.api, response_model=serializers.OfferReportReasons, cache_max_age=STATIC_RESPONSES_MAX_AGE
+)  # type: ignore
 @authenticated_user_required
 def report_offer_reasons(user: User) -> serializers.OfferReportReasons:
     return serializers.OfferReportReasons(reasons=Reason.get_full_meta())
@@ -88,7 +137,11 @@ def send_offer_link_by_push(user: User, offer_id: int) -> None:
 
 
 @blueprint.native_v1.route("/subcategories", methods=["GET"])
-@spectree_serialize(api=blueprint.api, response_model=serializers.SubcategoriesResponseModel)
+@spectree_serialize(
+    api=blueprint.api,
+    response_model=serializers.SubcategoriesResponseModel,
+    cache_max_age=STATIC_RESPONSES_MAX_AGE,
+)
 def get_subcategories() -> serializers.SubcategoriesResponseModel:
     return serializers.SubcategoriesResponseModel(
         subcategories=[
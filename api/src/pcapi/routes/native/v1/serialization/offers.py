@@ -66,21 +66,11 @@ class OfferStockResponse(BaseModel):
         # compute date as if it were booked now
         return compute_cancellation_limit_date(stock.beginningDatetime, datetime.utcnow())
 
-    @staticmethod
-    def _get_non_scrappable_activation_code(stock: Stock) -> Optional[dict]:
-        if not stock.canHaveActivationCodes:
-            return None
-        # here we have N+1 requests (for each stock we query an activation code)
-        # but it should be more efficient than loading all activationCodes of all stocks
-        activation_code = offers_repository.get_available_activation_code(stock)
-        if not activation_code:
-            return None
-        return {"expirationDate": activation_code.expirationDate}
-
     @classmethod
     def from_orm(cls, stock):  # type: ignore
         stock.cancellation_limit_datetime = cls._get_cancellation_limit_datetime(stock)
-        stock.activationCode = cls._get_non_scrappable_activation_code(stock)
+        # `activationCode` is set by `OfferResponse.from_orm()` for
+        # all stocks of the offer at once.
         return super().from_orm(stock)
 
 
@@ -166,6 +156,31 @@ class OfferImageResponse(BaseModel):
         orm_mode = True
 
 
+def refresh_cancellation_limit_datetimes(serialized_offer: dict) -> None:
+    """Update the cancellation limit datetimes of a serialized (and
+    cached) offer, since they depend on the current time.
+    """
+    now = datetime.utcnow()
+    for stock in serialized_offer["stocks"]:
+        beginning = stock["beginningDatetime"]
+        if beginning:
+            beginning = datetime.fromisoformat(beginning.rstrip("Z"))
+        limit = compute_cancellation_limit_date(beginning, now)
+        stock["cancellationLimitDatetime"] = format_into_utc_date(limit) if limit else None
+
+
+def _set_non_scrappable_activation_codes(stocks: list[Stock]) -> None:
+    digital_stock_ids = [stock.id for stock in stocks if stock.canHaveActivationCodes]
+    # Only the expiration date is exposed, so that the code itself
+    # cannot be scrapped.
+    expiration_dates = offers_repository.get_available_activation_code_expiration_dates(digital_stock_ids)
+    for stock in stocks:
+        if stock.id in expiration_dates:
+            stock.activationCode = {"expirationDate": expiration_dates[stock.id]}
+        else:
+            stock.activationCode = None
+
+
 class OfferResponse(BaseModel):
     @classmethod
     def from_orm(cls: Any, offer: Offer):  # type: ignore
@@ -177,6 +192,7 @@ class OfferResponse(BaseModel):
         }
         offer.expense_domains = get_expense_domains(offer)
         offer.isExpired = offer.hasBookingLimitDatetimesPassed
+        _set_non_scrappable_activation_codes(offer.stocks)
 
         result = super().from_orm(offer)
 
@@ -1,6 +1,5 @@
 from pcapi.core.users import constants
 from pcapi.models.feature import FeatureToggle
-from pcapi.repository import feature_queries
 from pcapi.serialization.decorator import spectree_serialize
 from pcapi.settings import OBJECT_STORAGE_URL
 
@@ -8,28 +7,37 @@ from . import blueprint
 from .serialization import settings as serializers
 
 
-def _get_features(*requested_features: FeatureToggle):  # type: ignore [no-untyped-def]
-    requested_features = {feature.name: feature for feature in requested_features}  # type: ignore [assignment]
-    return {
-        requested_features[db_feature.name]: db_feature.isActive
-        for db_feature in feature_queries.find_all()
-        if db_feature.name in requested_features
-    }
+SETTINGS_FEATURES = (
+    FeatureToggle.DISPLAY_DMS_REDIRECTION,
+    FeatureToggle.ENABLE_ID_CHECK_RETENTION,
+    FeatureToggle.ENABLE_NATIVE_APP_RECAPTCHA,
+    FeatureToggle.ENABLE_NATIVE_ID_CHECK_VERBOSE_DEBUGGING,
+    FeatureToggle.ENABLE_PHONE_VALIDATION,
+    FeatureToggle.ID_CHECK_ADDRESS_AUTOCOMPLETION,
+    FeatureToggle.PRO_DISABLE_EVENTS_QRCODE,
+)
+
+
+def _get_features(*requested_features: FeatureToggle) -> dict[FeatureToggle, bool]:
+    return {feature: feature.is_active() for feature in requested_features}
+
+
+def _get_features_state() -> tuple[bool, ...]:
+    return tuple(_get_features(*SETTINGS_FEATURES).values())
 
 
 @blueprint.native_v1.route("/settings", methods=["GET"])
-@spectree_serialize(api=blueprint.api, response_model=serializers.SettingsResponse)
+@spectree_serialize(
+    api=blueprint.api,
+    response_model=serializers.SettingsResponse,
+    # Settings only change with feature flags, which are part of the
+    # key of the cached response.
+    cache_max_age=60,
+    cache_key=_get_features_state,
+)
 def get_settings() -> serializers.SettingsResponse:
 
-    features = _get_features(
-        FeatureToggle.DISPLAY_DMS_REDIRECTION,
-        FeatureToggle.ENABLE_ID_CHECK_RETENTION,
-        FeatureToggle.ENABLE_NATIVE_APP_RECAPTCHA,
-        FeatureToggle.ENABLE_NATIVE_ID_CHECK_VERBOSE_DEBUGGING,
-        FeatureToggle.ENABLE_PHONE_VALIDATION,
-        FeatureToggle.ID_CHECK_ADDRESS_AUTOCOMPLETION,
-        FeatureToggle.PRO_DISABLE_EVENTS_QRCODE,
-    )
+    features = _get_features(*SETTINGS_FEATURES)
 
     return serializers.SettingsResponse(
         account_creation_minimum_age=constants.ACCOUNT_CREATION_MINIMUM_AGE,
@@ -1,15 +1,20 @@
 from datetime import datetime
+import typing
 from typing import Optional
 
 from dateutil import parser
+from flask import Response
 from flask import request
+from flask import stream_with_context
 from flask_login import current_user
 from flask_login import login_required
 
 import pcapi.core.bookings.api as bookings_api
+import pcapi.core.bookings.exceptions as bookings_exceptions
 from pcapi.core.bookings.models import Booking
 import pcapi.core.bookings.repository as booking_repository
 import pcapi.core.bookings.validation as bookings_validation
+from pcapi.models.api_errors import ApiErrors
 from pcapi.routes.serialization import serialize
 from pcapi.routes.serialization.bookings_recap_serialize import ListBookingsQueryModel
 from pcapi.routes.serialization.bookings_recap_serialize import ListBookingsResponseModel
@@ -21,6 +26,7 @@ from pcapi.routes.serialization.bookings_serialize import UserHasBookingResponse
 from pcapi.routes.serialization.bookings_serialize import get_booking_response
 from pcapi.serialization.decorator import spectree_serialize
 from pcapi.serialization.spec_tree import ExtendResponse as SpectreeResponse
+from pcapi.tasks import bookings_tasks
 from pcapi.utils.human_ids import dehumanize
 from pcapi.utils.human_ids import humanize
 from pcapi.utils.rate_limiting import basic_auth_rate_limiter
@@ -112,6 +118,7 @@ def get_bookings_pro(query: ListBookingsQueryModel) -> ListBookingsResponseModel
         venue_id=venue_id,
         offer_type=offer_type,
         page=int(page),
+        cursor=query.cursor,
     )
 
     return ListBookingsResponseModel(
@@ -121,6 +128,7 @@ def get_bookings_pro(query: ListBookingsQueryModel) -> ListBookingsResponseModel
         page=bookings_recap_paginated.page,
         pages=bookings_recap_paginated.pages,
         total=bookings_recap_paginated.total,
+        nextCursor=bookings_recap_paginated.next_cursor,
     )
 
 
@@ -132,37 +140,87 @@ def get_user_has_bookings() -> UserHasBookingResponse:
     return UserHasBookingResponse(hasBookings=booking_repository.user_has_bookings(user))
 
 
+CSV_REPORT_HEADERS = {
+    "Content-Type": "text/csv; charset=utf-8;",
+    "Content-Disposition": "attachment; filename=reservations_pass_culture.csv",
+}
+
+
 @blueprint.pro_private_api.route("/bookings/csv", methods=["GET"])
 @login_required
 @spectree_serialize(
     json_format=False,
-    response_headers={
-        "Content-Type": "text/csv; charset=utf-8;",
-        "Content-Disposition": "attachment; filename=reservations_pass_culture.csv",
-    },
+    response_headers=CSV_REPORT_HEADERS,
 )
-def get_bookings_csv(query: ListBookingsQueryModel) -> bytes:
-    venue_id = query.venue_id
-    event_date = parser.parse(query.event_date) if query.event_date else None
+def get_bookings_csv(query: ListBookingsQueryModel) -> Response:
+    # The report is streamed: rows are fetched by batches and sent as
+    # they are serialized.
+    chunks = booking_repository.stream_csv_report(
+        user=current_user._get_current_object(),  # for tests to succeed, because current_user is actually a LocalProxy
+        **_get_csv_report_filters(query),
+    )
+    return _make_csv_report_response(chunks)
+
+
+@blueprint.pro_private_api.route("/bookings/csv/export", methods=["POST"])
+@login_required
+@spectree_serialize(on_success_status=204)
+def export_bookings_csv(query: ListBookingsQueryModel) -> None:
+    """Generate the report in a background task. The user is sent an
+    email with a link to the file once it has been generated.
+    """
+    filters = _get_csv_report_filters(query)
+    booking_period = filters["booking_period"]
+    bookings_tasks.export_bookings_csv_task.delay(
+        bookings_tasks.ExportBookingsCsvRequest(
+            user_id=current_user.id,
+            booking_period_beginning_date=booking_period[0] if booking_period else None,
+            booking_period_ending_date=booking_period[1] if booking_period else None,
+            status_filter=filters["status_filter"],
+            event_date=filters["event_date"],
+            venue_id=filters["venue_id"],
+            offer_type=filters["offer_type"],
+        )
+    )
+
+
+@blueprint.pro_private_api.route("/bookings/csv/exports/<token>", methods=["GET"])
+@login_required
+@spectree_serialize(
+    json_format=False,
+    response_headers=CSV_REPORT_HEADERS,
+)
+def get_exported_bookings_csv(token: str) -> Response:
+    """Download a report generated by `export_bookings_csv()`, with the
+    link that has been sent by email.
+    """
+    try:
+        chunks = bookings_api.get_exported_csv_report(current_user._get_current_object(), token)
+    except bookings_exceptions.InvalidBookingsExportLink:
+        raise ApiErrors({"global": ["Ce lien de téléchargement est invalide ou a expiré."]}, status_code=404)
+    return _make_csv_report_response(chunks)
+
+
+def _make_csv_report_response(chunks: typing.Iterator[bytes]) -> Response:
+    # `make_response()` does not accept generators: the streamed
+    # response is built here, and returned as is by `spectree_serialize`.
+    return Response(stream_with_context(chunks), status=200, headers=CSV_REPORT_HEADERS)
+
+
+def _get_csv_report_filters(query: ListBookingsQueryModel) -> dict:
     booking_period = None
     if query.booking_period_beginning_date and query.booking_period_ending_date:
         booking_period = (
             datetime.fromisoformat(query.booking_period_beginning_date).date(),
             datetime.fromisoformat(query.booking_period_ending_date).date(),
         )
-    booking_status = query.booking_status_filter
-    offer_type = query.offer_type
-
-    bookings = booking_repository.get_csv_report(
-        user=current_user._get_current_object(),  # for tests to succeed, because current_user is actually a LocalProxy
-        booking_period=booking_period,
-        status_filter=booking_status,
-        event_date=event_date,
-        venue_id=venue_id,
-        offer_type=offer_type,
-    )
-
-    return bookings.encode("utf-8-sig")
+    return {
+        "booking_period": booking_period,
+        "status_filter": query.booking_status_filter,
+        "event_date": parser.parse(query.event_date) if query.event_date else None,
+        "venue_id": query.venue_id,
+        "offer_type": query.offer_type,
+    }
 
 
 @blueprint.pro_public_api_v2.route("/bookings/token/<token>", methods=["GET"])
@@ -3,6 +3,7 @@ from enum import Enum
 from typing import Optional
 
 from pydantic import root_validator
+from pydantic import validator
 
 from pcapi.core.bookings.models import BookingStatusFilter
 from pcapi.domain.booking_recap.booking_recap import BookingRecap
@@ -14,6 +15,7 @@ from pcapi.domain.booking_recap.booking_recap_history import BookingRecapPending
 from pcapi.domain.booking_recap.booking_recap_history import BookingRecapReimbursedHistory
 from pcapi.domain.booking_recap.booking_recap_history import BookingRecapValidatedHistory
 from pcapi.domain.booking_recap.bookings_recap_paginated import BookingsRecapPaginated
+from pcapi.domain.booking_recap.bookings_recap_paginated import decode_cursor
 from pcapi.models.api_errors import ApiErrors
 from pcapi.routes.serialization import BaseModel
 from pcapi.serialization.utils import dehumanize_field
@@ -63,6 +65,7 @@ class ListBookingsResponseModel(BaseModel):
     page: int
     pages: int
     total: int
+    nextCursor: Optional[str]
 
 
 class PatchBookingByTokenQueryModel(BaseModel):
@@ -161,6 +164,9 @@ def _serialize_booking_recap(booking_recap: BookingRecap) -> BookingRecapRespons
 
 class ListBookingsQueryModel(BaseModel):
     page: int = 1
+    # If set, rows are returned after this cursor and `page` is only
+    # used to compute the number of pages. See `find_by_pro_user()`.
+    cursor: Optional[str]
     venue_id: Optional[int]
     event_date: Optional[str]
     booking_status_filter: Optional[BookingStatusFilter]
@@ -175,6 +181,12 @@ class ListBookingsQueryModel(BaseModel):
 
     extra = "forbid"
 
+    @validator("cursor")
+    def validate_cursor(cls, cursor: Optional[str]) -> Optional[str]:  # pylint: disable=no-self-argument
+        if cursor is not None:
+            decode_cursor(cursor)
+        return cursor
+
     @root_validator(pre=True)
     def booking_period_or_event_date_required(cls, values):  # type: ignore [no-untyped-def] # pylint: disable=no-self-argument
         event_date = values.get("eventDate")
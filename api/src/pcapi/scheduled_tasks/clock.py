@@ -26,6 +26,7 @@ from pcapi.core.offers.repository import delete_past_draft_collective_offers
 from pcapi.core.offers.repository import delete_past_draft_offers
 from pcapi.core.offers.repository import find_event_stocks_happening_in_x_days
 from pcapi.core.offers.repository import find_today_event_stock_ids_metropolitan_france
+from pcapi.core.payments.repository import check_deposit_balance_consistency
 from pcapi.core.providers.repository import get_provider_by_local_class
 from pcapi.core.subscription.dms import api as dms_api
 from pcapi.core.users import api as users_api
@@ -166,6 +167,16 @@ def pc_check_stock_quantity_consistency() -> None:
         logger.error("Found inconsistent stocks: %s", ", ".join([str(stock_id) for stock_id in inconsistent_stocks]))
 
 
+@cron_context
+@log_cron_with_transaction
+def pc_check_deposit_balance_consistency() -> None:
+    inconsistent_deposits = check_deposit_balance_consistency()
+    if inconsistent_deposits:
+        logger.error(
+            "Found inconsistent deposits: %s", ", ".join([str(deposit_id) for deposit_id in inconsistent_deposits])
+        )
+
+
 @cron_context
 @log_cron_with_transaction
 def pc_send_yesterday_event_offers_notifications() -> None:
@@ -217,7 +228,10 @@ def pc_recredit_underage_users() -> None:
 @log_cron_with_transaction
 @cron_require_feature(FeatureToggle.PRICE_BOOKINGS)
 def price_bookings() -> None:
-    finance_api.price_bookings()
+    if FeatureToggle.PRICE_BOOKINGS_BY_BUSINESS_UNIT.is_active():
+        finance_api.price_bookings_by_business_unit()
+    else:
+        finance_api.price_bookings()
 
 
 @cron_context
@@ -327,6 +341,8 @@ def clock() -> None:
 
     scheduler.add_job(pc_check_stock_quantity_consistency, "cron", day="*", hour="1")
 
+    scheduler.add_job(pc_check_deposit_balance_consistency, "cron", day="*", hour="1", minute="30")
+
     scheduler.add_job(pc_send_today_events_notifications_metropolitan_france, "cron", day="*", hour="8")
 
     scheduler.add_job(pc_clean_past_draft_offers, "cron", day="*", hour="20")
@@ -1,6 +1,8 @@
 import datetime
 import logging
+import typing
 
+import click
 import sqlalchemy.orm as sqla_orm
 
 from pcapi import settings
@@ -24,6 +26,7 @@ from pcapi.core.offers.repository import delete_past_draft_collective_offers
 from pcapi.core.offers.repository import delete_past_draft_offers
 from pcapi.core.offers.repository import find_event_stocks_happening_in_x_days
 from pcapi.core.offers.repository import find_today_event_stock_ids_metropolitan_france
+from pcapi.core.payments import repository as payments_repository
 from pcapi.core.providers.repository import get_provider_by_local_class
 from pcapi.core.subscription.dms import api as dms_api
 from pcapi.core.users import api as users_api
@@ -158,6 +161,16 @@ def check_stock_quantity_consistency() -> None:
         logger.error("Found inconsistent stocks: %s", ", ".join([str(stock_id) for stock_id in inconsistent_stocks]))
 
 
+@blueprint.cli.command("check_deposit_balance_consistency")
+@log_cron_with_transaction
+def check_deposit_balance_consistency() -> None:
+    inconsistent_deposits = payments_repository.check_deposit_balance_consistency()
+    if inconsistent_deposits:
+        logger.error(
+            "Found inconsistent deposits: %s", ", ".join([str(deposit_id) for deposit_id in inconsistent_deposits])
+        )
+
+
 @blueprint.cli.command("send_yesterday_event_offers_notifications")
 @log_cron_with_transaction
 def send_yesterday_event_offers_notifications() -> None:
@@ -212,6 +225,24 @@ def price_bookings() -> None:
     finance_api.price_bookings()
 
 
+@blueprint.cli.command("price_bookings_by_business_unit")
+@log_cron_with_transaction
+@cron_require_feature(FeatureToggle.PRICE_BOOKINGS)
+def price_bookings_by_business_unit() -> None:
+    """Price bookings that have been recently marked as used, in bulk
+    (business unit by business unit).
+    """
+    finance_api.price_bookings_by_business_unit()
+
+
+@blueprint.cli.command("check_siret_revenues")
+@click.option("--year", type=int, help="Only check this year (all years by default)")
+@log_cron_with_transaction
+def check_siret_revenues(year: typing.Optional[int]) -> None:
+    """Check the revenue ledger of SIRETs against their pricings."""
+    finance_api.check_siret_revenues(year)
+
+
 @blueprint.cli.command("generate_cashflows_and_payment_files")
 @log_cron_with_transaction
 @cron_require_feature(FeatureToggle.GENERATE_CASHFLOWS_BY_CRON)
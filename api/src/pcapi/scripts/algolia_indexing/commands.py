@@ -3,7 +3,7 @@ import click
 from pcapi.core import search
 import pcapi.core.educational.api as educational_api
 import pcapi.core.offers.api as offers_api
-from pcapi.scripts.algolia_indexing.indexing import batch_indexing_offers_in_algolia_from_database
+from pcapi.scripts.algolia_indexing.indexing import batch_indexing_active_offers_in_algolia_from_database
 from pcapi.scripts.algolia_indexing.indexing import batch_indexing_venues_in_algolia_from_database
 from pcapi.utils.blueprint import Blueprint
 
@@ -12,8 +12,9 @@ blueprint = Blueprint(__name__, __name__)
 
 
 @blueprint.cli.command("process_offers")
-def process_offers():  # type: ignore [no-untyped-def]
-    search.index_offers_in_queue(stop_only_when_empty=True)
+@click.option("--workers", help="Number of threads that process batches concurrently", type=int, default=1)
+def process_offers(workers: int):  # type: ignore [no-untyped-def]
+    search.index_offers_in_queue(stop_only_when_empty=True, workers=workers)
 
 
 @blueprint.cli.command("process_offers_by_venue")
@@ -21,20 +22,22 @@ def process_offers_by_venue():  # type: ignore [no-untyped-def]
     search.index_offers_of_venues_in_queue()
 
 
-@blueprint.cli.command("process_offers_from_database")
-@click.option("--clear", help="Clear search index", type=bool, default=False)
-@click.option("-ep", "--ending-page", help="Ending page for indexing offers", type=int, default=None)
-@click.option("-l", "--limit", help="Number of offers per page", type=int, default=10_000)
-@click.option("-sp", "--starting-page", help="Starting page for indexing offers", type=int, default=0)
-def process_offers_from_database(  # type: ignore [no-untyped-def]
-    clear: bool,
-    ending_page: int,
-    limit: int,
-    starting_page: int,
+@blueprint.cli.command("process_active_offers_from_database")
+@click.option("--clear", help="Clear search index", is_flag=True, default=False)
+@click.option("--from-id", help="Reindex offers from this id (included)", type=int, default=1)
+@click.option("--to-id", help="Reindex offers up to this id (included)", type=int, default=None)
+@click.option("-l", "--limit", help="Number of offers per batch", type=int, default=10_000)
+@click.option("--resume", help="Resume from the last checkpoint of this id range", is_flag=True, default=False)
+def process_active_offers_from_database(  # type: ignore [no-untyped-def]
+    clear: bool, from_id: int, to_id: int, limit: int, resume: bool
 ):
     if clear:
+        # The whole index is cleared, including offers that have been
+        # indexed by other runs of this command on other id ranges.
+        if from_id != 1 or to_id is not None or resume:
+            raise click.UsageError("--clear cannot be used with --from-id, --to-id or --resume")
         search.unindex_all_offers()
-    batch_indexing_offers_in_algolia_from_database(ending_page=ending_page, limit=limit, starting_page=starting_page)
+    batch_indexing_active_offers_in_algolia_from_database(limit=limit, from_id=from_id, to_id=to_id, resume=resume)
 
 
 @blueprint.cli.command("process_expired_offers")
@@ -1,6 +1,8 @@
 import logging
 import typing
 
+from flask import current_app
+
 from pcapi.core import search
 from pcapi.core.offerers import api as offerers_api
 from pcapi.repository import offer_queries
@@ -9,21 +11,42 @@ from pcapi.utils.chunks import get_chunks
 
 logger = logging.getLogger(__name__)
 
+REDIS_FULL_REINDEX_CHECKPOINT = "search:algolia:full-reindex-checkpoint:{from_id}:{to_id}"
+
 
-def batch_indexing_offers_in_algolia_from_database(
-    ending_page: int = None, limit: int = 10000, starting_page: int = 0
+def batch_indexing_active_offers_in_algolia_from_database(
+    limit: int = 10_000, from_id: int = 1, to_id: typing.Optional[int] = None, resume: bool = False
 ) -> None:
-    page = starting_page
-    while True:
-        if ending_page and ending_page == page:
-            break
+    """Reindex active offers whose id is between ``from_id`` and
+    ``to_id`` (both included, no upper bound if ``to_id`` is None).
+
+    Offers are fetched by batches of ``limit`` ids, with keyset
+    pagination: each batch starts after the last id of the previous
+    batch. The last processed id is stored in Redis after each batch.
+    If ``resume`` is True, we start after the stored id instead of
+    ``from_id``, so that an interrupted reindexation can be resumed.
+
+    Several processes can share a full reindexation by processing
+    distinct id ranges. Each range has its own checkpoint.
+    """
+    checkpoint_key = REDIS_FULL_REINDEX_CHECKPOINT.format(from_id=from_id, to_id=to_id or "")
+    last_id = from_id - 1
+    if resume:
+        checkpoint = current_app.redis_client.get(checkpoint_key)
+        if checkpoint:
+            last_id = int(checkpoint)
+            logger.info("[ALGOLIA] Resuming reindexation of offers after id %d", last_id)
 
-        offer_ids = offer_queries.get_paginated_active_offer_ids(limit=limit, page=page)
+    while True:
+        offer_ids = offer_queries.get_active_offer_ids_after(last_id=last_id, limit=limit, max_id=to_id)
         if not offer_ids:
             break
         search.reindex_offer_ids(offer_ids)
-        logger.info("[ALGOLIA] Processed %d offers from page %d", len(offer_ids), page)
-        page += 1
+        last_id = offer_ids[-1]
+        current_app.redis_client.set(checkpoint_key, last_id)
+        logger.info("[ALGOLIA] Processed %d offers up to id %d", len(offer_ids), last_id)
+
+    current_app.redis_client.delete(checkpoint_key)
 
 
 def batch_indexing_venues_in_algolia_from_database(algolia_batch_size: int, max_venues: typing.Optional[int]) -> None:
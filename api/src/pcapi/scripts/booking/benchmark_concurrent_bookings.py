@@ -0,0 +1,122 @@
+"""Benchmark concurrent bookings of a single stock, with and without
+the ENABLE_LOW_CONTENTION_BOOKING feature flag.
+
+Each thread books the same stock for its own beneficiaries. The stock
+has fewer places than there are beneficiaries, so that the benchmark
+also checks that the stock is never overbooked. It creates users and
+offers, and must only be run against a local database:
+
+    flask benchmark_concurrent_bookings --threads 20 --bookings 400
+"""
+from concurrent.futures import ThreadPoolExecutor
+import dataclasses
+import time
+
+import click
+import flask
+
+from pcapi import settings
+from pcapi.core.bookings import api as bookings_api
+from pcapi.core.bookings.models import Booking
+from pcapi.core.bookings.models import BookingStatus
+import pcapi.core.offers.factories as offers_factories
+from pcapi.core.offers.models import Stock
+import pcapi.core.users.factories as users_factories
+from pcapi.core.users.models import User
+from pcapi.domain.client_exceptions import ClientError
+from pcapi.models import db
+from pcapi.models.api_errors import ApiErrors
+from pcapi.models.feature import Feature
+from pcapi.models.feature import FeatureToggle
+from pcapi.models.feature import invalidate_features_cache
+from pcapi.utils.blueprint import Blueprint
+
+
+blueprint = Blueprint(__name__, __name__)
+
+
+@dataclasses.dataclass
+class BenchmarkResult:
+    attempts: int
+    bookings: int
+    rejections: int
+    errors: int
+    elapsed: float
+
+
+@blueprint.cli.command("benchmark_concurrent_bookings")
+@click.option("--threads", type=int, default=20, help="Number of concurrent threads")
+@click.option("--bookings", type=int, default=400, help="Number of booking attempts (one per beneficiary)")
+def benchmark_concurrent_bookings(threads: int, bookings: int) -> None:
+    if not settings.IS_DEV:
+        raise click.ClickException("This benchmark creates data and must only be run locally")
+
+    user_ids = [user.id for user in users_factories.BeneficiaryGrant18Factory.create_batch(bookings)]
+    initial_state = FeatureToggle.ENABLE_LOW_CONTENTION_BOOKING.is_active()
+    try:
+        for low_contention in (False, True):
+            _set_low_contention_booking(low_contention)
+            # Each beneficiary can book each offer once: use a new stock
+            # for each run.
+            stock = offers_factories.EventStockFactory(price=0, quantity=bookings // 2)
+            stock_id, quantity = stock.id, stock.quantity
+            db.session.commit()
+
+            app = flask.current_app._get_current_object()  # pylint: disable=protected-access
+            result = book_concurrently(app, stock_id, user_ids, threads)
+            _check_stock_consistency(stock_id, quantity, result)
+            click.echo(
+                f"low_contention={low_contention}: {result.attempts} attempts, {result.bookings} bookings, "
+                f"{result.rejections} rejections, {result.errors} errors in {result.elapsed:.2f}s "
+                f"({result.attempts / result.elapsed:.1f} attempts/s)"
+            )
+    finally:
+        _set_low_contention_booking(initial_state)
+
+
+def book_concurrently(app: flask.Flask, stock_id: int, user_ids: list[int], thread_count: int) -> BenchmarkResult:
+    """Book the stock for each user, from ``thread_count`` threads."""
+    chunks = [user_ids[i::thread_count] for i in range(thread_count)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=thread_count) as executor:
+        results = list(executor.map(lambda chunk: _book_for_users(app, stock_id, chunk), chunks))
+    return BenchmarkResult(
+        attempts=len(user_ids),
+        bookings=sum(result[0] for result in results),
+        rejections=sum(result[1] for result in results),
+        errors=sum(result[2] for result in results),
+        elapsed=time.perf_counter() - start,
+    )
+
+
+def _book_for_users(app: flask.Flask, stock_id: int, user_ids: list[int]) -> tuple[int, int, int]:
+    bookings = rejections = errors = 0
+    with app.app_context():
+        for user_id in user_ids:
+            try:
+                bookings_api.book_offer(beneficiary=User.query.get(user_id), stock_id=stock_id, quantity=1)
+                bookings += 1
+            except (ClientError, ApiErrors):
+                rejections += 1
+            except Exception:  # pylint: disable=broad-except
+                errors += 1
+            finally:
+                db.session.rollback()
+        db.session.remove()
+    return bookings, rejections, errors
+
+
+def _check_stock_consistency(stock_id: int, quantity: int, result: BenchmarkResult) -> None:
+    booked_quantity = Stock.query.get(stock_id).dnBookedQuantity
+    booking_count = Booking.query.filter(Booking.stockId == stock_id, Booking.status != BookingStatus.CANCELLED).count()
+    if not booked_quantity == booking_count == result.bookings or booking_count > quantity:
+        raise click.ClickException(
+            f"Inconsistent stock: {booking_count} bookings for {quantity} places "
+            f"(dnBookedQuantity={booked_quantity}, successful calls={result.bookings})"
+        )
+
+
+def _set_low_contention_booking(is_active: bool) -> None:
+    Feature.query.filter_by(name=FeatureToggle.ENABLE_LOW_CONTENTION_BOOKING.name).update({"isActive": is_active})
+    db.session.commit()
+    invalidate_features_cache()
@@ -12,6 +12,7 @@ def install_commands(app: flask.Flask) -> None:
         "pcapi.scheduled_tasks.commands",
         "pcapi.scheduled_tasks.titelive_commands",
         "pcapi.scripts.algolia_indexing.commands",
+        "pcapi.scripts.booking.benchmark_concurrent_bookings",
         "pcapi.scripts.clean_database",
         "pcapi.scripts.external_users.commands",
         "pcapi.scripts.force_19yo_dms_import",
@@ -20,6 +21,8 @@ def install_commands(app: flask.Flask) -> None:
         "pcapi.scripts.install_data",
         "pcapi.scripts.offerer.commands",
         "pcapi.scripts.payment.add_custom_offer_reimbursement_rule",
+        "pcapi.scripts.payment.benchmark_reimbursement_rules",
+        "pcapi.scripts.payment.recompute_deposit_balances",
         "pcapi.scripts.provider.check_provider_api",
         "pcapi.scripts.sandbox",
         "pcapi.scripts.update_providables",
@@ -0,0 +1,83 @@
+"""Benchmark the lookup of reimbursement rules, with and without the
+precompiled index of regular rules and the cache of custom rules.
+
+It only reads custom rules from the database:
+
+    flask benchmark_reimbursement_rules --iterations 100
+"""
+import datetime
+from decimal import Decimal
+import time
+import types
+import typing
+
+import click
+
+from pcapi.core.categories import subcategories
+from pcapi.domain import reimbursement
+from pcapi.utils.blueprint import Blueprint
+
+
+blueprint = Blueprint(__name__, __name__)
+
+DATES = (
+    datetime.datetime(2021, 1, 1),
+    reimbursement.SEPTEMBER_2021,
+    datetime.datetime(2022, 1, 1),
+)
+REVENUES = tuple(Decimal(revenue) for revenue in (0, 20000, 30000, 40001, 150000, 10**6))
+
+
+@blueprint.cli.command("benchmark_reimbursement_rules")
+@click.option("--iterations", type=int, default=100, help="Number of iterations of each benchmark")
+def benchmark_reimbursement_rules(iterations: int) -> None:
+    bookings = [
+        _make_booking(choice.value, is_educational, date_used)
+        for choice in subcategories.ReimbursementRuleChoices
+        for is_educational in (False, True)
+        for date_used in DATES
+    ]
+    lookups = iterations * len(bookings) * len(REVENUES)
+
+    def without_index() -> None:
+        for booking in bookings:
+            for revenue in REVENUES:
+                _rules = [rule for rule in reimbursement.REGULAR_RULES if rule.matches(booking, revenue)]
+
+    def with_index() -> None:
+        for booking in bookings:
+            for revenue in REVENUES:
+                reimbursement.REGULAR_RULES_INDEX.get_rules(booking, revenue)
+
+    _report("regular rules, without index", _measure(without_index, iterations), lookups)
+    _report("regular rules, with index", _measure(with_index, iterations), lookups)
+
+    # Before the cache, all custom rules were loaded from the database
+    # each time a booking was priced.
+    reimbursement.get_custom_rule_finder()  # warm up the cache
+    _report(
+        "custom rules, loaded from the database",
+        _measure(reimbursement.CustomRuleFinder, iterations),
+        iterations,
+    )
+    _report("custom rules, cached", _measure(reimbursement.get_custom_rule_finder, iterations), iterations)
+
+
+def _make_booking(reimbursement_rule: str, is_educational: bool, date_used: datetime.datetime) -> typing.Any:
+    """Return an object that looks like a booking, as far as regular
+    rules are concerned.
+    """
+    subcategory = types.SimpleNamespace(reimbursement_rule=reimbursement_rule)
+    offer = types.SimpleNamespace(subcategory=subcategory, isEducational=is_educational)
+    return types.SimpleNamespace(stock=types.SimpleNamespace(offer=offer), dateUsed=date_used, total_amount=Decimal(10))
+
+
+def _measure(func: typing.Callable[[], typing.Any], iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return time.perf_counter() - start
+
+
+def _report(label: str, elapsed: float, count: int) -> None:
+    click.echo(f"{label}: {elapsed:.3f}s for {count} lookups ({elapsed / count * 1_000_000:.2f}µs per lookup)")
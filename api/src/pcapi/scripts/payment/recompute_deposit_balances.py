@@ -0,0 +1,35 @@
+import logging
+
+import click
+import sqlalchemy as sqla
+
+import pcapi.core.payments.api as payments_api
+import pcapi.core.payments.models as payments_models
+from pcapi.models import db
+from pcapi.utils.blueprint import Blueprint
+
+
+blueprint = Blueprint(__name__, __name__)
+logger = logging.getLogger(__name__)
+
+
+@blueprint.cli.command("recompute_deposit_balances")
+@click.option("--batch-size", type=int, default=1_000, help="Number of deposits to update in each transaction")
+@click.option("--start-id", type=int, default=0, help="Resume from this deposit id")
+def recompute_deposit_balances(batch_size: int, start_id: int) -> None:
+    """Recompute `bookedAmount` and `usedAmount` of all deposits: to
+    backfill them after they have been added, or if
+    `check_deposit_balance_consistency` finds discrepancies.
+    """
+    max_id = db.session.query(sqla.func.max(payments_models.Deposit.id)).scalar() or 0
+    for batch_start in range(start_id, max_id + 1, batch_size):
+        deposit_ids = [
+            deposit_id
+            for deposit_id, in payments_models.Deposit.query.filter(
+                payments_models.Deposit.id.between(batch_start, batch_start + batch_size - 1)
+            ).with_entities(payments_models.Deposit.id)
+        ]
+        if deposit_ids:
+            payments_api.recompute_deposit_balances(deposit_ids)
+            db.session.commit()
+        logger.info("Recomputed deposit balances", extra={"last_deposit_id": batch_start + batch_size - 1})
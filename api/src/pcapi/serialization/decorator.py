@@ -1,8 +1,11 @@
 from copy import deepcopy
+from dataclasses import dataclass
 from functools import wraps
+import hashlib
 import logging
 from typing import Any
 from typing import Callable
+from typing import Hashable
 from typing import Iterable
 from typing import Optional
 from typing import Type
@@ -56,6 +59,22 @@ def _make_string_response(content: Optional[BaseModel], status_code: int, header
     return response
 
 
+@dataclass(frozen=True)
+class _CachedResponse:
+    content: bytes
+    mimetype: str
+    etag: str
+
+
+def _make_cached_response(cached: _CachedResponse, status_code: int, headers: dict, cache_control: str) -> Response:
+    response = make_response(cached.content, status_code, headers)
+    response.mimetype = cached.mimetype
+    response.set_etag(cached.etag)
+    response.headers["Cache-Control"] = cache_control
+    # Return a "304 Not Modified" if the client sent a matching `If-None-Match`.
+    return response.make_conditional(request)
+
+
 def spectree_serialize(
     headers: Type[BaseModel] = None,
     cookies: Type[BaseModel] = None,
@@ -72,6 +91,8 @@ def spectree_serialize(
     json_format: bool = True,
     response_headers: Optional[dict[str, str]] = None,
     resp: Optional[SpectreeResponse] = None,
+    cache_max_age: Optional[int] = None,
+    cache_key: Optional[Callable[[], Hashable]] = None,
 ) -> Callable[[Any], Any]:
     """A decorator that serialize/deserialize and validate input/output
 
@@ -89,6 +110,14 @@ def spectree_serialize(
         json_format: JSON format response if true, else text format response. Defaults to True.
         response_headers: a dict of headers to be added to the response. defaults to {}.
         resp: a Spectree.Response explicitely listing the possible responses.
+        cache_max_age: if set, the serialized response is computed once
+            and kept in memory, then served with an ETag and a
+            ``Cache-Control`` header with this max age (in seconds).
+            Only use it for responses that do not depend on the
+            request or on the user.
+        cache_key: a function that returns a key that identifies the
+            cached response, for responses that depend on something
+            else than the path (feature flags, for example).
 
     Returns:
         Callable[[Any], Any]: [description]
@@ -155,6 +184,9 @@ def spectree_serialize(
                     raise ApiErrors(error_dict)
 
             result = route(*args, **kwargs)
+            if isinstance(result, Response):
+                # Already serialized by the route (from a cache, for example).
+                return result
             if json_format:
                 return _make_json_response(
                     content=result,
@@ -166,6 +198,37 @@ def spectree_serialize(
 
             return _make_string_response(content=result, status_code=on_success_status, headers=response_headers)
 
-        return sync_validate
+        if cache_max_age is None:
+            return sync_validate
+
+        if body_in_kwargs or query_in_kwargs or form_in_kwargs or headers or cookies:
+            raise ValueError("Cannot cache the response of a route that validates its input")
+
+        cache: dict[Hashable, _CachedResponse] = {}
+        cache_control = f"{'private' if security else 'public'}, max-age={cache_max_age}"
+
+        # This wrapper is outside the spectree validation, so that
+        # cached responses are served without being validated again.
+        @wraps(sync_validate)
+        def serve_cached_response(*args: Any, **kwargs: Any) -> Response:
+            key = (cache_key() if cache_key else None, tuple(sorted(kwargs.items())))
+            cached = cache.get(key)
+            if cached is None:
+                response = sync_validate(*args, **kwargs)
+                if response.status_code != on_success_status:
+                    return response
+                content = response.get_data()
+                cached = _CachedResponse(
+                    content=content,
+                    mimetype=response.mimetype,
+                    etag=hashlib.sha256(content).hexdigest()[:32],
+                )
+                cache[key] = cached
+            elif security:
+                # The route is still called to authenticate the user.
+                route(*args, **kwargs)
+            return _make_cached_response(cached, on_success_status, response_headers, cache_control)
+
+        return serve_cached_response
 
     return decorate_validation
@@ -115,6 +115,24 @@ REDIS_VENUE_IDS_FOR_OFFERS_CHUNK_SIZE = int(os.environ.get("REDIS_VENUE_IDS_FOR_
 REDIS_VENUE_IDS_CHUNK_SIZE = int(os.environ.get("REDIS_VENUE_IDS_CHUNK_SIZE", 1000))
 
 
+# FEATURE FLAGS
+# Number of seconds during which feature flags are read from a
+# process-wide snapshot without checking whether they have changed.
+# Tests modify feature flags in transactions that are rolled back, the
+# snapshot is hence disabled.
+FEATURES_CACHE_TTL = int(os.environ.get("FEATURES_CACHE_TTL", 0 if IS_RUNNING_TESTS else 10))
+# Number of seconds after which the snapshot is reloaded from the
+# database, even if feature flags do not seem to have changed.
+FEATURES_CACHE_MAX_AGE = int(os.environ.get("FEATURES_CACHE_MAX_AGE", 300))
+
+
+# NATIVE APP CACHE
+# Maximum number of seconds during which offers returned by the native
+# API are cached in Redis. Tests modify offers without reindexing them,
+# the cache is hence disabled.
+NATIVE_OFFER_CACHE_TTL = int(os.environ.get("NATIVE_OFFER_CACHE_TTL", 0 if IS_RUNNING_TESTS else 300))
+
+
 # SENTRY
 SENTRY_DSN = os.environ.get("SENTRY_DSN", "")
 SENTRY_SAMPLE_RATE = float(os.environ.get("SENTRY_SAMPLE_RATE", 0))
@@ -246,6 +264,16 @@ STAGING_TEST_USER_PASSWORD = os.environ.get("STAGING_TEST_USER_PASSWORD", "TestP
 
 # PROVIDERS
 ALLOCINE_API_KEY = os.environ.get("ALLOCINE_API_KEY")
+# Venue providers are synchronized concurrently, in threads that each
+# use their own database session. Tests run in a single database
+# transaction, synchronizations are hence run sequentially.
+PROVIDER_SYNC_MAX_WORKERS = int(os.environ.get("PROVIDER_SYNC_MAX_WORKERS", 1 if IS_RUNNING_TESTS else 16))
+# Maximum number of venues of the same provider that are synchronized
+# at the same time, so that the API of the provider is not flooded.
+PROVIDER_SYNC_MAX_WORKERS_PER_PROVIDER = int(os.environ.get("PROVIDER_SYNC_MAX_WORKERS_PER_PROVIDER", 4))
+# Number of seconds after which the synchronization of a venue is
+# interrupted. It is resumed during the next synchronization.
+PROVIDER_SYNC_VENUE_TIMEOUT = int(os.environ.get("PROVIDER_SYNC_VENUE_TIMEOUT", 15 * 60))
 
 
 # DEMARCHES SIMPLIFIEES
@@ -304,6 +332,7 @@ GCP_BATCH_CUSTOM_DATA_ANDROID_QUEUE_NAME = os.environ.get("GCP_BATCH_CUSTOM_DATA
 GCP_BATCH_CUSTOM_DATA_IOS_QUEUE_NAME = os.environ.get("GCP_BATCH_CUSTOM_DATA_IOS_QUEUE_NAME")
 GCP_UBBLE_ARCHIVE_ID_PICTURES_QUEUE_NAME = os.environ.get("GCP_UBBLE_ARCHIVE_ID_PICTURES_QUEUE_NAME")
 GCP_ZENDESK_ATTRIBUTES_QUEUE_NAME = os.environ.get("GCP_ZENDESK_ATTRIBUTES_QUEUE_NAME")
+GCP_BOOKINGS_EXPORT_QUEUE_NAME = os.environ.get("GCP_BOOKINGS_EXPORT_QUEUE_NAME")
 
 GCP_BATCH_NOTIFICATION_QUEUE_NAME = os.environ.get("GCP_BATCH_NOTIFICATION_QUEUE_NAME", "")
 
@@ -386,3 +415,16 @@ OUTSCALE_ENDPOINT_URL = os.environ.get("OUTSCALE_ENDPOINT_URL", "https://oos.clo
 ZENDESK_API_URL = os.environ.get("ZENDESK_API_URL")
 ZENDESK_API_EMAIL = os.environ.get("ZENDESK_API_EMAIL")
 ZENDESK_API_TOKEN = os.environ.get("ZENDESK_API_TOKEN")
+
+# FINANCE
+FINANCE_FILES_COMPRESSION_LEVEL = int(os.environ.get("FINANCE_FILES_COMPRESSION_LEVEL", 9))
+# Tests share a single database connection, files cannot be generated
+# concurrently (in multiple threads).
+FINANCE_FILES_GENERATION_WORKERS = int(os.environ.get("FINANCE_FILES_GENERATION_WORKERS", 1 if IS_RUNNING_TESTS else 3))
+# Invoice PDF files are rendered in worker processes. In tests, they
+# are rendered in the current process so that the object storage
+# testing backend (and mocks) can be used.
+INVOICE_PDF_GENERATION_WORKERS = int(
+    os.environ.get("INVOICE_PDF_GENERATION_WORKERS", 1 if IS_RUNNING_TESTS else os.cpu_count() or 1)
+)
+INVOICE_PDF_GENERATION_MAX_ATTEMPTS = int(os.environ.get("INVOICE_PDF_GENERATION_MAX_ATTEMPTS", 3))
@@ -0,0 +1,43 @@
+from datetime import date
+from datetime import datetime
+import logging
+from typing import Optional
+
+from pcapi import settings
+import pcapi.core.bookings.api as bookings_api
+from pcapi.core.bookings.models import BookingStatusFilter
+from pcapi.core.users.models import User
+from pcapi.routes.serialization import BaseModel
+from pcapi.routes.serialization.bookings_recap_serialize import OfferType
+from pcapi.tasks.decorator import task
+
+
+logger = logging.getLogger(__name__)
+
+BOOKINGS_EXPORT_QUEUE_NAME = settings.GCP_BOOKINGS_EXPORT_QUEUE_NAME
+
+
+class ExportBookingsCsvRequest(BaseModel):
+    user_id: int
+    booking_period_beginning_date: Optional[date]
+    booking_period_ending_date: Optional[date]
+    status_filter: Optional[BookingStatusFilter]
+    event_date: Optional[datetime]
+    venue_id: Optional[int]
+    offer_type: Optional[OfferType]
+
+
+@task(BOOKINGS_EXPORT_QUEUE_NAME, "/bookings/export_csv")  # type: ignore [arg-type]
+def export_bookings_csv_task(payload: ExportBookingsCsvRequest) -> None:
+    user = User.query.get(payload.user_id)
+    booking_period = None
+    if payload.booking_period_beginning_date and payload.booking_period_ending_date:
+        booking_period = (payload.booking_period_beginning_date, payload.booking_period_ending_date)
+    bookings_api.export_csv_report(
+        user,
+        booking_period=booking_period,
+        status_filter=payload.status_filter,
+        event_date=payload.event_date,
+        venue_id=payload.venue_id,
+        offer_type=payload.offer_type,
+    )
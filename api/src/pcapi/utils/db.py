@@ -1,4 +1,6 @@
+import contextlib
 import enum
+import threading
 import typing
 
 import sqlalchemy as sqla
@@ -33,6 +35,53 @@ def get_batches(query, key, batch_size):  # type: ignore [no-untyped-def]
         yield query.filter(key.between(start, end))
 
 
+_query_counters = threading.local()
+_query_counters_listener_lock = threading.Lock()
+_query_counters_listener_registered = False
+
+
+class QueryCounter:
+    def __init__(self) -> None:
+        self.count = 0
+
+
+def _count_query(*args, **kwargs) -> None:  # type: ignore [no-untyped-def]
+    for counter in getattr(_query_counters, "stack", ()):
+        counter.count += 1
+
+
+def _register_query_counters_listener() -> None:
+    global _query_counters_listener_registered  # pylint: disable=global-statement
+    with _query_counters_listener_lock:
+        if not _query_counters_listener_registered:
+            sqla.event.listen(sqla.engine.Engine, "after_cursor_execute", _count_query)
+            _query_counters_listener_registered = True
+
+
+@contextlib.contextmanager
+def count_queries() -> typing.Generator[QueryCounter, None, None]:
+    """A context manager that counts SQL queries executed within the
+    block, in the current thread only. Unlike
+    ``pcapi.core.testing.assert_num_queries``, it is meant to be used
+    in production code to report metrics.
+
+    Usage::
+
+        with count_queries() as counter:
+            do_something()
+        logger.info("Did something", extra={"queries": counter.count})
+    """
+    _register_query_counters_listener()
+    counter = QueryCounter()
+    if not hasattr(_query_counters, "stack"):
+        _query_counters.stack = []
+    _query_counters.stack.append(counter)
+    try:
+        yield counter
+    finally:
+        _query_counters.stack.remove(counter)
+
+
 class MagicEnum(sqla_types.TypeDecorator):
     """A column type that stores an instance of a Python Enum object as a
     string or integer (depending on the type of the enum).
@@ -17,6 +17,7 @@ from pcapi.core.bookings import models
 from pcapi.core.bookings.models import Booking
 from pcapi.core.bookings.models import BookingCancellationReasons
 from pcapi.core.bookings.models import BookingStatus
+import pcapi.core.bookings.repository as booking_repository
 from pcapi.core.categories import subcategories
 import pcapi.core.educational.factories as educational_factories
 from pcapi.core.educational.models import CollectiveBooking
@@ -26,15 +27,19 @@ import pcapi.core.finance.factories as finance_factories
 import pcapi.core.finance.models as finance_models
 import pcapi.core.mails.testing as mails_testing
 from pcapi.core.mails.transactional.sendinblue_template_ids import TransactionalEmail
+import pcapi.core.offerers.factories as offerers_factories
+from pcapi.core.offers import exceptions as offers_exceptions
 import pcapi.core.offers.factories as offers_factories
 import pcapi.core.offers.models as offers_models
 from pcapi.core.testing import assert_num_queries
 from pcapi.core.testing import override_features
+from pcapi.core.users import utils as users_utils
 from pcapi.core.users.external.batch import BATCH_DATETIME_FORMAT
 import pcapi.core.users.factories as users_factories
 from pcapi.models import api_errors
 from pcapi.models import db
 import pcapi.notifications.push.testing as push_testing
+from pcapi.scripts.booking import benchmark_concurrent_bookings
 
 from tests.conftest import clean_database
 
@@ -114,6 +119,41 @@ class BookOfferConcurrencyTest:
         assert models.Booking.query.filter().count() == 4
         assert models.Booking.query.filter(models.Booking.status == BookingStatus.CANCELLED).count() == 1
 
+    @clean_database
+    def test_create_booking_with_low_contention(self, app):
+        beneficiary = users_factories.BeneficiaryGrant18Factory()
+        stock = offers_factories.StockFactory(price=10, dnBookedQuantity=5)
+
+        # open a second connection on purpose and lock the stock
+        engine = create_engine(app.config["SQLALCHEMY_DATABASE_URI"])
+        with override_features(ENABLE_LOW_CONTENTION_BOOKING=True):
+            with engine.connect() as connection:
+                connection.execute(
+                    text("""SELECT * FROM stock WHERE stock.id = :stock_id FOR UPDATE"""), stock_id=stock.id
+                )
+
+                with pytest.raises(sqlalchemy.exc.OperationalError):
+                    api.book_offer(beneficiary=beneficiary, stock_id=stock.id, quantity=1)
+
+        assert models.Booking.query.count() == 0
+        assert offers_models.Stock.query.filter_by(id=stock.id, dnBookedQuantity=5).count() == 1
+
+    @clean_database
+    def test_concurrent_bookings_with_low_contention(self, app):
+        stock = offers_factories.EventStockFactory(price=0, quantity=5)
+        stock_id = stock.id
+        user_ids = [user.id for user in users_factories.BeneficiaryGrant18Factory.create_batch(12)]
+
+        with override_features(ENABLE_LOW_CONTENTION_BOOKING=True):
+            db.session.commit()  # make the feature flag visible to other threads
+            result = benchmark_concurrent_bookings.book_concurrently(app, stock_id, user_ids, thread_count=4)
+
+        assert result.bookings == 5
+        assert result.rejections == 7
+        assert result.errors == 0
+        assert models.Booking.query.filter_by(stockId=stock_id).count() == 5
+        assert offers_models.Stock.query.get(stock_id).dnBookedQuantity == 5
+
 
 @pytest.mark.usefixtures("db_session")
 class BookOfferTest:
@@ -387,6 +427,62 @@ class BookOfferTest:
             }
 
 
+@pytest.mark.usefixtures("db_session")
+class LowContentionBookOfferTest:
+    @override_features(ENABLE_LOW_CONTENTION_BOOKING=True)
+    def test_create_booking(self):
+        beneficiary = users_factories.BeneficiaryGrant18Factory()
+        stock = offers_factories.StockFactory(price=10, quantity=10, dnBookedQuantity=5)
+
+        booking = api.book_offer(beneficiary=beneficiary, stock_id=stock.id, quantity=1)
+
+        assert booking.individualBooking.userId == beneficiary.id
+        assert booking.individualBooking.depositId == beneficiary.deposit.id
+        assert booking.amount == 10
+        assert booking.stock == stock
+        assert booking.status is BookingStatus.CONFIRMED
+        assert stock.dnBookedQuantity == 6
+        assert len(mails_testing.outbox) == 2
+
+    @override_features(ENABLE_LOW_CONTENTION_BOOKING=True)
+    def test_raise_if_no_more_stock(self):
+        booking = booking_factories.IndividualBookingFactory(stock__quantity=1)
+        with pytest.raises(exceptions.StockIsNotBookable):
+            api.book_offer(
+                beneficiary=users_factories.BeneficiaryGrant18Factory(),
+                stock_id=booking.stock.id,
+                quantity=1,
+            )
+
+    @override_features(ENABLE_LOW_CONTENTION_BOOKING=True)
+    def test_raise_if_user_has_already_booked(self):
+        booking = booking_factories.IndividualBookingFactory()
+        with pytest.raises(exceptions.OfferIsAlreadyBooked):
+            api.book_offer(
+                beneficiary=booking.individualBooking.user,
+                stock_id=booking.stock.id,
+                quantity=1,
+            )
+
+    @override_features(ENABLE_LOW_CONTENTION_BOOKING=True)
+    def test_raise_if_stock_does_not_exist(self):
+        with pytest.raises(offers_exceptions.StockDoesNotExist):
+            api.book_offer(beneficiary=users_factories.BeneficiaryGrant18Factory(), stock_id=0, quantity=1)
+
+    @override_features(ENABLE_LOW_CONTENTION_BOOKING=True)
+    def test_book_offer_with_activation_code(self):
+        beneficiary = users_factories.BeneficiaryGrant18Factory()
+        stock = offers_factories.StockWithActivationCodesFactory(
+            activationCodes=["code-vgya451afvyux", "code-bha45k15fuz"]
+        )
+        stock.activationCodes[0].booking = booking_factories.UsedIndividualBookingFactory()
+
+        booking = api.book_offer(beneficiary=beneficiary, stock_id=stock.id, quantity=1)
+
+        assert booking.activationCode.code == "code-bha45k15fuz"
+        assert booking.status is BookingStatus.USED
+
+
 @pytest.mark.usefixtures("db_session")
 class CancelByBeneficiaryTest:
     def test_cancel_booking(self):
@@ -927,3 +1023,74 @@ class AutoMarkAsUsedAfterEventTest:
     def test_raise_if_feature_flag_is_deactivated(self):
         with pytest.raises(ValueError):
             api.auto_mark_as_used_after_event()
+
+
+@pytest.mark.usefixtures("db_session")
+class ExportCsvReportTest:
+    @mock.patch("pcapi.core.users.utils.store_object_from_file")
+    def test_store_report_and_send_email(self, mocked_store_object_from_file):
+        stored = {}
+        mocked_store_object_from_file.side_effect = lambda bucket, object_id, fp, content_type: stored.update(
+            bucket=bucket, object_id=object_id, content=fp.read()
+        )
+        booking = booking_factories.IndividualBookingFactory()
+        pro = users_factories.ProFactory()
+        offerers_factories.UserOffererFactory(user=pro, offerer=booking.offerer)
+        period = (booking.dateCreated.date() - timedelta(days=1), booking.dateCreated.date() + timedelta(days=1))
+
+        url = api.export_csv_report(pro, booking_period=period)
+
+        assert stored["bucket"] == "bookings_exports"
+        assert stored["object_id"].startswith(f"{pro.id}/")
+        report = stored["content"].decode("utf-8-sig")
+        assert report == booking_repository.get_csv_report(user=pro, booking_period=period)
+        assert booking.token in report
+        assert "/bookings/csv/exports/" in url
+        assert len(mails_testing.outbox) == 1
+        assert mails_testing.outbox[0].sent_data["To"] == pro.email
+        assert (
+            mails_testing.outbox[0].sent_data["template"]
+            == TransactionalEmail.BOOKINGS_CSV_EXPORT_TO_PRO.value.__dict__
+        )
+        assert mails_testing.outbox[0].sent_data["params"]["EXPORT_LINK"] == url
+
+
+@pytest.mark.usefixtures("db_session")
+class GetExportedCsvReportTest:
+    def _get_token(self, user, object_id="1/report.csv", expiration_date=None):
+        return users_utils.encode_jwt_payload(
+            {"user_id": user.id, "object_id": object_id},
+            expiration_date or datetime.utcnow() + timedelta(days=1),
+        )
+
+    @mock.patch("pcapi.core.bookings.api.BOOKINGS_EXPORT_DOWNLOAD_CHUNK_SIZE", 4)
+    @mock.patch("pcapi.core.users.utils.get_object")
+    def test_get_report_by_chunks(self, mocked_get_object):
+        content = b"header;row"
+        blob = mock.Mock(size=len(content))
+        blob.download_as_bytes.side_effect = lambda start, end: content[start : end + 1]
+        mocked_get_object.return_value = blob
+        pro = users_factories.ProFactory()
+
+        chunks = list(api.get_exported_csv_report(pro, self._get_token(pro)))
+
+        mocked_get_object.assert_called_once_with("bookings_exports/1/report.csv")
+        assert chunks == [b"head", b"er;r", b"ow"]
+
+    @mock.patch("pcapi.core.users.utils.get_object")
+    def test_expired_link(self, mocked_get_object):
+        pro = users_factories.ProFactory()
+        token = self._get_token(pro, expiration_date=datetime.utcnow() - timedelta(minutes=1))
+
+        with pytest.raises(exceptions.InvalidBookingsExportLink):
+            api.get_exported_csv_report(pro, token)
+        mocked_get_object.assert_not_called()
+
+    @mock.patch("pcapi.core.users.utils.get_object")
+    def test_link_of_another_user(self, mocked_get_object):
+        pro = users_factories.ProFactory()
+        other_pro = users_factories.ProFactory()
+
+        with pytest.raises(exceptions.InvalidBookingsExportLink):
+            api.get_exported_csv_report(other_pro, self._get_token(pro))
+        mocked_get_object.assert_not_called()
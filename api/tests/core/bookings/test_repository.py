@@ -4,12 +4,14 @@ from datetime import datetime
 from datetime import time
 from datetime import timedelta
 from io import StringIO
+from unittest import mock
 
 from dateutil import tz
 from dateutil.relativedelta import relativedelta
 from freezegun import freeze_time
 import pytest
 from pytest import fixture
+import redis
 
 import pcapi.core.bookings.factories as bookings_factories
 from pcapi.core.bookings.factories import EducationalBookingFactory
@@ -1017,6 +1019,75 @@ class FindByProUserTest:
         assert educational_resulting_booking_recap.booking_is_educational == True
         assert len(all_bookings_recap_paginated.bookings_recap) == 2
 
+    def test_paginate_with_cursor(self):
+        pro = users_factories.ProFactory()
+        offerer = offers_factories.OffererFactory()
+        offerers_factories.UserOffererFactory(user=pro, offerer=offerer)
+        stock = offers_factories.ThingStockFactory(offer__venue__managingOfferer=offerer)
+        booking_date = datetime(2020, 1, 1, 10, 0, 0)
+        bookings_factories.IndividualBookingFactory(stock=stock, dateCreated=booking_date, token="AAAAAA")
+        bookings_factories.IndividualBookingFactory(stock=stock, dateCreated=booking_date, token="BBBBBB", quantity=2)
+        bookings_factories.IndividualBookingFactory(
+            stock=stock, dateCreated=booking_date - timedelta(days=1), token="CCCCCC"
+        )
+        period = (booking_date.date() - timedelta(days=10), booking_date.date() + timedelta(days=10))
+        all_rows = booking_repository.find_by_pro_user(user=pro, booking_period=period)
+        assert [b.booking_token for b in all_rows.bookings_recap] == ["BBBBBB", "BBBBBB", "AAAAAA", "CCCCCC"]
+        assert all_rows.next_cursor is None
+
+        tokens = []
+        cursor = None
+        for _ in range(4):
+            page = booking_repository.find_by_pro_user(user=pro, booking_period=period, per_page_limit=1, cursor=cursor)
+            tokens.extend(b.booking_token for b in page.bookings_recap)
+            cursor = page.next_cursor
+        assert tokens == ["BBBBBB", "BBBBBB", "AAAAAA", "CCCCCC"]
+        assert cursor is None  # the last page is full, but there is no next page
+        assert page.total == 4
+        assert page.pages == 4
+
+        first_page = booking_repository.find_by_pro_user(user=pro, booking_period=period, per_page_limit=2)
+        last_page = booking_repository.find_by_pro_user(
+            user=pro, booking_period=period, per_page_limit=2, cursor=first_page.next_cursor
+        )
+        assert [b.booking_token for b in last_page.bookings_recap] == ["AAAAAA", "CCCCCC"]
+        assert last_page.next_cursor is None
+
+    def test_count_is_cached(self):
+        pro = users_factories.ProFactory()
+        offerer = offers_factories.OffererFactory()
+        offerers_factories.UserOffererFactory(user=pro, offerer=offerer)
+        stock = offers_factories.ThingStockFactory(offer__venue__managingOfferer=offerer)
+        booking_date = datetime(2020, 1, 1, 10, 0, 0)
+        bookings_factories.IndividualBookingFactory(stock=stock, dateCreated=booking_date)
+        period = (booking_date.date() - timedelta(days=10), booking_date.date() + timedelta(days=10))
+        assert booking_repository.find_by_pro_user(user=pro, booking_period=period).total == 1
+
+        bookings_factories.IndividualBookingFactory(stock=stock, dateCreated=booking_date)
+        with assert_num_queries(1):  # no count
+            page = booking_repository.find_by_pro_user(user=pro, booking_period=period)
+        assert page.total == 1  # cached
+        assert len(page.bookings_recap) == 2
+
+        other_period = (period[0], period[1] + timedelta(days=1))
+        assert booking_repository.find_by_pro_user(user=pro, booking_period=other_period).total == 2
+
+    def test_count_without_redis(self, app):
+        pro = users_factories.ProFactory()
+        offerer = offers_factories.OffererFactory()
+        offerers_factories.UserOffererFactory(user=pro, offerer=offerer)
+        stock = offers_factories.ThingStockFactory(offer__venue__managingOfferer=offerer)
+        booking_date = datetime(2020, 1, 1, 10, 0, 0)
+        bookings_factories.IndividualBookingFactory(stock=stock, dateCreated=booking_date)
+        period = (booking_date.date() - timedelta(days=10), booking_date.date() + timedelta(days=10))
+
+        with mock.patch.object(app.redis_client, "get", side_effect=redis.exceptions.ConnectionError):
+            with mock.patch.object(app.redis_client, "set", side_effect=redis.exceptions.ConnectionError):
+                page = booking_repository.find_by_pro_user(user=pro, booking_period=period)
+
+        assert page.total == 1
+        assert len(page.bookings_recap) == 1
+
 
 class GetCsvReportTest:
     def test_should_return_only_expected_booking_attributes(self, app: fixture):
@@ -2251,6 +2322,30 @@ class GetCsvReportTest:
             ]
 
 
+class StreamCsvReportTest:
+    def test_stream_by_chunks(self):
+        pro = users_factories.ProFactory()
+        offerer = offers_factories.OffererFactory()
+        offerers_factories.UserOffererFactory(user=pro, offerer=offerer)
+        venue = offers_factories.VenueFactory(managingOfferer=offerer, postalCode="97300", departementCode="973")
+        stock = offers_factories.EventStockFactory(offer__venue=venue, beginningDatetime=datetime(2020, 3, 1, 20, 0))
+        bookings_factories.UsedIndividualBookingFactory.create_batch(3, stock=stock, dateCreated=datetime(2020, 1, 1))
+        period = (date(2019, 1, 1), date(2021, 1, 1))
+
+        with mock.patch("pcapi.core.bookings.repository.CSV_REPORT_CHUNK_SIZE", 2):
+            chunks = list(booking_repository.stream_csv_report(user=pro, booking_period=period))
+
+        assert len(chunks) == 3  # BOM, header and 2 rows, last row
+        report = b"".join(chunks).decode("utf-8-sig")
+        assert report == booking_repository.get_csv_report(user=pro, booking_period=period)
+        headers, *data = csv.reader(StringIO(report), delimiter=";")
+        assert len(data) == 3
+        data_dict = dict(zip(headers, data[0]))
+        # Guyane, UTC-3
+        assert data_dict["Date de l'évènement"] == "2020-03-01 17:00:00-03:00"
+        assert data_dict["Date et heure de réservation"] == "2019-12-31 21:00:00-03:00"
+
+
 class FindSoonToBeExpiredBookingsTest:
     def test_should_return_only_soon_to_be_expired_individual_bookings(self, app: fixture):
         # Given
@@ -1,3 +1,4 @@
+import concurrent.futures
 import csv
 import datetime
 from decimal import Decimal
@@ -205,9 +206,11 @@ class PriceBookingTest:
         queries += 1  # fetch booking again with multiple joinedload
         queries += 1  # select existing Pricing (if any)
         queries += 1  # select dependent pricings
-        queries += 1  # select latest pricing (to get revenue)
+        queries += 1  # select revenue from ledger
+        queries += 2  # compute revenue and insert it in ledger (no ledger entry yet)
         queries += 1  # select all CustomReimbursementRule
         queries += 3  # insert 1 Pricing + 2 PricingLine
+        queries += 1  # update revenue ledger
         queries += 1  # commit
         with assert_num_queries(queries):
             api.price_booking(booking)
@@ -304,6 +307,71 @@ class GetSiretAndCurrentRevenueTest:
         assert current_revenue == 3000
 
 
+class SiretRevenueLedgerTest:
+    def test_ledger_is_initialized_and_updated_on_pricing(self):
+        venue = offerers_factories.VenueFactory()
+        factories.PricingFactory(booking__stock__offer__venue=venue, booking__amount=10)
+        booking1 = bookings_factories.UsedIndividualBookingFactory(stock__offer__venue=venue, amount=20)
+        booking2 = bookings_factories.UsedIndividualBookingFactory(stock__offer__venue=venue, amount=40)
+
+        api.price_booking(booking1)
+        entry = models.SiretRevenue.query.one()
+        assert entry.siret == venue.siret
+        assert entry.year == api._get_revenue_year(booking1.dateUsed)
+        assert entry.revenue == 3000
+
+        pricing2 = api.price_booking(booking2)
+        assert pricing2.revenue == 7000
+        assert models.SiretRevenue.query.one().revenue == 7000
+        assert api.check_siret_revenues() == []
+
+    def test_ledger_is_updated_on_cancellation(self):
+        booking1 = bookings_factories.UsedIndividualBookingFactory(
+            amount=10,
+            stock=offers_factories.ThingStockFactory(),
+        )
+        booking2 = bookings_factories.UsedIndividualBookingFactory(
+            stock=offers_factories.ThingStockFactory(offer__venue=booking1.venue),
+            amount=20,
+            dateUsed=booking1.dateUsed + datetime.timedelta(seconds=1),
+        )
+        api.price_booking(booking1)
+        api.price_booking(booking2)
+        assert models.SiretRevenue.query.one().revenue == 3000
+
+        # Cancelling the first pricing deletes the second one.
+        api.cancel_pricing(booking1, models.PricingLogReason.MARK_AS_UNUSED)
+        assert models.SiretRevenue.query.one().revenue == 0
+        assert api.check_siret_revenues() == []
+
+    def test_ledger_is_updated_on_deletion_of_dependent_pricings(self):
+        booking1 = bookings_factories.UsedIndividualBookingFactory(
+            amount=10,
+            stock=offers_factories.ThingStockFactory(),
+        )
+        api.price_booking(booking1)
+        booking2 = bookings_factories.UsedIndividualBookingFactory(
+            stock=offers_factories.ThingStockFactory(offer__venue=booking1.venue),
+            amount=20,
+            dateUsed=booking1.dateUsed - datetime.timedelta(seconds=1),
+        )
+
+        api.price_booking(booking2)
+
+        # Pricing of `booking1` has been deleted.
+        assert models.SiretRevenue.query.one().revenue == 2000
+        assert api.check_siret_revenues() == []
+
+    def test_check_siret_revenues_reports_discrepancies(self):
+        pricing = factories.PricingFactory(booking__amount=10)
+        year = api._get_revenue_year(pricing.valueDate)
+        entry = factories.SiretRevenueFactory(siret=pricing.siret, year=year, revenue=500)
+
+        discrepancies = api.check_siret_revenues(year)
+
+        assert discrepancies == [{"siret": entry.siret, "year": year, "ledger": 500, "expected": 1000}]
+
+
 class CancelPricingTest:
     def test_basics(self):
         pricing = factories.PricingFactory()
@@ -441,6 +509,96 @@ class PriceBookingsTest:
         assert ordered_bookings == [booking1, booking4, booking3, booking2]
 
 
+class PriceBookingsByBusinessUnitTest:
+    few_minutes_ago = datetime.datetime.utcnow() - datetime.timedelta(minutes=5)
+
+    def test_basics(self):
+        booking = bookings_factories.UsedIndividualBookingFactory(
+            dateUsed=self.few_minutes_ago,
+            amount=10,
+            stock=offers_factories.ThingStockFactory(),
+        )
+        api.price_bookings_by_business_unit(min_date=self.few_minutes_ago)
+
+        assert len(booking.pricings) == 1
+        pricing = booking.pricings[0]
+        assert pricing.status == models.PricingStatus.VALIDATED
+        assert pricing.amount == -1000
+        assert pricing.revenue == 1000
+        assert pricing.standardRule == "Remboursement total pour les offres physiques"
+        assert {(line.category, line.amount) for line in pricing.lines} == {
+            (models.PricingLineCategory.OFFERER_REVENUE, -1000),
+            (models.PricingLineCategory.OFFERER_CONTRIBUTION, 0),
+        }
+
+    def test_accrue_revenue_within_chunk(self):
+        booking1 = bookings_factories.UsedIndividualBookingFactory(
+            dateUsed=self.few_minutes_ago - datetime.timedelta(minutes=2),
+            amount=10,
+        )
+        venue = booking1.venue
+        booking2 = bookings_factories.UsedIndividualBookingFactory(
+            dateUsed=self.few_minutes_ago - datetime.timedelta(minutes=1),
+            amount=20,
+            stock__offer__venue=venue,
+        )
+
+        api.price_bookings_by_business_unit(min_date=self.few_minutes_ago - datetime.timedelta(minutes=2))
+
+        assert booking1.pricings[0].revenue == 1000
+        assert booking2.pricings[0].revenue == 3000
+
+    def test_same_result_as_price_bookings(self):
+        venue = offerers_factories.VenueFactory()
+        dates_used = [self.few_minutes_ago - datetime.timedelta(minutes=i) for i in range(5)]
+        for date_used in dates_used:
+            bookings_factories.UsedBookingFactory(dateUsed=date_used, stock__offer__venue=venue)
+
+        def get_pricings():
+            pricings = models.Pricing.query.order_by(models.Pricing.id)
+            return [(p.bookingId, p.amount, p.revenue, p.standardRule) for p in pricings]
+
+        api.price_bookings(min_date=min(dates_used))
+        expected = get_pricings()
+        models.PricingLine.query.delete()
+        models.Pricing.query.delete()
+
+        api.price_bookings_by_business_unit(min_date=min(dates_used), chunk_size=2)
+        assert get_pricings() == expected
+
+    def test_num_queries(self):
+        venue = offerers_factories.VenueFactory()
+        for _ in range(3):
+            bookings_factories.UsedBookingFactory(dateUsed=self.few_minutes_ago, stock__offer__venue=venue)
+        db.session.expire_all()
+
+        n_queries = 0
+        n_queries += 1  # select bookings to price
+        n_queries += 1  # select custom reimbursement rules
+        n_queries += 1  # lock business unit
+        n_queries += 1  # select bookings, again
+        n_queries += 1  # select dependent pricings
+        n_queries += 1  # select revenue from ledger
+        n_queries += 2  # compute revenue and insert it in ledger (no ledger entry yet)
+        n_queries += 1  # insert pricings
+        n_queries += 1  # insert pricing lines
+        n_queries += 1  # update revenue ledger
+        n_queries += 1  # commit
+        with assert_num_queries(n_queries):
+            api.price_bookings_by_business_unit(self.few_minutes_ago)
+
+        assert models.Pricing.query.count() == 3
+
+    def test_error_on_a_business_unit_does_not_block_other_business_units(self):
+        booking1 = create_booking_with_undeletable_dependent(date_used=self.few_minutes_ago)
+        booking2 = bookings_factories.UsedBookingFactory(dateUsed=self.few_minutes_ago)
+
+        api.price_bookings_by_business_unit(self.few_minutes_ago)
+
+        assert not booking1.pricings
+        assert len(booking2.pricings) == 1
+
+
 class GenerateCashflowsTest:
     def test_basics(self):
         now = datetime.datetime.utcnow()
@@ -542,22 +700,49 @@ class GenerateCashflowsTest:
         n_queries = 0
         n_queries += 1  # insert CashflowBatch
         n_queries += 1  # commit
-        n_queries += 1  # select business unit and bank account ids to process
-        n_queries += 2 * sum(  # 2 business units
-            (
-                1,  # compute sum of pricings
-                1,  # insert Cashflow
-                1,  # select pricings to...
-                1,  # ... insert CashflowPricing
-                1,  # update Pricing.status
-                1,  # commit
-            )
-        )
+        n_queries += 1  # select business unit ids to process
+        n_queries += 1  # insert Cashflow and CashflowPricing, update Pricing.status
+        n_queries += 1  # commit
         with assert_num_queries(n_queries):
             api.generate_cashflows(cutoff)
 
         assert models.Cashflow.query.count() == 2
 
+    def test_process_business_units_by_chunks(self):
+        pricing1 = factories.PricingFactory(status=models.PricingStatus.VALIDATED, amount=-1000)
+        pricing2 = factories.PricingFactory(status=models.PricingStatus.VALIDATED, amount=-2000)
+        pricing3 = factories.PricingFactory(status=models.PricingStatus.VALIDATED, amount=-3000)
+        cutoff = datetime.datetime.utcnow()
+
+        api.generate_cashflows(cutoff, chunk_size=2)
+
+        assert models.Cashflow.query.count() == 3
+        for pricing in (pricing1, pricing2, pricing3):
+            assert pricing.status == models.PricingStatus.PROCESSED
+            assert len(pricing.cashflows) == 1
+            assert pricing.cashflows[0].amount == pricing.amount
+            assert pricing.cashflows[0].businessUnitId == pricing.businessUnitId
+
+    @override_settings(IS_RUNNING_TESTS=False)
+    def test_error_on_a_business_unit_does_not_block_other_business_units(self):
+        pricing1 = factories.PricingFactory(status=models.PricingStatus.VALIDATED, amount=-1000)
+        pricing2 = factories.PricingFactory(status=models.PricingStatus.VALIDATED, amount=-2000)
+        cutoff = datetime.datetime.utcnow()
+        original = api._generate_cashflows_of_business_units
+
+        def fail_on_pricing1(batch_id, cutoff, business_unit_ids):
+            if pricing1.businessUnitId in business_unit_ids:
+                raise ValueError("Simulated failure")
+            original(batch_id, cutoff, business_unit_ids)
+
+        with mock.patch("pcapi.core.finance.api._generate_cashflows_of_business_units", fail_on_pricing1):
+            api.generate_cashflows(cutoff)
+
+        assert pricing1.status == models.PricingStatus.VALIDATED
+        assert not pricing1.cashflows
+        assert pricing2.status == models.PricingStatus.PROCESSED
+        assert pricing2.cashflows[0].amount == -2000
+
 
 @clean_temporary_files
 def test_generate_payment_files():
@@ -576,6 +761,42 @@ def test_generate_payment_files():
     assert cashflow.logs[0].statusAfter == models.CashflowStatus.UNDER_REVIEW
 
 
+@clean_temporary_files
+@override_settings(FINANCE_FILES_COMPRESSION_LEVEL=1)
+def test_write_csv_streams_rows_to_zip_file():
+    rows = ((i, f"row {i}") for i in range(3))
+
+    path = api._write_csv("example", header=["id", "label"], rows=rows, compress=True)
+
+    assert path.name == "example.csv.zip"
+    with zipfile.ZipFile(path) as zfile:
+        assert zfile.namelist() == ["example.csv"]
+        with zfile.open("example.csv") as csv_bytefile:
+            csv_textfile = io.TextIOWrapper(csv_bytefile, encoding="utf-8")
+            reader = csv.DictReader(csv_textfile, quoting=csv.QUOTE_NONNUMERIC)
+            rows = list(reader)
+    assert rows == [
+        {"id": 0, "label": "row 0"},
+        {"id": 1, "label": "row 1"},
+        {"id": 2, "label": "row 2"},
+    ]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_generate_files(workers):
+    generators = {
+        "first": lambda: pathlib.Path("/tmp/first.csv"),
+        "second": lambda: pathlib.Path("/tmp/second.csv"),
+    }
+
+    paths = api._generate_files(generators, workers=workers)
+
+    assert paths == {
+        "first": pathlib.Path("/tmp/first.csv"),
+        "second": pathlib.Path("/tmp/second.csv"),
+    }
+
+
 @clean_temporary_files
 def test_generate_business_units_file():
     venue1 = offers_factories.VenueFactory(
@@ -1055,6 +1276,95 @@ class GenerateInvoicesTest:
         invoiced_bookings = {inv.cashflows[0].pricings[0].booking for inv in invoices}
         assert invoiced_bookings == {booking1, booking2}
 
+    @mock.patch("pcapi.core.finance.api.send_invoice_available_to_pro_email")
+    @mock.patch("pcapi.core.finance.api._store_invoice_pdf")
+    @override_settings(INVOICE_PDF_GENERATION_MAX_ATTEMPTS=2)
+    def test_pdf_jobs_are_retried(self, mocked_store_invoice_pdf, mocked_send_email):
+        invoice = factories.InvoiceFactory(isPdfStored=False)
+        mocked_store_invoice_pdf.side_effect = [
+            ValueError("temporary failure"),
+            {"render_duration": 1.0, "upload_duration": 0.1},
+        ]
+        job = api._InvoicePdfJob(
+            invoice_id=invoice.id,
+            business_unit_id=invoice.businessUnitId,
+            storage_object_id=invoice.storage_object_id,
+            html="<html></html>",
+        )
+
+        # Use threads so that mocks are visible by workers.
+        pending = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            api._submit_invoice_pdf_job(executor, pending, job)
+            while pending:
+                api._process_invoice_pdf_jobs(executor, pending)
+
+        assert mocked_store_invoice_pdf.call_count == 2
+        assert invoice.isPdfStored
+        mocked_send_email.assert_called_once_with(invoice)
+
+    @mock.patch("pcapi.core.finance.api.send_invoice_available_to_pro_email")
+    @mock.patch("pcapi.core.finance.api._store_invoice_pdf")
+    @override_settings(INVOICE_PDF_GENERATION_MAX_ATTEMPTS=2)
+    def test_pdf_job_gives_up_after_max_attempts(self, mocked_store_invoice_pdf, mocked_send_email):
+        invoice = factories.InvoiceFactory(isPdfStored=False)
+        mocked_store_invoice_pdf.side_effect = ValueError("permanent failure")
+        job = api._InvoicePdfJob(
+            invoice_id=invoice.id,
+            business_unit_id=invoice.businessUnitId,
+            storage_object_id=invoice.storage_object_id,
+            html="<html></html>",
+        )
+
+        pending = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            api._submit_invoice_pdf_job(executor, pending, job)
+            while pending:
+                api._process_invoice_pdf_jobs(executor, pending)
+
+        assert mocked_store_invoice_pdf.call_count == 2
+        assert not invoice.isPdfStored
+        mocked_send_email.assert_not_called()
+
+    @mock.patch("pcapi.core.finance.api.send_invoice_available_to_pro_email")
+    @mock.patch("pcapi.core.finance.api._generate_invoice_html")
+    @mock.patch("pcapi.core.finance.api._store_invoice_pdf")
+    def test_pdf_of_previous_run_is_generated_again(self, mocked_store_invoice_pdf, _mocked_html, mocked_send_email):
+        invoice_without_pdf = factories.InvoiceFactory(isPdfStored=False)
+        factories.InvoiceFactory()
+
+        api.generate_invoices()
+
+        mocked_store_invoice_pdf.assert_called_once()
+        assert invoice_without_pdf.isPdfStored
+        mocked_send_email.assert_called_once_with(invoice_without_pdf)
+
+    @mock.patch("pcapi.core.finance.api.send_invoice_available_to_pro_email")
+    @mock.patch("pcapi.core.finance.api._generate_invoice_html")
+    @mock.patch("pcapi.core.finance.api._store_invoice_pdf")
+    @mock.patch("pcapi.core.finance.api._get_invoice_pdf_executor")
+    @override_settings(INVOICE_PDF_GENERATION_WORKERS=2)
+    def test_pdf_pool(self, mocked_get_executor, mocked_store_invoice_pdf, _mocked_html, mocked_send_email):
+        # Use threads so that mocks are visible by workers.
+        mocked_get_executor.side_effect = lambda workers: concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        mocked_store_invoice_pdf.return_value = {"render_duration": 1.0, "upload_duration": 0.1}
+        invoice_without_pdf = factories.InvoiceFactory(isPdfStored=False)
+        booking1 = bookings_factories.UsedIndividualBookingFactory()
+        booking2 = bookings_factories.UsedIndividualBookingFactory()
+        api.price_booking(booking1)
+        api.price_booking(booking2)
+        api.generate_cashflows_and_payment_files(datetime.datetime.utcnow())
+
+        api.generate_invoices()
+
+        invoices = models.Invoice.query.all()
+        assert len(invoices) == 3
+        assert all(invoice.isPdfStored for invoice in invoices)
+        invoiced_bookings = {inv.cashflows[0].pricings[0].booking for inv in invoices if inv.cashflows}
+        assert invoiced_bookings == {booking1, booking2}
+        assert mocked_store_invoice_pdf.call_count == 3
+        assert set(mocked_send_email.call_args_list) == {mock.call(invoice) for invoice in invoices}
+
 
 class GenerateInvoiceTest:
     EXPECTED_NUM_QUERIES = (
@@ -0,0 +1,29 @@
+from datetime import datetime
+
+import pytest
+
+from pcapi.core.mails import testing as mails_testing
+from pcapi.core.mails.transactional.pro.bookings_csv_export_to_pro import send_bookings_csv_export_to_pro_email
+from pcapi.core.mails.transactional.sendinblue_template_ids import TransactionalEmail
+import pcapi.core.users.factories as users_factories
+
+
+pytestmark = pytest.mark.usefixtures("db_session")
+
+
+class SendinblueBookingsCsvExportToProEmailTest:
+    def test_send_email(self):
+        pro = users_factories.ProFactory(email="pro@example.com")
+
+        send_bookings_csv_export_to_pro_email(pro, "https://example.com/export", datetime(2022, 4, 20, 12, 0))
+
+        assert len(mails_testing.outbox) == 1
+        assert (
+            mails_testing.outbox[0].sent_data["template"]
+            == TransactionalEmail.BOOKINGS_CSV_EXPORT_TO_PRO.value.__dict__
+        )
+        assert mails_testing.outbox[0].sent_data["To"] == "pro@example.com"
+        assert mails_testing.outbox[0].sent_data["params"] == {
+            "EXPORT_LINK": "https://example.com/export",
+            "EXPIRATION_DATE": "20/04/2022",
+        }
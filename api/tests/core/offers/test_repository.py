@@ -15,6 +15,7 @@ from pcapi.core.offers.factories import ActivationCodeFactory
 from pcapi.core.offers.factories import EventStockFactory
 from pcapi.core.offers.models import Offer
 from pcapi.core.offers.models import Stock
+from pcapi.core.offers.repository import book_stock_quantity
 from pcapi.core.offers.repository import check_stock_consistency
 from pcapi.core.offers.repository import delete_past_draft_collective_offers
 from pcapi.core.offers.repository import delete_past_draft_offers
@@ -22,14 +23,17 @@ from pcapi.core.offers.repository import find_event_stocks_happening_in_x_days
 from pcapi.core.offers.repository import find_today_event_stock_ids_metropolitan_france
 from pcapi.core.offers.repository import get_active_offers_count_for_venue
 from pcapi.core.offers.repository import get_available_activation_code
+from pcapi.core.offers.repository import get_available_activation_code_expiration_dates
 from pcapi.core.offers.repository import get_capped_offers_for_filters
 from pcapi.core.offers.repository import get_collective_offers_template_by_filters
 from pcapi.core.offers.repository import get_expired_offers
 from pcapi.core.offers.repository import get_offers_by_ids
 from pcapi.core.offers.repository import get_sold_out_offers_count_for_venue
 import pcapi.core.providers.factories as providers_factories
+from pcapi.core.testing import assert_num_queries
 from pcapi.core.users import factories as users_factories
 from pcapi.domain.pro_offers.offers_recap import OffersRecap
+from pcapi.models import db
 from pcapi.models.offer_mixin import OfferStatus
 from pcapi.models.offer_mixin import OfferValidationStatus
 from pcapi.repository import repository
@@ -1102,6 +1106,34 @@ class GetSoldOutOffersCountForVenueTest:
         assert sold_out_offers_count == 2
 
 
+@pytest.mark.usefixtures("db_session")
+class BookStockQuantityTest:
+    def test_book_remaining_quantity(self):
+        stock = offers_factories.StockFactory(quantity=5, dnBookedQuantity=3)
+
+        assert book_stock_quantity(stock.id, 2)
+        assert not book_stock_quantity(stock.id, 1)
+
+        db.session.refresh(stock)
+        assert stock.dnBookedQuantity == 5
+
+    def test_unlimited_stock(self):
+        stock = offers_factories.StockFactory(quantity=None, dnBookedQuantity=3)
+
+        assert book_stock_quantity(stock.id, 2)
+
+        db.session.refresh(stock)
+        assert stock.dnBookedQuantity == 5
+
+    def test_soft_deleted_stock(self):
+        stock = offers_factories.StockFactory(quantity=None, isSoftDeleted=True)
+
+        assert not book_stock_quantity(stock.id, 1)
+
+        db.session.refresh(stock)
+        assert stock.dnBookedQuantity == 0
+
+
 @pytest.mark.usefixtures("db_session")
 class CheckStockConsistenceTest:
     def test_with_inconsistencies(self):
@@ -1286,6 +1318,31 @@ class AvailableActivationCodeTest:
         assert not get_available_activation_code(stock)
 
 
+@pytest.mark.usefixtures("db_session")
+class GetAvailableActivationCodeExpirationDatesTest:
+    def test_get_earliest_expiration_date_per_stock(self):
+        booking = bookings_factories.BookingFactory()
+        stock1 = booking.stock
+        ActivationCodeFactory(booking=booking, stock=stock1, expirationDate=datetime(2049, 1, 1))  # booked
+        ActivationCodeFactory(stock=stock1, expirationDate=datetime.utcnow() - timedelta(days=1))  # expired
+        ActivationCodeFactory(stock=stock1, expirationDate=datetime(2051, 1, 1))
+        ActivationCodeFactory(stock=stock1, expirationDate=datetime(2050, 1, 1))
+        ActivationCodeFactory(stock=stock1, expirationDate=None)
+        stock2 = offers_factories.StockFactory()
+        ActivationCodeFactory(stock=stock2, expirationDate=None)
+        stock3 = offers_factories.StockFactory()  # no code
+        other_stock = offers_factories.StockFactory()
+        ActivationCodeFactory(stock=other_stock)
+
+        expiration_dates = get_available_activation_code_expiration_dates([stock1.id, stock2.id, stock3.id])
+
+        assert expiration_dates == {stock1.id: datetime(2050, 1, 1), stock2.id: None}
+
+    def test_no_stock(self):
+        with assert_num_queries(0):
+            assert get_available_activation_code_expiration_dates([]) == {}
+
+
 @pytest.mark.usefixtures("db_session")
 class GetCollectiveOffersTemplateByFiltersTest:
     def test_status_filter_no_crash(self):
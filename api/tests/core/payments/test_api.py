@@ -8,6 +8,7 @@ from freezegun import freeze_time
 import pytest
 import pytz
 
+import pcapi.core.bookings.factories as bookings_factories
 from pcapi.core.fraud import factories as fraud_factories
 from pcapi.core.fraud import models as fraud_models
 import pcapi.core.offerers.factories as offerers_factories
@@ -227,3 +228,22 @@ class EditReimbursementRuleTest:
         end = pytz.utc.localize(datetime.today())
         with pytest.raises(exceptions.WrongDateForReimbursementRule):
             api.edit_reimbursement_rule(rule, end_date=end)
+
+
+class RecomputeDepositBalancesTest:
+    def test_recompute(self):
+        deposit = users_factories.DepositGrantFactory()
+        bookings_factories.IndividualBookingFactory(individualBooking__attached_deposit=deposit, amount=10)
+        bookings_factories.UsedIndividualBookingFactory(individualBooking__attached_deposit=deposit, amount=5)
+        bookings_factories.CancelledIndividualBookingFactory(individualBooking__attached_deposit=deposit, amount=20)
+        other_deposit = users_factories.DepositGrantFactory()
+        db.session.execute('UPDATE deposit SET "bookedAmount" = 1000, "usedAmount" = 1000')
+
+        api.recompute_deposit_balances([deposit.id])
+
+        db.session.refresh(deposit)
+        db.session.refresh(other_deposit)
+        assert deposit.bookedAmount == 15
+        assert deposit.usedAmount == 5
+        assert other_deposit.bookedAmount == 1000
+        assert other_deposit.usedAmount == 1000
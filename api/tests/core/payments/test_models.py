@@ -5,6 +5,7 @@ import pytest
 import pytz
 
 import pcapi.core.bookings.factories as bookings_factories
+import pcapi.core.bookings.models as bookings_models
 import pcapi.core.offers.factories as offers_factories
 from pcapi.core.payments import factories
 from pcapi.core.payments import models
@@ -94,3 +95,50 @@ class CustomReimbursementRuleTest:
 
         assert rule.apply(single) == 8
         assert rule.apply(double) == 16
+
+
+@pytest.mark.usefixtures("db_session")
+class DepositBalanceTriggerTest:
+    def test_booking_lifecycle(self):
+        booking = bookings_factories.IndividualBookingFactory(amount=10, quantity=2)
+        deposit = booking.individualBooking.deposit
+        db.session.refresh(deposit)
+        assert deposit.bookedAmount == 20
+        assert deposit.usedAmount == 0
+
+        booking.status = bookings_models.BookingStatus.USED
+        db.session.commit()
+        db.session.refresh(deposit)
+        assert deposit.bookedAmount == 20
+        assert deposit.usedAmount == 20
+
+        booking.status = bookings_models.BookingStatus.REIMBURSED
+        db.session.commit()
+        db.session.refresh(deposit)
+        assert deposit.bookedAmount == 20
+        assert deposit.usedAmount == 20
+
+    def test_cancel_and_uncancel_booking(self):
+        booking = bookings_factories.IndividualBookingFactory(amount=10)
+        deposit = booking.individualBooking.deposit
+        bookings_factories.UsedIndividualBookingFactory(individualBooking__attached_deposit=deposit, amount=5)
+
+        booking.status = bookings_models.BookingStatus.CANCELLED
+        db.session.commit()
+        db.session.refresh(deposit)
+        assert deposit.bookedAmount == 5
+        assert deposit.usedAmount == 5
+
+        booking.status = bookings_models.BookingStatus.CONFIRMED
+        db.session.commit()
+        db.session.refresh(deposit)
+        assert deposit.bookedAmount == 15
+        assert deposit.usedAmount == 5
+
+    def test_ignore_bookings_without_deposit(self):
+        booking = bookings_factories.IndividualBookingFactory(
+            amount=0, individualBooking__attached_deposit="forced_none"
+        )
+        deposit = booking.individualBooking.user.deposit
+        db.session.refresh(deposit)
+        assert deposit.bookedAmount == 0
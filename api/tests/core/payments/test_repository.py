@@ -0,0 +1,32 @@
+import pytest
+
+import pcapi.core.bookings.factories as bookings_factories
+from pcapi.core.payments import repository
+import pcapi.core.users.factories as users_factories
+from pcapi.models import db
+
+
+pytestmark = pytest.mark.usefixtures("db_session")
+
+
+def test_check_deposit_balance_consistency():
+    # consistent deposit without any booking
+    users_factories.DepositGrantFactory()
+    # consistent deposit with bookings
+    booking = bookings_factories.IndividualBookingFactory(amount=10)
+    bookings_factories.CancelledIndividualBookingFactory(
+        individualBooking__attached_deposit=booking.individualBooking.deposit
+    )
+    # inconsistent deposits
+    deposit1 = bookings_factories.IndividualBookingFactory(amount=10).individualBooking.deposit
+    deposit2 = bookings_factories.UsedIndividualBookingFactory(amount=10).individualBooking.deposit
+    db.session.execute(
+        'UPDATE deposit SET "bookedAmount" = 0 WHERE id = :id',
+        {"id": deposit1.id},
+    )
+    db.session.execute(
+        'UPDATE deposit SET "usedAmount" = 0 WHERE id = :id',
+        {"id": deposit2.id},
+    )
+
+    assert set(repository.check_deposit_balance_consistency()) == {deposit1.id, deposit2.id}
@@ -18,6 +18,7 @@ from pcapi.core.providers.exceptions import ProviderNotFound
 import pcapi.core.providers.factories as providers_factories
 from pcapi.core.providers.models import StockDetail
 from pcapi.core.providers.models import VenueProvider
+from pcapi.core.testing import override_features
 from pcapi.local_providers.provider_api import synchronize_provider_api
 from pcapi.models.product import Product
 
@@ -203,6 +204,83 @@ class SynchronizeStocksTest:
             {stock.offer.id, offer.id, stock_with_booking.offer.id, created_offer.id, second_created_offer.id}
         )
 
+    @pytest.mark.usefixtures("db_session")
+    @override_features(ENABLE_PROVIDER_STOCK_UPSERT=True)
+    @mock.patch("pcapi.core.search.async_index_offer_ids")
+    def test_execution_with_upsert(self, mock_async_index_offer_ids):
+        spec = [
+            {"ref": "3010000101789", "available": 6},
+            {"ref": "3010000101797", "available": 4},
+            {"ref": "3010000103769", "available": 18},
+            {"ref": "3010000107163", "available": 12},
+            {"ref": "3010000108123", "available": 0},
+            {"ref": "3010000108124", "available": 17},
+            {"ref": "3010000108125", "available": 17},
+            {"ref": "3010000102735", "available": 0},
+        ]
+        venue = VenueFactory()
+        siret = venue.siret
+        provider = providers_factories.ProviderFactory()
+        stock_details = synchronize_provider_api._build_stock_details_from_raw_stocks(spec, siret, provider, venue.id)
+
+        stock = create_stock(spec[0]["ref"], siret, venue, quantity=20)
+        offer = create_offer(spec[1]["ref"], venue)
+        product = create_product(spec[2]["ref"])
+        create_product(spec[4]["ref"])
+        create_product(spec[6]["ref"], isGcuCompatible=False)
+        offer_without_quantity = create_offer(spec[7]["ref"], venue)
+        stock_with_booking = create_stock(spec[5]["ref"], siret, venue, quantity=20)
+        BookingFactory(stock=stock_with_booking)
+        BookingFactory(stock=stock_with_booking, quantity=2)
+
+        operations = api.synchronize_stocks(stock_details, venue, provider_id=provider.id)
+
+        assert operations == {"new_offers": 1, "new_stocks": 2, "updated_stocks": 2}
+        # Existing stocks are updated, and their bookings are added to the quantity
+        assert stock.quantity == 6
+        assert stock.rawProviderQuantity == 6
+        assert stock.lastProviderId == provider.id
+        assert stock_with_booking.quantity == 17 + 1 + 2
+        assert stock_with_booking.rawProviderQuantity == 17
+        # Missing stocks of existing offers are created
+        created_stock = offer.stocks[0]
+        assert created_stock.quantity == 4
+        assert created_stock.price == Decimal("12.00")
+        assert created_stock.idAtProviders == f"{spec[1]['ref']}@{siret}"
+        assert offer.lastProviderId == provider.id
+        # Missing offers are created
+        created_offer = Offer.query.filter_by(idAtProvider=spec[2]["ref"]).one()
+        assert created_offer.stocks[0].quantity == 18
+        assert created_offer.bookingEmail == venue.bookingEmail
+        assert created_offer.extraData == product.extraData
+        assert created_offer.name == product.name
+        assert created_offer.productId == product.id
+        assert created_offer.venueId == venue.id
+        assert created_offer.lastProviderId == provider.id
+        assert created_offer.isActive
+        # ... but not for unknown or incompatible products, nor without quantity
+        assert Offer.query.filter_by(idAtProvider=spec[3]["ref"]).count() == 0
+        assert Offer.query.filter_by(idAtProvider=spec[4]["ref"]).count() == 0
+        assert Offer.query.filter_by(idAtProvider=spec[6]["ref"]).count() == 0
+        # Existing offers without quantity are updated
+        assert offer_without_quantity.lastProviderId == provider.id
+        assert not offer_without_quantity.stocks
+
+        # Prices have changed (from 10 to 12): all offers are reindexed
+        mock_async_index_offer_ids.assert_called_once_with(
+            {stock.offer.id, stock_with_booking.offer.id, offer.id, created_offer.id}
+        )
+
+    def test_get_valid_stock_rows(self):
+        rows = [
+            {"idAtProviders": "valid", "quantity": 1, "price": 10},
+            {"idAtProviders": "negative quantity", "quantity": -1, "price": 10},
+            {"idAtProviders": "negative price", "quantity": 1, "price": -1},
+            {"idAtProviders": "x" * 71, "quantity": 1, "price": 10},
+        ]
+
+        assert api._get_valid_stock_rows(rows) == rows[:1]
+
     def test_build_new_offers_from_stock_details(self, db_session):
         # Given
         spec = [
@@ -6,6 +6,7 @@ from pcapi.core import search
 from pcapi.core.offerers import models as offerers_models
 import pcapi.core.offers.factories as offers_factories
 import pcapi.core.search.testing as search_testing
+from pcapi.core.testing import assert_num_queries
 from pcapi.core.testing import override_settings
 
 
@@ -26,12 +27,12 @@ def fail(*args, **kwargs):
 
 def test_async_index_offer_ids(app):
     search.async_index_offer_ids({1, 2})
-    assert app.redis_client.lrange("offer_ids", 0, 5) == ["1", "2"]
+    assert app.redis_client.zrange("search:algolia:offer-ids-to-index", 0, 5) == ["1", "2"]
 
 
 def test_async_index_offers_of_venue_ids(app):
     search.async_index_offers_of_venue_ids({1, 2})
-    assert app.redis_client.lrange("venue_ids_for_offers", 0, 5) == ["1", "2"]
+    assert app.redis_client.zrange("search:algolia:venue-ids-for-offers-to-index", 0, 5) == ["1", "2"]
 
 
 def test_async_index_venue_ids(app):
@@ -55,16 +56,16 @@ def test_index_offers_of_venues_in_queue(app):
     venue1 = bookable_offer.venue
     unbookable_offer = make_unbookable_offer()
     venue2 = unbookable_offer.venue
-    queue = "venue_ids_for_offers"
-    app.redis_client.lpush(queue, venue1.id, venue2.id)
+    queue = "search:algolia:venue-ids-for-offers-to-index"
+    search.async_index_offers_of_venue_ids([venue1.id, venue2.id])
 
     # `index_offers_of_venues_in_queue` pops 1 venue from the queue
     # (REDIS_VENUE_IDS_FOR_OFFERS_CHUNK_SIZE).
     search.index_offers_of_venues_in_queue()
-    assert app.redis_client.llen(queue) == 1
+    assert app.redis_client.zcard(queue) == 1
 
     search.index_offers_of_venues_in_queue()
-    assert app.redis_client.llen(queue) == 0
+    assert app.redis_client.zcard(queue) == 0
 
     assert bookable_offer.id in search_testing.search_store["offers"]
     assert unbookable_offer.id not in search_testing.search_store["offers"]
@@ -92,6 +93,21 @@ class ReindexOfferIdsTest:
         search.reindex_offer_ids([offer.id])
         assert offer.id in search_testing.search_store["offers"]
 
+    def test_number_of_queries_does_not_depend_on_number_of_offers(self):
+        offers = [make_bookable_offer() for _ in range(3)]
+        offers_factories.StockFactory(offer=offers[0])
+        offers_factories.MediationFactory(offer=offers[1])
+        offer_ids = [offer.id for offer in offers]
+
+        n_queries = 1  # select offers, venues, offerers and products
+        n_queries += 1  # select stocks
+        n_queries += 1  # select criteria
+        n_queries += 1  # select mediations
+        with assert_num_queries(n_queries):
+            search.reindex_offer_ids(offer_ids)
+
+        assert set(search_testing.search_store["offers"]) == set(offer_ids)
+
     def test_unindex_unbookable_offer(self, app):
         offer = make_unbookable_offer()
         search_testing.search_store["offers"][offer.id] = "dummy"
@@ -106,7 +122,7 @@ class ReindexOfferIdsTest:
         with override_settings(IS_RUNNING_TESTS=False):  # as on prod: don't catch errors
             search.reindex_offer_ids([offer.id])
         assert offer.id not in search_testing.search_store["offers"]
-        assert app.redis_client.lrange("offer_ids_in_error", 0, 5) == [str(offer.id)]
+        assert app.redis_client.zrange("search:algolia:offer-ids-in-error-to-index", 0, 5) == [str(offer.id)]
 
     @mock.patch("pcapi.core.search.backends.testing.FakeClient.delete_objects", fail)
     def test_handle_unindexation_error(self, app):
@@ -116,7 +132,7 @@ class ReindexOfferIdsTest:
         with override_settings(IS_RUNNING_TESTS=False):  # as on prod: don't catch errors
             search.reindex_offer_ids([offer.id])
         assert offer.id in search_testing.search_store["offers"]
-        assert app.redis_client.lrange("offer_ids_in_error", 0, 5) == [str(offer.id)]
+        assert app.redis_client.zrange("search:algolia:offer-ids-in-error-to-index", 0, 5) == [str(offer.id)]
 
 
 class ReindexVenueIdsTest:
@@ -151,7 +167,7 @@ class ReindexVenueIdsTest:
 class IndexOffersInQueueTest:
     def test_cron_behaviour(self, mocked_reindex_offer_ids, app):
         items = range(1, 9)  # 8 items: 1..8
-        app.redis_client.lpush("offer_ids", *items)
+        search.async_index_offer_ids(items)
 
         search.index_offers_in_queue()
 
@@ -160,28 +176,39 @@ class IndexOffersInQueueTest:
         # less than REDIS_OFFER_IDS_CHUNK_SIZE items left in the
         # queue.
         assert mocked_reindex_offer_ids.mock_calls == [
-            mock.call({8, 7, 6}),
-            mock.call({5, 4, 3}),
+            mock.call({1, 2, 3}),
+            mock.call({4, 5, 6}),
         ]
 
-        assert app.redis_client.lrange("offer_ids", 0, 5) == ["2", "1"]
+        assert app.redis_client.zrange("search:algolia:offer-ids-to-index", 0, 5) == ["7", "8"]
 
     def test_command_behaviour(self, mocked_reindex_offer_ids, app):
         items = range(1, 9)  # 8 items: 1..8
-        app.redis_client.lpush("offer_ids", *items)
+        search.async_index_offer_ids(items)
 
         search.index_offers_in_queue(stop_only_when_empty=True)
 
-        # First run pops and indexes 8, 7, 6. Second run pops and
-        # indexes 5, 4, 3. Third run pops 2, 1 and stops because the
+        # First run pops and indexes 1, 2, 3. Second run pops and
+        # indexes 4, 5, 6. Third run pops 7, 8 and stops because the
         # queue is empty.
         assert mocked_reindex_offer_ids.mock_calls == [
-            mock.call({8, 7, 6}),
-            mock.call({5, 4, 3}),
-            mock.call({2, 1}),
+            mock.call({1, 2, 3}),
+            mock.call({4, 5, 6}),
+            mock.call({7, 8}),
         ]
 
-        assert app.redis_client.llen("offer_ids") == 0
+        assert app.redis_client.zcard("search:algolia:offer-ids-to-index") == 0
+
+    def test_command_behaviour_with_workers(self, mocked_reindex_offer_ids, app):
+        items = range(1, 9)  # 8 items: 1..8
+        search.async_index_offer_ids(items)
+
+        search.index_offers_in_queue(stop_only_when_empty=True, workers=2)
+
+        # Batches are processed concurrently, in no particular order.
+        batches = [call.args[0] for call in mocked_reindex_offer_ids.mock_calls]
+        assert sorted(batches, key=min) == [{1, 2, 3}, {4, 5, 6}, {7, 8}]
+        assert app.redis_client.zcard("search:algolia:offer-ids-to-index") == 0
 
 
 def test_unindex_offer_ids():
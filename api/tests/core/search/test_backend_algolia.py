@@ -22,7 +22,23 @@ def test_enqueue_offer_ids(app):
     backend.enqueue_offer_ids([1])
     backend.enqueue_offer_ids({2, 3})
     backend.enqueue_offer_ids([])
-    assert set(app.redis_client.lrange("offer_ids", 0, 5)) == {"1", "2", "3"}
+    assert app.redis_client.zrange("search:algolia:offer-ids-to-index", 0, 5) == ["1", "2", "3"]
+
+
+def test_enqueue_offer_ids_deduplicates(app):
+    backend = get_backend()
+    backend.enqueue_offer_ids([1, 2])
+    backend.enqueue_offer_ids([3, 1])
+    backend.enqueue_offer_ids([1])
+
+    # 1 keeps the position (i.e. the score) of its first enqueue.
+    assert app.redis_client.zrange("search:algolia:offer-ids-to-index", 0, 5) == ["1", "2", "3"]
+    assert backend.get_offer_queue_stats() == {
+        "queue": "search:algolia:offer-ids-to-index",
+        "depth": 3,
+        "enqueued": 3,
+        "duplicates": 2,
+    }
 
 
 def test_enqueue_offer_ids_in_error(app):
@@ -30,7 +46,7 @@ def test_enqueue_offer_ids_in_error(app):
     backend.enqueue_offer_ids_in_error([1])
     backend.enqueue_offer_ids_in_error({2, 3})
     backend.enqueue_offer_ids_in_error([])
-    assert set(app.redis_client.lrange("offer_ids_in_error", 0, 5)) == {"1", "2", "3"}
+    assert set(app.redis_client.zrange("search:algolia:offer-ids-in-error-to-index", 0, 5)) == {"1", "2", "3"}
 
 
 def test_enqueue_collective_offer_ids(app):
@@ -82,12 +98,12 @@ def test_enqueue_venue_ids_for_offers(app):
     backend.enqueue_venue_ids_for_offers([1])
     backend.enqueue_venue_ids_for_offers({2, 3})
     backend.enqueue_venue_ids_for_offers([])
-    assert set(app.redis_client.lrange("venue_ids_for_offers", 0, 5)) == {"1", "2", "3"}
+    assert set(app.redis_client.zrange("search:algolia:venue-ids-for-offers-to-index", 0, 5)) == {"1", "2", "3"}
 
 
 def test_pop_offer_ids_from_queue(app):
     backend = get_backend()
-    app.redis_client.lpush("offer_ids", 1, 2, 3)
+    backend.enqueue_offer_ids([1, 2, 3])
 
     popped = set()
     offer_ids = backend.pop_offer_ids_from_queue(count=2)
@@ -105,15 +121,35 @@ def test_pop_offer_ids_from_queue(app):
     assert offer_ids == set()
 
 
+def test_pop_offer_ids_from_queue_oldest_first(app):
+    backend = get_backend()
+    app.redis_client.zadd("search:algolia:offer-ids-to-index", {"1": 30, "2": 10, "3": 20})
+
+    assert backend.pop_offer_ids_from_queue(count=2) == {2, 3}
+    assert backend.pop_offer_ids_from_queue(count=2) == {1}
+
+
+def test_pop_offer_ids_from_queue_drains_legacy_list_first(app):
+    backend = get_backend()
+    app.redis_client.lpush("offer_ids", 1, 2, 3)
+    backend.enqueue_offer_ids([4, 5])
+
+    assert backend.count_offers_to_index_from_queue() == 5
+    assert backend.pop_offer_ids_from_queue(count=2) == {3, 2}
+    assert backend.pop_offer_ids_from_queue(count=2) == {1, 4}
+    assert backend.pop_offer_ids_from_queue(count=2) == {5}
+    assert not app.redis_client.exists("offer_ids")
+
+
 def test_pop_offer_ids_from_error_queue(app):
     backend = get_backend()
-    app.redis_client.lpush("offer_ids_in_error", 1, 2, 3)
+    backend.enqueue_offer_ids_in_error([1, 2, 3])
 
     offer_ids = backend.pop_offer_ids_from_queue(count=2, from_error_queue=True)
-    assert offer_ids == {3, 2}
+    assert offer_ids == {1, 2}
 
     offer_ids = backend.pop_offer_ids_from_queue(count=2, from_error_queue=True)
-    assert offer_ids == {1}
+    assert offer_ids == {3}
 
     offer_ids = backend.pop_offer_ids_from_queue(count=2, from_error_queue=True)
     assert offer_ids == set()
@@ -121,31 +157,29 @@ def test_pop_offer_ids_from_error_queue(app):
 
 def test_get_venue_ids_for_offers_from_queue(app):
     backend = get_backend()
-    # The following pushes 1 to head, then 2 to head, etc. In the end,
-    # we'll get `[3, 2, 1]` in that order.
-    app.redis_client.lpush("venue_ids_for_offers", 1, 2, 3)
+    backend.enqueue_venue_ids_for_offers([1, 2, 3])
 
     venue_ids = backend.pop_venue_ids_for_offers_from_queue(count=2)
-    assert venue_ids == {3, 2}
+    assert venue_ids == {1, 2}
 
     venue_ids = backend.pop_venue_ids_for_offers_from_queue(count=1)
-    assert venue_ids == {1}
+    assert venue_ids == {3}
 
-    # Make sure we did pop values off the list.
-    assert not set(app.redis_client.lrange("venue_ids_for_offers", 0, 5))
+    # Make sure we did pop values off the queue.
+    assert not app.redis_client.zcard("search:algolia:venue-ids-for-offers-to-index")
 
 
 def test_count_offers_to_index_from_queue(app):
     backend = get_backend()
     assert backend.count_offers_to_index_from_queue() == 0
-    app.redis_client.lpush("offer_ids", 1, 2, 3)
+    backend.enqueue_offer_ids([1, 2, 3])
     assert backend.count_offers_to_index_from_queue() == 3
 
 
 def test_count_offers_to_index_from_error_queue(app):
     backend = get_backend()
     assert backend.count_offers_to_index_from_queue(from_error_queue=True) == 0
-    app.redis_client.lpush("offer_ids_in_error", 1, 2, 3)
+    backend.enqueue_offer_ids_in_error([1, 2, 3])
     assert backend.count_offers_to_index_from_queue(from_error_queue=True) == 3
 
 
@@ -307,6 +341,32 @@ def test_index_offers(app):
     assert backend.check_offer_is_indexed(offer)
 
 
+@pytest.mark.usefixtures("db_session")
+def test_index_offers_skips_unchanged_offers(app):
+    backend = get_backend()
+    offer1 = offers_factories.StockFactory().offer
+    offer2 = offers_factories.StockFactory().offer
+    with requests_mock.Mocker() as mock:
+        posted = mock.post("https://dummy-app-id.algolia.net/1/indexes/offers/batch", json={})
+        backend.index_offers([offer1, offer2])
+        assert posted.call_count == 1
+
+        # Nothing has changed: nothing is pushed.
+        backend.index_offers([offer1, offer2])
+        assert posted.call_count == 1
+
+        # Only the modified offer is pushed.
+        offer2.name = "New name"
+        backend.index_offers([offer1, offer2])
+        assert posted.call_count == 2
+        posted_json = posted.last_request.json()
+        assert [request["body"]["objectID"] for request in posted_json["requests"]] == [offer2.id]
+
+    assert app.redis_client.hget("indexed_offers", offer2.id) == algolia.get_fingerprint(
+        backend.serialize_offer(offer2)
+    )
+
+
 def test_unindex_offer_ids(app):
     backend = get_backend()
     app.redis_client.hset("indexed_offers", "1", "")
@@ -8,9 +8,11 @@ from dateutil.relativedelta import relativedelta
 from freezegun import freeze_time
 import pytest
 import requests_mock
+import sqlalchemy.orm as sqla_orm
 
 from pcapi.connectors.dms import models as dms_models
 from pcapi.core.bookings import factories as bookings_factories
+import pcapi.core.bookings.models as bookings_models
 from pcapi.core.bookings.models import BookingStatus
 from pcapi.core.categories import subcategories
 import pcapi.core.fraud.factories as fraud_factories
@@ -18,6 +20,7 @@ import pcapi.core.fraud.models as fraud_models
 from pcapi.core.offerers import factories as offerers_factories
 from pcapi.core.payments.conf import GRANT_18_VALIDITY_IN_YEARS
 from pcapi.core.subscription import api as subscription_api
+from pcapi.core.testing import assert_num_queries
 from pcapi.core.testing import override_features
 from pcapi.core.testing import override_settings
 from pcapi.core.users import api as users_api
@@ -648,6 +651,56 @@ class DomainsCreditTest:
 
         assert not get_domains_credit(user)
 
+    def test_get_domains_credit_from_given_bookings(self):
+        user = users_factories.BeneficiaryGrant18Factory(deposit__version=1)
+        bookings_factories.IndividualBookingFactory(
+            individualBooking__user=user,
+            amount=80,
+            stock__offer__subcategoryId=subcategories.JEU_EN_LIGNE.id,
+            stock__offer__url="http://on.line",
+        )
+        bookings_factories.IndividualBookingFactory(
+            individualBooking__user=user,
+            amount=150,
+            stock__offer__subcategoryId=subcategories.JEU_SUPPORT_PHYSIQUE.id,
+        )
+        user_bookings = bookings_models.Booking.query.all()
+
+        expected = DomainsCredit(
+            all=Credit(initial=Decimal(500), remaining=Decimal(270)),
+            digital=Credit(initial=Decimal(200), remaining=Decimal(120)),
+            physical=Credit(initial=Decimal(200), remaining=Decimal(50)),
+        )
+        assert get_domains_credit(user, user_bookings) == expected
+        assert get_domains_credit(user) == expected
+
+    def test_get_domains_credits(self):
+        user1 = users_factories.BeneficiaryGrant18Factory()
+        bookings_factories.IndividualBookingFactory(
+            individualBooking__user=user1,
+            amount=30,
+            stock__offer__subcategoryId=subcategories.JEU_EN_LIGNE.id,
+            stock__offer__url="http://on.line",
+        )
+        user2 = users_factories.BeneficiaryGrant18Factory(deposit__version=1)
+        bookings_factories.IndividualBookingFactory(
+            individualBooking__user=user2,
+            amount=250,
+            stock__offer__subcategoryId=subcategories.JEU_SUPPORT_PHYSIQUE.id,
+        )
+        user3 = users_factories.BeneficiaryGrant18Factory()  # no booking
+        user4 = users_factories.UserFactory()  # no deposit
+        users = User.query.options(sqla_orm.joinedload(User.deposits)).all()
+
+        with assert_num_queries(1):
+            credits = users_api.get_domains_credits(users)
+
+        assert credits == {user.id: get_domains_credit(user) for user in (user1, user2, user3, user4)}
+        assert credits[user1.id].digital.remaining == Decimal(70)
+        assert credits[user2.id].physical.remaining == Decimal(0)
+        assert credits[user3.id].all.remaining == Decimal(300)
+        assert credits[user4.id] is None
+
 
 class CreateProUserTest:
     def test_create_pro_user(self):
@@ -13,6 +13,7 @@ import pcapi.core.offerers.factories as offerers_factories
 import pcapi.core.offers.factories as offers_factories
 from pcapi.core.payments import api as payments_api
 from pcapi.core.payments.models import DepositType
+from pcapi.core.testing import override_features
 from pcapi.core.users import factories as users_factories
 from pcapi.core.users import models as user_models
 from pcapi.models import db
@@ -61,6 +62,11 @@ class HasAccessTest:
 
 
 class WalletBalanceTest:
+    @pytest.fixture(autouse=True, params=[False, True], ids=["get_wallet_balance", "deposit_balance_columns"])
+    def use_deposit_balance_columns(self, request, db_session):
+        with override_features(USE_DEPOSIT_BALANCE_COLUMNS=request.param):
+            yield
+
     @pytest.mark.usefixtures("db_session")
     def test_balance_is_0_with_no_deposits_and_no_bookings(self):
         # given
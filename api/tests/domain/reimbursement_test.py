@@ -1,8 +1,11 @@
 from datetime import datetime
 from datetime import timedelta
 from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
 import pytest
+import redis
 
 import pcapi.core.bookings.factories as bookings_factories
 from pcapi.core.bookings.models import Booking
@@ -10,8 +13,10 @@ from pcapi.core.categories import subcategories
 import pcapi.core.offers.factories as offers_factories
 import pcapi.core.payments.factories as payments_factories
 import pcapi.core.payments.models as payments_models
+from pcapi.core.testing import assert_num_queries
 import pcapi.core.users.factories as users_factories
 from pcapi.domain import reimbursement
+from pcapi.models import db
 
 
 def create_non_digital_thing_booking(quantity=1, price=10, user=None, date_used=None, product_subcategory_id=None):
@@ -443,6 +448,83 @@ class CustomRuleFinderTest:
         assert finder.get_rule(booking4) is None  # no rule for this offerer
 
 
+@pytest.mark.usefixtures("db_session")
+class GetCustomRuleFinderTest:
+    def test_cache_is_invalidated_when_rules_change(self):
+        booking = bookings_factories.UsedBookingFactory()
+        yesterday = datetime.utcnow() - timedelta(days=1)
+
+        finder = reimbursement.get_custom_rule_finder()
+        assert finder.get_rule(booking) is None
+        assert reimbursement.get_custom_rule_finder() is finder
+
+        rule = payments_factories.CustomReimbursementRuleFactory(offer=booking.stock.offer, timespan=(yesterday, None))
+
+        finder = reimbursement.get_custom_rule_finder()
+        assert finder.get_rule(booking).id == rule.id
+
+    def test_cached_finder_does_not_query_the_database(self):
+        booking = bookings_factories.UsedBookingFactory()
+        yesterday = datetime.utcnow() - timedelta(days=1)
+        rule = payments_factories.CustomReimbursementRuleFactory(offer=booking.stock.offer, timespan=(yesterday, None))
+        reimbursement.get_custom_rule_finder()
+        db.session.commit()  # expire all objects of the session
+        assert booking.stock.offer and booking.offererId  # reload the booking
+
+        with assert_num_queries(0):
+            assert reimbursement.get_custom_rule_finder().get_rule(booking).id == rule.id
+
+    def test_rules_of_the_current_session_are_not_detached(self):
+        booking = bookings_factories.UsedBookingFactory()
+        yesterday = datetime.utcnow() - timedelta(days=1)
+        rule = payments_factories.CustomReimbursementRuleFactory(offer=booking.stock.offer, timespan=(yesterday, None))
+
+        finder = reimbursement.get_custom_rule_finder()
+
+        assert finder.get_rule(booking) is not rule
+        assert rule in db.session
+        assert rule.offerId == booking.stock.offerId
+
+    def test_fallback_to_database_if_redis_is_down(self, app):
+        booking = bookings_factories.UsedBookingFactory()
+        yesterday = datetime.utcnow() - timedelta(days=1)
+        rule = payments_factories.CustomReimbursementRuleFactory(offer=booking.stock.offer, timespan=(yesterday, None))
+
+        with mock.patch.object(app.redis_client, "get", side_effect=redis.exceptions.ConnectionError()):
+            finder = reimbursement.get_custom_rule_finder()
+
+        assert finder.get_rule(booking) == rule
+
+
+def _make_booking(reimbursement_rule, is_educational, date_used, amount=10):
+    subcategory = SimpleNamespace(reimbursement_rule=reimbursement_rule)
+    offer = SimpleNamespace(subcategory=subcategory, isEducational=is_educational)
+    return SimpleNamespace(stock=SimpleNamespace(offer=offer), dateUsed=date_used, total_amount=Decimal(amount))
+
+
+def _get_matching_rules_without_index(booking, cumulative_revenue):
+    return [rule for rule in reimbursement.REGULAR_RULES if rule.matches(booking, cumulative_revenue)]
+
+
+class RegularRuleIndexTest:
+    dates = [
+        datetime(2021, 1, 1),
+        reimbursement.SEPTEMBER_2021 - timedelta(microseconds=1),
+        reimbursement.SEPTEMBER_2021,
+        datetime(2022, 1, 1),
+    ]
+    revenues = [Decimal(value) for value in (0, 19999.99, 20000, 20000.01, 40000, 40001, 150000, 150000.01, 10**6)]
+
+    def test_same_rules_as_without_index(self):
+        for choice in subcategories.ReimbursementRuleChoices:
+            for is_educational in (False, True):
+                for date_used in self.dates:
+                    booking = _make_booking(choice.value, is_educational, date_used)
+                    for revenue in self.revenues:
+                        expected = _get_matching_rules_without_index(booking, revenue)
+                        assert reimbursement.REGULAR_RULES_INDEX.get_rules(booking, revenue) == expected
+
+
 def assert_total_reimbursement(booking_reimbursement, rule, booking):
     assert booking_reimbursement.booking == booking
     assert isinstance(booking_reimbursement.rule, rule)
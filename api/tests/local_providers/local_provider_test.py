@@ -12,6 +12,7 @@ from pcapi.local_providers.providable_info import ProvidableInfo
 from pcapi.models.api_errors import ApiErrors
 from pcapi.models.product import Product
 from pcapi.repository import repository
+from pcapi.repository.providable_queries import get_existing_objects
 
 from . import provider_test_utils
 
@@ -171,6 +172,44 @@ class UpdateObjectsTest:
         assert new_product.subcategoryId == subcategories.LIVRE_PAPIER.id
 
 
+@pytest.mark.usefixtures("db_session")
+class UpdateObjectsWithLookAheadTest:
+    @patch("pcapi.local_providers.chunk_manager.get_existing_object")
+    @patch("pcapi.local_providers.local_provider.get_existing_objects", wraps=get_existing_objects)
+    def test_creates_and_updates_objects(self, mocked_get_existing_objects, mocked_get_existing_object):
+        provider = providers_factories.AllocineProviderFactory(localClass="TestLocalProviderWithLookAhead")
+        for id_at_providers in ("1", "2"):
+            offers_factories.ThingProductFactory(
+                dateModifiedAtLastProvider=datetime(2000, 1, 1),
+                lastProvider=provider,
+                idAtProviders=id_at_providers,
+                name="Old product name",
+            )
+        items = [(str(i), f"Product {i}") for i in range(1, 16)]
+        local_provider = provider_test_utils.TestLocalProviderWithLookAhead(items)
+
+        local_provider.updateObjects()
+
+        names = {product.idAtProviders: product.name for product in Product.query.all()}
+        assert names == {str(i): f"Product {i}" for i in range(1, 16)}
+        assert local_provider.createdObjects == 13
+        assert local_provider.updatedObjects == 2
+        # One query per batch of 10 items, no query per item
+        assert mocked_get_existing_objects.call_count == 2
+        mocked_get_existing_object.assert_not_called()
+
+    def test_handles_same_object_twice_in_a_batch(self):
+        providers_factories.AllocineProviderFactory(localClass="TestLocalProviderWithLookAhead")
+        items = [("1", "First name"), ("1", "Second name")]
+        local_provider = provider_test_utils.TestLocalProviderWithLookAhead(items)
+
+        local_provider.updateObjects()
+
+        product = Product.query.one()
+        assert product.name == "First name"
+        assert local_provider.createdObjects == 1
+
+
 @pytest.mark.usefixtures("db_session")
 class CreateObjectTest:
     def test_returns_object_with_expected_attributes(self):
@@ -1,5 +1,4 @@
 import datetime
-from unittest.mock import call
 from unittest.mock import patch
 
 import pytest
@@ -35,4 +34,5 @@ class ProviderApiStocksTest:
 
         # Then
         assert mocked_synchronize_venue_provider.call_count == len(correct_venue_providers)
-        mocked_synchronize_venue_provider.assert_has_calls(call(v) for v in reversed(correct_venue_providers))
+        synchronized_venue_providers = [c.args[0] for c in mocked_synchronize_venue_provider.call_args_list]
+        assert synchronized_venue_providers == list(reversed(correct_venue_providers))
@@ -1,8 +1,10 @@
+from datetime import datetime
 from pathlib import Path
 
 from pcapi.core.categories import subcategories
 from pcapi.core.providers.models import VenueProvider
 from pcapi.local_providers.local_provider import LocalProvider
+from pcapi.local_providers.providable_info import ProvidableInfo
 from pcapi.models import Model
 import pcapi.sandboxes
 
@@ -102,3 +104,23 @@ class TestLocalProviderWithThumbIndexAt4(LocalProvider):
 
     def __next__(self):
         pass
+
+
+class TestLocalProviderWithLookAhead(LocalProvider):
+    name = "LocalProvider Test With Look-Ahead"
+    can_create = True
+    look_ahead_size = 10
+    item_state_attributes = ("product_name",)
+
+    def __init__(self, items: list[tuple[str, str]]):
+        super().__init__()
+        self.items = iter(items)
+        self.product_name = None
+
+    def fill_object_attributes(self, obj):
+        obj.name = self.product_name
+        obj.subcategoryId = subcategories.LIVRE_PAPIER.id
+
+    def __next__(self):
+        id_at_providers, self.product_name = next(self.items)
+        return [ProvidableInfo(id_at_providers=id_at_providers, date_modified_at_provider=datetime(2018, 1, 1))]
@@ -0,0 +1,78 @@
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from pcapi.core.providers import exceptions
+import pcapi.core.providers.factories as providers_factories
+from pcapi.core.providers.models import VenueProvider
+from pcapi.local_providers import sync_scheduler
+
+from tests.conftest import clean_database
+
+
+class SynchronizeVenueProvidersTest:
+    @pytest.mark.usefixtures("db_session")
+    def test_synchronize_sequentially(self):
+        venue_providers = providers_factories.VenueProviderFactory.create_batch(3)
+        failing, timing_out = venue_providers[1], venue_providers[2]
+
+        def sync_function(venue_provider, deadline):
+            assert deadline is not None
+            if venue_provider == failing:
+                raise ValueError("sync error")
+            if venue_provider == timing_out:
+                raise exceptions.SynchronizationTimeout()
+
+        on_error = mock.Mock()
+        stats = sync_scheduler.synchronize_venue_providers(venue_providers, sync_function, on_error=on_error)
+
+        assert (stats.synchronized, stats.failed, stats.timed_out) == (1, 1, 1)
+        on_error.assert_called_once()
+        info, exc = on_error.call_args.args
+        assert info.id == failing.id
+        assert info.venue_id_at_offer_provider == failing.venueIdAtOfferProvider
+        assert str(exc) == "sync error"
+
+    @pytest.mark.usefixtures("db_session")
+    def test_no_timeout(self):
+        venue_provider = providers_factories.VenueProviderFactory()
+        sync_function = mock.Mock()
+
+        sync_scheduler.synchronize_venue_providers([venue_provider], sync_function, timeout=0)
+
+        sync_function.assert_called_once_with(venue_provider, None)
+
+    @clean_database
+    def test_synchronize_concurrently(self, app):
+        provider1 = providers_factories.APIProviderFactory()
+        provider2 = providers_factories.APIProviderFactory()
+        venue_providers = providers_factories.VenueProviderFactory.create_batch(
+            4, provider=provider1
+        ) + providers_factories.VenueProviderFactory.create_batch(4, provider=provider2)
+        ids = {venue_provider.id for venue_provider in venue_providers}
+
+        lock = threading.Lock()
+        running = {provider1.id: 0, provider2.id: 0}
+        max_running = {provider1.id: 0, provider2.id: 0}
+        synchronized = []
+
+        def sync_function(venue_provider, deadline):
+            assert isinstance(venue_provider, VenueProvider)
+            provider_id = venue_provider.providerId
+            with lock:
+                running[provider_id] += 1
+                max_running[provider_id] = max(max_running[provider_id], running[provider_id])
+            time.sleep(0.05)
+            with lock:
+                running[provider_id] -= 1
+                synchronized.append(venue_provider.id)
+
+        stats = sync_scheduler.synchronize_venue_providers(
+            venue_providers, sync_function, max_workers=4, max_workers_per_provider=2
+        )
+
+        assert stats.synchronized == 8
+        assert set(synchronized) == ids
+        assert max_running == {provider1.id: 2, provider2.id: 2}
@@ -1,4 +1,5 @@
 from decimal import Decimal
+import logging
 from unittest import mock
 
 from freezegun.api import freeze_time
@@ -11,6 +12,7 @@ from pcapi.core.offerers.models import Venue
 from pcapi.core.offers import factories
 from pcapi.core.offers.factories import VenueFactory
 from pcapi.core.offers.models import Offer
+from pcapi.core.providers import exceptions
 import pcapi.core.providers.factories as providers_factories
 from pcapi.core.providers.models import StockDetail
 from pcapi.local_providers.provider_api import synchronize_provider_api
@@ -185,6 +187,49 @@ class ProviderAPICronTest:
             )
             synchronize_provider_api.synchronize_venue_provider(venue_provider)
 
+    @pytest.mark.usefixtures("db_session")
+    @mock.patch("pcapi.core.search.async_index_offer_ids")
+    def test_stop_after_deadline(self, mocked_async_index_offer_ids):
+        provider = providers_factories.APIProviderFactory(apiUrl="https://provider_url", authToken="fake_token")
+        venue_provider = providers_factories.VenueProviderFactory(provider=provider, lastSyncDate=None)
+        siret = venue_provider.venue.siret
+        stock = create_stock(ISBNs[0], siret, venue_provider.venue, quantity=20, product_price="5.01")
+
+        with requests_mock.Mocker() as request_mock:
+            request_mock.get(
+                f"https://provider_url/{siret}?limit=1000",
+                [{"json": r, "headers": {"content-type": "application/json"}} for r in provider_responses],
+            )
+            with pytest.raises(exceptions.SynchronizationTimeout):
+                synchronize_provider_api.synchronize_venue_provider(venue_provider, deadline=0)
+
+        # The first batch has been synchronized, but not the next ones.
+        assert stock.quantity == 6
+        assert venue_provider.lastSyncDate is None
+
+    @pytest.mark.usefixtures("db_session")
+    @mock.patch("pcapi.core.search.async_index_offer_ids")
+    def test_log_phase_durations(self, mocked_async_index_offer_ids, caplog):
+        provider = providers_factories.APIProviderFactory(apiUrl="https://provider_url", authToken="fake_token")
+        venue_provider = providers_factories.VenueProviderFactory(provider=provider)
+        siret = venue_provider.venue.siret
+        create_stock(ISBNs[0], siret, venue_provider.venue, quantity=20, product_price="5.01")
+
+        with requests_mock.Mocker() as request_mock:
+            request_mock.get(
+                f"https://provider_url/{siret}?limit=1000",
+                [{"json": r, "headers": {"content-type": "application/json"}} for r in provider_responses],
+            )
+            with caplog.at_level(logging.INFO):
+                synchronize_provider_api.synchronize_venue_provider(venue_provider)
+
+        record = caplog.records[-1]
+        assert record.message.startswith("Ended synchronization")
+        assert record.extra["updated_stocks"] == 1
+        assert record.extra["http_duration"] > 0
+        assert record.extra["lookup_duration"] > 0
+        assert record.extra["write_duration"] > 0
+
     @pytest.mark.usefixtures("db_session")
     class BuildStocksDetailsTest:
         def test_build_stock_details_from_raw_stocks(self):
@@ -263,3 +308,35 @@ class ProviderAPICronTest:
                     venue_reference="3010000108123@13",
                 )
             ]
+
+
+class PrefetchTest:
+    def test_yield_batches_in_order(self):
+        assert list(synchronize_provider_api._prefetch(iter(range(5)))) == [0, 1, 2, 3, 4]
+
+    def test_raise_error_of_background_thread(self):
+        def batches():
+            yield 1
+            raise ValueError("fetch error")
+
+        prefetched = synchronize_provider_api._prefetch(batches())
+
+        assert next(prefetched) == 1
+        with pytest.raises(ValueError, match="fetch error"):
+            next(prefetched)
+
+    def test_stop_background_thread_when_closed(self):
+        fetched = []
+
+        def batches():
+            for i in range(100):
+                fetched.append(i)
+                yield i
+
+        prefetched = synchronize_provider_api._prefetch(batches(), size=1)
+        assert next(prefetched) == 0
+        prefetched.close()
+
+        # The first batch, the buffered batch and the batch that could
+        # not be buffered.
+        assert len(fetched) <= 3
@@ -1,8 +1,13 @@
+import io
 import re
 from unittest.mock import patch
+import zipfile
 
 import pytest
 
+import pcapi.core.offers.factories as offers_factories
+import pcapi.core.providers.factories as providers_factories
+import pcapi.core.providers.models as providers_models
 from pcapi.core.providers.repository import get_provider_by_local_class
 from pcapi.local_providers import TiteLiveThingDescriptions
 from pcapi.repository import repository
@@ -63,6 +68,49 @@ class TiteLiveThingDescriptionsTest:
             assert mock_get_date_from_filename.call_count == 3
 
 
+class UpdateObjectsTest:
+    @pytest.mark.usefixtures("db_session")
+    @patch(
+        "pcapi.local_providers.titelive_thing_descriptions.titelive_thing_descriptions.get_files_to_process_from_titelive_ftp"
+    )
+    @patch("pcapi.local_providers.titelive_thing_descriptions.titelive_thing_descriptions.get_zip_file_from_ftp")
+    def test_log_end_of_files_once_descriptions_are_saved(
+        self, get_zip_file_from_ftp, get_files_to_process_from_titelive_ftp
+    ):
+        get_files_to_process_from_titelive_ftp.return_value = ["Resume191012.zip", "Resume191013.zip"]
+        get_zip_file_from_ftp.side_effect = [
+            _build_zip_file("Resume191012.zip", {"9782000000001_p.txt": "Description 1"}),
+            _build_zip_file("Resume191013.zip", {"9782000000002_p.txt": "Description 2"}),
+        ]
+        product1 = offers_factories.ProductFactory(idAtProviders="9782000000001")
+        product2 = offers_factories.ProductFactory(idAtProviders="9782000000002")
+        providers_factories.ProviderFactory(localClass="TiteLiveThingDescriptions")
+
+        TiteLiveThingDescriptions().updateObjects()
+
+        assert product1.description == "Description 1"
+        assert product2.description == "Description 2"
+        events = providers_models.LocalProviderEvent.query.order_by(providers_models.LocalProviderEvent.id).all()
+        assert [(event.type, event.payload) for event in events] == [
+            (providers_models.LocalProviderEventType.SyncStart, "None"),
+            (providers_models.LocalProviderEventType.SyncPartStart, "191012"),
+            (providers_models.LocalProviderEventType.SyncPartStart, "191013"),
+            (providers_models.LocalProviderEventType.SyncPartEnd, "191012"),
+            (providers_models.LocalProviderEventType.SyncPartEnd, "191013"),
+            (providers_models.LocalProviderEventType.SyncEnd, "None"),
+        ]
+
+
+def _build_zip_file(filename: str, files: dict[str, str]) -> zipfile.ZipFile:
+    content = io.BytesIO()
+    with zipfile.ZipFile(content, "w") as zip_file:
+        for name, text in files.items():
+            zip_file.writestr(name, text.encode("iso-8859-1"))
+    zip_file = zipfile.ZipFile(content)
+    zip_file.filename = filename
+    return zip_file
+
+
 class MockZipFile:
     def __init__(self, filename: str):
         self.filename = filename
@@ -15,6 +15,7 @@ import pcapi.core.providers.factories as providers_factories
 import pcapi.core.providers.models as providers_models
 from pcapi.core.providers.repository import get_provider_by_local_class
 from pcapi.local_providers import TiteLiveThings
+from pcapi.local_providers.titelive_things.titelive_things import get_lines_from_thing_file
 from pcapi.model_creators.specific_creators import create_product_with_thing_subcategory
 from pcapi.models.product import BookFormat
 from pcapi.models.product import Product
@@ -516,3 +517,82 @@ class TiteliveThingsTest:
         assert refreshed_product.name == "xxx"
         assert refreshed_offer.isActive == False
         assert refreshed_offer.name == "xxx"
+
+
+class ResumeSynchronizationTest:
+    @pytest.mark.usefixtures("db_session")
+    @patch("pcapi.local_providers.titelive_things.titelive_things.get_files_to_process_from_titelive_ftp")
+    @patch("pcapi.local_providers.titelive_things.titelive_things.get_lines_from_thing_file")
+    def test_log_progress_at_end_of_synchronization(
+        self, get_lines_from_thing_file, get_files_to_process_from_titelive_ftp, app
+    ):
+        get_files_to_process_from_titelive_ftp.return_value = ["Quotidien30.tit"]
+        get_lines_from_thing_file.return_value = iter(["~".join(BASE_DATA_LINE_PARTS)])
+        providers_factories.ProviderFactory(localClass="TiteLiveThings")
+
+        TiteLiveThings().updateObjects()
+
+        events = providers_models.LocalProviderEvent.query.order_by(providers_models.LocalProviderEvent.id).all()
+        assert [(event.type, event.payload) for event in events] == [
+            (providers_models.LocalProviderEventType.SyncStart, "None"),
+            (providers_models.LocalProviderEventType.SyncPartStart, "30"),
+            (providers_models.LocalProviderEventType.SyncPartEnd, "30"),
+            (providers_models.LocalProviderEventType.SyncPartProgress, "30:1"),
+            (providers_models.LocalProviderEventType.SyncEnd, "None"),
+        ]
+
+    @pytest.mark.usefixtures("db_session")
+    @patch("pcapi.local_providers.titelive_things.titelive_things.get_files_to_process_from_titelive_ftp")
+    @patch("pcapi.local_providers.titelive_things.titelive_things.get_lines_from_thing_file")
+    def test_resume_interrupted_synchronization(
+        self, get_lines_from_thing_file, get_files_to_process_from_titelive_ftp, app
+    ):
+        get_files_to_process_from_titelive_ftp.return_value = ["Quotidien29.tit", "Quotidien30.tit"]
+        get_lines_from_thing_file.return_value = iter([])
+        provider = providers_factories.ProviderFactory(localClass="TiteLiveThings")
+        providers_factories.LocalProviderEventFactory(
+            provider=provider, type=providers_models.LocalProviderEventType.SyncPartEnd, payload="29"
+        )
+        providers_factories.LocalProviderEventFactory(
+            provider=provider, type=providers_models.LocalProviderEventType.SyncPartProgress, payload="30:1000"
+        )
+
+        TiteLiveThings().updateObjects()
+
+        get_lines_from_thing_file.assert_called_once_with("Quotidien30.tit", start_line=1000)
+
+    @pytest.mark.usefixtures("db_session")
+    @patch("pcapi.local_providers.titelive_things.titelive_things.get_files_to_process_from_titelive_ftp")
+    @patch("pcapi.local_providers.titelive_things.titelive_things.get_lines_from_thing_file")
+    def test_do_not_resume_completed_synchronization(
+        self, get_lines_from_thing_file, get_files_to_process_from_titelive_ftp, app
+    ):
+        get_files_to_process_from_titelive_ftp.return_value = ["Quotidien30.tit"]
+        get_lines_from_thing_file.return_value = iter([])
+        provider = providers_factories.ProviderFactory(localClass="TiteLiveThings")
+        providers_factories.LocalProviderEventFactory(
+            provider=provider, type=providers_models.LocalProviderEventType.SyncPartProgress, payload="30:1000"
+        )
+        providers_factories.LocalProviderEventFactory(
+            provider=provider, type=providers_models.LocalProviderEventType.SyncEnd
+        )
+
+        TiteLiveThings().updateObjects()
+
+        get_lines_from_thing_file.assert_called_once_with("Quotidien30.tit", start_line=0)
+
+
+class GetLinesFromThingFileTest:
+    @patch("pcapi.connectors.ftp_titelive.connect_to_titelive_ftp")
+    def test_stream_lines_from_offset(self, connect_to_titelive_ftp):
+        def retrbinary(command, callback):
+            assert command == "RETR livre3_11/Quotidien30.tit"
+            callback("première~ligne\n".encode("iso-8859-1"))
+            callback(b"deuxi")
+            callback("ème~ligne\ntroisième~ligne\n".encode("iso-8859-1"))
+
+        connect_to_titelive_ftp.return_value.__enter__.return_value.retrbinary.side_effect = retrbinary
+
+        lines = list(get_lines_from_thing_file("Quotidien30.tit", start_line=1))
+
+        assert lines == ["deuxième~ligne\n", "troisième~ligne\n"]
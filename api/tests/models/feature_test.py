@@ -1,15 +1,21 @@
+import contextlib
 import enum
 from unittest.mock import patch
 
 import flask
+from freezegun import freeze_time
 import pytest
+import redis
 
 from pcapi.core.testing import assert_num_queries
+from pcapi.core.testing import override_settings
 from pcapi.models import db
 from pcapi.models.feature import FEATURES_DISABLED_BY_DEFAULT
+from pcapi.models.feature import FEATURES_VERSION_REDIS_KEY
 from pcapi.models.feature import Feature
 from pcapi.models.feature import FeatureToggle
 from pcapi.models.feature import install_feature_flags
+from pcapi.models.feature import invalidate_features_cache
 from pcapi.repository import repository
 
 
@@ -68,6 +74,87 @@ class FeatureToggleTest:
             flask._request_ctx_stack.push(context)
 
 
+@contextlib.contextmanager
+def outside_request_context():
+    context = flask._request_ctx_stack.pop()
+    try:
+        yield
+    finally:
+        flask._request_ctx_stack.push(context)
+
+
+def deactivate_feature(feature):
+    Feature.query.filter_by(name=feature.name).update({"isActive": False})
+
+
+@pytest.mark.usefixtures("db_session")
+@override_settings(FEATURES_CACHE_TTL=60)
+class FeaturesSnapshotTest:
+    def test_query_count(self, app):
+        invalidate_features_cache()
+
+        with outside_request_context():
+            with assert_num_queries(1):
+                assert FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+                assert FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+                assert FeatureToggle.UPDATE_BOOKING_USED.is_active()
+
+    def test_snapshot_is_kept_if_version_has_not_changed(self, app):
+        invalidate_features_cache()
+
+        with outside_request_context(), freeze_time() as frozen_time:
+            assert FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+            deactivate_feature(FeatureToggle.SYNCHRONIZE_ALLOCINE)
+            frozen_time.tick(61)
+
+            with assert_num_queries(0):
+                assert FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+
+    def test_snapshot_is_reloaded_if_version_has_changed(self, app):
+        invalidate_features_cache()
+
+        with outside_request_context(), freeze_time() as frozen_time:
+            assert FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+            deactivate_feature(FeatureToggle.SYNCHRONIZE_ALLOCINE)
+            # Simulate a change made by another process.
+            app.redis_client.set(FEATURES_VERSION_REDIS_KEY, "new-version")
+
+            # The snapshot is still fresh.
+            assert FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+
+            frozen_time.tick(61)
+            with assert_num_queries(1):
+                assert not FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+
+    @override_settings(FEATURES_CACHE_MAX_AGE=300)
+    def test_snapshot_is_reloaded_after_max_age(self, app):
+        invalidate_features_cache()
+
+        with outside_request_context(), freeze_time() as frozen_time:
+            assert FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+            deactivate_feature(FeatureToggle.SYNCHRONIZE_ALLOCINE)
+
+            frozen_time.tick(241)
+            with assert_num_queries(0):  # version has not changed
+                assert FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+
+            frozen_time.tick(61)
+            with assert_num_queries(1):
+                assert not FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+
+    def test_fallback_to_database_if_redis_is_down(self, app):
+        invalidate_features_cache()
+
+        with outside_request_context(), freeze_time() as frozen_time:
+            assert FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+            deactivate_feature(FeatureToggle.SYNCHRONIZE_ALLOCINE)
+            frozen_time.tick(61)
+
+            with patch.object(app.redis_client, "get", side_effect=redis.exceptions.ConnectionError):
+                with assert_num_queries(1):
+                    assert not FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+
+
 @pytest.mark.usefixtures("db_session")
 class FeatureTest:
     def test_features_installation(self):
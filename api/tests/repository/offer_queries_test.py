@@ -5,9 +5,9 @@ from pcapi.model_creators.generic_creators import create_venue
 from pcapi.model_creators.specific_creators import create_offer_with_event_product
 from pcapi.model_creators.specific_creators import create_offer_with_thing_product
 from pcapi.repository import repository
+from pcapi.repository.offer_queries import get_active_offer_ids_after
+from pcapi.repository.offer_queries import get_offer_ids_by_venue_id_after
 from pcapi.repository.offer_queries import get_offers_by_ids
-from pcapi.repository.offer_queries import get_paginated_active_offer_ids
-from pcapi.repository.offer_queries import get_paginated_offer_ids_by_venue_id
 
 
 class GetOffersByIdsTest:
@@ -30,86 +30,33 @@ class GetOffersByIdsTest:
         assert offer2 in offers
 
 
-class GetPaginatedActiveOfferIdsTest:
+class GetActiveOfferIdsAfterTest:
     @pytest.mark.usefixtures("db_session")
-    def test_should_return_two_offer_ids_from_first_page_when_limit_is_two_and_two_active_offers(self, app):
-        # Given
-        offerer = create_offerer()
-        venue = create_venue(offerer=offerer)
-        offer1 = create_offer_with_event_product(is_active=True, venue=venue)
-        offer2 = create_offer_with_event_product(is_active=True, venue=venue)
-        create_offer_with_thing_product(is_active=True, venue=venue)
-        create_offer_with_thing_product(is_active=True, venue=venue)
-        repository.save(offer1, offer2)
-
-        # When
-        offer_ids = get_paginated_active_offer_ids(limit=2, page=0)
-
-        # Then
-        assert set(offer_ids) == {offer1.id, offer2.id}
-
-    @pytest.mark.usefixtures("db_session")
-    def test_should_return_one_offer_id_from_second_page_when_limit_is_1_and_three_active_offers(self, app):
-        # Given
+    def test_return_active_offer_ids_after_given_id(self, app):
         offerer = create_offerer()
         venue = create_venue(offerer=offerer)
         offer1 = create_offer_with_event_product(is_active=True, venue=venue)
         offer2 = create_offer_with_event_product(is_active=False, venue=venue)
         offer3 = create_offer_with_thing_product(is_active=True, venue=venue)
-        create_offer_with_thing_product(is_active=True, venue=venue)
-        repository.save(offer1, offer2)
-
-        # When
-        offer_ids = get_paginated_active_offer_ids(limit=1, page=1)
-
-        # Then
-        assert offer_ids == [offer3.id]
-
-    @pytest.mark.usefixtures("db_session")
-    def test_should_return_one_offer_id_from_third_page_when_limit_is_1_and_three_active_offers(self, app):
-        # Given
-        offerer = create_offerer()
-        venue = create_venue(offerer=offerer)
-        offer1 = create_offer_with_event_product(is_active=True, venue=venue)
-        offer2 = create_offer_with_event_product(is_active=False, venue=venue)
-        create_offer_with_thing_product(is_active=True, venue=venue)
         offer4 = create_offer_with_thing_product(is_active=True, venue=venue)
-        repository.save(offer1, offer2)
-
-        # When
-        offer_ids = get_paginated_active_offer_ids(limit=1, page=2)
-
-        # Then
-        assert offer_ids == [offer4.id]
-
-
-class GetPaginatedOfferIdsByVenueIdTest:
-    @pytest.mark.usefixtures("db_session")
-    def test_should_return_one_offer_id_in_two_offers_from_first_page_when_limit_is_one(self, app):
-        # Given
-        offerer = create_offerer()
-        venue = create_venue(offerer=offerer)
-        offer1 = create_offer_with_event_product(venue=venue)
-        offer2 = create_offer_with_event_product(venue=venue)
-        repository.save(offer1, offer2)
+        repository.save(offer1, offer2, offer3, offer4)
 
-        # When
-        offer_ids = get_paginated_offer_ids_by_venue_id(venue_id=venue.id, limit=1, page=0)
+        assert get_active_offer_ids_after(last_id=0, limit=2) == [offer1.id, offer3.id]
+        assert get_active_offer_ids_after(last_id=offer3.id, limit=2) == [offer4.id]
+        assert get_active_offer_ids_after(last_id=0, limit=10, max_id=offer3.id) == [offer1.id, offer3.id]
 
-        # Then
-        assert offer_ids == [offer1.id]
 
+class GetOfferIdsByVenueIdAfterTest:
     @pytest.mark.usefixtures("db_session")
-    def test_should_return_one_offer_id_in_two_offers_from_second_page_when_limit_is_one(self, app):
-        # Given
+    def test_return_offer_ids_of_venue_after_given_id(self, app):
         offerer = create_offerer()
         venue = create_venue(offerer=offerer)
+        other_venue = create_venue(offerer=offerer, siret="12345678912346")
         offer1 = create_offer_with_event_product(venue=venue)
-        offer2 = create_offer_with_event_product(venue=venue)
-        repository.save(offer1, offer2)
+        offer2 = create_offer_with_event_product(venue=other_venue)
+        offer3 = create_offer_with_event_product(venue=venue)
+        repository.save(offer1, offer2, offer3)
 
-        # When
-        offer_ids = get_paginated_offer_ids_by_venue_id(venue_id=venue.id, limit=1, page=1)
-
-        # Then
-        assert offer_ids == [offer2.id]
+        assert get_offer_ids_by_venue_id_after(venue_id=venue.id, last_id=0, limit=1) == [offer1.id]
+        assert get_offer_ids_by_venue_id_after(venue_id=venue.id, last_id=offer1.id, limit=1) == [offer3.id]
+        assert get_offer_ids_by_venue_id_after(venue_id=venue.id, last_id=offer3.id, limit=1) == []
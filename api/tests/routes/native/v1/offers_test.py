@@ -1,13 +1,17 @@
 from datetime import datetime
 from datetime import timedelta
+from unittest.mock import patch
 
 from freezegun import freeze_time
 import pytest
 
 from pcapi import settings
+from pcapi.core import search
 from pcapi.core.bookings.factories import BookingFactory
 from pcapi.core.categories import subcategories
 import pcapi.core.mails.testing as mails_testing
+from pcapi.core.offers import cache as offers_cache
+from pcapi.core.offers.factories import DigitalOfferFactory
 from pcapi.core.offers.factories import EventStockFactory
 from pcapi.core.offers.factories import MediationFactory
 from pcapi.core.offers.factories import OfferFactory
@@ -18,6 +22,7 @@ from pcapi.core.offers.factories import ThingStockFactory
 from pcapi.core.offers.models import OfferReport
 from pcapi.core.testing import assert_num_queries
 from pcapi.core.testing import override_features
+from pcapi.core.testing import override_settings
 from pcapi.core.users import factories as users_factories
 from pcapi.core.users.factories import UserFactory
 import pcapi.notifications.push.testing as notifications_testing
@@ -192,7 +197,7 @@ class OffersTest:
         offer_id = stock.offer.id
 
         queries = 1  # select offer
-        queries += 1  # get available_activation_code for each offer.stocks
+        queries += 1  # get available activation codes of all stocks
 
         # when
         with assert_num_queries(queries):
@@ -208,7 +213,7 @@ class OffersTest:
         offer_id = stock.offer.id
 
         queries = 1  # select offer
-        queries += 1  # get available_activation_code for each offer.stocks
+        queries += 1  # get available activation codes of all stocks
 
         # when
         with assert_num_queries(queries):
@@ -218,13 +223,33 @@ class OffersTest:
         assert response.status_code == 200
         assert response.json["stocks"][0]["activationCode"] == {"expirationDate": "2050-01-01T00:00:00Z"}
 
+    def test_get_digital_offer_with_many_stocks(self, app):
+        offer = DigitalOfferFactory()
+        StockWithActivationCodesFactory(offer=offer, activationCodes__expirationDate=datetime(2050, 1, 1))
+        StockWithActivationCodesFactory(offer=offer, activationCodes__expirationDate=datetime(2000, 1, 1))
+        StockWithActivationCodesFactory(offer=offer)
+        ThingStockFactory(offer=offer)
+        offer_id = offer.id
+
+        queries = 1  # select offer
+        queries += 1  # get available activation codes of all stocks
+        with assert_num_queries(queries):
+            response = TestClient(app.test_client()).get(f"/native/v1/offer/{offer_id}")
+
+        assert response.status_code == 200
+        activation_codes = [stock["activationCode"] for stock in response.json["stocks"]]
+        assert len(activation_codes) == 4
+        assert {"expirationDate": "2050-01-01T00:00:00Z"} in activation_codes
+        assert {"expirationDate": None} in activation_codes
+        assert activation_codes.count(None) == 2
+
     def test_get_digital_offer_without_available_activation_code(self, app):
         # given
         stock = StockWithActivationCodesFactory(activationCodes__expirationDate=datetime(2000, 1, 1))
         offer_id = stock.offer.id
 
         queries = 1  # select offer
-        queries += 1  # get available_activation_code for each offer.stocks
+        queries += 1  # get available activation codes of all stocks
 
         # when
         with assert_num_queries(2):
@@ -250,6 +275,64 @@ class OffersTest:
         assert response.status_code == 404
 
 
+@override_settings(NATIVE_OFFER_CACHE_TTL=300)
+class CachedOfferTest:
+    def test_second_call_is_served_from_cache(self, app):
+        stock = ThingStockFactory(price=12.34)
+        offer_id = stock.offer.id
+
+        with assert_num_queries(1):
+            first = TestClient(app.test_client()).get(f"/native/v1/offer/{offer_id}")
+        with assert_num_queries(0):
+            second = TestClient(app.test_client()).get(f"/native/v1/offer/{offer_id}")
+
+        assert first.status_code == second.status_code == 200
+        assert second.json == first.json
+        assert second.json["stocks"][0]["price"] == 1234
+
+    def test_reindexing_offer_invalidates_cache(self, app):
+        stock = ThingStockFactory()
+        offer_id = stock.offer.id
+        TestClient(app.test_client()).get(f"/native/v1/offer/{offer_id}")
+
+        search.async_index_offer_ids([offer_id])
+
+        assert offers_cache.get_native_offer(offer_id) is None
+
+    def test_reindexing_venue_invalidates_cache(self, app):
+        stock = ThingStockFactory()
+        offer_id = stock.offer.id
+        venue_id = stock.offer.venueId
+        TestClient(app.test_client()).get(f"/native/v1/offer/{offer_id}")
+        assert offers_cache.get_native_offer(offer_id) is not None
+
+        search.async_index_offers_of_venue_ids([venue_id])
+
+        assert offers_cache.get_native_offer(offer_id) is None
+
+    def test_cancellation_limit_datetime_is_recomputed(self, app):
+        with freeze_time("2020-01-01") as frozen_time:
+            stock = EventStockFactory(beginningDatetime=datetime(2020, 1, 30))
+            offer_id = stock.offer.id
+            response = TestClient(app.test_client()).get(f"/native/v1/offer/{offer_id}")
+            assert response.json["stocks"][0]["cancellationLimitDatetime"] == "2020-01-03T00:00:00Z"
+
+            frozen_time.tick(timedelta(minutes=1))
+            with assert_num_queries(0):
+                response = TestClient(app.test_client()).get(f"/native/v1/offer/{offer_id}")
+
+        assert response.json["stocks"][0]["cancellationLimitDatetime"] == "2020-01-03T00:01:00Z"
+
+    def test_ttl_is_bounded_by_next_booking_limit_datetime(self, app):
+        stock = ThingStockFactory(bookingLimitDatetime=datetime.utcnow() + timedelta(seconds=60))
+        offer_id = stock.offer.id
+
+        TestClient(app.test_client()).get(f"/native/v1/offer/{offer_id}")
+
+        ttl = app.redis_client.ttl(offers_cache.NATIVE_OFFER_REDIS_KEY.format(offer_id=offer_id))
+        assert 0 < ttl <= 60
+
+
 class SendOfferWebAppLinkTest:
     def test_sendinblue_send_offer_webapp_link_by_email(self, client):
         """
@@ -495,6 +578,15 @@ class OfferReportReasonsTest:
             "OTHER": {"title": "Autre", "description": ""},
         }
 
+    def test_cached_reasons_require_authentication(self, app, client):
+        user = UserFactory()
+        response = client.with_token(user.email).get("/native/v1/offer/report/reasons")
+        assert response.status_code == 200
+        assert response.headers["Cache-Control"] == "private, max-age=600"
+
+        response = TestClient(app.test_client()).get("/native/v1/offer/report/reasons")
+        assert response.status_code == 401
+
 
 class ReportedOffersTest:
     def test_get_user_reported_offers(self, client):
@@ -540,6 +632,23 @@ class ReportedOffersTest:
 
 
 class SubcategoriesTest:
+    def test_cached_response(self, app):
+        client = TestClient(app.test_client())
+        response = client.get("/native/v1/subcategories")
+        assert response.status_code == 200
+        assert response.headers["Cache-Control"] == "public, max-age=600"
+        etag = response.headers["ETag"]
+
+        with patch("pcapi.routes.native.v1.offers.serializers.SubcategoriesResponseModel") as response_model:
+            response = client.get("/native/v1/subcategories")
+        assert response.status_code == 200
+        assert response.headers["ETag"] == etag
+        response_model.assert_not_called()
+
+        response = client.get("/native/v1/subcategories", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.data == b""
+
     def test_get_subcategories(self, app):
         with assert_num_queries(0):
             response = TestClient(app.test_client()).get("/native/v1/subcategories")
@@ -66,3 +66,19 @@ class SettingsTest:
             "objectStorageUrl": "http://localhost/storage",
             "proDisableEventsQrcode": True,
         }
+
+    def test_cached_response_depends_on_features(self, app):
+        client = TestClient(app.test_client())
+        with override_features(ENABLE_PHONE_VALIDATION=True):
+            response = client.get("/native/v1/settings")
+            assert response.headers["Cache-Control"] == "public, max-age=60"
+            etag = response.headers["ETag"]
+
+            response = client.get("/native/v1/settings", headers={"If-None-Match": etag})
+            assert response.status_code == 304
+
+        with override_features(ENABLE_PHONE_VALIDATION=False):
+            response = client.get("/native/v1/settings", headers={"If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.headers["ETag"] != etag
+            assert not response.json["enablePhoneValidation"]
@@ -14,6 +14,7 @@ import pcapi.core.offers.factories as offers_factories
 from pcapi.core.offers.factories import VenueFactory
 from pcapi.core.testing import assert_num_queries
 import pcapi.core.users.factories as users_factories
+from pcapi.domain.booking_recap.bookings_recap_paginated import BookingsRecapPaginated
 from pcapi.utils.date import format_into_timezoned_date
 from pcapi.utils.date import utc_datetime_to_department_timezone
 from pcapi.utils.human_ids import humanize
@@ -30,6 +31,7 @@ class GetAllBookingsTest:
     @pytest.mark.usefixtures("db_session")
     @patch("pcapi.core.bookings.repository.find_by_pro_user")
     def test_call_repository_with_user_and_page(self, find_by_pro_user, app):
+        find_by_pro_user.return_value = BookingsRecapPaginated(bookings_recap=[], page=3, pages=0, total=0)
         pro = users_factories.ProFactory()
         response = (
             TestClient(app.test_client())
@@ -46,6 +48,7 @@ class GetAllBookingsTest:
             venue_id=None,
             offer_type=None,
             page=3,
+            cursor=None,
         )
 
     @pytest.mark.usefixtures("db_session")
@@ -63,6 +66,7 @@ class GetAllBookingsTest:
             venue_id=None,
             offer_type=None,
             page=1,
+            cursor=None,
         )
 
     @pytest.mark.usefixtures("db_session")
@@ -86,6 +90,7 @@ class GetAllBookingsTest:
             venue_id=venue.id,
             offer_type=None,
             page=1,
+            cursor=None,
         )
 
 
@@ -297,6 +302,15 @@ class Returns400Test:
         assert response.status_code == 400
         assert response.json["page"] == ["Saisissez un nombre valide"]
 
+    def when_cursor_is_invalid(self, app):
+        pro = users_factories.ProFactory()
+
+        client = TestClient(app.test_client()).with_session_auth(pro.email)
+        response = client.get(f"/bookings/pro?{BOOKING_PERIOD_PARAMS}&cursor=invalid")
+
+        assert response.status_code == 400
+        assert "cursor" in response.json
+
     def when_booking_period_and_event_date_is_not_given(self, app):
         pro = users_factories.ProFactory()
 
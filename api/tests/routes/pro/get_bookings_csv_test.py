@@ -0,0 +1,39 @@
+import csv
+from datetime import datetime
+from io import StringIO
+from unittest import mock
+
+import pytest
+
+import pcapi.core.bookings.factories as bookings_factories
+import pcapi.core.offerers.factories as offerers_factories
+import pcapi.core.offers.factories as offers_factories
+
+
+pytestmark = pytest.mark.usefixtures("db_session")
+
+
+class Returns200Test:
+    def test_stream_report(self, client):
+        user_offerer = offerers_factories.UserOffererFactory()
+        stock = offers_factories.ThingStockFactory(offer__venue__managingOfferer=user_offerer.offerer)
+        bookings = bookings_factories.IndividualBookingFactory.create_batch(
+            3, stock=stock, dateCreated=datetime(2020, 8, 11, 12, 0, 0)
+        )
+
+        client = client.with_session_auth(user_offerer.user.email)
+        with mock.patch("pcapi.core.bookings.repository.CSV_REPORT_CHUNK_SIZE", 2):
+            response = client.get(
+                "/bookings/csv?bookingPeriodBeginningDate=2020-08-10&bookingPeriodEndingDate=2020-08-12"
+            )
+            body = response.data  # the report is generated while the response is read
+
+        assert response.status_code == 200
+        assert response.headers["Content-Type"] == "text/csv; charset=utf-8;"
+        assert response.headers["Content-Disposition"] == "attachment; filename=reservations_pass_culture.csv"
+        assert body.startswith("\ufeff".encode("utf-8"))
+        headers, *data = csv.reader(StringIO(body.decode("utf-8-sig")), delimiter=";")
+        assert headers[0] == "Lieu"
+        assert sorted(row[headers.index("Contremarque")] for row in data) == sorted(
+            booking.token for booking in bookings
+        )
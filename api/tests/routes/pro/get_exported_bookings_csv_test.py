@@ -0,0 +1,73 @@
+from datetime import datetime
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+
+from pcapi.core.users import utils as users_utils
+import pcapi.core.users.factories as users_factories
+
+from tests.conftest import TestClient
+
+
+pytestmark = pytest.mark.usefixtures("db_session")
+
+
+def _get_token(user, expiration_date=None):
+    return users_utils.encode_jwt_payload(
+        {"user_id": user.id, "object_id": f"{user.id}/report.csv"},
+        expiration_date or datetime.utcnow() + timedelta(days=1),
+    )
+
+
+class Returns200Test:
+    @mock.patch("pcapi.core.users.utils.get_object")
+    def test_download(self, mocked_get_object, client):
+        content = "\ufeffLieu;Nom de l’offre\r\n".encode("utf-8")
+        blob = mock.Mock(size=len(content))
+        blob.download_as_bytes.side_effect = lambda start, end: content[start : end + 1]
+        mocked_get_object.return_value = blob
+        pro = users_factories.ProFactory()
+
+        client = client.with_session_auth(pro.email)
+        response = client.get(f"/bookings/csv/exports/{_get_token(pro)}")
+
+        assert response.status_code == 200
+        assert response.headers["Content-Disposition"] == "attachment; filename=reservations_pass_culture.csv"
+        assert response.data == content
+        mocked_get_object.assert_called_once_with(f"bookings_exports/{pro.id}/report.csv")
+
+
+class Returns401Test:
+    @mock.patch("pcapi.core.users.utils.get_object")
+    def test_not_authenticated(self, mocked_get_object, app):
+        pro = users_factories.ProFactory()
+
+        response = TestClient(app.test_client()).get(f"/bookings/csv/exports/{_get_token(pro)}")
+
+        assert response.status_code == 401
+        mocked_get_object.assert_not_called()
+
+
+class Returns404Test:
+    @mock.patch("pcapi.core.users.utils.get_object")
+    def test_expired_link(self, mocked_get_object, client):
+        pro = users_factories.ProFactory()
+        token = _get_token(pro, expiration_date=datetime.utcnow() - timedelta(minutes=1))
+
+        client = client.with_session_auth(pro.email)
+        response = client.get(f"/bookings/csv/exports/{token}")
+
+        assert response.status_code == 404
+        mocked_get_object.assert_not_called()
+
+    @mock.patch("pcapi.core.users.utils.get_object")
+    def test_link_of_another_user(self, mocked_get_object, client):
+        pro = users_factories.ProFactory()
+        other_pro = users_factories.ProFactory()
+
+        client = client.with_session_auth(other_pro.email)
+        response = client.get(f"/bookings/csv/exports/{_get_token(pro)}")
+
+        assert response.status_code == 404
+        mocked_get_object.assert_not_called()
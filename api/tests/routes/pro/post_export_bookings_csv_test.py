@@ -0,0 +1,61 @@
+from datetime import date
+from unittest import mock
+
+import pytest
+
+from pcapi.core.bookings.models import BookingStatusFilter
+import pcapi.core.offerers.factories as offerers_factories
+from pcapi.tasks import bookings_tasks
+
+from tests.conftest import TestClient
+
+
+pytestmark = pytest.mark.usefixtures("db_session")
+
+
+class Returns204Test:
+    @mock.patch("pcapi.routes.pro.bookings.bookings_tasks.export_bookings_csv_task.delay")
+    def test_enqueue_export(self, mocked_delay, client):
+        user_offerer = offerers_factories.UserOffererFactory()
+
+        client = client.with_session_auth(user_offerer.user.email)
+        response = client.post(
+            "/bookings/csv/export?bookingPeriodBeginningDate=2022-01-01&bookingPeriodEndingDate=2022-01-31"
+            "&bookingStatusFilter=validated"
+        )
+
+        assert response.status_code == 204
+        mocked_delay.assert_called_once_with(
+            bookings_tasks.ExportBookingsCsvRequest(
+                user_id=user_offerer.user.id,
+                booking_period_beginning_date=date(2022, 1, 1),
+                booking_period_ending_date=date(2022, 1, 31),
+                status_filter=BookingStatusFilter.VALIDATED,
+                event_date=None,
+                venue_id=None,
+                offer_type=None,
+            )
+        )
+
+    @mock.patch("pcapi.core.users.utils.store_object_from_file")
+    def test_export_and_send_email(self, mocked_store_object_from_file, client):
+        user_offerer = offerers_factories.UserOffererFactory()
+
+        client = client.with_session_auth(user_offerer.user.email)
+        response = client.post(
+            "/bookings/csv/export?bookingPeriodBeginningDate=2022-01-01&bookingPeriodEndingDate=2022-01-31"
+        )
+
+        # Tasks are run synchronously in tests.
+        assert response.status_code == 204
+        mocked_store_object_from_file.assert_called_once()
+        assert mocked_store_object_from_file.call_args.args[0] == "bookings_exports"
+
+
+class Returns401Test:
+    @mock.patch("pcapi.routes.pro.bookings.bookings_tasks.export_bookings_csv_task.delay")
+    def test_not_authenticated(self, mocked_delay, app):
+        response = TestClient(app.test_client()).post("/bookings/csv/export")
+
+        assert response.status_code == 401
+        mocked_delay.assert_not_called()
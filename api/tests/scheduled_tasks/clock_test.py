@@ -1,5 +1,6 @@
 from datetime import datetime
 from datetime import timedelta
+from unittest import mock
 
 from freezegun import freeze_time
 import pytest
@@ -8,11 +9,13 @@ from pcapi.core.bookings import constants
 from pcapi.core.bookings import factories as bookings_factories
 from pcapi.core.bookings.models import BookingStatus
 from pcapi.core.offers import factories as offers_factories
+from pcapi.core.testing import override_features
 from pcapi.core.testing import override_settings
 from pcapi.core.users import factories as users_factories
 from pcapi.notifications.push import testing
 from pcapi.scheduled_tasks.clock import pc_notify_users_bookings_not_retrieved
 from pcapi.scheduled_tasks.clock import pc_send_today_events_notifications_metropolitan_france
+from pcapi.scheduled_tasks.clock import price_bookings
 
 
 @pytest.mark.usefixtures("db_session")
@@ -72,3 +75,15 @@ def test_pc_notify_users_bookings_not_retrieved() -> None:
     assert (
         data["message"]["body"] == f'Vite, il ne te reste plus que 3 jours pour récupérer "{booking.stock.offer.name}"'
     )
+
+
+@pytest.mark.usefixtures("db_session")
+@pytest.mark.parametrize("by_business_unit", [False, True])
+@mock.patch("pcapi.core.finance.api.price_bookings_by_business_unit")
+@mock.patch("pcapi.core.finance.api.price_bookings")
+def test_price_bookings(mocked_price_bookings, mocked_price_bookings_by_business_unit, by_business_unit):
+    with override_features(PRICE_BOOKINGS=True, PRICE_BOOKINGS_BY_BUSINESS_UNIT=by_business_unit):
+        price_bookings()
+
+    assert mocked_price_bookings.called is not by_business_unit
+    assert mocked_price_bookings_by_business_unit.called is by_business_unit
@@ -0,0 +1,33 @@
+from unittest import mock
+
+import pytest
+
+
+pytestmark = pytest.mark.usefixtures("db_session")
+
+
+def _run_command(app, *args):
+    runner = app.test_cli_runner()
+    args = ("process_active_offers_from_database",) + args
+    return runner.invoke(args=args)
+
+
+@mock.patch("pcapi.scripts.algolia_indexing.commands.batch_indexing_active_offers_in_algolia_from_database")
+@mock.patch("pcapi.core.search.unindex_all_offers")
+def test_clear(mock_unindex_all_offers, mock_batch_indexing, app):
+    result = _run_command(app, "--clear")
+
+    assert result.exit_code == 0
+    mock_unindex_all_offers.assert_called_once_with()
+    mock_batch_indexing.assert_called_once_with(limit=10_000, from_id=1, to_id=None, resume=False)
+
+
+@mock.patch("pcapi.scripts.algolia_indexing.commands.batch_indexing_active_offers_in_algolia_from_database")
+@mock.patch("pcapi.core.search.unindex_all_offers")
+def test_refuse_to_clear_when_indexing_id_range(mock_unindex_all_offers, mock_batch_indexing, app):
+    result = _run_command(app, "--clear", "--from-id", "1000", "--to-id", "2000")
+
+    assert result.exit_code != 0
+    assert "--clear cannot be used" in result.output
+    mock_unindex_all_offers.assert_not_called()
+    mock_batch_indexing.assert_not_called()
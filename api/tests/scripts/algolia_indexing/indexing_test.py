@@ -3,58 +3,49 @@ from unittest import mock
 import pytest
 
 import pcapi.core.offers.factories as offers_factories
-from pcapi.scripts.algolia_indexing.indexing import batch_indexing_offers_in_algolia_from_database
+from pcapi.scripts.algolia_indexing.indexing import batch_indexing_active_offers_in_algolia_from_database
 from pcapi.scripts.algolia_indexing.indexing import batch_indexing_venues_in_algolia_from_database
 
 
-# FIXME (dbaty, 2021-06-25): review these tests (remove mock of database queries)
-class BatchIndexingOffersInAlgoliaFromDatabaseTest:
-    @mock.patch("pcapi.repository.offer_queries.get_paginated_active_offer_ids")
+@pytest.mark.usefixtures("db_session")
+class BatchIndexingActiveOffersInAlgoliaFromDatabaseTest:
     @mock.patch("pcapi.core.search.reindex_offer_ids")
-    def test_should_index_offers_once_when_offers_per_page_is_one_and_only_one_page(
-        self, mock_reindex_offer_ids, mock_get_paginated_active_offer_ids
-    ):
-        # Given
-        mock_get_paginated_active_offer_ids.side_effect = [[1], []]
+    def test_index_by_batches(self, mock_reindex_offer_ids, app):
+        offer1, offer2, offer3 = offers_factories.OfferFactory.create_batch(3)
+        offers_factories.OfferFactory(isActive=False)
 
-        # When
-        batch_indexing_offers_in_algolia_from_database(ending_page=None, limit=1, starting_page=0)
+        batch_indexing_active_offers_in_algolia_from_database(limit=2)
 
-        # Then
-        assert mock_get_paginated_active_offer_ids.call_count == 2
-        mock_reindex_offer_ids.assert_called_once_with([1])
+        assert mock_reindex_offer_ids.call_args_list == [
+            mock.call([offer1.id, offer2.id]),
+            mock.call([offer3.id]),
+        ]
+        assert not app.redis_client.keys("search:algolia:full-reindex-checkpoint:*")
 
-    @mock.patch("pcapi.repository.offer_queries.get_paginated_active_offer_ids")
     @mock.patch("pcapi.core.search.reindex_offer_ids")
-    def test_should_index_offers_twice_when_offers_per_page_is_one_and_two_pages(
-        self, mock_reindex_offer_ids, mock_get_paginated_active_offer_ids
-    ):
-        # Given
-        mock_get_paginated_active_offer_ids.side_effect = [[1], [2], []]
+    def test_index_id_range(self, mock_reindex_offer_ids):
+        offer1, offer2, offer3 = offers_factories.OfferFactory.create_batch(3)
 
-        # When
-        batch_indexing_offers_in_algolia_from_database(ending_page=None, limit=1, starting_page=0)
+        batch_indexing_active_offers_in_algolia_from_database(limit=10, from_id=offer2.id, to_id=offer2.id)
 
-        # Then
-        assert mock_get_paginated_active_offer_ids.call_count == 3
-        assert mock_reindex_offer_ids.call_args_list == [
-            mock.call([1]),
-            mock.call([2]),
-        ]
+        mock_reindex_offer_ids.assert_called_once_with([offer2.id])
 
-    @mock.patch("pcapi.repository.offer_queries.get_paginated_active_offer_ids")
     @mock.patch("pcapi.core.search.reindex_offer_ids")
-    def test_should_index_offers_from_first_page_only_when_ending_page_is_provided(
-        self, mock_reindex_offer_ids, mock_get_paginated_active_offer_ids
-    ):
-        # Given
-        mock_get_paginated_active_offer_ids.side_effect = [[1], [2], []]
+    def test_resume_from_checkpoint(self, mock_reindex_offer_ids, app):
+        offer1, offer2, offer3 = offers_factories.OfferFactory.create_batch(3)
+        mock_reindex_offer_ids.side_effect = [None, ValueError("Algolia is down")]
+
+        with pytest.raises(ValueError):
+            batch_indexing_active_offers_in_algolia_from_database(limit=1)
+        assert app.redis_client.get("search:algolia:full-reindex-checkpoint:1:") == str(offer1.id)
 
-        # When
-        batch_indexing_offers_in_algolia_from_database(ending_page=1, limit=1, starting_page=0)
+        mock_reindex_offer_ids.reset_mock(side_effect=True)
+        batch_indexing_active_offers_in_algolia_from_database(limit=1, resume=True)
 
-        # Then
-        mock_reindex_offer_ids.assert_called_once_with([1])
+        assert mock_reindex_offer_ids.call_args_list == [
+            mock.call([offer2.id]),
+            mock.call([offer3.id]),
+        ]
 
 
 @pytest.mark.usefixtures("db_session")
@@ -0,0 +1,15 @@
+import pytest
+
+
+pytestmark = pytest.mark.usefixtures("db_session")
+
+
+def test_benchmark(app):
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=("benchmark_reimbursement_rules", "--iterations", "2"))
+
+    assert result.exit_code == 0, result.output
+    assert "regular rules, without index" in result.output
+    assert "regular rules, with index" in result.output
+    assert "custom rules, cached" in result.output